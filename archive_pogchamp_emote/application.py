@@ -1,14 +1,29 @@
 import logging
 import pprint
 import subprocess
-import sys
 import json
+import concurrent.futures
 
 import attr
 
 from archive_pogchamp_emote import model as model
 from archive_pogchamp_emote import utils as utils
 from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import wbm as wbm
+from archive_pogchamp_emote import cdx as cdx
+from archive_pogchamp_emote import wbm_http as wbm_http
+from archive_pogchamp_emote import wbm_cache as wbm_cache
+from archive_pogchamp_emote import wbm_retry as wbm_retry
+from archive_pogchamp_emote import stages as stages
+from archive_pogchamp_emote import checkpoint as checkpoint
+from archive_pogchamp_emote import process as process
+from archive_pogchamp_emote import native_fetch as native_fetch
+from archive_pogchamp_emote import warc_zstd as warc_zstd
+from archive_pogchamp_emote import wpull_runner as wpull_runner
+from archive_pogchamp_emote import wpull_monitor as wpull_monitor
+from archive_pogchamp_emote import blob_store as blob_store
+from archive_pogchamp_emote import warc as warc
+from archive_pogchamp_emote import metrics as metrics
 
 
 logger = logging.getLogger(__name__)
@@ -18,13 +33,19 @@ class Application:
     main application
     '''
 
-    def __init__(self, args):
+    def __init__(self, args, job_limits=None):
         ''' constructor
         @param logger the Logger instance
         @param args - the namespace object we get from argparse.parse_args()
+        @param job_limits - a `model.JobLimits` that caps the number of concurrent wpull / youtube-dl jobs,
+            if None then there is no cap
         '''
 
         self.args = args
+        self.job_limits = job_limits if job_limits is not None else model.JobLimits()
+        self.checkpoint_journal = None
+        self.blob_store = None
+        self.metrics_recorder = metrics.MetricsRecorder()
 
     def run(self):
 
@@ -32,7 +53,165 @@ class Application:
 
         emote_config = utils.build_emote_config_from_argparse_args(self.args)
 
-        wpull_pex_path = self.args.wpull_pex_path
+        if self.args.native_emote_fetch:
+            # find out now rather than after the wayback machine saves are done
+            native_fetch.check_native_fetch_dependencies()
+
+        if self.args.zstd_recompress:
+            warc_zstd.check_zstd_dependencies()
+
+        # the journal lives in the day's folder, so create it now instead of waiting on the folder stage
+        emote_config.root_output_folder.mkdir(exist_ok=True)
+        self.checkpoint_journal = checkpoint.CheckpointJournal(
+            emote_config.root_output_folder / constants.CHECKPOINT_JOURNAL_FILE_FORMAT.format(
+                emote_config.emote_date.format(constants.ARROW_DATE_FORMAT)),
+            resume=not self.args.no_resume)
+
+        # the stages only depend on what they actually need, so the wayback machine saves, youtube-dl
+        # and wpull all run at the same time, wpull only has to wait on the WARC headers
+        scheduler = stages.StageScheduler()
+
+        def _add_stage(name, func, dependencies=()):
+            scheduler.add_stage(name, self._timed_stage(name, self._checkpointed_stage(name, func)), dependencies)
+
+        _add_stage(constants.STAGE_CREATE_FOLDERS,
+            lambda results: self.create_folders(emote_config))
+        _add_stage(constants.STAGE_WRITE_VERSION_INFO,
+            lambda results: self.write_version_info_file(emote_config),
+            dependencies=[constants.STAGE_CREATE_FOLDERS])
+        _add_stage(constants.STAGE_WBM_SAVE,
+            lambda results: self.save_urls_in_wbm(emote_config))
+        _add_stage(constants.STAGE_WRITE_WPULL_ARGUMENTS,
+            lambda results: self.write_wpull_arguments(emote_config, results[constants.STAGE_WBM_SAVE]),
+            dependencies=[constants.STAGE_CREATE_FOLDERS, constants.STAGE_WBM_SAVE])
+        _add_stage(constants.STAGE_YOUTUBE_DL,
+            lambda results: self.download_videos(emote_config),
+            dependencies=[constants.STAGE_CREATE_FOLDERS])
+
+        if self.args.blob_store:
+            self.blob_store = blob_store.BlobStore(blob_store.get_blob_store_folder(self.args.root_output_folder),
+                self.args.blob_store_link_mode)
+            _add_stage(constants.STAGE_BLOB_STORE,
+                lambda results: self.store_videos_in_blob_store(emote_config),
+                dependencies=[constants.STAGE_YOUTUBE_DL])
+
+        if self.args.native_emote_fetch:
+            _add_stage(constants.STAGE_NATIVE_FETCH,
+                lambda results: self.native_fetch_emote_urls(emote_config, results[constants.STAGE_WBM_SAVE]),
+                dependencies=[constants.STAGE_CREATE_FOLDERS, constants.STAGE_WBM_SAVE])
+
+        # with the native fetcher, wpull is only needed for the recursive crawl of the additional urls
+        if not self.args.native_emote_fetch or emote_config.additional_urls_to_include_in_warc:
+            _add_stage(constants.STAGE_WRITE_WPULL_URL_LIST,
+                lambda results: self.write_wpull_url_list(emote_config),
+                dependencies=[constants.STAGE_CREATE_FOLDERS])
+            _add_stage(constants.STAGE_WPULL,
+                lambda results: self.run_wpull(emote_config, results[constants.STAGE_WRITE_WPULL_ARGUMENTS]),
+                dependencies=[constants.STAGE_WRITE_WPULL_URL_LIST, constants.STAGE_WRITE_WPULL_ARGUMENTS])
+        else:
+            logger.info("the native fetcher is fetching the emote urls and there are no additional urls to include in the WARC, not running wpull")
+
+        # index whatever WARCs the day ended up with, once they are all written
+        _add_stage(constants.STAGE_CDXJ_INDEX,
+            lambda results: self.index_warcs(emote_config),
+            dependencies=[iter_stage for iter_stage in [constants.STAGE_WPULL, constants.STAGE_NATIVE_FETCH]
+                if scheduler.has_stage(iter_stage)])
+
+        if self.args.zstd_recompress:
+            _add_stage(constants.STAGE_ZSTD_RECOMPRESS,
+                lambda results: self.recompress_warcs_with_zstd(emote_config),
+                dependencies=[constants.STAGE_CDXJ_INDEX])
+
+        success = False
+        try:
+            with self.metrics_recorder.span(constants.METRICS_SPAN_RUN):
+                scheduler.run()
+            success = True
+        finally:
+            if self.blob_store is not None:
+                self.blob_store.close()
+
+            self.write_metrics(emote_config, success)
+
+    def _timed_stage(self, stage_name, func):
+        ''' wraps a stage function so it gets a span in the metrics
+
+        @param stage_name - the name of the stage
+        @param func - the stage function to wrap
+        @return the wrapped stage function
+        '''
+
+        def _inner_timed_stage(dependency_results):
+
+            with self.metrics_recorder.span(constants.METRICS_SPAN_STAGE_FORMAT.format(stage_name)):
+                return func(dependency_results)
+
+        return _inner_timed_stage
+
+    def write_metrics(self, emote_config, success:bool):
+        '''
+        writes the spans and counters of this run to the metrics json file in the day's folder, and to the
+        prometheus textfile if `--metrics-prometheus-textfile` was given. failing to write them is only logged,
+        so it doesn't hide whatever happened during the run
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param success - whether the run finished without an exception
+        '''
+
+        emote_date = emote_config.emote_date.format(constants.ARROW_DATE_FORMAT)
+
+        try:
+            self.metrics_recorder.write_json(
+                emote_config.root_output_folder / constants.METRICS_FILE_FORMAT.format(emote_date), emote_date, success)
+
+            if self.args.metrics_prometheus_textfile:
+                self.metrics_recorder.write_prometheus_textfile(self.args.metrics_prometheus_textfile, emote_date, success)
+
+        except Exception as e:
+            logger.exception("writing the metrics failed: `%s`", e)
+
+    def _checkpointed_stage(self, stage_name, func):
+        '''
+        wraps a stage function so it gets recorded in the checkpoint journal when it completes, and so that
+        stages in `constants.CHECKPOINT_SKIPPABLE_STAGES` are skipped if an earlier run already completed them
+
+        @param stage_name - the name of the stage
+        @param func - the stage function to wrap
+        @return the wrapped stage function
+        '''
+
+        def _inner_checkpointed_stage(dependency_results):
+
+            if stage_name in constants.CHECKPOINT_SKIPPABLE_STAGES and self.checkpoint_journal.is_stage_complete(stage_name):
+                logger.info("stage `%s` was already completed during an earlier run, skipping it", stage_name)
+                return None
+
+            result = func(dependency_results)
+
+            # a dry run didn't actually do the work, so don't let a later run skip it. wpull counts too
+            # when the wayback machine saves were a dry run, since its WARC headers won't have the archive urls
+            is_dry_run = {
+                constants.STAGE_YOUTUBE_DL: self.args.no_youtube_dl,
+                constants.STAGE_BLOB_STORE: self.args.no_youtube_dl,
+                constants.STAGE_WPULL: self.args.no_wbm_save,
+                constants.STAGE_NATIVE_FETCH: self.args.no_wbm_save,
+            }.get(stage_name, False)
+
+            if is_dry_run:
+                logger.info("stage `%s` was a dry run, not marking it as completed in the checkpoint journal", stage_name)
+            else:
+                self.checkpoint_journal.mark_stage_complete(stage_name)
+
+            return result
+
+        return _inner_checkpointed_stage
+
+    def create_folders(self, emote_config):
+        '''
+        creates the day's output folders if they don't exist yet
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        '''
 
         folders_to_create_if_they_dont_exist = [
             emote_config.root_output_folder,
@@ -40,9 +219,6 @@ class Application:
             emote_config.warc_output_folder
         ]
 
-        #########################################################################
-        # creating folders
-        #########################################################################
         for iter_folder_path in folders_to_create_if_they_dont_exist:
             if not iter_folder_path.exists():
                 logger.info("creating folder `%s` because it doesn't exist yet", iter_folder_path)
@@ -51,11 +227,13 @@ class Application:
             else:
                 logger.info("folder `%s` already exists, don't need to recreate it", iter_folder_path)
 
-        wpull_url_list_path = emote_config.root_output_folder / emote_config.warc_input_url_list_file_name
+    def write_version_info_file(self, emote_config):
+        '''
+        writes the app version info json file
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        '''
 
-        #########################################################################
-        # write version info file
-        #########################################################################
         ver_info_path = emote_config.root_output_folder / emote_config.application_version_info_name
         logger.info("writing app version info file to `%s`", ver_info_path)
 
@@ -68,17 +246,23 @@ class Application:
 
         logger.info("writing of app version info file was successful")
 
-        #########################################################################
-        # write wpull url list
-        #########################################################################
+    def write_wpull_url_list(self, emote_config):
+        '''
+        writes the list of urls that wpull will save in the WARC
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        '''
+
+        wpull_url_list_path = emote_config.root_output_folder / emote_config.warc_input_url_list_file_name
         logger.info("writing wpull url list to `%s`", wpull_url_list_path)
 
         with open(wpull_url_list_path, "w", encoding="utf-8") as f:
 
-            # write the base twitch emote URLs
-            for iter_url in constants.WPULL_INPUT_URLS_FORMAT_LIST:
-                url_to_write = iter_url.format(emote_config.twitch_emote_id)
-                f.write(f"{url_to_write}\n")
+            # write the base twitch emote URLs, unless the native fetcher is getting them
+            if not self.args.native_emote_fetch:
+                for iter_url in constants.WPULL_INPUT_URLS_FORMAT_LIST:
+                    url_to_write = iter_url.format(emote_config.twitch_emote_id)
+                    f.write(f"{url_to_write}\n")
 
             # write any additional urls the user may have provided in the configuration
             logger.info("including `%s` additional urls to save in the WARC",
@@ -88,157 +272,122 @@ class Application:
 
         logger.info("writing wpull url list was successful")
 
-        #########################################################################
-        # write wpull arguments file
-        #########################################################################
+    def write_wpull_arguments(self, emote_config, wbm_archive_urls):
+        '''
+        builds the WARC headers and writes the wpull arguments file
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param wbm_archive_urls - the `model.WbmArchiveUrls` we got back from saving the urls in the wayback machine
+        @return the path to the wpull arguments file
+        '''
+
         wpull_arguments_path = emote_config.root_output_folder / emote_config.warc_arguments_file_name
-        logger.info("writing wpull arguments to `%s`", wpull_arguments_path)
-
-        with open(wpull_arguments_path, "w", encoding="utf-8") as f:
-
-            f.write(f"{constants.WPULL_ARGUMENT_DATABASE}\n")
-            f.write(f"{emote_config.warc_output_folder / emote_config.warc_database_name}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_OUTPUT_FILE}\n")
-            f.write(f"{emote_config.warc_output_folder / emote_config.warc_output_file_name}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_INPUT_FILE_URL_LIST}\n")
-            f.write(f"{emote_config.root_output_folder / emote_config.warc_input_url_list_file_name}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_FILE}\n")
-            f.write(f"{emote_config.warc_output_folder / emote_config.warc_file_name}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_TEMPDIR}\n")
-            f.write(f"{emote_config.warc_tempdir_folder}\n")
-
-            #########################################################################
-            # WARC headers that always get included
-            ##########################################################################
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-            f.write(f"{constants.WARC_HEADER_DESCRIPTION}:Daily https://twitch.tv PogChamp emote for {emote_config.emote_date.format(constants.ARROW_DATE_FORMAT)}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-            f.write(f"{constants.WARC_HEADER_STREAMER_NAME}:{emote_config.streamer_name}\n")
+        warc_header_list = self.build_warc_header_list(emote_config, wbm_archive_urls)
 
-            # link to the streamer's twitch page, if there was a streamer today
-            if emote_config.streamer_twitch_url:
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{constants.WARC_HEADER_STREAMER_TWITCH_LINK}:{emote_config.streamer_twitch_url}\n")
-            else:
-                logger.info("no streamer twitch url configured, not adding the header to the wpull arguments file")
+        # let wpull write revisit records for payloads that an earlier day's WARC already has
+        dedup_cdx_path = None
+        if self.blob_store is not None:
+            dedup_cdx_path = emote_config.warc_output_folder / constants.WPULL_DEDUP_CDX_FILE_FORMAT.format(
+                emote_config.emote_date.format(constants.ARROW_DATE_FORMAT))
+            self.blob_store.write_wpull_dedup_cdx_file(dedup_cdx_path, emote_config.warc_file_name)
 
+        write_wpull_arguments_file(wpull_arguments_path, emote_config, warc_header_list, dedup_cdx_path)
 
-            #########################################################################
-            # link to the streamer's social media page + WBM save
-            #########################################################################
-            logger.info("saving `%s` streamer social media pages via the Wayback Machine",
-                len(emote_config.streamer_social_media_urls))
-            for idx, iter_social_media_url in enumerate(emote_config.streamer_social_media_urls):
+        if not self.args.no_wbm_save:
+            wbm_retry.write_wbm_manifest(self.get_wbm_manifest_path(emote_config),
+                emote_config.emote_date.format(constants.ARROW_DATE_FORMAT),
+                [{"url": iter_entry.url, "warc_header_key": iter_entry.warc_header_key, "archive_url": iter_entry.archive_url}
+                    for iter_entry in self.build_wbm_warc_header_entries(emote_config, wbm_archive_urls)])
 
-                streamer_social_media_link_archive = utils.save_archive_of_webpage_in_wbm(
-                    iter_social_media_url, idx, len(emote_config.streamer_social_media_urls), self.args.no_wbm_save)
+        return wpull_arguments_path
 
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{constants.WARC_HEADER_STREAMER_SOCIAL_MEDIA_URL_FORMAT.format(idx)}:{iter_social_media_url}\n")
+    def native_fetch_emote_urls(self, emote_config, wbm_archive_urls):
+        '''
+        fetches the emote image urls in this process and writes them to their own WARC, with the same
+        warcinfo headers that wpull gets
 
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{constants.WARC_HEADER_STREAMER_SOCIAL_MEDIA_URL_WBM_FORMAT.format(idx)}:{streamer_social_media_link_archive}\n")
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param wbm_archive_urls - the `model.WbmArchiveUrls` we got back from saving the urls in the wayback machine
+        '''
 
-            #########################################################################
-            # link to the twitter.com post by the Twitch user account announcing the emote of the day
-            #########################################################################
-            if emote_config.twitch_twitter_post_url:
-                logger.info("saving the announcement twitter.com/twitch post via the Wayback Machine")
-                twitch_twitter_post_url_archive = utils.save_archive_of_webpage_in_wbm(
-                    emote_config.twitch_twitter_post_url, 1, 1, self.args.no_wbm_save)
+        url_list = [iter_url.format(emote_config.twitch_emote_id) for iter_url in constants.WPULL_INPUT_URLS_FORMAT_LIST]
+        warc_path = emote_config.warc_output_folder / constants.NATIVE_FETCH_WARC_FILE_FORMAT.format(
+            emote_config.emote_date.format(constants.ARROW_DATE_FORMAT))
 
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{constants.WARC_HEADER_STREAMER_TWICH_TWEET_URL}:{emote_config.twitch_twitter_post_url}\n")
+        native_fetch.fetch_urls_to_warc(url_list, warc_path,
+            self.build_warc_header_list(emote_config, wbm_archive_urls), self.args.native_fetch_concurrency,
+            self.blob_store, self.metrics_recorder)
 
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{constants.WARC_HEADER_STREAMER_TWICH_TWEET_URL_WBM}:{twitch_twitter_post_url_archive}\n")
+        return warc_path
 
-            else:
-                logger.info("Twitch did not post on twitter about today's pogchamp emote, therefore nothing to save via the WBM")
+    def index_warcs(self, emote_config):
+        '''
+        writes a sorted CDXJ index next to every WARC in the day's WARC folder, a WARC that already has
+        an index that is newer than it (from an earlier run) is skipped
 
-            #########################################################################
-            # any other links the configuration file says to include as headers (plus the WBM backup)
-            #########################################################################
-            logger.info("saving `%s` additional url(s) via the Wayback Machine",
-                len(emote_config.additional_urls_to_save_via_wbm))
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        '''
 
-            for idx, iter_additional_url in enumerate(emote_config.additional_urls_to_save_via_wbm):
+        num_indexed = warc.index_warcs_in_folder(emote_config.warc_output_folder, only_if_stale=True)
 
-                iter_additional_url_archive = utils.save_archive_of_webpage_in_wbm(
-                    iter_additional_url, idx, len(emote_config.additional_urls_to_save_via_wbm), self.args.no_wbm_save)
+        logger.info("indexing `%s` WARC(s) was successful", num_indexed)
 
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{constants.WARC_HEADER_ADDITIONAL_URL_FORMAT.format(idx)}:{iter_additional_url}\n")
+    def recompress_warcs_with_zstd(self, emote_config):
+        '''
+        recompresses the day's WARCs to `.warc.zst` next to them, with the zstd dictionary from the root output
+        folder (which gets trained from the most recent days' WARCs the first time). the `.warc.gz` files are
+        kept, the CDXJ indexes and the blob store point into them
 
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{constants.WARC_HEADER_ADDITIONAL_URL_WBM_FORMAT.format(idx)}:{iter_additional_url_archive}\n")
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        '''
 
-            # date
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-            f.write(f"{constants.WARC_HEADER_DATE}:{emote_config.emote_date.format(constants.ARROW_DATE_FORMAT)}\n")
+        dictionary = warc_zstd.get_or_train_dictionary(self.args.root_output_folder)
 
+        result_list, num_failed = warc_zstd.recompress_warcs(warc.find_warc_files(emote_config.warc_output_folder),
+            dictionary, self.args.zstd_level, self.args.zstd_workers, only_if_stale=True)
 
-            ##############################################################################
-            # custom warc headers, provided by the configuration file
-            ##############################################################################
-            for iter_header in emote_config.extra_warc_headers:
+        if num_failed:
+            raise Exception(f"recompressing `{num_failed}` of the day's WARC(s) with zstd failed")
 
-                f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-                f.write(f"{iter_header.key}:{iter_header.value}\n")
+        logger.info("recompressing `%s` WARC(s) with zstd was successful", len(result_list))
 
-            #########################################################
-            # warc headers for this application
-            #########################################################
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-            f.write(f"{constants.WARC_HEADER_KEY_APPLICATION_NAME}:{constants.WARC_HEADER_VALUE_APPLICATION_NAME}\n")
+    def store_videos_in_blob_store(self, emote_config):
+        '''
+        adds every file in the day's video folder to the blob store, so a video we already have from
+        another day becomes a link to that one instead of a second copy
 
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-            f.write(f"{constants.WARC_HEADER_KEY_APPLICATION_VERSION}:{constants.WARC_HEADER_VALUE_APPLICATION_VERSION}\n")
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        '''
 
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-            f.write(f"{constants.WARC_HEADER_KEY_APPLICATION_GITHUB_LINK}:{constants.WARC_HEADER_VALUE_APPLICATION_GITHUB_LINK}\n")
+        path_list = [iter_path for iter_path in sorted(emote_config.youtube_dl_output_folder.glob("**/*"))
+            if iter_path.is_file() and not iter_path.is_symlink()]
 
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
-            f.write(f"{constants.WARC_HEADER_KEY_APPLICATION_GIT_HASH}:{utils.get_git_hash()}\n")
-
-            #########################################################
-            # rest of the wpull arguments
-            ########################################################
-            f.write(f"{constants.WPULL_ARGUMENT_WAITRETRY}\n")
-            f.write("30\n")
-            f.write(f"{constants.WPULL_ARGUMENT_NO_ROBOTS}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_MAX_SIZE}\n")
-            f.write("5368709000\n")
-            f.write(f"{constants.WPULL_ARGUMENT_HTML_PARSER}\n")
-            f.write("libxml2-lxml\n")
-            f.write(f"{constants.WPULL_ARGUMENT_PAGE_REQUISITES}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_DELETE_AFTER}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_WARC_APPEND}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_RECURSIVE}\n")
-            f.write(f"{constants.WPULL_ARGUMENT_VERBOSE}\n")
-
-        logger.info("writing wpull arguments was successful")
+        logger.info("adding `%s` file(s) from `%s` to the blob store", len(path_list), emote_config.youtube_dl_output_folder)
+
+        result_list = blob_store.add_files_to_blob_store(self.blob_store, path_list, self.args.dedup_workers)
+
+        logger.info("adding files to the blob store was successful, `%s` bytes saved",
+            sum(iter_result.bytes_saved for iter_result in result_list))
+
+    def download_videos(self, emote_config):
+        '''
+        downloads the twitter.com/twitch announcement video (if there is one) and any additional
+        videos in the config with youtube-dl
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        '''
+
+        video_url_list = []
 
         #########################################################################
         # save twitter.com/twitch twitter post with youtube-dl
         #########################################################################
 
-        total_videos_to_dl = len(emote_config.additional_urls_to_save_via_youtube_dl)
-        current_idx_of_videos_to_dl = 1
         # see if twitch actually made an announcement today and if that tweet contained a video
         if emote_config.twitch_twitter_post_is_video and emote_config.twitch_twitter_post_url:
-            total_videos_to_dl += 1
 
             logger.info("Downloading the twitter.com/twitch announcement video")
-
-            utils.save_video_with_youtube_dl(emote_config.youtube_dl_output_folder,
-                emote_config.twitch_twitter_post_url,
-                emote_config.ytdl_arguments_file_name,
-                self.args.no_youtube_dl)
-
-            current_idx_of_videos_to_dl += 1
-
-            logger.info("video download successful")
+            video_url_list.append(emote_config.twitch_twitter_post_url)
 
         else:
             logger.info("config has marked that the Twitch twitter post was not a video, not calling youtube-dl")
@@ -264,34 +413,466 @@ class Application:
         logger.info("saving `%s` additional video(s) with youtube-dl",
             len(emote_config.additional_urls_to_save_via_youtube_dl))
 
-        for idx, iter_video_url in enumerate(emote_config.additional_urls_to_save_via_youtube_dl, start=current_idx_of_videos_to_dl):
-            utils.save_video_with_youtube_dl(emote_config.youtube_dl_output_folder,
-                iter_video_url,
-                emote_config.ytdl_arguments_file_name,
-                idx,
-                total_videos_to_dl,
-                self.args.no_youtube_dl)
+        video_url_list.extend(emote_config.additional_urls_to_save_via_youtube_dl)
 
+        # skip the videos that an earlier run already downloaded
+        pending_request_list = []
+        for idx, iter_video_url in enumerate(video_url_list, start=1):
 
-        #########################################################################
-        # call wpull
-        #########################################################################
+            finished_video_folder = self.checkpoint_journal.get_video_folder(iter_video_url)
+            if finished_video_folder:
+                logger.info("[`%s/%s`] - video at `%s` was already downloaded to `%s` during an earlier run, skipping it",
+                    idx, len(video_url_list), iter_video_url, finished_video_folder)
+            else:
+                pending_request_list.append(model.VideoDownloadRequest(url=iter_video_url, idx=idx, total=len(video_url_list)))
 
-        wpull_argument_list = [
-            sys.executable,
-            wpull_pex_path,
-            f"@{wpull_arguments_path}"
-        ]
+        if self.args.youtube_dl_workers > 1 and len(pending_request_list) > 1:
+            self.download_videos_in_process_pool(emote_config, pending_request_list)
+
+        else:
+            for iter_request in pending_request_list:
+                with self.metrics_recorder.span(constants.METRICS_SPAN_YOUTUBE_DL_DOWNLOAD, url=iter_request.url):
+                    video_folder = download_video(self.job_limits.youtube_dl, emote_config.youtube_dl_output_folder,
+                        iter_request.url, emote_config.ytdl_arguments_file_name, iter_request.idx, iter_request.total,
+                        self.args.no_youtube_dl, self.args.youtube_dl_progress_interval)
+                self.on_video_downloaded(iter_request, video_folder)
+
+    def download_videos_in_process_pool(self, emote_config, video_request_list):
+        '''
+        downloads the videos in a process pool of `--youtube-dl-workers` processes, since the
+        youtube-dl extractors are mostly python code and would just fight over the GIL in threads
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param video_request_list - the list of `model.VideoDownloadRequest` objects to download
+        '''
+
+        num_workers = min(self.args.youtube_dl_workers, len(video_request_list))
+        logger.info("downloading `%s` video(s) with `%s` youtube-dl worker processes", len(video_request_list), num_workers)
+
+        with utils.worker_process_log_forwarding() as (initializer, initargs):
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers,
+                initializer=initializer, initargs=initargs) as executor:
+
+                # timed in the worker, so the time spent waiting for a free worker isn't counted
+                future_list = [
+                    executor.submit(metrics.timed_call, download_video, self.job_limits.youtube_dl, emote_config.youtube_dl_output_folder,
+                        iter_request.url, emote_config.ytdl_arguments_file_name, iter_request.idx, iter_request.total,
+                        self.args.no_youtube_dl, self.args.youtube_dl_progress_interval)
+                    for iter_request in video_request_list]
+
+                try:
+                    for iter_request, iter_future in zip(video_request_list, future_list):
+                        video_folder, start_timestamp, duration_seconds = iter_future.result()
+                        self.metrics_recorder.record_span(constants.METRICS_SPAN_YOUTUBE_DL_DOWNLOAD, start_timestamp, duration_seconds,
+                            url=iter_request.url)
+                        self.on_video_downloaded(iter_request, video_folder)
+                except Exception as e:
+                    logger.error("downloading a video failed, cancelling the remaining downloads")
+                    for iter_future in future_list:
+                        iter_future.cancel()
+                    raise e
+
+    def on_video_downloaded(self, video_request, video_folder):
+        '''
+        records a finished video download in the checkpoint journal, and how big it was in the metrics
+
+        @param video_request - the `model.VideoDownloadRequest` that finished
+        @param video_folder - the folder the video was downloaded to
+        '''
+
+        if not self.args.no_youtube_dl:
+            self.checkpoint_journal.record_video_folder(video_request.url, video_folder)
+
+            self.metrics_recorder.increment(constants.METRICS_COUNTER_BYTES_DOWNLOADED,
+                sum(iter_path.stat().st_size for iter_path in video_folder.glob("**/*") if iter_path.is_file()),
+                source=constants.METRICS_SOURCE_YOUTUBE_DL)
+
+        logger.info("[`%s/%s`] - video download successful", video_request.idx, video_request.total)
+
+    def run_wpull(self, emote_config, wpull_arguments_path):
+        '''
+        runs the wpull PEX with the arguments file we wrote, while watching its database for progress
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param wpull_arguments_path - the path to the wpull arguments file
+        '''
+
+        # stream the output to the logger as wpull runs instead of holding all of it in memory
+        # until it exits, the CompletedProcess we get back only has the last lines of the output
+        wpull_progress_counters = process.WpullProgressCounters()
+        runner = wpull_runner.WpullRunner(self.args.wpull_pex_path, self.args.wpull_pex_root)
 
-        logger.info("executing wpull with the arguments: `%s`", wpull_argument_list)
         try:
             # don't use `check=True` cause we need to check the status codes , and subprocess.run() doesn't have a built in
             # mechanism to do that
-            wpull_result = subprocess.run(wpull_argument_list, capture_output=True)
-            utils.check_completedprocess_for_acceptable_exit_codes(wpull_result, constants.ACCEPTABLE_WPULL_EXIT_CODES)
+            with self.job_limits.wpull, self.metrics_recorder.span(constants.METRICS_SPAN_WPULL_PROCESS):
+                runner.start(wpull_arguments_path, logger.getChild("wpull"),
+                    line_callback=wpull_progress_counters.parse_line)
+
+                monitor = wpull_monitor.WpullDatabaseMonitor(
+                    emote_config.warc_output_folder / emote_config.warc_database_name,
+                    emote_config.warc_output_folder,
+                    emote_config.warc_file_name,
+                    interval_seconds=self.args.wpull_monitor_interval_seconds,
+                    stall_timeout_seconds=None if self.args.wpull_stall_timeout_minutes is None else self.args.wpull_stall_timeout_minutes * 60,
+                    stop_callback=lambda: runner.stop(self.args.wpull_stop_grace_seconds),
+                    crawl_budget=emote_config.crawl_budget,
+                    warc_tempdir_folder=emote_config.warc_tempdir_folder)
+                monitor.start()
+
+                try:
+                    wpull_result = runner.wait()
+                finally:
+                    monitor.stop()
+
+            logger.info("wpull finished with exit code `%s`, %s", wpull_result.returncode, wpull_progress_counters)
+
+            self.metrics_recorder.increment(constants.METRICS_COUNTER_BYTES_DOWNLOADED, wpull_progress_counters.bytes_fetched,
+                source=constants.METRICS_SOURCE_WPULL)
+
+            # we stopped wpull on purpose, so it having to be forced to stop isn't a failure, we keep what it got
+            # before then, see `constants.WPULL_FORCED_STOP_EXIT_CODE`
+            acceptable_exit_code_list = constants.ACCEPTABLE_WPULL_EXIT_CODES
+            if monitor.stalled or monitor.exceeded_limit_list:
+                acceptable_exit_code_list = acceptable_exit_code_list + [constants.WPULL_FORCED_STOP_EXIT_CODE]
+
+            if monitor.stalled:
+                logger.warning("wpull was stopped early because it stalled, the WARC only has what it got before then")
+            if monitor.exceeded_limit_list:
+                logger.warning("wpull was stopped early because it went over the crawl budget for `%s`, the WARC only has what it got before then",
+                    monitor.exceeded_limit_list)
+
+            if self.blob_store is not None:
+                self.blob_store.index_wpull_cdx_file(
+                    emote_config.warc_output_folder / f"{emote_config.warc_file_name}.cdx", emote_config.warc_file_name)
+
+            if emote_config.crawl_budget != model.CrawlBudget():
+                self.write_crawl_budget_report(emote_config, monitor.build_crawl_budget_report())
+
+            utils.check_completedprocess_for_acceptable_exit_codes(wpull_result, acceptable_exit_code_list)
         except subprocess.CalledProcessError as e:
             logger.error("error running wpull: Exception: `%s`, output: `%s`, stderr: `%s`",
                 e, e.output, e.stderr)
             raise e
 
         logger.info("executing wpull was successful")
+
+    def write_crawl_budget_report(self, emote_config, crawl_budget_report):
+        '''
+        writes the crawl budget report json file, with which limits were hit and the urls that got cut
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param crawl_budget_report - the `model.CrawlBudgetReport` to write
+        '''
+
+        report_path = emote_config.root_output_folder / constants.CRAWL_BUDGET_REPORT_FILE_FORMAT.format(
+            emote_config.emote_date.format(constants.ARROW_DATE_FORMAT))
+        logger.info("writing crawl budget report to `%s`, `%s` url(s) were cut from the crawl",
+            report_path, len(crawl_budget_report.cut_url_list))
+
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(attr.asdict(crawl_budget_report), indent=4))
+
+    def save_urls_in_wbm(self, emote_config):
+        '''
+        saves the streamer's social media urls, the twitter.com/twitch post and any additional urls
+        in the wayback machine
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @return a `WbmArchiveUrls` with the archive urls, in the same order as the urls in the config
+        '''
+
+        save_request_list = []
+
+        #########################################################################
+        # link to the streamer's social media page
+        #########################################################################
+        logger.info("saving `%s` streamer social media pages via the Wayback Machine",
+            len(emote_config.streamer_social_media_urls))
+        for idx, iter_social_media_url in enumerate(emote_config.streamer_social_media_urls):
+            save_request_list.append(model.WbmSaveRequest(
+                url=iter_social_media_url, idx=idx, total=len(emote_config.streamer_social_media_urls)))
+
+        #########################################################################
+        # the twitter.com post by the Twitch user account announcing the emote of the day
+        #########################################################################
+        if emote_config.twitch_twitter_post_url:
+            logger.info("saving the announcement twitter.com/twitch post via the Wayback Machine")
+            save_request_list.append(model.WbmSaveRequest(
+                url=emote_config.twitch_twitter_post_url, idx=1, total=1))
+        else:
+            logger.info("Twitch did not post on twitter about today's pogchamp emote, therefore nothing to save via the WBM")
+
+        #########################################################################
+        # any other links the configuration file says to include as headers
+        #########################################################################
+        logger.info("saving `%s` additional url(s) via the Wayback Machine",
+            len(emote_config.additional_urls_to_save_via_wbm))
+        for idx, iter_additional_url in enumerate(emote_config.additional_urls_to_save_via_wbm):
+            save_request_list.append(model.WbmSaveRequest(
+                url=iter_additional_url, idx=idx, total=len(emote_config.additional_urls_to_save_via_wbm)))
+
+        result_cache = None
+        if self.args.wbm_cache_file:
+            result_cache = wbm_cache.WbmResultCache(self.args.wbm_cache_file,
+                freshness_seconds=self.args.wbm_cache_freshness_hours * 60 * 60,
+                max_age_seconds=self.args.wbm_cache_max_age_days * 24 * 60 * 60)
+
+        # unless we were told to fail fast, a url that fails is put in the retry queue instead of failing the day,
+        # the queue is only opened once something actually fails
+        retry_queue = None
+        failure_callback = None
+
+        def _on_save_failed(save_request, error):
+            nonlocal retry_queue
+            if retry_queue is None:
+                retry_queue = wbm_retry.WbmRetryQueue(self.args.root_output_folder / constants.WBM_RETRY_QUEUE_FILE_NAME)
+            retry_queue.enqueue(save_request.url, self.get_wbm_manifest_path(emote_config), str(error))
+
+        if not self.args.wbm_fail_fast:
+            failure_callback = _on_save_failed
+
+        # shared with every other day that runs in this process, so the latency summary covers all of them. a
+        # dry run doesn't send any requests, so it doesn't need one (or to import requests)
+        http_session = None
+        cdx_client = None
+        if not self.args.no_wbm_save:
+            wbm_http.set_shared_wbm_http_pool_size(self.args.wbm_http_pool_size)
+            http_session = wbm_http.get_shared_wbm_http_session()
+            cdx_client = cdx.build_cdx_client_from_argparse_args(self.args, wbm.PerHostRateLimiter(
+                constants.WAYBACK_MACHINE_CDX_RATE_LIMIT_PER_SECOND, constants.WAYBACK_MACHINE_CDX_RATE_LIMIT_BURST), http_session)
+
+        try:
+            rate_limiter = wbm.PerHostRateLimiter(self.args.wbm_rate_limit, self.args.wbm_rate_limit_burst)
+            archive_url_list = wbm.save_urls_in_wbm_concurrently(
+                save_request_list, self.args.wbm_concurrency, rate_limiter, self.args.no_wbm_save,
+                result_cache, self.checkpoint_journal,
+                backoff_policy=model.BackoffPolicy(
+                    base_seconds=self.args.wbm_backoff_base_seconds,
+                    multiplier=constants.WAYBACK_MACHINE_BACKOFF_MULTIPLIER,
+                    max_seconds=self.args.wbm_backoff_max_seconds,
+                    jitter_fraction=constants.WAYBACK_MACHINE_BACKOFF_JITTER_FRACTION),
+                hashflags_backoff_policy=model.BackoffPolicy(
+                    base_seconds=self.args.wbm_hashflags_backoff_base_seconds,
+                    multiplier=constants.WAYBACK_MACHINE_BACKOFF_MULTIPLIER,
+                    max_seconds=self.args.wbm_hashflags_backoff_max_seconds,
+                    jitter_fraction=constants.WAYBACK_MACHINE_BACKOFF_JITTER_FRACTION),
+                failure_callback=failure_callback,
+                cdx_client=cdx_client,
+                http_session=http_session,
+                metrics_recorder=self.metrics_recorder)
+        finally:
+            if http_session is not None:
+                http_session.latency_recorder.log_summary()
+            if result_cache is not None:
+                result_cache.close()
+            if retry_queue is not None:
+                retry_queue.close()
+
+        # split the results back up, they are in the same order we added them to the request list
+        num_social_media_urls = len(emote_config.streamer_social_media_urls)
+        social_media_archive_urls = archive_url_list[:num_social_media_urls]
+        remaining_archive_urls = archive_url_list[num_social_media_urls:]
+
+        twitch_twitter_post_archive_url = None
+        if emote_config.twitch_twitter_post_url:
+            twitch_twitter_post_archive_url = remaining_archive_urls[0]
+            remaining_archive_urls = remaining_archive_urls[1:]
+
+        return model.WbmArchiveUrls(
+            streamer_social_media_archive_urls=social_media_archive_urls,
+            twitch_twitter_post_archive_url=twitch_twitter_post_archive_url,
+            additional_archive_urls=remaining_archive_urls)
+
+    def build_wbm_warc_header_entries(self, emote_config, wbm_archive_urls):
+        '''
+        pairs up every url we saved in the wayback machine with its archive url and the WARC headers they go in
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param wbm_archive_urls - the `model.WbmArchiveUrls` we got back from saving the urls in the wayback machine
+        @return a list of `model.WbmWarcHeaderEntry` objects, in the order the headers should be written
+        '''
+
+        entry_list = []
+
+        def _add(url_warc_header_key, url, warc_header_key, archive_url):
+            entry_list.append(model.WbmWarcHeaderEntry(
+                url_warc_header_key=url_warc_header_key, url=url, warc_header_key=warc_header_key, archive_url=archive_url))
+
+        #########################################################################
+        # link to the streamer's social media page + WBM save
+        #########################################################################
+        for idx, (iter_social_media_url, iter_archive_url) in enumerate(
+            zip(emote_config.streamer_social_media_urls, wbm_archive_urls.streamer_social_media_archive_urls)):
+
+            _add(constants.WARC_HEADER_STREAMER_SOCIAL_MEDIA_URL_FORMAT.format(idx), iter_social_media_url,
+                constants.WARC_HEADER_STREAMER_SOCIAL_MEDIA_URL_WBM_FORMAT.format(idx), iter_archive_url)
+
+        #########################################################################
+        # link to the twitter.com post by the Twitch user account announcing the emote of the day
+        #########################################################################
+        if emote_config.twitch_twitter_post_url:
+            _add(constants.WARC_HEADER_STREAMER_TWICH_TWEET_URL, emote_config.twitch_twitter_post_url,
+                constants.WARC_HEADER_STREAMER_TWICH_TWEET_URL_WBM, wbm_archive_urls.twitch_twitter_post_archive_url)
+
+        #########################################################################
+        # any other links the configuration file says to include as headers (plus the WBM backup)
+        #########################################################################
+        for idx, (iter_additional_url, iter_archive_url) in enumerate(
+            zip(emote_config.additional_urls_to_save_via_wbm, wbm_archive_urls.additional_archive_urls)):
+
+            _add(constants.WARC_HEADER_ADDITIONAL_URL_FORMAT.format(idx), iter_additional_url,
+                constants.WARC_HEADER_ADDITIONAL_URL_WBM_FORMAT.format(idx), iter_archive_url)
+
+        return entry_list
+
+    def get_wbm_manifest_path(self, emote_config):
+        ''' @return the path to the day's wbm manifest, see `wbm_retry.write_wbm_manifest` '''
+
+        return emote_config.root_output_folder / constants.WBM_MANIFEST_FILE_FORMAT.format(
+            emote_config.emote_date.format(constants.ARROW_DATE_FORMAT))
+
+    def build_warc_header_list(self, emote_config, wbm_archive_urls):
+        '''
+        builds the list of WARC headers that end up in the warcinfo record, in the order they should be written
+
+        @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+        @param wbm_archive_urls - the `model.WbmArchiveUrls` we got back from saving the urls in the wayback machine
+        @return a list of `model.WarcHeader` objects
+        '''
+
+        warc_header_list = []
+
+        def _add(key, value):
+            warc_header_list.append(model.WarcHeader(key=key, value=value))
+
+        #########################################################################
+        # WARC headers that always get included
+        ##########################################################################
+        _add(constants.WARC_HEADER_DESCRIPTION,
+            f"Daily https://twitch.tv PogChamp emote for {emote_config.emote_date.format(constants.ARROW_DATE_FORMAT)}")
+        _add(constants.WARC_HEADER_STREAMER_NAME, emote_config.streamer_name)
+
+        # link to the streamer's twitch page, if there was a streamer today
+        if emote_config.streamer_twitch_url:
+            _add(constants.WARC_HEADER_STREAMER_TWITCH_LINK, emote_config.streamer_twitch_url)
+        else:
+            logger.info("no streamer twitch url configured, not adding the header to the wpull arguments file")
+
+        for iter_entry in self.build_wbm_warc_header_entries(emote_config, wbm_archive_urls):
+            _add(iter_entry.url_warc_header_key, iter_entry.url)
+
+            if iter_entry.archive_url is None and not self.args.no_wbm_save:
+                # it is in the retry queue, `retry-wbm` writes the archive url to the wbm manifest later
+                _add(iter_entry.warc_header_key, constants.WARC_HEADER_VALUE_WBM_PENDING_FORMAT.format(
+                    self.get_wbm_manifest_path(emote_config).name))
+            else:
+                _add(iter_entry.warc_header_key, iter_entry.archive_url)
+
+        # date
+        _add(constants.WARC_HEADER_DATE, emote_config.emote_date.format(constants.ARROW_DATE_FORMAT))
+
+        ##############################################################################
+        # custom warc headers, provided by the configuration file
+        ##############################################################################
+        warc_header_list.extend(emote_config.extra_warc_headers)
+
+        #########################################################
+        # warc headers for this application
+        #########################################################
+        _add(constants.WARC_HEADER_KEY_APPLICATION_NAME, constants.WARC_HEADER_VALUE_APPLICATION_NAME)
+        _add(constants.WARC_HEADER_KEY_APPLICATION_VERSION, constants.WARC_HEADER_VALUE_APPLICATION_VERSION)
+        _add(constants.WARC_HEADER_KEY_APPLICATION_GITHUB_LINK, constants.WARC_HEADER_VALUE_APPLICATION_GITHUB_LINK)
+        _add(constants.WARC_HEADER_KEY_APPLICATION_GIT_HASH, utils.get_git_hash())
+
+        return warc_header_list
+
+
+def write_wpull_arguments_file(wpull_arguments_path, emote_config, warc_header_list, dedup_cdx_path=None):
+    '''
+    writes the wpull arguments file, that we pass to wpull with `@<path>`
+
+    @param wpull_arguments_path - the path of the file to write
+    @param emote_config - the `model.DailyPogchampEmoteConfig` for today
+    @param warc_header_list - the list of `model.WarcHeader` objects to write as `--warc-header` arguments
+    @param dedup_cdx_path - if not None, the CDX file of payloads that wpull writes revisit records for,
+        and wpull writes a CDX file of its own WARC so the blob store can index it afterwards
+    '''
+
+    logger.info("writing wpull arguments to `%s`", wpull_arguments_path)
+
+    with open(wpull_arguments_path, "w", encoding="utf-8") as f:
+
+        f.write(f"{constants.WPULL_ARGUMENT_DATABASE}\n")
+        f.write(f"{emote_config.warc_output_folder / emote_config.warc_database_name}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_OUTPUT_FILE}\n")
+        f.write(f"{emote_config.warc_output_folder / emote_config.warc_output_file_name}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_INPUT_FILE_URL_LIST}\n")
+        f.write(f"{emote_config.root_output_folder / emote_config.warc_input_url_list_file_name}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_WARC_FILE}\n")
+        f.write(f"{emote_config.warc_output_folder / emote_config.warc_file_name}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_WARC_TEMPDIR}\n")
+        f.write(f"{emote_config.warc_tempdir_folder}\n")
+
+        #########################################################################
+        # WARC headers, in the order they were built
+        #########################################################################
+        for iter_header in warc_header_list:
+
+            f.write(f"{constants.WPULL_ARGUMENT_WARC_HEADER}\n")
+            f.write(f"{iter_header.key}:{iter_header.value}\n")
+
+        #########################################################
+        # rest of the wpull arguments
+        ########################################################
+        f.write(f"{constants.WPULL_ARGUMENT_WAITRETRY}\n")
+        f.write("30\n")
+        f.write(f"{constants.WPULL_ARGUMENT_NO_ROBOTS}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_WARC_MAX_SIZE}\n")
+        f.write("5368709000\n")
+        f.write(f"{constants.WPULL_ARGUMENT_HTML_PARSER}\n")
+        f.write("libxml2-lxml\n")
+        f.write(f"{constants.WPULL_ARGUMENT_PAGE_REQUISITES}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_DELETE_AFTER}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_WARC_APPEND}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_RECURSIVE}\n")
+        f.write(f"{constants.WPULL_ARGUMENT_VERBOSE}\n")
+
+        #########################################################
+        # the parts of the crawl budget that wpull can enforce itself, the rest
+        # is enforced by `wpull_monitor.WpullDatabaseMonitor`
+        ########################################################
+        if emote_config.crawl_budget.max_depth is not None:
+            f.write(f"{constants.WPULL_ARGUMENT_LEVEL}\n")
+            f.write(f"{emote_config.crawl_budget.max_depth}\n")
+        if emote_config.crawl_budget.max_bytes is not None:
+            f.write(f"{constants.WPULL_ARGUMENT_QUOTA}\n")
+            f.write(f"{emote_config.crawl_budget.max_bytes}\n")
+
+        if dedup_cdx_path is not None:
+            f.write(f"{constants.WPULL_ARGUMENT_WARC_CDX}\n")
+            f.write(f"{constants.WPULL_ARGUMENT_WARC_DEDUP}\n")
+            f.write(f"{dedup_cdx_path}\n")
+
+    logger.info("writing wpull arguments was successful")
+
+
+def download_video(youtube_dl_job_limit, root_videos_folder, url, ytdl_args_file_format, idx, total, dry_run,
+    progress_interval_seconds):
+    '''
+    downloads a single video with youtube-dl, this is module level so it can run in a worker process
+
+    @param youtube_dl_job_limit - a context manager (usually a semaphore) to enter before downloading
+    @param root_videos_folder - the folder where we will create a directory to store the video  + arguments in
+    @param url - the url to download
+    @param ytdl_args_file_format - the format of the ytdl args file we will write
+    @param idx - the current index of videos that we are downloading with ytdl, for logging
+    @param total - the total number of videos we are donwloading with ytdl, for logging
+    @param dry_run if true, then we will only print out what we will do
+    @param progress_interval_seconds - the minimum number of seconds between download progress log lines
+    @return the folder that the video was downloaded to
+    '''
+
+    with youtube_dl_job_limit:
+        return utils.save_video_with_youtube_dl(root_videos_folder, url, ytdl_args_file_format, idx, total, dry_run,
+            progress_interval_seconds)
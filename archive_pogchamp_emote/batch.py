@@ -0,0 +1,145 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import time
+
+import arrow
+import attr
+
+from archive_pogchamp_emote import application as application
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import utils as utils
+from archive_pogchamp_emote import wpull_runner as wpull_runner
+
+logger = logging.getLogger(__name__)
+
+# set in every worker process by `_init_worker`
+_worker_job_limits = None
+
+
+def _init_worker(wpull_semaphore, youtube_dl_semaphore):
+    ''' process pool initializer, stores the shared semaphores for the days that this worker runs
+
+    @param wpull_semaphore - the shared semaphore that caps the number of concurrent wpull jobs
+    @param youtube_dl_semaphore - the shared semaphore that caps the number of concurrent youtube-dl jobs
+    '''
+
+    global _worker_job_limits
+    _worker_job_limits = model.JobLimits(wpull=wpull_semaphore, youtube_dl=youtube_dl_semaphore)
+
+
+def _run_day(args, config_path):
+    '''
+    runs a single day in a worker process
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @param config_path - the path to the HOCON config file for this day
+    @return a `model.BatchDayResult`
+    '''
+
+    start_time = time.monotonic()
+    emote_date = None
+
+    try:
+        config = utils.hocon_config_file_type(str(config_path))
+        emote_date = config.get(f"{constants.CONFIG_PATH_ROOT_SECTION}.{constants.CONFIG_PATH_DATE}", None)
+
+        logger.info("batch: starting day `%s` from the config `%s`", emote_date, config_path)
+
+        # each day gets its own copy of the arguments with its own config file
+        day_args = argparse.Namespace(**vars(args))
+        day_args.config_file = config
+
+        app = application.Application(day_args, job_limits=_worker_job_limits)
+        app.run()
+
+    except Exception as e:
+        logger.exception("batch: day `%s` from the config `%s` failed", emote_date, config_path)
+
+        return model.BatchDayResult(config_file=str(config_path), emote_date=emote_date,
+            success=False, error=repr(e), elapsed_seconds=time.monotonic() - start_time)
+
+    logger.info("batch: day `%s` from the config `%s` was successful", emote_date, config_path)
+
+    return model.BatchDayResult(config_file=str(config_path), emote_date=emote_date,
+        success=True, error=None, elapsed_seconds=time.monotonic() - start_time)
+
+
+def run_batch(args):
+    '''
+    runs every config file in `args.config_dir` that matches `args.config_glob`, `args.batch_workers` days at a time
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @return the exit code for the process, 0 if every day was successful, 1 otherwise
+    '''
+
+    config_path_list = sorted(args.config_dir.glob(args.config_glob))
+
+    logger.info("batch: found `%s` config file(s) in `%s` matching `%s`", len(config_path_list), args.config_dir, args.config_glob)
+
+    if not config_path_list:
+        logger.error("batch: no config files found, nothing to do")
+        return 1
+
+    # do this once in the parent so the worker processes inherit the cached result instead of each running git
+    logger.info("batch: version `%s`, git hash `%s`", constants.WARC_HEADER_VALUE_APPLICATION_VERSION, utils.get_git_hash())
+
+    start_time = time.monotonic()
+    result_list = []
+
+    # extract the PEX once up front, instead of every day that starts at the same time racing to do it
+    wpull_runner.WpullRunner(args.wpull_pex_path, args.wpull_pex_root).warm_up()
+
+    with multiprocessing.Manager() as manager:
+
+        wpull_semaphore = manager.BoundedSemaphore(args.max_concurrent_wpull)
+        youtube_dl_semaphore = manager.BoundedSemaphore(args.max_concurrent_youtube_dl)
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.batch_workers,
+            initializer=_init_worker,
+            initargs=(wpull_semaphore, youtube_dl_semaphore)) as executor:
+
+            future_list = [executor.submit(_run_day, args, iter_config_path) for iter_config_path in config_path_list]
+
+            for iter_config_path, iter_future in zip(config_path_list, future_list):
+                try:
+                    result_list.append(iter_future.result())
+                except Exception as e:
+                    # the worker process itself died, so `_run_day` couldn't report the error
+                    logger.error("batch: worker for the config `%s` died: `%s`", iter_config_path, e)
+                    result_list.append(model.BatchDayResult(config_file=str(iter_config_path), emote_date=None,
+                        success=False, error=repr(e), elapsed_seconds=0.0))
+
+    elapsed_seconds = time.monotonic() - start_time
+    num_failed = len([iter_result for iter_result in result_list if not iter_result.success])
+
+    #########################################################################
+    # write the summary report
+    #########################################################################
+    summary_path = args.root_output_folder / constants.BATCH_SUMMARY_FILE_FORMAT.format(arrow.utcnow().format(constants.ARROW_FILENAME_TIMESTAMP_FORMAT))
+    logger.info("batch: writing summary report to `%s`", summary_path)
+
+    with open(summary_path, "w", encoding="utf-8") as f:
+
+        summary_dict = {
+            "total": len(result_list),
+            "succeeded": len(result_list) - num_failed,
+            "failed": num_failed,
+            "elapsed_seconds": elapsed_seconds,
+            "days": [attr.asdict(iter_result) for iter_result in result_list],
+        }
+        f.write(json.dumps(summary_dict, indent=4))
+
+    for iter_result in result_list:
+        logger.info("batch: [`%s`] `%s` - `%s` in `%.1f` seconds%s",
+            "OK" if iter_result.success else "FAILED", iter_result.emote_date, iter_result.config_file,
+            iter_result.elapsed_seconds, "" if iter_result.success else f", error: `{iter_result.error}`")
+
+    logger.info("batch: `%s/%s` day(s) were successful, took `%.1f` seconds",
+        len(result_list) - num_failed, len(result_list), elapsed_seconds)
+
+    return 0 if num_failed == 0 else 1
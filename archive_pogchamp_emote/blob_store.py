@@ -0,0 +1,360 @@
+import concurrent.futures
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path) -> str:
+    ''' @return the sha256 of a file, as a hex string '''
+
+    # hashlib lets go of the GIL for big updates, so hashing on a thread pool actually runs in parallel
+    hasher = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for iter_chunk in iter(lambda: f.read(constants.BLOB_STORE_HASH_CHUNK_BYTES), b""):
+            hasher.update(iter_chunk)
+
+    return hasher.hexdigest()
+
+
+def _reflink(source_path, destination_path):
+    ''' makes `destination_path` a copy on write clone of `source_path` (btrfs / xfs only)
+
+    @throws OSError if the filesystem (or the OS) can't do it
+    '''
+
+    try:
+        import fcntl
+    except ImportError as e:
+        raise OSError(f"reflinks are not supported on this platform: `{e}`") from e
+
+    with open(source_path, "rb") as source_file:
+        destination_fd = os.open(destination_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+
+        try:
+            fcntl.ioctl(destination_fd, constants.BLOB_STORE_FICLONE_IOCTL, source_file.fileno())
+        except OSError:
+            os.close(destination_fd)
+            os.unlink(destination_path)
+            raise
+
+        os.close(destination_fd)
+
+
+def link_file(source_path, destination_path, link_mode:str) -> str:
+    ''' makes `destination_path` point at the same data as `source_path` without copying it
+
+    @param source_path - the existing file
+    @param destination_path - the path to create, it must not exist
+    @param link_mode - the `constants.BLOB_STORE_LINK_MODE_*` to try first, the other one is tried if it fails
+    @return the `constants.BLOB_STORE_LINK_MODE_*` that worked
+    @throws FileExistsError if `destination_path` exists, OSError if neither link mode works
+    '''
+
+    link_func_dict = {
+        constants.BLOB_STORE_LINK_MODE_HARDLINK: os.link,
+        constants.BLOB_STORE_LINK_MODE_REFLINK: _reflink,
+    }
+    link_mode_list = [link_mode] + [iter_mode for iter_mode in link_func_dict.keys() if iter_mode != link_mode]
+
+    error_list = []
+    for iter_link_mode in link_mode_list:
+        try:
+            link_func_dict[iter_link_mode](source_path, destination_path)
+            return iter_link_mode
+        except FileExistsError:
+            raise
+        except OSError as e:
+            logger.debug("linking `%s` to `%s` with `%s` failed: `%s`", destination_path, source_path, iter_link_mode, e)
+            error_list.append(e)
+
+    raise OSError(f"could not link `{destination_path}` to `{source_path}`, errors: `{error_list}`")
+
+
+class BlobStore:
+    '''
+    a content addressed store of files, keyed by their sha256, that is shared by every day in the root
+    output folder, so a video that gets posted again on a later day is only stored once
+
+    the day's folders keep their files where they are, they just become hardlinks (or reflinks) to the blob
+
+    it also keeps an index of the WARC payload digests of every response we wrote (or wpull wrote, from
+    its CDX file), so later WARCs can write a `revisit` record instead of the same payload again
+    '''
+
+    def __init__(self, root_folder, link_mode:str=constants.BLOB_STORE_LINK_MODE_HARDLINK):
+        '''
+        @param root_folder - the folder the blobs and the index live in, gets created if it doesn't exist
+        @param link_mode - the `constants.BLOB_STORE_LINK_MODE_*` to try first when linking a file to a blob
+        '''
+
+        self.root_folder = root_folder
+        self.link_mode = link_mode
+
+        self.root_folder.mkdir(parents=True, exist_ok=True)
+
+        logger.info("opening blob store `%s`", root_folder)
+
+        # batch mode runs several days in different processes, they all share the index, and the
+        # native fetch / wpull stages use it from different threads
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(root_folder / constants.BLOB_STORE_INDEX_FILE_NAME),
+            timeout=constants.SQLITE_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS warc_payloads (
+                    payload_digest TEXT PRIMARY KEY NOT NULL,
+                    url TEXT NOT NULL,
+                    warc_record_id TEXT NOT NULL,
+                    warc_date TEXT NOT NULL,
+                    warc_file_name TEXT NOT NULL
+                )''')
+
+    def get_blob_path(self, sha256:str):
+        ''' @return the path of the blob with the sha256, split up so no one folder gets too big '''
+
+        return self.root_folder / constants.BLOB_STORE_BLOBS_FOLDER_NAME / sha256[0:2] / sha256[2:4] / sha256
+
+    def add_file(self, path, sha256:typing.Optional[str]=None) -> model.BlobStoreAddResult:
+        '''
+        adds a file to the store, if there is already a blob with the same contents the file is replaced
+        with a link to that blob, otherwise the file becomes the blob
+
+        @param path - the file to add
+        @param sha256 - the sha256 of the file if we already know it, otherwise it gets hashed
+        @return a `model.BlobStoreAddResult`
+        '''
+
+        if sha256 is None:
+            sha256 = hash_file(path)
+
+        size = path.stat().st_size
+        blob_path = self.get_blob_path(sha256)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            # the first copy we see becomes the blob, without copying anything
+            link_method = link_file(path, blob_path, self.link_mode)
+            logger.debug("added `%s` to the blob store as `%s`", path, sha256)
+            return model.BlobStoreAddResult(path=path, sha256=sha256, size=size, link_method=link_method, is_new_blob=True, bytes_saved=0)
+
+        except FileExistsError:
+            pass
+
+        if os.path.samefile(path, blob_path):
+            return model.BlobStoreAddResult(path=path, sha256=sha256, size=size, link_method=None, is_new_blob=False, bytes_saved=0)
+
+        if blob_path.stat().st_size != size:
+            raise Exception(f"the blob `{blob_path}` has a different size than `{path}`, even though they have the same sha256")
+
+        # link next to the file and then rename over it, so the file is never missing
+        temp_path = path.with_name(f"{path.name}{constants.BLOB_STORE_TEMP_FILE_SUFFIX}")
+        if temp_path.exists():
+            temp_path.unlink()
+
+        link_method = link_file(blob_path, temp_path, self.link_mode)
+        os.replace(temp_path, path)
+
+        logger.debug("replaced `%s` with a `%s` to the blob `%s`", path, link_method, sha256)
+
+        return model.BlobStoreAddResult(path=path, sha256=sha256, size=size, link_method=link_method, is_new_blob=False, bytes_saved=size)
+
+    def record_warc_payload(self, warc_payload:model.WarcPayloadRecord, replace:bool=False):
+        ''' remember where a payload was first written
+
+        @param warc_payload - the `model.WarcPayloadRecord` of the response record
+        @param replace - if False, this does nothing if we already know about the payload. if True, it replaces
+            what we know, for when the WARC that had the payload got rewritten
+        '''
+
+        with self._lock, self._connection:
+            self._connection.execute(f'''
+                INSERT OR {"REPLACE" if replace else "IGNORE"} INTO warc_payloads (payload_digest, url, warc_record_id, warc_date, warc_file_name)
+                VALUES (?, ?, ?, ?, ?)''',
+                (warc_payload.payload_digest, warc_payload.url, warc_payload.warc_record_id,
+                    warc_payload.warc_date, warc_payload.warc_file_name))
+
+    def get_warc_payload(self, payload_digest:str) -> typing.Optional[model.WarcPayloadRecord]:
+        ''' @return the `model.WarcPayloadRecord` of the first response with the payload digest, or None '''
+
+        with self._lock:
+            row = self._connection.execute('''
+                SELECT payload_digest, url, warc_record_id, warc_date, warc_file_name
+                FROM warc_payloads WHERE payload_digest = ?''', (payload_digest,)).fetchone()
+
+        if row is None:
+            return None
+
+        return model.WarcPayloadRecord(payload_digest=row[0], url=row[1], warc_record_id=row[2], warc_date=row[3], warc_file_name=row[4])
+
+    def index_wpull_cdx_file(self, cdx_path, warc_file_name:str) -> int:
+        ''' records the payload of every response in the CDX file that wpull writes with `--warc-cdx`
+
+        @param cdx_path - the path to the CDX file
+        @param warc_file_name - the name of the WARC the CDX file is for
+        @return the number of CDX rows read
+        '''
+
+        if not cdx_path.exists():
+            logger.info("the CDX file `%s` doesn't exist, nothing to add to the blob store index", cdx_path)
+            return 0
+
+        num_rows = 0
+
+        with open(cdx_path, "r", encoding="utf-8") as f:
+
+            # ` CDX a b m s k S V g u`, the letters say what each column is
+            field_list = f.readline().split()[1:]
+
+            for iter_line in f:
+                iter_row = dict(zip(field_list, iter_line.split()))
+
+                # only responses have a payload worth pointing back to
+                if iter_row.get(constants.CDX_FIELD_PAYLOAD_DIGEST, "-") == "-" or iter_row.get(constants.CDX_FIELD_MIME_TYPE) == "warc/revisit":
+                    continue
+
+                self.record_warc_payload(model.WarcPayloadRecord(
+                    payload_digest=iter_row[constants.CDX_FIELD_PAYLOAD_DIGEST],
+                    url=iter_row[constants.CDX_FIELD_ORIGINAL_URL],
+                    warc_record_id=iter_row[constants.CDX_FIELD_RECORD_ID],
+                    warc_date=iter_row.get(constants.CDX_FIELD_DATE, ""),
+                    warc_file_name=warc_file_name))
+                num_rows += 1
+
+        logger.info("added `%s` payload(s) from the CDX file `%s` to the blob store index", num_rows, cdx_path)
+
+        return num_rows
+
+    def write_wpull_dedup_cdx_file(self, cdx_path, exclude_warc_file_name:str) -> int:
+        ''' writes every payload we know about as a CDX file that wpull reads with `--warc-dedup`
+
+        @param cdx_path - the path of the CDX file to write
+        @param exclude_warc_file_name - payloads from this WARC are left out, since it is about to get written again
+        @return the number of payloads written
+        '''
+
+        with self._lock:
+            row_list = self._connection.execute('''
+                SELECT url, payload_digest, warc_record_id FROM warc_payloads
+                WHERE warc_file_name != ? ORDER BY url''', (exclude_warc_file_name,)).fetchall()
+
+        logger.info("writing `%s` known payload(s) to the wpull dedup CDX file `%s`", len(row_list), cdx_path)
+
+        with open(cdx_path, "w", encoding="utf-8") as f:
+            f.write(f" CDX {constants.CDX_FIELD_ORIGINAL_URL} {constants.CDX_FIELD_PAYLOAD_DIGEST} {constants.CDX_FIELD_RECORD_ID}\n")
+
+            for iter_url, iter_payload_digest, iter_warc_record_id in row_list:
+                f.write(f"{iter_url} {iter_payload_digest} {iter_warc_record_id}\n")
+
+        return len(row_list)
+
+    def close(self):
+
+        with self._lock:
+            self._connection.close()
+
+
+def get_blob_store_folder(root_output_folder):
+    ''' @return the blob store folder, it lives in the root output folder so every day shares it '''
+
+    return root_output_folder / constants.BLOB_STORE_FOLDER_NAME
+
+
+def find_day_files_to_dedup(root_output_folder) -> typing.List:
+    ''' @return every file in every day's video folder, the only place big files that repeat across days end up '''
+
+    result = []
+
+    for iter_day_folder in sorted(root_output_folder.iterdir()):
+        if not iter_day_folder.is_dir() or iter_day_folder.name == constants.BLOB_STORE_FOLDER_NAME:
+            continue
+
+        for iter_path in sorted((iter_day_folder / constants.DAY_VIDEOS_FOLDER_NAME).glob("**/*")):
+            if iter_path.is_file() and not iter_path.is_symlink() and not iter_path.name.endswith(constants.BLOB_STORE_TEMP_FILE_SUFFIX):
+                result.append(iter_path)
+
+    return result
+
+
+def add_files_to_blob_store(store:BlobStore, path_list:typing.Sequence, max_workers:int) -> typing.List[model.BlobStoreAddResult]:
+    ''' hashes the files on a thread pool and adds them to the blob store
+
+    the linking happens on this thread, one file at a time, so two copies of the same file that get
+    hashed at the same time can't race each other to become the blob
+
+    @param store - the `BlobStore` to add the files to
+    @param path_list - the files to add
+    @param max_workers - how many files get hashed at the same time
+    @return a `model.BlobStoreAddResult` for every file that was added, a file that failed is logged and left alone
+    '''
+
+    result_list = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="blob_hash") as executor:
+
+        future_dict = {executor.submit(hash_file, iter_path): iter_path for iter_path in path_list}
+
+        for idx, iter_future in enumerate(concurrent.futures.as_completed(future_dict), start=1):
+            iter_path = future_dict[iter_future]
+
+            try:
+                iter_result = store.add_file(iter_path, sha256=iter_future.result())
+            except Exception as e:
+                logger.warning("[`%s/%s`] - adding `%s` to the blob store failed, leaving it alone: `%s`", idx, len(path_list), iter_path, e)
+                continue
+
+            logger.info("[`%s/%s`] - `%s`: sha256 `%s`, new blob: `%s`, bytes saved: `%s`",
+                idx, len(path_list), iter_path, iter_result.sha256, iter_result.is_new_blob, iter_result.bytes_saved)
+            result_list.append(iter_result)
+
+    return result_list
+
+
+def dedup_archive_tree(args) -> int:
+    '''
+    the `dedup` subcommand, adds the video files of every day in the root output folder to the blob
+    store, and indexes the payloads of every wpull CDX file so later WARCs can refer back to them
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @return the exit code, 0 if every file was added, 1 if any failed
+    '''
+
+    start_time = time.monotonic()
+
+    store = BlobStore(get_blob_store_folder(args.root_output_folder), args.blob_store_link_mode)
+
+    try:
+        path_list = find_day_files_to_dedup(args.root_output_folder)
+        logger.info("found `%s` file(s) to dedup in `%s`, hashing `%s` at a time", len(path_list), args.root_output_folder, args.dedup_workers)
+
+        result_list = add_files_to_blob_store(store, path_list, args.dedup_workers)
+
+        for iter_cdx_path in sorted(args.root_output_folder.glob(f"*/{constants.DAY_WARC_FOLDER_NAME}/*.cdx")):
+            # the dedup CDX files we write for wpull are a copy of the index, not a WARC's CDX
+            if iter_cdx_path.name.endswith(constants.WPULL_DEDUP_CDX_FILE_SUFFIX):
+                continue
+            store.index_wpull_cdx_file(iter_cdx_path, iter_cdx_path.stem)
+
+    finally:
+        store.close()
+
+    elapsed_seconds = time.monotonic() - start_time
+    total_bytes = sum(iter_result.size for iter_result in result_list)
+
+    logger.info("dedup: `%s/%s` file(s) added, `%s` new blob(s), `%s` bytes saved, hashed `%s` bytes in `%.1f` seconds (`%.1f` MB/s)",
+        len(result_list), len(path_list),
+        sum(1 for iter_result in result_list if iter_result.is_new_blob),
+        sum(iter_result.bytes_saved for iter_result in result_list),
+        total_bytes, elapsed_seconds, total_bytes / 1000 / 1000 / elapsed_seconds if elapsed_seconds else 0.0)
+
+    return 0 if len(result_list) == len(path_list) else 1
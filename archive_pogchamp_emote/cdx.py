@@ -0,0 +1,142 @@
+import concurrent.futures
+import logging
+import typing
+import urllib.parse
+
+import arrow
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import wbm_http as wbm_http
+
+logger = logging.getLogger(__name__)
+
+
+class WbmCdxClient:
+    '''
+    looks up the most recent wayback machine capture of urls using the CDX API, so that a url that
+    was captured recently (the emote CDN urls, popular twitter profiles) can reuse that capture
+    instead of waiting in line for a save page now request
+    '''
+
+    def __init__(self, endpoint:str, window_seconds:float, max_workers:int, rate_limiter,
+        timeout_seconds:float=constants.WAYBACK_MACHINE_CDX_TIMEOUT_SECONDS, http_session=None):
+        '''
+        @param endpoint - the url of the CDX API, `constants.WAYBACK_MACHINE_CDX_DEFAULT_ENDPOINT` unless we are testing
+        @param window_seconds - only captures newer than this many seconds are used
+        @param max_workers - the max number of CDX queries that run at the same time
+        @param rate_limiter - the `wbm.PerHostRateLimiter` that every CDX query goes through
+        @param timeout_seconds - the timeout for a single CDX query
+        @param http_session - the `wbm_http.WbmHttpSession` to send the queries with, if None then the one for this process
+        '''
+
+        self.endpoint = endpoint
+        self.window_seconds = window_seconds
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter
+        self.timeout_seconds = timeout_seconds
+        self.http_session = http_session if http_session is not None else wbm_http.get_shared_wbm_http_session()
+
+        self._hostname = urllib.parse.urlsplit(endpoint).hostname
+
+    def find_recent_capture(self, url:str) -> typing.Optional[str]:
+        ''' look up the most recent capture of a url
+
+        @param url - the url to look up
+        @return the archive url of the most recent successful capture of the url if it is inside of
+            `window_seconds`, else None
+        '''
+
+        window_start = arrow.utcnow().shift(seconds=-self.window_seconds)
+
+        params = {
+            "url": url,
+            "output": "json",
+            "fl": "timestamp,original,statuscode",
+            "filter": "statuscode:200",
+            "from": window_start.format(constants.ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT),
+            # a negative limit means the last N captures, and `fastLatest` makes that cheap
+            "limit": "-1",
+            "fastLatest": "true",
+        }
+
+        if self.rate_limiter:
+            self.rate_limiter.acquire(self._hostname)
+
+        logger.debug("querying the CDX API for url `%s`", url)
+
+        response = self.http_session.get("cdx", self.endpoint, params=params, timeout=self.timeout_seconds)
+        response.raise_for_status()
+
+        # the output is a list of rows, where the first row is the field names, and the CDX API returns
+        # an empty body rather than an empty list when nothing matched
+        row_list = response.json() if response.text.strip() else []
+
+        if len(row_list) < 2:
+            logger.debug("no capture of url `%s` since `%s`", url, window_start)
+            return None
+
+        capture_dict = dict(zip(row_list[0], row_list[-1]))
+        capture_time = arrow.get(capture_dict["timestamp"], constants.ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT)
+
+        # don't trust `from` to have been applied
+        if capture_time < window_start:
+            logger.debug("the most recent capture of url `%s` is from `%s`, which is older than `%s`", url, capture_time, window_start)
+            return None
+
+        return constants.WAYBACK_MACHINE_ARCHIVE_URL_FORMAT.format(capture_dict["timestamp"], capture_dict["original"])
+
+    def find_recent_captures(self, url_list:typing.Sequence[str]) -> typing.Dict[str, str]:
+        ''' look up the most recent capture of every url at the same time
+
+        a query that fails is logged and treated as if there was no recent capture, since the
+        url just gets saved like it would have without the CDX lookup
+
+        @param url_list - the urls to look up
+        @return a dict of `url -> archive url` for the urls that have a capture inside of `window_seconds`
+        '''
+
+        if not url_list:
+            return {}
+
+        logger.info("checking the CDX API for captures of `%s` url(s) in the last `%s` seconds", len(url_list), self.window_seconds)
+
+        result = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cdx") as executor:
+
+            future_dict = {executor.submit(self.find_recent_capture, iter_url): iter_url for iter_url in url_list}
+
+            for iter_future in concurrent.futures.as_completed(future_dict):
+                iter_url = future_dict[iter_future]
+
+                try:
+                    iter_archive_url = iter_future.result()
+                except Exception as e:
+                    logger.warning("querying the CDX API for url `%s` failed, it will be saved instead: `%s`", iter_url, e)
+                    continue
+
+                if iter_archive_url is not None:
+                    result[iter_url] = iter_archive_url
+
+        logger.info("`%s` of `%s` url(s) have a recent capture in the wayback machine", len(result), len(url_list))
+
+        return result
+
+
+def build_cdx_client_from_argparse_args(args, rate_limiter, http_session) -> typing.Optional[WbmCdxClient]:
+    ''' builds the `WbmCdxClient` for the `--wbm-cdx-*` arguments
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @param rate_limiter - the `wbm.PerHostRateLimiter` that every CDX query goes through
+    @param http_session - the `wbm_http.WbmHttpSession` to send the queries with
+    @return a `WbmCdxClient`, or None if `--no-wbm-cdx-check` was given
+    '''
+
+    if args.no_wbm_cdx_check:
+        return None
+
+    return WbmCdxClient(args.wbm_cdx_endpoint,
+        window_seconds=args.wbm_cdx_window_hours * 60 * 60,
+        max_workers=args.wbm_concurrency,
+        rate_limiter=rate_limiter,
+        http_session=http_session)
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import threading
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointJournal:
+    '''
+    a json file in the day's output folder that records which stages have completed, plus the
+    per url results (wayback machine archive urls, finished video folders), so that a re-run
+    of the same day can skip the work that was already done
+    '''
+
+    JOURNAL_VERSION = 1
+
+    def __init__(self, journal_path, resume:bool=True):
+        '''
+        @param journal_path - the path to the journal file
+        @param resume - if True, load the existing journal (if there is one), if False start over
+        '''
+
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+
+        self._completed_stages = []
+        self._wbm_results = {}
+        self._videos = {}
+
+        if resume and journal_path.exists():
+            logger.info("loading checkpoint journal `%s`", journal_path)
+
+            with open(journal_path, "r", encoding="utf-8") as f:
+                journal_dict = json.load(f)
+
+            self._completed_stages = journal_dict["completed_stages"]
+            self._wbm_results = journal_dict["wbm_results"]
+            self._videos = journal_dict["videos"]
+
+            logger.info("checkpoint journal has `%s` completed stage(s) `%s`, `%s` wayback machine result(s) and `%s` finished video(s)",
+                len(self._completed_stages), self._completed_stages, len(self._wbm_results), len(self._videos))
+
+        elif journal_path.exists():
+            logger.info("not resuming, ignoring the existing checkpoint journal `%s`", journal_path)
+
+    def _write(self):
+        ''' writes the journal to disk, must be called with the lock held
+
+        writes to a temporary file first and then renames it, so a crash in the middle of
+        writing doesn't leave a corrupted journal behind
+        '''
+
+        journal_dict = {
+            "version": self.JOURNAL_VERSION,
+            "completed_stages": self._completed_stages,
+            "wbm_results": self._wbm_results,
+            "videos": self._videos,
+        }
+
+        temp_path = self.journal_path.with_name(f"{self.journal_path.name}.tmp")
+
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(journal_dict, indent=4))
+
+        os.replace(temp_path, self.journal_path)
+
+    def is_stage_complete(self, stage_name:str) -> bool:
+
+        with self._lock:
+            return stage_name in self._completed_stages
+
+    def mark_stage_complete(self, stage_name:str):
+
+        with self._lock:
+            if stage_name not in self._completed_stages:
+                self._completed_stages.append(stage_name)
+                self._write()
+
+    def get_wbm_result(self, url:str) -> typing.Optional[str]:
+        ''' @return the archive url that we saved earlier for the url, or None if we haven't saved it yet '''
+
+        with self._lock:
+            return self._wbm_results.get(url)
+
+    def record_wbm_result(self, url:str, archive_url:str):
+
+        with self._lock:
+            self._wbm_results[url] = archive_url
+            self._write()
+
+    def get_video_folder(self, url:str) -> typing.Optional[str]:
+        ''' @return the folder that the video was downloaded to, or None if it hasn't been downloaded yet '''
+
+        with self._lock:
+            return self._videos.get(url)
+
+    def record_video_folder(self, url:str, video_folder):
+
+        with self._lock:
+            self._videos[url] = str(video_folder)
+            self._write()
@@ -1,9 +1,12 @@
 import re
 
 from archive_pogchamp_emote import __version__ as __version__
+from archive_pogchamp_emote import model as model
 
 
 ARROW_DATE_FORMAT = "YYYY-MM-DD"
+ARROW_FILENAME_TIMESTAMP_FORMAT = "YYYY-MM-DDTHH-mm-ss"
+ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT = "YYYYMMDDHHmmss"
 
 WPULL_DATABASE_FORMAT = "{}_twitch-tv_pogchamp_emote_wpull_database.sqlite3"
 WPULL_OUTPUT_FILE_FORMAT = "{}_twitch-tv_pogchamp_emote_wpull_output.log"
@@ -13,6 +16,58 @@ WPULL_INPUT_URL_LIST_FORMAT = "{}_twitch-tv_pogchamp_emote_wpull_url_list.txt"
 WPULL_ARGS_FILE_FORMAT = "{}_twitch-tv_pogchamp_emote_wpull_arguments.txt"
 YTDL_ARGS_FILE_FORMAT = "youtube_dl_args.txt"
 APPLICATION_VERSION_FILE_FORMAT = "{}_archive_pogchamp_emote_version_info.json"
+CHECKPOINT_JOURNAL_FILE_FORMAT = "{}_archive_pogchamp_emote_checkpoint.json"
+BATCH_SUMMARY_FILE_FORMAT = "{}_archive_pogchamp_emote_batch_summary.json"
+VERIFY_REPORT_FILE_FORMAT = "{}_archive_pogchamp_emote_verify_report.json"
+NATIVE_FETCH_WARC_FILE_FORMAT = "{}_twitch-tv_pogchamp_emote_native_fetch.warc.gz"
+WBM_MANIFEST_FILE_FORMAT = "{}_archive_pogchamp_emote_wbm_manifest.json"
+CRAWL_BUDGET_REPORT_FILE_FORMAT = "{}_archive_pogchamp_emote_crawl_budget_report.json"
+METRICS_FILE_FORMAT = "{}_archive_pogchamp_emote_metrics.json"
+WPULL_DEDUP_CDX_FILE_SUFFIX = "_wpull_dedup.cdx"
+WPULL_DEDUP_CDX_FILE_FORMAT = "{}_twitch-tv_pogchamp_emote" + WPULL_DEDUP_CDX_FILE_SUFFIX
+
+# lives in the root output folder, every day's CDXJ indexes merged together, see the `index` subcommand
+MERGED_CDXJ_INDEX_FILE_NAME = "archive_pogchamp_emote_index.cdxj"
+CDXJ_FILE_EXTENSION = ".cdxj"
+WARC_FILE_EXTENSIONS = [".warc.gz", ".warc"]
+
+# the folders inside of a day's folder
+DAY_WARC_FOLDER_NAME = "warc"
+DAY_VIDEOS_FOLDER_NAME = "videos"
+
+# lives in the root output folder (not a day's folder), since `retry-wbm` drains it for every day at once
+WBM_RETRY_QUEUE_FILE_NAME = "archive_pogchamp_emote_wbm_retry_queue.sqlite3"
+
+# the content addressed store that every day's videos get linked into, in the root output folder too
+BLOB_STORE_FOLDER_NAME = "archive_pogchamp_emote_blob_store"
+BLOB_STORE_BLOBS_FOLDER_NAME = "sha256"
+BLOB_STORE_INDEX_FILE_NAME = "archive_pogchamp_emote_blob_store_index.sqlite3"
+BLOB_STORE_TEMP_FILE_SUFFIX = ".blob_store_tmp"
+BLOB_STORE_HASH_CHUNK_BYTES = 1024 * 1024
+BLOB_STORE_DEFAULT_HASH_WORKERS = 4
+BLOB_STORE_LINK_MODE_HARDLINK = "hardlink"
+BLOB_STORE_LINK_MODE_REFLINK = "reflink"
+BLOB_STORE_LINK_MODES = [BLOB_STORE_LINK_MODE_HARDLINK, BLOB_STORE_LINK_MODE_REFLINK]
+# `FICLONE` from linux/fs.h
+BLOB_STORE_FICLONE_IOCTL = 0x40049409
+
+# `--zstd-recompress` / the `zstd` subcommand, WARCs recompressed to `.warc.zst` with one zstd frame per record
+# and the dictionary in a skippable frame at the start of the file, see
+# https://iipc.github.io/warc-specifications/specifications/warc-zstd/
+ZSTD_WARC_FILE_EXTENSION = ".warc.zst"
+ZSTD_TEMP_FILE_SUFFIX = ".zst_tmp"
+ZSTD_DICTIONARY_FILE_NAME = "archive_pogchamp_emote_warc_zstd_dictionary.zdict"
+ZSTD_SKIPPABLE_FRAME_MAGIC = 0x184D2A5D
+ZSTD_FRAME_MAGIC = 0xFD2FB528
+ZSTD_DEFAULT_LEVEL = 19
+ZSTD_DEFAULT_WORKERS = 4
+# the dictionary gets embedded in every `.warc.zst`, so it is sized at 1/100 of the samples (what zstd recommends)
+# between these, rather than always being zstd's default of 110 KiB, which is bigger than most of the daily WARCs
+ZSTD_DICTIONARY_MIN_SIZE_BYTES = 4 * 1024
+ZSTD_DICTIONARY_MAX_SIZE_BYTES = 110 * 1024
+ZSTD_DICTIONARY_SAMPLE_RATIO = 100
+# the dictionary gets trained on the start of every record in the WARCs of this many of the most recent days
+ZSTD_DICTIONARY_SAMPLE_DAYS = 14
 
 
 CONFIG_PATH_ROOT_SECTION = "archive_pogchamp_emote"
@@ -30,6 +85,13 @@ CONFIG_PATH_ADDITIONAL_URLS_SAVE_WARC = "additional_urls_to_include_in_warc"
 CONFIG_PATH_ADDITIONAL_URLS_SAVE_WBM = "additional_urls_to_save_via_wbm"
 CONFIG_PATH_ADDITIONAL_URLS_SAVE_YTDL = "additional_urls_to_save_via_youtube_dl"
 
+# the optional `crawl_budget { ... }` section, every key in it is optional too
+CONFIG_PATH_CRAWL_BUDGET = "crawl_budget"
+CONFIG_PATH_CRAWL_BUDGET_MAX_URLS = "max_urls"
+CONFIG_PATH_CRAWL_BUDGET_MAX_BYTES = "max_bytes"
+CONFIG_PATH_CRAWL_BUDGET_MAX_WALL_TIME_MINUTES = "max_wall_time_minutes"
+CONFIG_PATH_CRAWL_BUDGET_MAX_DEPTH = "max_depth"
+
 
 WPULL_INPUT_URLS_FORMAT_LIST = [
     "https://static-cdn.jtvnw.net/emoticons/v2/{}/default/dark/1.0",
@@ -46,13 +108,180 @@ WAYBACK_ATTEMPT_MAX = 6
 
 YOUTUBE_DL_FILE_TEMPLATE_STR = "%(id)s.%(ext)s"
 
+# the minimum number of seconds between youtube-dl download progress log lines for the same file
+YOUTUBE_DL_PROGRESS_DEFAULT_INTERVAL_SECONDS = 10
+
+# how many videos we download at the same time, 1 means one after another in the same process
+YOUTUBE_DL_DEFAULT_WORKERS = 1
+
 ACCEPTABLE_WPULL_EXIT_CODES = [0, 4, 5, 8]
 
+# stopping wpull early (crawl budget / stall): SIGINT makes wpull stop once the requests it is in the middle of are
+# done, it closes its WARC and exits with its usual exit code. if it is still going after the grace period it gets
+# SIGTERM, which makes wpull 2.x stop its event loop right away and exit with 1 (a generic error), and the responses
+# it was in the middle of never make it into the WARC
+WPULL_STOP_DEFAULT_GRACE_SECONDS = 5 * 60
+WPULL_FORCED_STOP_EXIT_CODE = 1
+
+# watching wpull's SQLite database while it runs, wpull 2.x calls the queue table `queued_urls`
+# and wpull 1.x calls it `urls`, both have a `status` column with these values
+WPULL_DATABASE_QUEUE_TABLE_NAMES = ["queued_urls", "urls"]
+WPULL_DATABASE_STATUS_TODO = "todo"
+WPULL_DATABASE_STATUS_IN_PROGRESS = "in_progress"
+WPULL_DATABASE_STATUS_DONE = "done"
+WPULL_DATABASE_STATUS_ERROR = "error"
+WPULL_DATABASE_STATUS_SKIPPED = "skipped"
+# the queue row's url is an id into this table, the column is `url_string_id` in wpull 2.x and `url_str_id` in wpull 1.x
+WPULL_DATABASE_URL_STRINGS_TABLE_NAME = "url_strings"
+WPULL_DATABASE_URL_STRING_ID_COLUMN_NAMES = ["url_string_id", "url_str_id"]
+WPULL_MONITOR_DEFAULT_INTERVAL_SECONDS = 30
+# log a warning after this many polls in a row couldn't read the wpull database
+WPULL_MONITOR_FAILED_POLL_WARNING_COUNT = 10
+# wpull names its temp files `tmp-wpull-<hint>-<random>.tmp`, the response it is downloading right now is `tmp-wpull-warcsesrsp-...`
+WPULL_TEMP_FILE_GLOB = "tmp-wpull-*"
+
+# how many of the last lines of a subprocess's output we keep around for error messages
+PROCESS_OUTPUT_TAIL_LINE_COUNT = 200
+PROCESS_OUTPUT_MAX_LINE_BYTES = 64 * 1024
+
+# wpull always logs these to stderr, `--output-file` only adds a second copy in a file. the quotes come out
+# as `\u2018` / `\u2019` escapes if wpull's stderr isn't utf-8, see `WPULL_PYTHONIOENCODING`
+WPULL_OUTPUT_OPEN_QUOTE = "(?:‘|\\\\u2018)"
+WPULL_OUTPUT_CLOSE_QUOTE = "(?:’|\\\\u2019)"
+# `INFO Fetching ‘https://example.com/’.`
+WPULL_OUTPUT_FETCHING_REGEX = re.compile(f"Fetching {WPULL_OUTPUT_OPEN_QUOTE}.*{WPULL_OUTPUT_CLOSE_QUOTE}\\.$")
+# `INFO Fetched ‘https://example.com/’: 200 OK. Length: 1270 [text/html].`, the length is the Content-Length
+# header, or `unspecified` for a chunked response
+WPULL_OUTPUT_FETCHED_REGEX = re.compile(
+    f"Fetched {WPULL_OUTPUT_OPEN_QUOTE}.*{WPULL_OUTPUT_CLOSE_QUOTE}: [0-9]+ .*?\\.( Length: (?P<length>[0-9,]+))?")
+WPULL_OUTPUT_ERROR_REGEX = re.compile("^ERROR ")
+# makes wpull write its log lines as utf-8 no matter what the locale is
+WPULL_PYTHONIOENCODING = "utf-8"
+
 # https://pbs.twimg.com/hashflag/config-2021-01-15-01.json
 TWITTER_HASHFLAGS_REGEX = re.compile("^.*hashflag/config-.*$")
 
-WAYBACK_MACHINE_BACKOFF_TIME_SECONDS = 5 * 60
-
+# retrying after a `utils.WbmSaveError`, this starts out short and then backs off exponentially up to the max
+WAYBACK_MACHINE_DEFAULT_BACKOFF_BASE_SECONDS = 30
+WAYBACK_MACHINE_DEFAULT_BACKOFF_MAX_SECONDS = 10 * 60
+
+# retrying after the wayback machine gave us a garbage twitter 'hashflags' url, this seems to take
+# a while to clear up so it starts out a lot longer
+WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_BASE_SECONDS = 5 * 60
+WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_MAX_SECONDS = 30 * 60
+
+WAYBACK_MACHINE_BACKOFF_MULTIPLIER = 2
+WAYBACK_MACHINE_BACKOFF_JITTER_FRACTION = 0.5
+
+WAYBACK_MACHINE_HOSTNAME = "web.archive.org"
+
+# how many urls we save in the wayback machine at the same time
+WAYBACK_MACHINE_DEFAULT_CONCURRENCY = 4
+
+# `https://web.archive.org/web/20210115010042/https://twitter.com/twitch`
+WAYBACK_MACHINE_ARCHIVE_URL_TIMESTAMP_REGEX = re.compile("/web/(?P<timestamp>[0-9]{14})")
+
+# how long a cached wayback machine result is used for, and when it gets deleted from the cache
+WAYBACK_MACHINE_CACHE_DEFAULT_FRESHNESS_HOURS = 24
+WAYBACK_MACHINE_CACHE_DEFAULT_MAX_AGE_DAYS = 30
+
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+# the CDX API, for finding recent captures of a url before we save it again
+WAYBACK_MACHINE_CDX_DEFAULT_ENDPOINT = "https://web.archive.org/cdx/search/cdx"
+WAYBACK_MACHINE_CDX_DEFAULT_WINDOW_HOURS = 6
+WAYBACK_MACHINE_CDX_TIMEOUT_SECONDS = 30
+
+# the CDX API is much cheaper than save page now, so it gets its own (looser) token bucket
+WAYBACK_MACHINE_CDX_RATE_LIMIT_PER_SECOND = 1
+WAYBACK_MACHINE_CDX_RATE_LIMIT_BURST = 4
+
+# the save page now API, GET this with the url on the end and the archive url is in the response headers
+WAYBACK_MACHINE_BASE_URL = "https://web.archive.org"
+# the base url, and then the url to save
+WAYBACK_MACHINE_SAVE_URL_FORMAT = "{}/save/{}"
+WAYBACK_MACHINE_SAVE_TIMEOUT_SECONDS = 3 * 60
+
+# where the save page now API puts the archive url, in the order we check them
+WAYBACK_MACHINE_SAVE_CONTENT_LOCATION_REGEX = re.compile("^(?P<path>/web/[0-9]{14}/.*)$")
+WAYBACK_MACHINE_SAVE_LINK_MEMENTO_REGEX = re.compile("rel=\"memento.*?(?P<url>web\\.archive\\.org/web/[0-9]{14}/.*?)>")
+WAYBACK_MACHINE_SAVE_X_CACHE_KEY_REGEX = re.compile("^https(?P<url>.*)[A-Z]{2}$")
+
+# the keep-alive connection pool that all wayback machine requests in a process share
+WAYBACK_MACHINE_HTTP_DEFAULT_POOL_SIZE = 8
+WAYBACK_MACHINE_HTTP_POOL_CONNECTIONS = 4
+WAYBACK_MACHINE_HTTP_RETRIES = 5
+WAYBACK_MACHINE_HTTP_RETRY_BACKOFF_FACTOR = 0.5
+
+# `https://web.archive.org/web/<timestamp>/<url>`
+WAYBACK_MACHINE_ARCHIVE_URL_FORMAT = "https://web.archive.org/web/{}/{}"
+
+# token bucket settings for requests to the wayback machine, the save page now API
+# gets angry at anything more than ~15 requests a minute
+WAYBACK_MACHINE_DEFAULT_RATE_LIMIT_PER_SECOND = 0.25
+WAYBACK_MACHINE_DEFAULT_RATE_LIMIT_BURST = 2
+
+# the subcommands of the cli, `archive` is the default when none is given
+CLI_SUBCOMMAND_ARCHIVE = "archive"
+CLI_SUBCOMMAND_RETRY_WBM = "retry-wbm"
+CLI_SUBCOMMAND_DEDUP = "dedup"
+CLI_SUBCOMMAND_INDEX = "index"
+CLI_SUBCOMMAND_LOOKUP = "lookup"
+CLI_SUBCOMMAND_VERIFY = "verify"
+CLI_SUBCOMMAND_ZSTD = "zstd"
+CLI_SUBCOMMAND_NAMES = [CLI_SUBCOMMAND_ARCHIVE, CLI_SUBCOMMAND_RETRY_WBM, CLI_SUBCOMMAND_DEDUP,
+    CLI_SUBCOMMAND_INDEX, CLI_SUBCOMMAND_LOOKUP, CLI_SUBCOMMAND_VERIFY, CLI_SUBCOMMAND_ZSTD]
+
+# the `verify` subcommand, every WARC gets checked in its own process
+VERIFY_DEFAULT_WORKERS = 4
+
+# batch mode (`--config-dir`)
+BATCH_DEFAULT_CONFIG_GLOB = "*.conf"
+BATCH_DEFAULT_WORKERS = 2
+BATCH_DEFAULT_MAX_CONCURRENT_WPULL = 2
+BATCH_DEFAULT_MAX_CONCURRENT_YOUTUBE_DL = 2
+
+# names of the stages in `Application.run`
+STAGE_CREATE_FOLDERS = "create_folders"
+STAGE_WRITE_VERSION_INFO = "write_version_info"
+STAGE_WRITE_WPULL_URL_LIST = "write_wpull_url_list"
+STAGE_WBM_SAVE = "wbm_save"
+STAGE_WRITE_WPULL_ARGUMENTS = "write_wpull_arguments"
+STAGE_YOUTUBE_DL = "youtube_dl"
+STAGE_WPULL = "wpull"
+STAGE_NATIVE_FETCH = "native_fetch"
+STAGE_BLOB_STORE = "blob_store"
+STAGE_CDXJ_INDEX = "cdxj_index"
+STAGE_ZSTD_RECOMPRESS = "zstd_recompress"
+
+# stages that get skipped entirely on a re-run if the checkpoint journal says they completed, the
+# other stages are either cheap or produce results that later stages need, so they always run
+# (and the wayback machine / youtube-dl work inside of them is skipped per url instead)
+CHECKPOINT_SKIPPABLE_STAGES = [STAGE_YOUTUBE_DL, STAGE_WPULL, STAGE_NATIVE_FETCH, STAGE_BLOB_STORE, STAGE_ZSTD_RECOMPRESS]
+
+# the spans and counters in the metrics file, see `metrics.MetricsRecorder`. every stage gets a span named
+# `METRICS_SPAN_STAGE_FORMAT.format(<stage name>)`
+METRICS_SPAN_RUN = "run"
+METRICS_SPAN_STAGE_FORMAT = "stage_{}"
+METRICS_SPAN_WBM_SAVE_ATTEMPT = "wbm_save_attempt"
+METRICS_SPAN_WBM_RETRY_WAIT = "wbm_retry_wait"
+METRICS_SPAN_YOUTUBE_DL_DOWNLOAD = "youtube_dl_download"
+METRICS_SPAN_WPULL_PROCESS = "wpull_process"
+METRICS_COUNTER_BYTES_DOWNLOADED = "bytes_downloaded"
+METRICS_COUNTER_RETRIES = "retries"
+# the `source` label of the counters
+METRICS_SOURCE_WBM_SAVE = "wbm_save"
+METRICS_SOURCE_YOUTUBE_DL = "youtube_dl"
+METRICS_SOURCE_NATIVE_FETCH = "native_fetch"
+METRICS_SOURCE_WPULL = "wpull"
+METRICS_PROMETHEUS_PREFIX = "archive_pogchamp_emote"
+
+# `--native-emote-fetch`, fetching the `WPULL_INPUT_URLS_FORMAT_LIST` urls in process instead of with wpull
+NATIVE_FETCH_DEFAULT_CONCURRENCY = 6
+NATIVE_FETCH_ATTEMPT_MAX = 3
+NATIVE_FETCH_RETRY_WAIT_SECONDS = 5
+NATIVE_FETCH_TIMEOUT_SECONDS = 60
+NATIVE_FETCH_WARC_VERSION = "WARC/1.0"
 
 WPULL_ARGUMENT_WARC_HEADER = "--warc-header"
 WPULL_ARGUMENT_DATABASE = "--database"
@@ -69,6 +298,37 @@ WPULL_ARGUMENT_DELETE_AFTER = "--delete-after"
 WPULL_ARGUMENT_WARC_APPEND = "--warc-append"
 WPULL_ARGUMENT_RECURSIVE = "--recursive"
 WPULL_ARGUMENT_VERBOSE = "--verbose"
+WPULL_ARGUMENT_VERSION = "--version"
+WPULL_ARGUMENT_LEVEL = "--level"
+WPULL_ARGUMENT_QUOTA = "--quota"
+WPULL_ARGUMENT_WARC_CDX = "--warc-cdx"
+WPULL_ARGUMENT_WARC_DEDUP = "--warc-dedup"
+
+# the CDX columns we use, wpull's `--warc-cdx` writes ` CDX a b m s k S V g u`
+CDX_FIELD_ORIGINAL_URL = "a"
+CDX_FIELD_DATE = "b"
+CDX_FIELD_MIME_TYPE = "m"
+CDX_FIELD_PAYLOAD_DIGEST = "k"
+CDX_FIELD_RECORD_ID = "u"
+
+# `WARC-Payload-Digest: sha1:<base32>`, the CDX files have the digest without the prefix
+WARC_PAYLOAD_DIGEST_PREFIX = "sha1:"
+
+# reading WARCs to index them, every gzip member is one record and only its start gets kept
+WARC_RECORD_TYPE_RESPONSE = "response"
+WARC_RECORD_TYPE_REVISIT = "revisit"
+WARC_RECORD_TYPE_RESOURCE = "resource"
+WARC_INDEX_RECORD_TYPES = [WARC_RECORD_TYPE_RESPONSE, WARC_RECORD_TYPE_REVISIT, WARC_RECORD_TYPE_RESOURCE]
+WARC_INDEX_REVISIT_MIME_TYPE = "warc/revisit"
+WARC_INDEX_HEAD_BYTES = 64 * 1024
+WARC_INDEX_READ_CHUNK_BYTES = 1024 * 1024
+WARC_INDEX_DEFAULT_PORTS = [80, 443]
+# `zlib.MAX_WBITS | 16`, for a gzip header and trailer instead of a zlib one
+GZIP_ZLIB_WBITS = 31
+
+# the environment variable that tells a PEX where to extract itself to
+PEX_ROOT_ENVIRONMENT_VARIABLE = "PEX_ROOT"
+PYTHONIOENCODING_ENVIRONMENT_VARIABLE = "PYTHONIOENCODING"
 
 ################
 # WARC headers
@@ -91,6 +351,10 @@ WARC_HEADER_VALUE_APPLICATION_VERSION = f"{__version__}"
 WARC_HEADER_KEY_APPLICATION_GITHUB_LINK = "{}application-github-link".format(WARC_CUSTOM_HEADER_PREFIX)
 WARC_HEADER_VALUE_APPLICATION_GITHUB_LINK= "https://github.com/mgrandi/archive_pogchamp_emote"
 
+# overrides the git hash, see `utils.get_git_hash()`
+GIT_HASH_ENVIRONMENT_VARIABLE = "ARCHIVE_POGCHAMP_EMOTE_GIT_HASH"
+EMBEDDED_GIT_HASH_MODULE_NAME = "_embedded_git_hash.py"
+
 WARC_HEADER_KEY_APPLICATION_GIT_HASH = "{}application-git-hash".format(WARC_CUSTOM_HEADER_PREFIX)
 
 WARC_HEADER_STREAMER_TWITCH_LINK = "{}streamer-twitch-link".format(WARC_CUSTOM_HEADER_PREFIX)
@@ -103,8 +367,21 @@ WARC_HEADER_STREAMER_TWICH_TWEET_URL_WBM = "{}twitch-tweet-link-wbm".format(WARC
 WARC_HEADER_ADDITIONAL_URL_FORMAT = "{}additional-url-{}".format(WARC_CUSTOM_HEADER_PREFIX, "{:03d}")
 WARC_HEADER_ADDITIONAL_URL_WBM_FORMAT = "{}additional-url-wbm-{}".format(WARC_CUSTOM_HEADER_PREFIX, "{:03d}")
 
-WARC_HEADER_STREAMER_NAME = "{}streamer-name".format(WARC_CUSTOM_HEADER_PREFIX)
+# the value of a `*-wbm*` WARC header when saving the url in the wayback machine failed, the archive url
+# gets filled in to the day's wbm manifest (`WBM_MANIFEST_FILE_FORMAT`) by `retry-wbm` later
+WARC_HEADER_VALUE_WBM_PENDING_FORMAT = "pending: saving in the wayback machine failed, see `{}` for the archive url once it is retried"
 
+WARC_HEADER_STREAMER_NAME = "{}streamer-name".format(WARC_CUSTOM_HEADER_PREFIX)
 
 
+WAYBACK_MACHINE_DEFAULT_BACKOFF_POLICY = model.BackoffPolicy(
+    base_seconds=WAYBACK_MACHINE_DEFAULT_BACKOFF_BASE_SECONDS,
+    multiplier=WAYBACK_MACHINE_BACKOFF_MULTIPLIER,
+    max_seconds=WAYBACK_MACHINE_DEFAULT_BACKOFF_MAX_SECONDS,
+    jitter_fraction=WAYBACK_MACHINE_BACKOFF_JITTER_FRACTION)
 
+WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_POLICY = model.BackoffPolicy(
+    base_seconds=WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_BASE_SECONDS,
+    multiplier=WAYBACK_MACHINE_BACKOFF_MULTIPLIER,
+    max_seconds=WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_MAX_SECONDS,
+    jitter_fraction=WAYBACK_MACHINE_BACKOFF_JITTER_FRACTION)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+'''
+writes the current git hash into `archive_pogchamp_emote/_embedded_git_hash.py`, so that installs
+without a `.git` folder (like a built wheel) still know what commit they came from, without having
+to run git at all
+
+run this before `poetry build` / `poetry install`:
+
+    python -m archive_pogchamp_emote.embed_git_hash
+'''
+
+# library imports
+import logging
+import pathlib
+import sys
+
+# library imports
+from archive_pogchamp_emote import utils as utils
+from archive_pogchamp_emote import constants as constants
+
+logger = logging.getLogger(__name__)
+
+
+def write_embedded_git_hash():
+    ''' runs git describe and writes the result into the embedded git hash module
+
+    @return the path of the file that was written
+    '''
+
+    git_hash = utils.run_git_describe()
+
+    if not git_hash:
+        raise Exception(f"`git describe` didn't return a git hash, is `{utils.get_git_repo_path()}` a git repository?")
+
+    embedded_git_hash_path = pathlib.Path(__file__).parent / constants.EMBEDDED_GIT_HASH_MODULE_NAME
+    logger.info("writing git hash `%s` to `%s`", git_hash, embedded_git_hash_path)
+
+    with open(embedded_git_hash_path, "w", encoding="utf-8") as f:
+        f.write("# generated by `python -m archive_pogchamp_emote.embed_git_hash`, do not edit\n")
+        f.write(f"GIT_HASH = {git_hash!r}\n")
+
+    return embedded_git_hash_path
+
+
+def main():
+
+    logging.basicConfig(level="INFO", format="%(levelname)-8s: %(message)s")
+
+    try:
+        write_embedded_git_hash()
+    except Exception as e:
+        logger.exception("failed to write the embedded git hash")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,19 @@
 # library imports
 import argparse
 import logging
+import pathlib
 import sys
 
-# third party imports
-import arrow
-import attr
-import requests
-import logging_tree
-
 # lirary imports
 from archive_pogchamp_emote import application as application
+from archive_pogchamp_emote import batch as batch
+from archive_pogchamp_emote import blob_store as blob_store
+from archive_pogchamp_emote import wbm_retry as wbm_retry
 from archive_pogchamp_emote import utils as utils
+from archive_pogchamp_emote import warc as warc
+from archive_pogchamp_emote import warc_verify as warc_verify
+from archive_pogchamp_emote import warc_zstd as warc_zstd
+from archive_pogchamp_emote import constants as constants
 
 def main():
     # if we are being run as a real program
@@ -25,46 +27,318 @@ def main():
 
 
 
+    # arguments that every subcommand has
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument("--log-to-file",
+        dest="log_to_file",
+        type=utils.isFileType(False),
+        help="save the application log to a file as well as print to stdout")
+    common_parser.add_argument("--log-async",
+        dest="log_async",
+        action="store_true",
+        help="write the log to stdout / --log-to-file on a background thread, so the threads doing the work don't block on it")
+    common_parser.add_argument("--verbose", action="store_true", help="Increase logging verbosity")
+
+    # arguments for saving urls in the wayback machine, used by both `archive` and `retry-wbm`
+    wbm_parser = argparse.ArgumentParser(add_help=False)
+    wbm_parser.add_argument("--wbm-concurrency",
+        dest="wbm_concurrency",
+        type=utils.positiveIntType,
+        default=constants.WAYBACK_MACHINE_DEFAULT_CONCURRENCY,
+        help="the max number of urls we save in the wayback machine at the same time")
+    wbm_parser.add_argument("--wbm-rate-limit",
+        dest="wbm_rate_limit",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_DEFAULT_RATE_LIMIT_PER_SECOND,
+        help="the max number of requests per second we send to the wayback machine")
+    wbm_parser.add_argument("--wbm-rate-limit-burst",
+        dest="wbm_rate_limit_burst",
+        type=utils.positiveIntType,
+        default=constants.WAYBACK_MACHINE_DEFAULT_RATE_LIMIT_BURST,
+        help="how many requests we can send to the wayback machine in a burst before the rate limit kicks in")
+    wbm_parser.add_argument("--wbm-backoff-base-seconds",
+        dest="wbm_backoff_base_seconds",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_DEFAULT_BACKOFF_BASE_SECONDS,
+        help="how long to wait before retrying the first time a wayback machine save fails, doubles with every failure")
+    wbm_parser.add_argument("--wbm-backoff-max-seconds",
+        dest="wbm_backoff_max_seconds",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_DEFAULT_BACKOFF_MAX_SECONDS,
+        help="the longest we wait before retrying a failed wayback machine save")
+    wbm_parser.add_argument("--wbm-hashflags-backoff-base-seconds",
+        dest="wbm_hashflags_backoff_base_seconds",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_BASE_SECONDS,
+        help="how long to wait before retrying the first time the wayback machine gives us a twitter hashflags url")
+    wbm_parser.add_argument("--wbm-hashflags-backoff-max-seconds",
+        dest="wbm_hashflags_backoff_max_seconds",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_MAX_SECONDS,
+        help="the longest we wait before retrying after the wayback machine gives us a twitter hashflags url")
+    wbm_parser.add_argument("--wbm-http-pool-size",
+        dest="wbm_http_pool_size",
+        type=utils.positiveIntType,
+        default=constants.WAYBACK_MACHINE_HTTP_DEFAULT_POOL_SIZE,
+        help="the max number of keep-alive connections to the wayback machine, should be at least --wbm-concurrency")
+    wbm_parser.add_argument("--no-wbm-cdx-check",
+        dest="no_wbm_cdx_check",
+        action="store_true",
+        help="always save urls in the wayback machine, instead of first checking the CDX API for a recent capture to reuse")
+    wbm_parser.add_argument("--wbm-cdx-endpoint",
+        dest="wbm_cdx_endpoint",
+        default=constants.WAYBACK_MACHINE_CDX_DEFAULT_ENDPOINT,
+        help="the url of the wayback machine CDX API")
+    wbm_parser.add_argument("--wbm-cdx-window-hours",
+        dest="wbm_cdx_window_hours",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_CDX_DEFAULT_WINDOW_HOURS,
+        help="a url that the wayback machine captured within this many hours reuses that capture instead of getting saved again")
+    wbm_parser.add_argument("--wbm-cache-file",
+        dest="wbm_cache_file",
+        type=utils.isFileType(False),
+        help="a SQLite database to cache wayback machine results in, urls with a fresh result in the cache don't get saved again")
+    wbm_parser.add_argument("--wbm-cache-freshness-hours",
+        dest="wbm_cache_freshness_hours",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_CACHE_DEFAULT_FRESHNESS_HOURS,
+        help="with --wbm-cache-file, cached wayback machine results older than this are saved again")
+    wbm_parser.add_argument("--wbm-cache-max-age-days",
+        dest="wbm_cache_max_age_days",
+        type=utils.positiveFloatType,
+        default=constants.WAYBACK_MACHINE_CACHE_DEFAULT_MAX_AGE_DAYS,
+        help="with --wbm-cache-file, cached wayback machine results older than this are deleted from the cache")
+
+    # arguments for the blob store, used by both `archive` and `dedup`
+    blob_store_parser = argparse.ArgumentParser(add_help=False)
+    blob_store_parser.add_argument("--blob-store-link-mode",
+        dest="blob_store_link_mode",
+        choices=constants.BLOB_STORE_LINK_MODES,
+        default=constants.BLOB_STORE_LINK_MODE_HARDLINK,
+        help="how files get linked to the blob they are a copy of, the other mode is tried if this one doesn't work")
+    blob_store_parser.add_argument("--dedup-workers",
+        dest="dedup_workers",
+        type=utils.positiveIntType,
+        default=constants.BLOB_STORE_DEFAULT_HASH_WORKERS,
+        help="the number of files that get hashed at the same time when adding them to the blob store")
+
+    zstd_parser = argparse.ArgumentParser(add_help=False)
+    zstd_parser.add_argument("--zstd-level",
+        dest="zstd_level",
+        type=utils.positiveIntType,
+        default=constants.ZSTD_DEFAULT_LEVEL,
+        help="the zstd compression level for recompressing WARCs")
+    zstd_parser.add_argument("--zstd-workers",
+        dest="zstd_workers",
+        type=utils.positiveIntType,
+        default=constants.ZSTD_DEFAULT_WORKERS,
+        help="how many WARCs get recompressed with zstd at the same time, each one in its own process")
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    archive_parser = subparsers.add_parser(constants.CLI_SUBCOMMAND_ARCHIVE,
+        parents=[common_parser, wbm_parser, blob_store_parser, zstd_parser],
+        help="archive a day's emote (or every day in a folder), this is the default if no subcommand is given")
     # optional arguments, if specified these are the input and output files, if not specified, it uses stdin and stdout
-    parser.add_argument("--config-file",
+    config_group = archive_parser.add_mutually_exclusive_group(required=True)
+    config_group.add_argument("--config-file",
         dest="config_file",
         type=utils.hocon_config_file_type,
-        required=True,
         help="the HOCON configuration file")
-    parser.add_argument("--root-output-folder",
+    config_group.add_argument("--config-dir",
+        dest="config_dir",
+        type=utils.isDirectoryType,
+        help="a folder of HOCON configuration files, archives every day in the folder (batch mode)")
+    archive_parser.add_argument("--root-output-folder",
         dest="root_output_folder",
         type=utils.isDirectoryType,
         required=True,
         help="the root folder that we put everything else in ")
-    parser.add_argument("--wpull-pex-path",
+    archive_parser.add_argument("--wpull-pex-path",
         dest="wpull_pex_path",
         type=utils.isFileType(True),
         required=True,
         help="the path to the wpull PEX that we will be executing to archive the emote")
-    parser.add_argument("--log-to-file",
-        dest="log_to_file",
-        type=utils.isFileType(False),
-        help="save the application log to a file as well as print to stdout")
-    parser.add_argument("--no-wbm-save",
+    archive_parser.add_argument("--wpull-pex-root",
+        dest="wpull_pex_root",
+        type=pathlib.Path,
+        help="the folder the wpull PEX extracts itself to (PEX_ROOT), reused by every wpull run so it only gets extracted once, " +
+            "the PEX default of `~/.pex` is used if this isn't given")
+    archive_parser.add_argument("--wpull-monitor-interval-seconds",
+        dest="wpull_monitor_interval_seconds",
+        type=utils.positiveFloatType,
+        default=constants.WPULL_MONITOR_DEFAULT_INTERVAL_SECONDS,
+        help="how often to read wpull's database and log how far along the crawl is")
+    archive_parser.add_argument("--wpull-stall-timeout-minutes",
+        dest="wpull_stall_timeout_minutes",
+        type=utils.positiveFloatType,
+        help="stop wpull if it doesn't do anything for this many minutes: no url starts or finishes, and neither the WARC " +
+            "nor a download that is still going grows. time where its database can't be read counts too. if this isn't given wpull is never stopped for stalling, " +
+            "it runs until it finishes on its own (or until wpull's own timeouts give up on a url)")
+    archive_parser.add_argument("--wpull-stop-grace-seconds",
+        dest="wpull_stop_grace_seconds",
+        type=utils.positiveFloatType,
+        default=constants.WPULL_STOP_DEFAULT_GRACE_SECONDS,
+        help="when wpull gets stopped early (crawl budget / stall), how long it gets to finish the requests it is in the " +
+            "middle of before it is forced to stop, anything it was still downloading then is left out of the WARC")
+    archive_parser.add_argument("--no-wbm-save",
         dest="no_wbm_save",
         action="store_true",
         help="use this to not save URLs in the wayback machine (for testing)")
-    parser.add_argument("--no-youtube-dl",
+    archive_parser.add_argument("--no-youtube-dl",
         dest="no_youtube_dl",
         action="store_true",
         help="use this to not save videos with youtube-dl (for testing)")
-    parser.add_argument("--verbose", action="store_true", help="Increase logging verbosity")
+    archive_parser.add_argument("--youtube-dl-workers",
+        dest="youtube_dl_workers",
+        type=utils.positiveIntType,
+        default=constants.YOUTUBE_DL_DEFAULT_WORKERS,
+        help="the number of worker processes that download videos with youtube-dl at the same time")
+    archive_parser.add_argument("--youtube-dl-progress-interval",
+        dest="youtube_dl_progress_interval",
+        type=utils.positiveFloatType,
+        default=constants.YOUTUBE_DL_PROGRESS_DEFAULT_INTERVAL_SECONDS,
+        help="the minimum number of seconds between youtube-dl download progress log lines for the same file")
+    archive_parser.add_argument("--native-emote-fetch",
+        dest="native_emote_fetch",
+        action="store_true",
+        help="fetch the emote image urls in this process and write them to their own WARC instead of running wpull for them, " +
+            "wpull still runs if there are additional urls to include in the WARC. needs the `native-fetch` extra")
+    archive_parser.add_argument("--native-fetch-concurrency",
+        dest="native_fetch_concurrency",
+        type=utils.positiveIntType,
+        default=constants.NATIVE_FETCH_DEFAULT_CONCURRENCY,
+        help="with --native-emote-fetch, the max number of urls we fetch at the same time")
+    archive_parser.add_argument("--wbm-fail-fast",
+        dest="wbm_fail_fast",
+        action="store_true",
+        help="fail the day if a url can't be saved in the wayback machine, instead of putting it in the retry queue for `retry-wbm`")
+    archive_parser.add_argument("--config-glob",
+        dest="config_glob",
+        default=constants.BATCH_DEFAULT_CONFIG_GLOB,
+        help="with --config-dir, the glob pattern used to find the HOCON configuration files in the folder")
+    archive_parser.add_argument("--batch-workers",
+        dest="batch_workers",
+        type=utils.positiveIntType,
+        default=constants.BATCH_DEFAULT_WORKERS,
+        help="with --config-dir, the number of days to archive at the same time")
+    archive_parser.add_argument("--max-concurrent-wpull",
+        dest="max_concurrent_wpull",
+        type=utils.positiveIntType,
+        default=constants.BATCH_DEFAULT_MAX_CONCURRENT_WPULL,
+        help="with --config-dir, the max number of wpull processes running at the same time across all days")
+    archive_parser.add_argument("--max-concurrent-youtube-dl",
+        dest="max_concurrent_youtube_dl",
+        type=utils.positiveIntType,
+        default=constants.BATCH_DEFAULT_MAX_CONCURRENT_YOUTUBE_DL,
+        help="with --config-dir, the max number of youtube-dl downloads running at the same time across all days")
+    archive_parser.add_argument("--no-resume",
+        dest="no_resume",
+        action="store_true",
+        help="ignore the checkpoint journal from an earlier run of the same day and redo everything")
+    archive_parser.add_argument("--metrics-prometheus-textfile",
+        dest="metrics_prometheus_textfile",
+        type=pathlib.Path,
+        help="also write the run's metrics to this file in the prometheus text format, for the node exporter's textfile " +
+            "collector (the file name has to end in `.prom`). with --config-dir, every day overwrites it when it finishes")
+    archive_parser.add_argument("--zstd-recompress",
+        dest="zstd_recompress",
+        action="store_true",
+        help="once the day's WARCs are written, recompress them to `.warc.zst` next to them with a zstd dictionary " +
+            "trained on the most recent days' WARCs. needs the `zstd` extra")
+    archive_parser.add_argument("--blob-store",
+        dest="blob_store",
+        action="store_true",
+        help="link the day's videos into the blob store in the root output folder (hardlinks / reflinks, so a video " +
+            "that shows up on several days is only stored once), and have the day's WARC write revisit records for " +
+            "payloads that an earlier day's WARC already has. NOTE: this means the day's WARC is no longer " +
+            "self contained, its revisit records point at other days' WARCs")
+    retry_wbm_parser = subparsers.add_parser(constants.CLI_SUBCOMMAND_RETRY_WBM,
+        parents=[common_parser, wbm_parser],
+        help="save the urls in the wayback machine retry queue, and patch the archive urls into each day's wbm manifest")
+    retry_wbm_parser.add_argument("--root-output-folder",
+        dest="root_output_folder",
+        type=utils.isDirectoryType,
+        required=True,
+        help="the root folder that was passed to `archive`, the retry queue lives in it")
+    dedup_parser = subparsers.add_parser(constants.CLI_SUBCOMMAND_DEDUP,
+        parents=[common_parser, blob_store_parser],
+        help="link the videos of every day that was already archived into the blob store, and index their WARCs' CDX files")
+    dedup_parser.add_argument("--root-output-folder",
+        dest="root_output_folder",
+        type=utils.isDirectoryType,
+        required=True,
+        help="the root folder that was passed to `archive`, the blob store lives in it")
+    index_parser = subparsers.add_parser(constants.CLI_SUBCOMMAND_INDEX,
+        parents=[common_parser],
+        help="index any WARC that doesn't have an up to date CDXJ index yet, and merge every day's indexes into one")
+    index_parser.add_argument("--root-output-folder",
+        dest="root_output_folder",
+        type=utils.isDirectoryType,
+        required=True,
+        help="the root folder that was passed to `archive`, the merged index is written to it")
+    lookup_parser = subparsers.add_parser(constants.CLI_SUBCOMMAND_LOOKUP,
+        parents=[common_parser],
+        help="print every capture of a url from the merged CDXJ index, see the `index` subcommand")
+    lookup_parser.add_argument("--root-output-folder",
+        dest="root_output_folder",
+        type=utils.isDirectoryType,
+        required=True,
+        help="the root folder that was passed to `archive`, the merged index lives in it")
+    lookup_parser.add_argument("--url",
+        dest="url",
+        required=True,
+        help="the url to look up")
+    lookup_parser.add_argument("--from",
+        dest="from_timestamp",
+        help="only captures at or after this timestamp, `YYYYMMDDhhmmss` or any prefix of it like `20210115`")
+    lookup_parser.add_argument("--to",
+        dest="to_timestamp",
+        help="only captures at or before this timestamp, `YYYYMMDDhhmmss` or any prefix of it like `20210115`")
+    verify_parser = subparsers.add_parser(constants.CLI_SUBCOMMAND_VERIFY,
+        parents=[common_parser],
+        help="check the gzip members and the block / payload digests of every record in every day's WARCs, and flag truncated WARCs")
+    verify_parser.add_argument("--root-output-folder",
+        dest="root_output_folder",
+        type=utils.isDirectoryType,
+        required=True,
+        help="the root folder that was passed to `archive`, the verify report is written to it")
+    verify_parser.add_argument("--verify-workers",
+        dest="verify_workers",
+        type=utils.positiveIntType,
+        default=constants.VERIFY_DEFAULT_WORKERS,
+        help="how many WARCs get checked at the same time, each one in its own process")
+    zstd_subcommand_parser = subparsers.add_parser(constants.CLI_SUBCOMMAND_ZSTD,
+        parents=[common_parser, zstd_parser],
+        help="recompress every day's WARCs to `.warc.zst` with a zstd dictionary trained on the most recent days' WARCs, " +
+            "needs the `zstd` extra")
+    zstd_subcommand_parser.add_argument("--root-output-folder",
+        dest="root_output_folder",
+        type=utils.isDirectoryType,
+        required=True,
+        help="the root folder that was passed to `archive`, the zstd dictionary lives in it")
+    zstd_subcommand_parser.add_argument("--retrain-dictionary",
+        dest="zstd_retrain_dictionary",
+        action="store_true",
+        help="train a new zstd dictionary even if there already is one, and recompress every WARC with it")
 
 
+    log_queue_listener = None
+
     try:
         root_logger = logging.getLogger()
 
-        parsed_args = parser.parse_args()
+        # the subcommands were added later, so no subcommand means `archive`
+        argv = sys.argv[1:]
+        if not argv or argv[0] not in constants.CLI_SUBCOMMAND_NAMES + ["-h", "--help"]:
+            argv = [constants.CLI_SUBCOMMAND_ARCHIVE] + argv
+
+        parsed_args = parser.parse_args(argv)
 
 
         # set up logging stuff
         logging.captureWarnings(True) # capture warnings with the logging infrastructure
-        logging_formatter = utils.ArrowLoggingFormatter("%(asctime)s %(threadName)-10s %(name)-40s %(levelname)-8s: %(message)s")
+        logging_formatter = utils.LocalTimeIsoLoggingFormatter("%(asctime)s %(threadName)-10s %(name)-40s %(levelname)-8s: %(message)s")
         logging_handler = logging.StreamHandler(sys.stdout)
         logging_handler.setFormatter(logging_formatter)
         root_logger.addHandler(logging_handler)
@@ -87,16 +361,55 @@ def main():
             file_handler.setFormatter(logging_formatter)
             root_logger.addHandler(file_handler)
 
+        if parsed_args.log_async:
+            # move the real handlers behind a queue, the listener's thread does the formatting and the writing
+            log_queue_listener = utils.start_async_logging(root_logger)
+
         root_logger.debug("argv: `%s`", sys.argv)
         root_logger.debug("Parsed arguments: %s", parsed_args)
-        root_logger.debug("Logger hierarchy:\n%s", logging_tree.format.build_description(node=None))
+        if root_logger.isEnabledFor(logging.DEBUG):
+            # only imported when we need it, see `benchmarks/import_time.py`
+            import logging_tree
+            root_logger.debug("Logger hierarchy:\n%s", logging_tree.format.build_description(node=None))
+
+        if parsed_args.command == constants.CLI_SUBCOMMAND_RETRY_WBM:
+            exit_code = wbm_retry.retry_pending_wbm_saves(parsed_args)
+
+        elif parsed_args.command == constants.CLI_SUBCOMMAND_DEDUP:
+            exit_code = blob_store.dedup_archive_tree(parsed_args)
+
+        elif parsed_args.command == constants.CLI_SUBCOMMAND_INDEX:
+            exit_code = warc.run_index_command(parsed_args)
+
+        elif parsed_args.command == constants.CLI_SUBCOMMAND_LOOKUP:
+            exit_code = warc.run_lookup_command(parsed_args)
 
-        # run the application
-        app = application.Application(parsed_args)
-        app.run()
+        elif parsed_args.command == constants.CLI_SUBCOMMAND_VERIFY:
+            exit_code = warc_verify.run_verify_command(parsed_args)
+
+        elif parsed_args.command == constants.CLI_SUBCOMMAND_ZSTD:
+            exit_code = warc_zstd.run_zstd_command(parsed_args)
+
+        elif parsed_args.config_dir:
+            # archive every day in the folder
+            exit_code = batch.run_batch(parsed_args)
+
+        else:
+            # run the application
+            app = application.Application(parsed_args)
+            app.run()
+            exit_code = 0
 
         root_logger.info("Done!")
 
+        if exit_code != 0:
+            sys.exit(exit_code)
+
     except Exception as e:
         root_logger.exception("Something went wrong!")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+    finally:
+        if log_queue_listener:
+            # flushes whatever is still in the queue
+            log_queue_listener.stop()
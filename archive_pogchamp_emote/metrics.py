@@ -0,0 +1,218 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import typing
+
+import arrow
+import attr
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+
+logger = logging.getLogger(__name__)
+
+
+def timed_call(func, *args, **kwargs) -> typing.Tuple[typing.Any, float, float]:
+    '''
+    calls `func` and times it, for work that runs in a worker process where the `MetricsRecorder`
+    can't follow, the caller records the span once it gets the result back
+
+    @return a tuple of `(the result of func, the start time as a unix timestamp, the duration in seconds)`
+    '''
+
+    start_timestamp = time.time()
+    start_time = time.monotonic()
+
+    result = func(*args, **kwargs)
+
+    return result, start_timestamp, time.monotonic() - start_time
+
+
+def _format_prometheus_labels(label_dict:typing.Dict[str, str]) -> str:
+    ''' @return the labels in the prometheus text format, like `{a="1",b="2"}`, or an empty string if there are none '''
+
+    if not label_dict:
+        return ""
+
+    label_list = []
+    for iter_key, iter_value in sorted(label_dict.items()):
+        iter_escaped_value = str(iter_value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        label_list.append(f"{iter_key}=\"{iter_escaped_value}\"")
+
+    return "{" + ",".join(label_list) + "}"
+
+
+class MetricsRecorder:
+    '''
+    keeps track of spans (how long something took) and counters (how many or how much of something) for one
+    day's run, and writes them out as json, and optionally as a prometheus textfile for the node exporter's
+    textfile collector. can be used from any thread
+    '''
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._span_list = []
+        self._counters = {}
+
+        self.start_timestamp = time.time()
+        self._start_time = time.monotonic()
+
+    @contextlib.contextmanager
+    def span(self, name:str, **labels):
+        ''' context manager that records a span for the time spent inside of it
+
+        @param name - the name of the span, one of the `constants.METRICS_SPAN_*` names
+        @param labels - extra labels for the span, like the url, these end up in the json but not in prometheus
+        '''
+
+        start_timestamp = time.time()
+        start_time = time.monotonic()
+        success = False
+
+        try:
+            yield
+            success = True
+        finally:
+            self.record_span(name, start_timestamp, time.monotonic() - start_time, success, **labels)
+
+    def record_span(self, name:str, start_timestamp:float, duration_seconds:float, success:bool=True, **labels):
+        ''' records a span that was timed somewhere else, see `timed_call()`
+
+        @param name - the name of the span
+        @param start_timestamp - when the span started, as a unix timestamp
+        @param duration_seconds - how long the span took
+        @param success - False if whatever the span timed raised an exception
+        @param labels - extra labels for the span
+        '''
+
+        metrics_span = model.MetricsSpan(
+            name=name,
+            labels={iter_key: str(iter_value) for iter_key, iter_value in labels.items()},
+            start_time=arrow.get(start_timestamp).isoformat(),
+            duration_seconds=duration_seconds,
+            success=success)
+
+        with self._lock:
+            self._span_list.append(metrics_span)
+
+    def increment(self, name:str, amount:typing.Union[int, float]=1, **labels):
+        ''' adds to a counter
+
+        @param name - the name of the counter, one of the `constants.METRICS_COUNTER_*` names
+        @param amount - how much to add
+        @param labels - the labels of the counter, each different set of labels is its own counter
+        '''
+
+        key = (name, tuple(sorted((iter_key, str(iter_value)) for iter_key, iter_value in labels.items())))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def get_span_list(self) -> typing.List[model.MetricsSpan]:
+        ''' @return every span that was recorded, sorted by when it started '''
+
+        with self._lock:
+            return sorted(self._span_list, key=lambda x: x.start_time)
+
+    def get_span_summary_list(self) -> typing.List[model.MetricsSpanSummary]:
+        ''' @return a `model.MetricsSpanSummary` for every span name, sorted by name '''
+
+        span_dict = {}
+        for iter_span in self.get_span_list():
+            span_dict.setdefault(iter_span.name, []).append(iter_span)
+
+        return [model.MetricsSpanSummary(
+                name=iter_name,
+                count=len(iter_span_list),
+                failed=len([iter_span for iter_span in iter_span_list if not iter_span.success]),
+                total_seconds=sum(iter_span.duration_seconds for iter_span in iter_span_list),
+                max_seconds=max(iter_span.duration_seconds for iter_span in iter_span_list))
+            for iter_name, iter_span_list in sorted(span_dict.items())]
+
+    def get_counter_list(self) -> typing.List[model.MetricsCounter]:
+        ''' @return every counter, sorted by name and then labels '''
+
+        with self._lock:
+            counters = dict(self._counters)
+
+        return [model.MetricsCounter(name=iter_name, labels=dict(iter_label_tuple), value=iter_value)
+            for (iter_name, iter_label_tuple), iter_value in sorted(counters.items())]
+
+    def write_json(self, metrics_path, emote_date:str, success:bool):
+        ''' writes every span and counter to a json file
+
+        @param metrics_path - the path of the json file
+        @param emote_date - the day that was archived
+        @param success - whether the run finished without an exception
+        '''
+
+        logger.info("writing metrics to `%s`", metrics_path)
+
+        metrics_dict = {
+            "emote_date": emote_date,
+            "started_at": arrow.get(self.start_timestamp).isoformat(),
+            "elapsed_seconds": time.monotonic() - self._start_time,
+            "success": success,
+            "span_summaries": [attr.asdict(iter_summary) for iter_summary in self.get_span_summary_list()],
+            "counters": [attr.asdict(iter_counter) for iter_counter in self.get_counter_list()],
+            "spans": [attr.asdict(iter_span) for iter_span in self.get_span_list()],
+        }
+
+        with open(metrics_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(metrics_dict, indent=4))
+
+    def write_prometheus_textfile(self, textfile_path, emote_date:str, success:bool):
+        '''
+        writes the span summaries and counters in the prometheus text format, for the node exporter's textfile
+        collector. it is written to a temporary file and renamed, so the node exporter never reads half of it
+
+        @param textfile_path - the path of the `.prom` file
+        @param emote_date - the day that was archived, every metric gets it as the `emote_date` label
+        @param success - whether the run finished without an exception
+        '''
+
+        logger.info("writing prometheus metrics to `%s`", textfile_path)
+
+        prefix = constants.METRICS_PROMETHEUS_PREFIX
+        run_labels = {"emote_date": emote_date}
+        line_list = []
+
+        def _add_metric(name, metric_type, help_text, sample_list):
+            line_list.append(f"# HELP {prefix}_{name} {help_text}")
+            line_list.append(f"# TYPE {prefix}_{name} {metric_type}")
+            for iter_suffix, iter_labels, iter_value in sample_list:
+                line_list.append(f"{prefix}_{name}{iter_suffix}{_format_prometheus_labels({**run_labels, **iter_labels})} {iter_value}")
+
+        _add_metric("run_success", "gauge", "1 if the last run finished without an exception, 0 if it didn't",
+            [("", {}, 1 if success else 0)])
+        _add_metric("run_start_timestamp_seconds", "gauge", "when the last run started, as a unix timestamp",
+            [("", {}, self.start_timestamp)])
+        _add_metric("run_duration_seconds", "gauge", "how long the last run took",
+            [("", {}, time.monotonic() - self._start_time)])
+
+        span_summary_list = self.get_span_summary_list()
+        _add_metric("span_duration_seconds", "summary", "how long the spans of the last run took, by span name",
+            [(iter_suffix, {"span": iter_summary.name}, iter_value)
+                for iter_summary in span_summary_list
+                for iter_suffix, iter_value in [("_sum", iter_summary.total_seconds), ("_count", iter_summary.count)]])
+        _add_metric("span_max_duration_seconds", "gauge", "the longest span of the last run, by span name",
+            [("", {"span": iter_summary.name}, iter_summary.max_seconds) for iter_summary in span_summary_list])
+        _add_metric("span_failed", "gauge", "how many spans of the last run raised an exception, by span name",
+            [("", {"span": iter_summary.name}, iter_summary.failed) for iter_summary in span_summary_list])
+
+        counter_dict = {}
+        for iter_counter in self.get_counter_list():
+            counter_dict.setdefault(iter_counter.name, []).append(iter_counter)
+
+        for iter_name, iter_counter_list in sorted(counter_dict.items()):
+            _add_metric(f"{iter_name}_total", "counter", f"the `{iter_name}` counter of the last run",
+                [("", iter_counter.labels, iter_counter.value) for iter_counter in iter_counter_list])
+
+        temp_path = textfile_path.with_name(f"{textfile_path.name}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(line_list) + "\n")
+        os.replace(temp_path, textfile_path)
@@ -1,5 +1,6 @@
 import pathlib
 import typing
+import contextlib
 
 import attr
 import arrow
@@ -21,6 +22,15 @@ class WarcHeader:
     key:str = attr.ib()
     value:str = attr.ib()
 
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class CrawlBudget:
+
+    # limits on what wpull crawls for a day, None means no limit
+    max_urls:typing.Optional[int] = attr.ib(default=None)
+    max_bytes:typing.Optional[int] = attr.ib(default=None)
+    max_wall_time_seconds:typing.Optional[float] = attr.ib(default=None)
+    max_depth:typing.Optional[int] = attr.ib(default=None)
+
 @attr.s(auto_attribs=True, frozen=True, kw_only=True)
 class DailyPogchampEmoteConfig:
 
@@ -55,3 +65,254 @@ class DailyPogchampEmoteConfig:
     additional_urls_to_save_via_wbm:typing.Sequence[str] = attr.ib()
     additional_urls_to_save_via_youtube_dl:typing.Sequence[str] = attr.ib()
 
+    # limits on the wpull crawl, from the optional `crawl_budget` section
+    crawl_budget:CrawlBudget = attr.ib()
+
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WbmSaveRequest:
+    # the url to save in the wayback machine
+    url:str = attr.ib()
+
+    # for logging, the `[idx/total]` we print out
+    idx:int = attr.ib()
+    total:int = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class VideoDownloadRequest:
+    # the url to download with youtube-dl
+    url:str = attr.ib()
+
+    # for logging, the `[idx/total]` we print out
+    idx:int = attr.ib()
+    total:int = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class BackoffPolicy:
+
+    # the delay after the first failure
+    base_seconds:float = attr.ib()
+
+    # the delay gets multiplied by this after every failure
+    multiplier:float = attr.ib()
+
+    # the delay never goes above this
+    max_seconds:float = attr.ib()
+
+    # the delay is picked randomly between `delay * (1 - jitter_fraction)` and `delay`
+    jitter_fraction:float = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WbmCacheEntry:
+    url:str = attr.ib()
+    archive_url:str = attr.ib()
+    capture_timestamp:arrow.arrow.Arrow = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WbmWarcHeaderEntry:
+
+    # a url that we saved in the wayback machine, and the WARC headers it and its archive url go in
+    url_warc_header_key:str = attr.ib()
+    url:str = attr.ib()
+    warc_header_key:str = attr.ib()
+    archive_url:typing.Optional[str] = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WbmRetryQueueEntry:
+    url:str = attr.ib()
+    manifest_path:pathlib.Path = attr.ib()
+    enqueued_timestamp:arrow.arrow.Arrow = attr.ib()
+    attempts:int = attr.ib()
+    last_error:str = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class NativeFetchResult:
+
+    url:str = attr.ib()
+
+    # the request line and headers, as they were sent
+    request_method:str = attr.ib()
+    request_path:str = attr.ib()
+    request_headers:typing.Sequence[typing.Tuple[str, str]] = attr.ib()
+
+    # the status line, headers and body, as they were received (the body is not decompressed)
+    status:int = attr.ib()
+    reason:str = attr.ib()
+    response_headers:typing.Sequence[typing.Tuple[str, str]] = attr.ib()
+    body:bytes = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class RequestLatencySummary:
+    label:str = attr.ib()
+    count:int = attr.ib()
+    total_seconds:float = attr.ib()
+    mean_seconds:float = attr.ib()
+    p50_seconds:float = attr.ib()
+    p95_seconds:float = attr.ib()
+    max_seconds:float = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WpullDatabaseProgress:
+
+    # how many urls in wpull's queue have each status
+    todo:int = attr.ib()
+    in_progress:int = attr.ib()
+    done:int = attr.ib()
+    error:int = attr.ib()
+    skipped:int = attr.ib()
+
+    # the size of the WARC file(s) wpull has written so far
+    warc_bytes:int = attr.ib()
+
+    # the size of wpull's temp files, a response only goes into the WARC once it is finished,
+    # until then it is downloaded into a temp file in the `--warc-tempdir`
+    temp_bytes:int = attr.ib(default=0)
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class CrawlBudgetReport:
+
+    crawl_budget:CrawlBudget = attr.ib()
+
+    # which limits were hit (`max_urls`, `max_bytes`, `max_wall_time_seconds`), empty if wpull finished on its own
+    exceeded_limit_list:typing.Sequence[str] = attr.ib()
+    elapsed_seconds:float = attr.ib()
+
+    # the state of wpull's queue when it stopped, None if it never created its database
+    final_progress:typing.Optional[WpullDatabaseProgress] = attr.ib()
+
+    # the urls that were still queued or in progress when wpull stopped, so were cut from the WARC
+    cut_url_list:typing.Sequence[str] = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class BlobStoreAddResult:
+    path:pathlib.Path = attr.ib()
+    sha256:str = attr.ib()
+    size:int = attr.ib()
+
+    # the `constants.BLOB_STORE_LINK_MODE_*` that was used, None if the file already was the blob
+    link_method:typing.Optional[str] = attr.ib()
+
+    # True if the file became a new blob, False if it was linked to an existing one
+    is_new_blob:bool = attr.ib()
+    bytes_saved:int = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WarcPayloadRecord:
+
+    # where a payload was first written, so a later identical payload can be a `revisit` record instead
+    payload_digest:str = attr.ib()
+    url:str = attr.ib()
+    warc_record_id:str = attr.ib()
+    warc_date:str = attr.ib()
+    warc_file_name:str = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class CdxjIndexEntry:
+
+    # `<surt> <timestamp>` is the sort key of the line
+    surt:str = attr.ib()
+    timestamp:str = attr.ib()
+
+    url:str = attr.ib()
+    mime:str = attr.ib()
+    status:str = attr.ib()
+    digest:str = attr.ib()
+
+    # where the record is in the WARC file, and how many bytes it takes up (compressed)
+    length:int = attr.ib()
+    offset:int = attr.ib()
+    filename:str = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WbmArchiveUrls:
+
+    # the wayback machine archive urls for a day, in the same order as the urls in the config, an
+    # archive url is None if saving the url failed and it was put in the retry queue instead
+    streamer_social_media_archive_urls:typing.Sequence[str] = attr.ib()
+    twitch_twitter_post_archive_url:typing.Optional[str] = attr.ib()
+    additional_archive_urls:typing.Sequence[str] = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class JobLimits:
+
+    # context managers (usually semaphores) that every wpull / youtube-dl job has to enter before it
+    # runs, so we can put a global cap on them when running multiple days at once
+    wpull:typing.ContextManager = attr.ib(factory=contextlib.nullcontext)
+    youtube_dl:typing.ContextManager = attr.ib(factory=contextlib.nullcontext)
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class BatchDayResult:
+
+    # the config file for the day
+    config_file:str = attr.ib()
+
+    # the `date` from the config file, or None if we couldn't read the config file
+    emote_date:typing.Optional[str] = attr.ib()
+
+    success:bool = attr.ib()
+    error:typing.Optional[str] = attr.ib()
+    elapsed_seconds:float = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WarcVerifyResult:
+
+    warc_path:str = attr.ib()
+    size_bytes:int = attr.ib()
+
+    num_records:int = attr.ib()
+    num_digests_checked:int = attr.ib()
+
+    # digests that didn't match, corrupt gzip members, etc
+    problem_list:typing.List[str] = attr.ib()
+
+    # the WARC ends in the middle of a gzip member or a record, usually because whatever wrote it got killed
+    truncated:bool = attr.ib()
+
+    elapsed_seconds:float = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class WarcRecompressResult:
+
+    warc_path:str = attr.ib()
+    zstd_path:str = attr.ib()
+
+    num_records:int = attr.ib()
+    input_bytes:int = attr.ib()
+    output_bytes:int = attr.ib()
+
+    # if the records were compressed with a dictionary, it is embedded in the `.warc.zst`
+    used_dictionary:bool = attr.ib()
+
+    elapsed_seconds:float = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class MetricsSpan:
+
+    # one of the `constants.METRICS_SPAN_*` names
+    name:str = attr.ib()
+
+    # things like the url or the attempt, these are only in the metrics json, not in prometheus
+    labels:typing.Dict[str, str] = attr.ib()
+
+    # ISO 8601
+    start_time:str = attr.ib()
+    duration_seconds:float = attr.ib()
+
+    # False if whatever the span timed raised an exception
+    success:bool = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class MetricsSpanSummary:
+    name:str = attr.ib()
+    count:int = attr.ib()
+    failed:int = attr.ib()
+    total_seconds:float = attr.ib()
+    max_seconds:float = attr.ib()
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class MetricsCounter:
+
+    # one of the `constants.METRICS_COUNTER_*` names
+    name:str = attr.ib()
+    labels:typing.Dict[str, str] = attr.ib()
+    value:typing.Union[int, float] = attr.ib()
@@ -0,0 +1,230 @@
+import base64
+import hashlib
+import io
+import logging
+import typing
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+
+logger = logging.getLogger(__name__)
+
+# NOTE: aiohttp and warcio are optional dependencies (the `native-fetch` extra), they are only imported once
+# we know `--native-emote-fetch` was given, see `check_native_fetch_dependencies()`. asyncio is imported
+# on first use too, it is a big chunk of the startup time otherwise, see `benchmarks/import_time.py`
+
+
+def check_native_fetch_dependencies():
+    ''' make sure the optional dependencies of the native fetcher are installed
+
+    @throws Exception with a message saying how to install them if they aren't
+    '''
+
+    try:
+        import aiohttp
+        import warcio
+    except ImportError as e:
+        raise Exception(f"`--native-emote-fetch` needs the optional `native-fetch` dependencies (aiohttp and warcio), " +
+            f"install them with `poetry install --extras native-fetch`: `{e}`") from e
+
+
+async def _fetch_url(client_session, semaphore, url:str, idx:int, total:int, metrics_recorder=None) -> model.NativeFetchResult:
+    ''' fetches a single url, retrying connection errors
+
+    @param client_session - the `aiohttp.ClientSession` to use
+    @param semaphore - the `asyncio.Semaphore` that limits how many urls we fetch at the same time
+    @param url - the url to fetch
+    @param idx - the index of the url, for logging
+    @param total - the number of urls, for logging
+    @param metrics_recorder - if not None, a `metrics.MetricsRecorder` that counts the retries
+    @return a `model.NativeFetchResult`
+    '''
+
+    import asyncio
+    import aiohttp
+
+    error_list = []
+
+    for iter_try_idx in range(1, constants.NATIVE_FETCH_ATTEMPT_MAX + 1):
+
+        try:
+            async with semaphore:
+
+                logger.info("[`%s/%s`] - fetching `%s` (try `%s/%s`)", idx, total, url, iter_try_idx, constants.NATIVE_FETCH_ATTEMPT_MAX)
+
+                async with client_session.get(url, allow_redirects=False) as response:
+
+                    body = await response.read()
+
+                    logger.info("[`%s/%s`] - fetched `%s`: `%s %s`, `%s` bytes", idx, total, url, response.status, response.reason, len(body))
+
+                    return model.NativeFetchResult(
+                        url=url,
+                        request_method=response.request_info.method,
+                        request_path=response.request_info.url.raw_path_qs,
+                        request_headers=list(response.request_info.headers.items()),
+                        status=response.status,
+                        reason=response.reason,
+                        response_headers=[(key.decode("latin-1"), value.decode("latin-1")) for key, value in response.raw_headers],
+                        body=body)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.info("[`%s/%s`] - fetching `%s` failed: `%s`", idx, total, url, repr(e))
+            error_list.append(e)
+
+            if iter_try_idx != constants.NATIVE_FETCH_ATTEMPT_MAX:
+                if metrics_recorder is not None:
+                    metrics_recorder.increment(constants.METRICS_COUNTER_RETRIES, source=constants.METRICS_SOURCE_NATIVE_FETCH)
+                await asyncio.sleep(constants.NATIVE_FETCH_RETRY_WAIT_SECONDS)
+
+    raise Exception(f"did not get a response when trying to fetch the url `{url}`, errors: `{error_list}`")
+
+
+async def _fetch_urls(url_list:typing.Sequence[str], concurrency:int, metrics_recorder=None) -> typing.List[model.NativeFetchResult]:
+    ''' fetches all of the urls, at most `concurrency` at a time
+
+    @return a list of `model.NativeFetchResult` in the same order as `url_list`
+    '''
+
+    import asyncio
+    import aiohttp
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # the body goes into the WARC exactly like it came over the wire, so don't let aiohttp decompress it
+    async with aiohttp.ClientSession(
+        headers={"User-Agent": constants.HTTP_USER_AGENT},
+        timeout=aiohttp.ClientTimeout(total=constants.NATIVE_FETCH_TIMEOUT_SECONDS),
+        auto_decompress=False) as client_session:
+
+        return await asyncio.gather(*[_fetch_url(client_session, semaphore, iter_url, idx, len(url_list), metrics_recorder)
+            for idx, iter_url in enumerate(url_list)])
+
+
+def get_payload_digest(body:bytes) -> str:
+    ''' @return the payload digest of a response body, in the CDX form (base32 sha1, without the `sha1:` prefix) '''
+
+    return base64.b32encode(hashlib.sha1(body).digest()).decode("ascii")
+
+
+def write_fetch_results_to_warc(warc_path, fetch_result_list:typing.Sequence[model.NativeFetchResult], warc_header_list, blob_store=None):
+    '''
+    writes a gzipped WARC with a `warcinfo` record that has the same headers that wpull gets with `--warc-header`,
+    followed by a `request` / `response` record pair for every fetched url
+
+    if a `200` response has a payload that an earlier WARC (or an earlier record in this WARC) already has,
+    it is written as a `revisit` record that refers back to that one instead
+
+    @param warc_path - the path of the WARC to write
+    @param fetch_result_list - the list of `model.NativeFetchResult` objects to write, in order
+    @param warc_header_list - the list of `model.WarcHeader` objects for the `warcinfo` record
+    @param blob_store - the `blob_store.BlobStore` whose payload index is used for the revisit records, None to not write any
+    '''
+
+    from warcio.statusandheaders import StatusAndHeaders
+    from warcio.warcwriter import WARCWriter
+
+    logger.info("writing `%s` fetched url(s) to the WARC `%s`", len(fetch_result_list), warc_path)
+
+    with open(warc_path, "wb") as f:
+
+        writer = WARCWriter(f, gzip=True, warc_version=constants.NATIVE_FETCH_WARC_VERSION)
+
+        # wpull writes its own software / format fields and then every `--warc-header` in order, so do the same
+        warcinfo_dict = {
+            "software": f"{constants.WARC_HEADER_VALUE_APPLICATION_NAME}/{constants.WARC_HEADER_VALUE_APPLICATION_VERSION}",
+            "format": f"WARC File Format {constants.NATIVE_FETCH_WARC_VERSION.split('/')[-1]}",
+        }
+        for iter_header in warc_header_list:
+            warcinfo_dict[iter_header.key] = iter_header.value
+
+        writer.write_record(writer.create_warcinfo_record(warc_path.name, warcinfo_dict))
+
+        # the `WARC-Record-ID` of every response record with a payload that we wrote to this WARC
+        written_record_id_set = set()
+
+        for iter_result in fetch_result_list:
+
+            # the body is stored exactly as the server sent it, except aiohttp already took the chunked
+            # encoding off, so the header saying it was chunked would make the record unreadable
+            response_header_list = [(key, value) for key, value in iter_result.response_headers
+                if key.lower() != "transfer-encoding"]
+
+            request_record = writer.create_warc_record(iter_result.url, "request",
+                payload=io.BytesIO(b""),
+                http_headers=StatusAndHeaders(f"{iter_result.request_method} {iter_result.request_path} HTTP/1.1",
+                    iter_result.request_headers, is_http_request=True))
+
+            response_http_headers = StatusAndHeaders(f"{iter_result.status} {iter_result.reason}",
+                response_header_list, protocol="HTTP/1.1")
+
+            payload_digest = get_payload_digest(iter_result.body)
+            original_payload = None
+            is_rewritten_original = False
+            if blob_store is not None and iter_result.status == 200 and iter_result.body:
+                original_payload = blob_store.get_warc_payload(payload_digest)
+
+                # a re-run of the same day is rewriting the WARC the original is in, so the original is gone,
+                # unless it is an earlier record that we just wrote
+                if (original_payload is not None and original_payload.warc_file_name == warc_path.name
+                    and original_payload.warc_record_id not in written_record_id_set):
+                    original_payload = None
+                    is_rewritten_original = True
+
+            if original_payload is not None:
+                logger.info("the payload of `%s` is already in `%s` (from `%s`), writing a revisit record",
+                    iter_result.url, original_payload.warc_file_name, original_payload.url)
+
+                response_record = writer.create_revisit_record(iter_result.url,
+                    digest=f"{constants.WARC_PAYLOAD_DIGEST_PREFIX}{payload_digest}",
+                    refers_to_uri=original_payload.url,
+                    refers_to_date=original_payload.warc_date,
+                    http_headers=response_http_headers,
+                    warc_headers_dict={"WARC-Refers-To": original_payload.warc_record_id})
+
+            else:
+                response_record = writer.create_warc_record(iter_result.url, "response",
+                    payload=io.BytesIO(iter_result.body),
+                    http_headers=response_http_headers)
+
+            writer.write_request_response_pair(request_record, response_record)
+
+            if blob_store is not None and original_payload is None and iter_result.status == 200 and iter_result.body:
+                warc_record_id = response_record.rec_headers.get_header("WARC-Record-ID")
+                written_record_id_set.add(warc_record_id)
+
+                blob_store.record_warc_payload(model.WarcPayloadRecord(
+                    payload_digest=payload_digest,
+                    url=iter_result.url,
+                    warc_record_id=warc_record_id,
+                    warc_date=response_record.rec_headers.get_header("WARC-Date"),
+                    warc_file_name=warc_path.name), replace=is_rewritten_original)
+
+    logger.info("writing the WARC was successful")
+
+
+def fetch_urls_to_warc(url_list:typing.Sequence[str], warc_path, warc_header_list, concurrency:int, blob_store=None, metrics_recorder=None):
+    '''
+    fetches the urls concurrently in this process, and writes them to a WARC, this is for the small,
+    fixed set of emote image urls that don't need a recursive crawl (or a whole wpull process)
+
+    @param url_list - the urls to fetch
+    @param warc_path - the path of the WARC to write
+    @param warc_header_list - the list of `model.WarcHeader` objects for the `warcinfo` record
+    @param concurrency - the max number of urls we fetch at the same time
+    @param blob_store - the `blob_store.BlobStore` whose payload index is used for revisit records, or None
+    @param metrics_recorder - if not None, a `metrics.MetricsRecorder` that counts the retries and the bytes downloaded
+    '''
+
+    import asyncio
+
+    logger.info("fetching `%s` url(s) with `%s` at a time", len(url_list), concurrency)
+
+    # this runs on a stage thread, so it gets its own event loop
+    fetch_result_list = asyncio.run(_fetch_urls(url_list, concurrency, metrics_recorder))
+
+    if metrics_recorder is not None:
+        metrics_recorder.increment(constants.METRICS_COUNTER_BYTES_DOWNLOADED,
+            sum(len(iter_result.body) for iter_result in fetch_result_list), source=constants.METRICS_SOURCE_NATIVE_FETCH)
+
+    write_fetch_results_to_warc(warc_path, fetch_result_list, warc_header_list, blob_store)
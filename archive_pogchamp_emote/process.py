@@ -0,0 +1,179 @@
+import collections
+import logging
+import signal
+import subprocess
+import sys
+import threading
+import typing
+
+from archive_pogchamp_emote import constants as constants
+
+logger = logging.getLogger(__name__)
+
+
+class WpullProgressCounters:
+    '''
+    keeps track of what wpull has done so far by parsing the lines it outputs, like
+    `INFO Fetching ‘https://example.com/’.` and `INFO Fetched ‘https://example.com/’: 200 OK. Length: 1270 [text/html].`
+
+    wpull logs these to stderr even with `--output-file`, which only adds a second copy of them in the file.
+    `bytes_fetched` is the sum of the Content-Length headers, so it doesn't count chunked responses
+    '''
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.urls_fetching = 0
+        self.urls_fetched = 0
+        self.bytes_fetched = 0
+        self.errors = 0
+
+    def parse_line(self, line:str):
+        ''' update the counters from a line of wpull output
+
+        @param line - the line of output
+        '''
+
+        with self._lock:
+
+            if constants.WPULL_OUTPUT_FETCHING_REGEX.search(line):
+                self.urls_fetching += 1
+                return
+
+            fetched_re_result = constants.WPULL_OUTPUT_FETCHED_REGEX.search(line)
+            if fetched_re_result:
+                self.urls_fetched += 1
+
+                length = fetched_re_result.group("length")
+                if length:
+                    self.bytes_fetched += int(length.replace(",", ""))
+                return
+
+            if constants.WPULL_OUTPUT_ERROR_REGEX.search(line):
+                self.errors += 1
+
+    def __str__(self):
+
+        with self._lock:
+            return (f"fetching: `{self.urls_fetching}`, fetched: `{self.urls_fetched}`, "
+                f"bytes fetched: `{self.bytes_fetched}`, errors: `{self.errors}`")
+
+
+class StreamingProcessRunner:
+    '''
+    runs a subprocess and reads its stdout / stderr line by line as it runs, instead of
+    buffering all of it in memory like `subprocess.run(capture_output=True)` does
+
+    every line gets forwarded to a logger, and only the last `tail_line_count` lines are kept
+    around so they can be included in the `subprocess.CalledProcessError` if the process fails
+    '''
+
+    def __init__(self, argument_list, output_logger:logging.Logger,
+        tail_line_count:int=constants.PROCESS_OUTPUT_TAIL_LINE_COUNT,
+        line_callback:typing.Optional[typing.Callable[[str], None]]=None,
+        env=None):
+        '''
+        @param argument_list - the arguments to pass to `subprocess.Popen`
+        @param output_logger - the logger that every line of output gets logged to
+        @param tail_line_count - how many of the last lines of stdout / stderr to keep
+        @param line_callback - if not None, gets called with every line of output (from both stdout and stderr)
+        @param env - the environment for the subprocess, None to inherit ours
+        '''
+
+        self.argument_list = argument_list
+        self.output_logger = output_logger
+        self.line_callback = line_callback
+        self.env = env
+
+        self._stdout_tail = collections.deque(maxlen=tail_line_count)
+        self._stderr_tail = collections.deque(maxlen=tail_line_count)
+        self._popen = None
+        self._reader_threads = []
+
+    def _read_pipe(self, pipe, tail, stream_name):
+        ''' reads a pipe line by line until EOF, runs in a background thread
+
+        @param pipe - the pipe to read from
+        @param tail - the deque to append the lines to
+        @param stream_name - `stdout` or `stderr`, for logging
+        '''
+
+        # a line longer than the limit just gets split up, so one giant line can't blow up our memory
+        for iter_line_bytes in iter(lambda: pipe.readline(constants.PROCESS_OUTPUT_MAX_LINE_BYTES), b""):
+
+            iter_line = iter_line_bytes.decode("utf-8", errors="replace").rstrip("\r\n")
+            tail.append(iter_line)
+
+            self.output_logger.info("[%s] %s", stream_name, iter_line)
+
+            if self.line_callback:
+                self.line_callback(iter_line)
+
+        pipe.close()
+
+    def start(self):
+        ''' starts the process and the threads that read its output '''
+
+        logger.debug("starting process: `%s`", self.argument_list)
+
+        self._popen = subprocess.Popen(self.argument_list,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self.env)
+
+        for iter_pipe, iter_tail, iter_name in [
+            (self._popen.stdout, self._stdout_tail, "stdout"),
+            (self._popen.stderr, self._stderr_tail, "stderr")]:
+
+            iter_thread = threading.Thread(target=self._read_pipe, args=(iter_pipe, iter_tail, iter_name),
+                name=f"pipe-{iter_name}-{self._popen.pid}", daemon=True)
+            iter_thread.start()
+            self._reader_threads.append(iter_thread)
+
+    def terminate(self):
+        ''' asks the process to stop, if it is running '''
+
+        if self._popen is not None and self._popen.poll() is None:
+            logger.info("terminating process `%s`", self._popen.pid)
+            self._popen.terminate()
+
+    def interrupt(self):
+        ''' sends the process SIGINT, like pressing ctrl+c, if it is running. windows can't do that, so it gets `terminate()`d '''
+
+        if sys.platform == "win32":
+            self.terminate()
+            return
+
+        if self._popen is not None and self._popen.poll() is None:
+            logger.info("interrupting process `%s`", self._popen.pid)
+            self._popen.send_signal(signal.SIGINT)
+
+    def wait_for_exit(self, timeout_seconds:float) -> bool:
+        ''' @return True if the process exited within `timeout_seconds`, without reading the rest of its output like `wait()` '''
+
+        try:
+            self._popen.wait(timeout_seconds)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
+    def wait(self) -> subprocess.CompletedProcess:
+        ''' waits for the process to exit and for all of its output to be read
+
+        @return a `subprocess.CompletedProcess`, where `stdout` and `stderr` are only the last lines of the output
+        '''
+
+        returncode = self._popen.wait()
+
+        for iter_thread in self._reader_threads:
+            iter_thread.join()
+
+        return subprocess.CompletedProcess(self.argument_list, returncode,
+            stdout="\n".join(self._stdout_tail), stderr="\n".join(self._stderr_tail))
+
+    def run(self) -> subprocess.CompletedProcess:
+        ''' starts the process and waits for it to finish
+
+        @return a `subprocess.CompletedProcess`, see `wait()`
+        '''
+
+        self.start()
+        return self.wait()
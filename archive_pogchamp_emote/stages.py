@@ -0,0 +1,136 @@
+import logging
+import typing
+import concurrent.futures
+
+import attr
+
+logger = logging.getLogger(__name__)
+
+
+@attr.s(auto_attribs=True, frozen=True, kw_only=True)
+class Stage:
+
+    # the unique name of this stage, other stages use this to depend on it
+    name:str = attr.ib()
+
+    # the callable that runs the stage, it gets called with a dict of
+    # `dependency name -> the result of that dependency`
+    func:typing.Callable[[typing.Dict[str, typing.Any]], typing.Any] = attr.ib()
+
+    # the names of the stages that have to finish before this one can start
+    dependencies:typing.Sequence[str] = attr.ib(factory=tuple)
+
+
+class StageScheduler:
+    '''
+    runs a set of `Stage` objects, where every stage is started as soon as all of the
+    stages it depends on have finished, so independent stages run in parallel
+    '''
+
+    def __init__(self):
+
+        self._stages = {}
+
+    def add_stage(self, name, func, dependencies=()):
+        ''' add a stage to the scheduler
+
+        @param name - the unique name of the stage
+        @param func - the callable to run, gets called with a dict of the results of its dependencies
+        @param dependencies - the names of the stages that have to finish before this one can start
+        '''
+
+        if name in self._stages:
+            raise ValueError(f"a stage with the name `{name}` was already added")
+
+        self._stages[name] = Stage(name=name, func=func, dependencies=tuple(dependencies))
+
+    def has_stage(self, name) -> bool:
+        ''' @return True if a stage with the name was added '''
+
+        return name in self._stages
+
+    def _validate(self):
+        ''' make sure every dependency exists and that there are no cycles
+        @throws ValueError if the stages don't form a valid DAG
+        '''
+
+        for iter_stage in self._stages.values():
+            for iter_dependency in iter_stage.dependencies:
+                if iter_dependency not in self._stages:
+                    raise ValueError(f"stage `{iter_stage.name}` depends on the stage `{iter_dependency}` that doesn't exist")
+
+        # kahn's algorithm, if we can't visit every stage then there is a cycle
+        num_unfinished_dependencies = {name: len(stage.dependencies) for name, stage in self._stages.items()}
+        ready = [name for name, count in num_unfinished_dependencies.items() if count == 0]
+        num_visited = 0
+
+        while ready:
+            iter_name = ready.pop()
+            num_visited += 1
+
+            for iter_stage in self._stages.values():
+                if iter_name in iter_stage.dependencies:
+                    num_unfinished_dependencies[iter_stage.name] -= 1
+                    if num_unfinished_dependencies[iter_stage.name] == 0:
+                        ready.append(iter_stage.name)
+
+        if num_visited != len(self._stages):
+            raise ValueError("the stages contain a dependency cycle")
+
+    def run(self) -> typing.Dict[str, typing.Any]:
+        ''' runs all of the stages, blocking until they are all done
+
+        if a stage raises an exception, no new stages are started, we wait for the ones that are already
+        running to finish, and then the exception is re-raised
+
+        @return a dict of `stage name -> the result of that stage`
+        '''
+
+        self._validate()
+
+        results = {}
+        pending_stage_names = list(self._stages.keys())
+        running_futures = {}
+        first_exception = None
+
+        logger.debug("running `%s` stage(s): `%s`", len(pending_stage_names), pending_stage_names)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self._stages)), thread_name_prefix="stage") as executor:
+
+            while pending_stage_names or running_futures:
+
+                # start everything whose dependencies are done, as long as nothing has failed
+                if first_exception is None:
+                    for iter_name in list(pending_stage_names):
+                        iter_stage = self._stages[iter_name]
+
+                        if all(iter_dependency in results for iter_dependency in iter_stage.dependencies):
+
+                            logger.info("starting stage `%s`", iter_name)
+                            dependency_results = {iter_dependency: results[iter_dependency] for iter_dependency in iter_stage.dependencies}
+                            running_futures[executor.submit(iter_stage.func, dependency_results)] = iter_name
+                            pending_stage_names.remove(iter_name)
+
+                if not running_futures:
+                    # something failed and there is nothing left running, so the pending stages will never start
+                    break
+
+                done_futures, _ = concurrent.futures.wait(running_futures.keys(), return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for iter_future in done_futures:
+                    iter_name = running_futures.pop(iter_future)
+
+                    try:
+                        results[iter_name] = iter_future.result()
+                        logger.info("stage `%s` finished", iter_name)
+                    except Exception as e:
+                        logger.error("stage `%s` failed: `%s`", iter_name, e)
+                        if first_exception is None:
+                            first_exception = e
+
+        if first_exception is not None:
+            if pending_stage_names:
+                logger.error("not running the stage(s) `%s` because an earlier stage failed", pending_stage_names)
+            raise first_exception
+
+        return results
@@ -1,4 +1,7 @@
 import logging
+import logging.handlers
+import multiprocessing
+import datetime
 import pathlib
 import pprint
 import typing
@@ -6,17 +9,21 @@ import subprocess
 import re
 import argparse
 import platform
-import urllib
+import urllib.parse
 import hashlib
 import time
+import functools
+import os
+import random
+import contextlib
 
 import arrow
-import pyhocon
-import bfa
 import attr
-import waybackpy
-from waybackpy.exceptions import WaybackError, URLError
-import youtube_dl
+import dateutil.tz
+
+# NOTE: pyhocon, bfa, requests and youtube_dl are imported inside of the functions that use them
+# rather than up here, youtube_dl especially takes a long time to import, and argument validation
+# errors or `--no-youtube-dl --no-wbm-save` runs shouldn't have to pay for it
 
 from archive_pogchamp_emote import constants as constants
 from archive_pogchamp_emote import model as model
@@ -25,7 +32,12 @@ from archive_pogchamp_emote import utils as utils
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
 def get_app_version_info():
+    '''
+    returns the `model.AppVersionInfo` for this process, it doesn't change while we are running
+    so it only gets built once
+    '''
 
     return model.AppVersionInfo(
         app_version=constants.WARC_HEADER_VALUE_APPLICATION_VERSION,
@@ -38,14 +50,48 @@ def get_app_version_info():
         python_compiler=platform.python_compiler(),
         python_branch=platform.python_branch())
 
+@functools.lru_cache(maxsize=None)
 def get_git_hash():
+    '''
+    returns the git hash of the code that is running, computed once per process
+
+    in order, this uses:
+    * the `ARCHIVE_POGCHAMP_EMOTE_GIT_HASH` environment variable, if it is set
+    * `git describe` if we are running from inside the git repository
+    * the hash that `embed_git_hash.py` wrote into `_embedded_git_hash.py` at build / install time
+    '''
+
+    env_git_hash = os.environ.get(constants.GIT_HASH_ENVIRONMENT_VARIABLE)
+    if env_git_hash:
+        logger.debug("using the git hash from the `%s` environment variable: `%s`", constants.GIT_HASH_ENVIRONMENT_VARIABLE, env_git_hash)
+        return env_git_hash
+
+    if get_git_repo_path().exists():
+        return run_git_describe()
+
+    try:
+        from archive_pogchamp_emote import _embedded_git_hash
+    except ImportError:
+        logger.warning("not running from a git repository and there is no embedded git hash, " +
+            "run `python -m archive_pogchamp_emote.embed_git_hash` when building / installing")
+        return ""
+
+    logger.debug("using the embedded git hash: `%s`", _embedded_git_hash.GIT_HASH)
+    return _embedded_git_hash.GIT_HASH
+
+def get_git_repo_path():
+    ''' returns the path to the `.git` folder of the repository we are in (which might not exist) '''
+
+    return pathlib.Path(__file__).joinpath("../../.git").resolve()
+
+def run_git_describe():
     '''
     runs git describe on the root folder of the git repository
 
     note: this is kinda hacky, and relies on this being run inside the git repo
     '''
 
-    git_repo_path = pathlib.Path(__file__).joinpath("../../.git").resolve()
+    git_repo_path = get_git_repo_path()
 
     # these arguments make it so that it will show the full commit hash + if it is dirty or not
     # even if there are no tags
@@ -95,7 +141,111 @@ def check_completedprocess_for_acceptable_exit_codes(
     if not completed_process_obj.returncode in acceptable_exit_codes:
         completed_process_obj.check_returncode()
 
-def youtube_dl_progress_hook(logger_to_use, idx, total):
+def format_bytes(num_bytes):
+    ''' formats a number of bytes as a human readable string, like `12.3 MiB`
+
+    @param num_bytes - the number of bytes, or None
+    @return the formatted string, or `?` if num_bytes is None
+    '''
+
+    if num_bytes is None:
+        return "?"
+
+    num_bytes = float(num_bytes)
+    for iter_unit in ["B", "KiB", "MiB", "GiB"]:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {iter_unit}"
+        num_bytes /= 1024
+
+    return f"{num_bytes:.1f} TiB"
+
+class YoutubeDlProgressAggregator:
+    '''
+    a youtube-dl progress hook that keeps track of the progress of each file being downloaded, and
+    only logs a progress line at most once every `interval_seconds` per file, plus a summary when
+    the file finishes
+
+    youtube-dl calls the progress hook for every chunk / fragment it downloads, so logging every
+    call means thousands of log lines for a fragmented (HLS) video
+
+    see https://github.com/ytdl-org/youtube-dl/blob/3e4cedf9e8cd3157df2457df7274d0c842421945/youtube_dl/YoutubeDL.py#L230
+
+    If status is one of "downloading", or "finished", the following properties may also be present:
+        * filename: The final filename (always present)
+        * tmpfilename: The filename we're currently writing to
+        * downloaded_bytes: Bytes on disk
+        * total_bytes: Size of the whole file, None if unknown
+        * total_bytes_estimate: Guess of the eventual file size, None if unavailable.
+        * elapsed: The number of seconds since download started.
+        * eta: The estimated time in seconds, None if unknown
+        * speed: The download speed in bytes/second, None if unknown
+        * fragment_index: The counter of the currently downloaded video fragment.
+        * fragment_count: The number of fragments (= individual files that will be merged)
+    '''
+
+    def __init__(self, logger_to_use, idx, total, interval_seconds):
+        '''
+        @param logger_to_use - the logging.Logger instance to use
+        @param idx - the current video idx that we are downloading via youtube-dl, for logging
+        @param total - the total number of videos we will be downloading via youtube-dl , for logging
+        @param interval_seconds - the minimum number of seconds between progress lines for the same file
+        '''
+
+        self.logger_to_use = logger_to_use
+        self.idx = idx
+        self.total = total
+        self.interval_seconds = interval_seconds
+
+        # the total number of bytes of every file that finished downloading
+        self.total_bytes_downloaded = 0
+
+        # filename -> the monotonic time we last logged a progress line for it
+        self._last_log_time = {}
+        # filename -> the monotonic time we first heard about it
+        self._start_time = {}
+
+    def __call__(self, dl_progress_dictionary):
+
+        status = dl_progress_dictionary.get("status")
+        filename = dl_progress_dictionary.get("filename")
+        now = time.monotonic()
+
+        self._start_time.setdefault(filename, now)
+
+        if status == "downloading":
+
+            if now - self._last_log_time.get(filename, float("-inf")) < self.interval_seconds:
+                return
+
+            self._last_log_time[filename] = now
+
+            fragment_str = ""
+            if dl_progress_dictionary.get("fragment_count"):
+                fragment_str = f", fragment `{dl_progress_dictionary.get('fragment_index')}/{dl_progress_dictionary.get('fragment_count')}`"
+
+            speed = dl_progress_dictionary.get("speed")
+            eta = dl_progress_dictionary.get("eta")
+            self.logger_to_use.info("[`%s/%s`] - downloading `%s`: `%s/%s` at `%s/s`, eta `%s`%s",
+                self.idx, self.total, filename,
+                format_bytes(dl_progress_dictionary.get("downloaded_bytes")),
+                format_bytes(dl_progress_dictionary.get("total_bytes") or dl_progress_dictionary.get("total_bytes_estimate")),
+                format_bytes(speed), f"{eta}s" if eta is not None else "?", fragment_str)
+
+        elif status == "finished":
+
+            num_bytes = dl_progress_dictionary.get("total_bytes") or dl_progress_dictionary.get("downloaded_bytes") or 0
+            elapsed = dl_progress_dictionary.get("elapsed") or (now - self._start_time[filename])
+            self.total_bytes_downloaded += num_bytes
+
+            self.logger_to_use.info("[`%s/%s`] - finished downloading `%s`: `%s` in `%.1f` seconds, average `%s/s`",
+                self.idx, self.total, filename, format_bytes(num_bytes), elapsed,
+                format_bytes(num_bytes / elapsed if elapsed > 0 else None))
+
+        else:
+            self.logger_to_use.warning("[`%s/%s`] - download progress for `%s` has the status `%s`: `%s`",
+                self.idx, self.total, filename, status, dl_progress_dictionary)
+
+def youtube_dl_progress_hook(logger_to_use, idx, total, interval_seconds=constants.YOUTUBE_DL_PROGRESS_DEFAULT_INTERVAL_SECONDS):
     '''
     returns a downloader hook that logs to a logger we specify
 
@@ -107,36 +257,16 @@ def youtube_dl_progress_hook(logger_to_use, idx, total):
     @param logger_to_use - the logging.Logger instance to use
     @param idx - the current video idx that we are downloading via youtube-dl, for logging
     @param total - the total number of videos we will be downloading via youtube-dl , for logging
+    @param interval_seconds - the minimum number of seconds between progress lines for the same file
+    @return a `YoutubeDlProgressAggregator`
 
     '''
 
+    return YoutubeDlProgressAggregator(logger_to_use, idx, total, interval_seconds)
 
-    def _inner_youtube_dl_progress_hook(dl_progress_dictionary):
-        '''
 
-        see https://github.com/ytdl-org/youtube-dl/blob/3e4cedf9e8cd3157df2457df7274d0c842421945/youtube_dl/YoutubeDL.py#L230
-
-        If status is one of "downloading", or "finished", the following properties may also be present:
-            * filename: The final filename (always present)
-            * tmpfilename: The filename we're currently writing to
-            * downloaded_bytes: Bytes on disk
-            * total_bytes: Size of the whole file, None if unknown
-            * total_bytes_estimate: Guess of the eventual file size, None if unavailable.
-            * elapsed: The number of seconds since download started.
-            * eta: The estimated time in seconds, None if unknown
-            * speed: The download speed in bytes/second, None if unknown
-            * fragment_index: The counter of the currently downloaded video fragment.
-            * fragment_count: The number of fragments (= individual files that will be merged)
-
-        '''
-
-        logger_to_use.info("[`%s/%s`] - download progress: `%s`",
-            idx, total, dl_progress_dictionary)
-
-    return _inner_youtube_dl_progress_hook
-
-
-def save_video_with_youtube_dl(root_videos_folder, url, ytdl_args_file_format, idx, total, dry_run=False):
+def save_video_with_youtube_dl(root_videos_folder, url, ytdl_args_file_format, idx, total, dry_run=False,
+    progress_interval_seconds=constants.YOUTUBE_DL_PROGRESS_DEFAULT_INTERVAL_SECONDS):
     '''
     download a url with youtube-dl, given the arguments and a url to download
 
@@ -148,6 +278,8 @@ def save_video_with_youtube_dl(root_videos_folder, url, ytdl_args_file_format, i
     @param idx - the current index of videos that we are downloading with ytdl, for logging
     @param total - the total number of videos we are donwloading with ytdl, for logging
     @param dry_run if true, then we will only print out what we will do
+    @param progress_interval_seconds - the minimum number of seconds between download progress log lines
+    @return the folder that the video was downloaded to
     '''
 
     # create youtube-dl arguments
@@ -191,7 +323,7 @@ def save_video_with_youtube_dl(root_videos_folder, url, ytdl_args_file_format, i
             # and looks weird in the file logging. So adding this supresses the default console progress
             # logging, but doesn't prevent youtube-dl from calling the progress hooks it seems.
             "noprogress": True,
-            "progress_hooks": [utils.youtube_dl_progress_hook(ytdl_logger, idx, total)],
+            "progress_hooks": [utils.youtube_dl_progress_hook(ytdl_logger, idx, total, progress_interval_seconds)],
             "logger": ytdl_logger,
             # this seems to output extra stuff to both stdout and the ytdl logger, should report a bug about this...
             # "verbose": True,
@@ -210,83 +342,140 @@ def save_video_with_youtube_dl(root_videos_folder, url, ytdl_args_file_format, i
         logger.info("writing youtube-dl arguments was successful")
 
         # now download the video
+        import youtube_dl
 
         with youtube_dl.YoutubeDL(ytdl_arguments_dict) as ydl:
             ydl.download([url])
 
+    return video_output_folder_with_hostname_and_sha1
+
+
+class WbmSaveError(Exception):
+    ''' the save page now request failed or didn't give us an archive url, this is what waybackpy called a `WaybackError` '''
+
+class WbmUrlError(Exception):
+    ''' the url we were asked to save in the wayback machine isn't a url '''
+
+class WbmRetryableError(Exception):
+    ''' raised by `attempt_save_archive_of_webpage_in_wbm` when the save failed in a way that is worth retrying '''
+
+    def __init__(self, message, is_hashflags=False):
+        '''
+        @param message - the error message
+        @param is_hashflags - True if the wayback machine gave us back a garbage twitter 'hashflags' url
+        '''
+
+        super().__init__(message)
+        self.is_hashflags = is_hashflags
+
+def compute_backoff_delay(backoff_policy, attempt, random_source=random):
+    ''' computes how long to wait before retrying, exponential backoff with jitter
+
+    @param backoff_policy - the `model.BackoffPolicy` to use
+    @param attempt - the attempt that just failed, starting at 1
+    @param random_source - where the jitter comes from, something with a `uniform(a, b)` method, the `random` module unless we are testing
+    @return the number of seconds to wait
+    '''
+
+    delay = min(backoff_policy.max_seconds, backoff_policy.base_seconds * (backoff_policy.multiplier ** (attempt - 1)))
+
+    # spread the retries out a bit so a bunch of urls that failed at the same time don't all retry at the same time
+    return random_source.uniform(delay * (1 - backoff_policy.jitter_fraction), delay)
+
+def parse_archive_url_from_wbm_save_response_headers(headers) -> typing.Optional[str]:
+    '''
+    the save page now API doesn't return JSON, the archive url is in one of the response headers, this checks
+    the same places that waybackpy did
+
+    @param headers - the response headers, a case insensitive dict
+    @return the archive url, or None if none of the headers had it
+    '''
+
+    re_result = constants.WAYBACK_MACHINE_SAVE_CONTENT_LOCATION_REGEX.search(headers.get("Content-Location", ""))
+    if re_result:
+        return f"https://{constants.WAYBACK_MACHINE_HOSTNAME}{re_result.group('path')}"
+
+    re_result = constants.WAYBACK_MACHINE_SAVE_LINK_MEMENTO_REGEX.search(headers.get("Link", ""))
+    if re_result:
+        return f"https://{re_result.group('url')}"
+
+    re_result = constants.WAYBACK_MACHINE_SAVE_X_CACHE_KEY_REGEX.search(headers.get("X-Cache-Key", ""))
+    if re_result:
+        return f"https://{re_result.group('url')}"
 
-def save_archive_of_webpage_in_wbm(url, idx, total, dry_run=False):
+    return None
+
+def attempt_save_archive_of_webpage_in_wbm(url, rate_limiter=None, http_session=None):
     '''
-    saves a copy of the given URL in the Internet Archive wayback machine
+    makes one attempt at saving a copy of the given URL in the Internet Archive wayback machine
     and returns the archive URL
 
     @param url - the url as a string
-    @param idx - the download # we are on
-    @aram total - the total downloads
-    @param dry_run - whether we should actually save it, or just log what we would do
-
+    @param rate_limiter - if not None, a `wbm.PerHostRateLimiter` that we acquire a token from
+        before the request to the wayback machine
+    @param http_session - the `wbm_http.WbmHttpSession` to send the request with, if None then the
+        one for this process from `wbm_http.get_shared_wbm_http_session()`
+    @throws WbmRetryableError if the save failed but might work if we try again
+    @throws WbmUrlError if the url is bad
     '''
 
-    if dry_run:
+    import requests
+
+    from archive_pogchamp_emote import wbm_http
 
-        logger.info("[`%s/%s`] DRY RUN: - would have saved the url `%s` in the wayback machine", idx, total, url)
-        return
+    if http_session is None:
+        http_session = wbm_http.get_shared_wbm_http_session()
+
+    try:
+        # the same check that `waybackpy.Url` did
+        if "." not in url:
+            raise WbmUrlError(f"'{url}' is not a vaild URL.")
 
-    logger.info("[`%s/%s`] - saving an archive of the url `%s` in the wayback machine", idx, total, url)
-    error_list = []
-    archive_url = None
+        if rate_limiter:
+            rate_limiter.acquire(constants.WAYBACK_MACHINE_HOSTNAME)
+
+        logger.debug("sending save page now request for url: `%s`", url)
 
-    # loop until we get a valid result since it seems to not return a result a lot of
-    # the time , probably because it takes too long and is queued?
-    # also, do +1 because we start at index 1 here
-    for iter_try_idx in range(1, constants.WAYBACK_ATTEMPT_MAX + 1):
         try:
-            logger.debug("try `%s/%s` on url `%s`", iter_try_idx, constants.WAYBACK_ATTEMPT_MAX, url)
-            wayback_handle_for_url = waybackpy.Url(url, constants.HTTP_USER_AGENT)
-
-            logger.debug("calling save() on wayback handle for url: `%s`", repr(wayback_handle_for_url))
-
-            archive = wayback_handle_for_url.save()
-            archive_url = archive.archive_url
-            logger.info("archive of url `%s` complete, url: `%s`", url, archive_url)
-        except WaybackError as e:
-            logger.debug(f"Got WaybackError when trying to save url `{url}`: `{e}`")
-            error_list.append(e)
-
-            logger.info("Got WaybackError, sleeping for `%s` seconds before trying again", constants.WAYBACK_MACHINE_BACKOFF_TIME_SECONDS)
-            time.sleep(constants.WAYBACK_MACHINE_BACKOFF_TIME_SECONDS)
-            continue
-        except URLError as e:
-            # don't continue here, this means we screwed up when providing
-            # the url
-            logger.debug(f"Got URLError when trying to save url `{url}`")
-            raise e
-
-        # check to see its not a garbage 'hashflags' url
-        # for some reason, the wayback machine when given a twitter url has a chance to return a result that
-        # isn't the page that is requested, but instead is a url of the form
-        # `https://web.archive.org/web/20210115010042/https://pbs.twimg.com/hashflag/config-2021-01-15-01.json`
-        # if we get this, we should throw an exception so we don't accidentally use this wayback machine URL as a real one
-        logger.debug("checking the returned archive url `%s` against the hashflags JSON regex: `%s`", archive_url, constants.TWITTER_HASHFLAGS_REGEX)
-        hashflags_re_result = constants.TWITTER_HASHFLAGS_REGEX.search(archive_url)
-        logger.debug("regex result: `%s`", hashflags_re_result)
-
-        if hashflags_re_result:
-            logger.error("Hashflasgs regex `%s matched the returned archive url `%s` ," +
-                " this means that the archive was corrupted and shouldn't be used, sleeping for 30 minutes",
-                constants.TWITTER_HASHFLAGS_REGEX, archive_url)
-            archive_url = None
-            time.sleep(30 * 60)
-
-            continue
+            response = http_session.get("save", constants.WAYBACK_MACHINE_SAVE_URL_FORMAT.format(
+                http_session.base_url, url.strip().replace(" ", "%20")),
+                timeout=constants.WAYBACK_MACHINE_SAVE_TIMEOUT_SECONDS)
+        except requests.RequestException as e:
+            raise WbmSaveError(f"Error while retrieving the save page now response: `{e}`") from e
+
+        archive_url = parse_archive_url_from_wbm_save_response_headers(response.headers)
+
+        if archive_url is None:
+            raise WbmSaveError(f"No archive URL found in the API response, status code: `{response.status_code}`, headers: `{response.headers}`")
+
+        logger.info("archive of url `%s` complete, url: `%s`", url, archive_url)
+    except WbmSaveError as e:
+        logger.debug(f"Got WbmSaveError when trying to save url `{url}`: `{e}`")
+        raise WbmRetryableError(f"Got WbmSaveError when trying to save url `{url}`: `{e}`") from e
+    except WbmUrlError as e:
+        # don't retry here, this means we screwed up when providing
+        # the url
+        logger.debug(f"Got WbmUrlError when trying to save url `{url}`")
+        raise e
 
-        else:
-            logger.debug("archive_url `%s` did not match the regex `%s`, returning",
-                archive_url, constants.TWITTER_HASHFLAGS_REGEX)
-            return archive_url
+    # check to see its not a garbage 'hashflags' url
+    # for some reason, the wayback machine when given a twitter url has a chance to return a result that
+    # isn't the page that is requested, but instead is a url of the form
+    # `https://web.archive.org/web/20210115010042/https://pbs.twimg.com/hashflag/config-2021-01-15-01.json`
+    # if we get this, we should throw an exception so we don't accidentally use this wayback machine URL as a real one
+    logger.debug("checking the returned archive url `%s` against the hashflags JSON regex: `%s`", archive_url, constants.TWITTER_HASHFLAGS_REGEX)
+    hashflags_re_result = constants.TWITTER_HASHFLAGS_REGEX.search(archive_url)
+    logger.debug("regex result: `%s`", hashflags_re_result)
+
+    if hashflags_re_result:
+        logger.error("Hashflasgs regex `%s matched the returned archive url `%s` ," +
+            " this means that the archive was corrupted and shouldn't be used",
+            constants.TWITTER_HASHFLAGS_REGEX, archive_url)
+        raise WbmRetryableError(f"the archive url `{archive_url}` for the url `{url}` was a hashflags url", is_hashflags=True)
 
-    # if we get here, then we ran out of tries
-    raise Exception(f"did not get a good result when trying to save the url `{url}` in the wayback machine, errors: `{error_list}`")
+    logger.debug("archive_url `%s` did not match the regex `%s`, returning",
+        archive_url, constants.TWITTER_HASHFLAGS_REGEX)
+    return archive_url
 
 
 def build_emote_config_from_argparse_args(args):
@@ -308,6 +497,8 @@ def build_emote_config_from_argparse_args(args):
 
     # now that the HOCON config is validated, build our config object
     # and return it
+    import bfa
+
     class_builder = bfa.builder(for_class=model.DailyPogchampEmoteConfig)
     builder = class_builder
 
@@ -320,9 +511,9 @@ def build_emote_config_from_argparse_args(args):
 
     # set folder paths that require the date
     builder = builder.root_output_folder(root_folder_with_date)
-    builder = builder.warc_output_folder(root_folder_with_date / "warc")
-    builder = builder.youtube_dl_output_folder(root_folder_with_date / "videos")
-    builder = builder.warc_tempdir_folder(root_folder_with_date / "warc")
+    builder = builder.warc_output_folder(root_folder_with_date / constants.DAY_WARC_FOLDER_NAME)
+    builder = builder.youtube_dl_output_folder(root_folder_with_date / constants.DAY_VIDEOS_FOLDER_NAME)
+    builder = builder.warc_tempdir_folder(root_folder_with_date / constants.DAY_WARC_FOLDER_NAME)
     builder = builder.application_version_info_name(constants.APPLICATION_VERSION_FILE_FORMAT.format(date_str))
     builder = builder.warc_database_name(constants.WPULL_DATABASE_FORMAT.format(date_str))
     builder = builder.warc_output_file_name(constants.WPULL_OUTPUT_FILE_FORMAT.format(date_str))
@@ -376,6 +567,7 @@ def build_emote_config_from_argparse_args(args):
     additional_ytdl_videos = root_config_section[constants.CONFIG_PATH_ADDITIONAL_URLS_SAVE_YTDL]
     builder = builder.additional_urls_to_save_via_youtube_dl(additional_ytdl_videos)
 
+    builder = builder.crawl_budget(build_crawl_budget(root_config_section.get(constants.CONFIG_PATH_CRAWL_BUDGET, None)))
 
     logger.debug("building DailyPogchampEmoteConfig object")
 
@@ -386,10 +578,120 @@ def build_emote_config_from_argparse_args(args):
     return final_config
 
 
+def build_crawl_budget(crawl_budget_section) -> model.CrawlBudget:
+    ''' builds the `model.CrawlBudget` from the optional `crawl_budget` section of the HOCON config
+
+    @param crawl_budget_section - the `crawl_budget` section, or None if the config doesn't have one
+    @return a `model.CrawlBudget`, with None for every limit that isn't in the section
+    '''
+
+    if crawl_budget_section is None:
+        return model.CrawlBudget()
+
+    def _get_positive(key, type_func):
+        value = crawl_budget_section.get(key, None)
+        if value is None:
+            return None
+
+        value = type_func(value)
+        if value <= 0:
+            raise Exception(f"`{constants.CONFIG_PATH_CRAWL_BUDGET}.{key}` has to be greater than 0, got `{value}`")
+        return value
+
+    max_wall_time_minutes = _get_positive(constants.CONFIG_PATH_CRAWL_BUDGET_MAX_WALL_TIME_MINUTES, float)
+
+    crawl_budget = model.CrawlBudget(
+        max_urls=_get_positive(constants.CONFIG_PATH_CRAWL_BUDGET_MAX_URLS, int),
+        max_bytes=_get_positive(constants.CONFIG_PATH_CRAWL_BUDGET_MAX_BYTES, int),
+        max_wall_time_seconds=max_wall_time_minutes * 60 if max_wall_time_minutes is not None else None,
+        max_depth=_get_positive(constants.CONFIG_PATH_CRAWL_BUDGET_MAX_DEPTH, int))
+
+    logger.info("crawl budget: `%s`", crawl_budget)
+
+    return crawl_budget
+
+
 def validate_hocon(hocon):
     logger.warning("TODO actually implement HOCON config validation!")
     pass
 
+class LocalTimeIsoLoggingFormatter(logging.Formatter):
+    ''' logging.Formatter subclass that formats the timestamp to the local timezone in ISO format,
+    the same output as `ArrowLoggingFormatter`, but without the string round trip through arrow
+    for every record
+
+    the local timezone object is looked up once and reused, it still handles DST changes since
+    `dateutil.tz.tzlocal()` figures out the offset for each timestamp
+    '''
+
+    _local_timezone = dateutil.tz.tzlocal()
+
+    def formatTime(self, record, datefmt=None):
+        return datetime.datetime.fromtimestamp(record.created, tz=self._local_timezone).isoformat()
+
+def start_async_logging(root_logger):
+    ''' moves all of the handlers on the given logger behind a `logging.handlers.QueueHandler`, and
+    starts a `logging.handlers.QueueListener` that writes the records to the real handlers on a background thread
+
+    the queue is a `multiprocessing.Queue` so that worker processes forked from this one can keep logging to it
+
+    @param root_logger - the logger whose handlers should be moved behind the queue
+    @return the started `logging.handlers.QueueListener`, call `stop()` on it before exiting to flush the queue
+    '''
+
+    log_queue = multiprocessing.Queue(-1)
+    real_handlers = list(root_logger.handlers)
+
+    log_queue_listener = logging.handlers.QueueListener(log_queue, *real_handlers, respect_handler_level=True)
+
+    for iter_handler in real_handlers:
+        root_logger.removeHandler(iter_handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    log_queue_listener.start()
+
+    return log_queue_listener
+
+class _DispatchToLoggerHandler(logging.Handler):
+    ''' handler that sends a record to the logger it was originally logged to, used to replay
+    records that came from a worker process through this process's logging configuration
+    '''
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+def _init_worker_process_logging(log_queue, level):
+    ''' process pool initializer, replaces the worker's handlers with one that sends every record
+    back to the parent process through `log_queue`
+
+    @param log_queue - the `multiprocessing.Queue` to send the records to
+    @param level - the level to set on the worker's root logger
+    '''
+
+    root_logger = logging.getLogger()
+    for iter_handler in list(root_logger.handlers):
+        root_logger.removeHandler(iter_handler)
+
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(level)
+
+@contextlib.contextmanager
+def worker_process_log_forwarding():
+    ''' context manager that makes the logs of worker processes end up in this process's log handlers,
+    no matter what multiprocessing start method is used
+
+    yields a tuple of `(initializer, initargs)` to pass to `concurrent.futures.ProcessPoolExecutor`
+    '''
+
+    log_queue = multiprocessing.Queue(-1)
+    log_queue_listener = logging.handlers.QueueListener(log_queue, _DispatchToLoggerHandler())
+    log_queue_listener.start()
+
+    try:
+        yield _init_worker_process_logging, (log_queue, logging.getLogger().level)
+    finally:
+        log_queue_listener.stop()
+
 class ArrowLoggingFormatter(logging.Formatter):
     ''' logging.Formatter subclass that uses arrow, that formats the timestamp
     to the local timezone (but its in ISO format)
@@ -410,6 +712,8 @@ def hocon_config_file_type(stringArg):
     if not resolved_path.exists:
         raise argparse.ArgumentTypeError("The path {} doesn't exist!".format(resolved_path))
 
+    import pyhocon
+
     conf = None
     try:
         conf = pyhocon.ConfigFactory.parse_file(str(resolved_path))
@@ -440,6 +744,36 @@ def isDirectoryType(filePath):
 
     return path_resolved
 
+def positiveIntType(stringArg):
+    ''' argparse type method that returns the argument as an int if it is greater than 0
+    @param stringArg - the argument given to us by argparse
+    @return the argument as an int, else we raise a ArgumentTypeError'''
+
+    try:
+        value = int(stringArg)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError("`{}` is not an integer: `{}`".format(stringArg, e))
+
+    if value <= 0:
+        raise argparse.ArgumentTypeError("`{}` must be greater than 0".format(value))
+
+    return value
+
+def positiveFloatType(stringArg):
+    ''' argparse type method that returns the argument as a float if it is greater than 0
+    @param stringArg - the argument given to us by argparse
+    @return the argument as a float, else we raise a ArgumentTypeError'''
+
+    try:
+        value = float(stringArg)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError("`{}` is not a number: `{}`".format(stringArg, e))
+
+    if value <= 0:
+        raise argparse.ArgumentTypeError("`{}` must be greater than 0".format(value))
+
+    return value
+
 def isFileType(strict=True):
     def _isFileType(filePath):
         ''' see if the file path given to us by argparse is a file
@@ -0,0 +1,430 @@
+import heapq
+import json
+import logging
+import mmap
+import os
+import re
+import typing
+import urllib.parse
+import zlib
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+
+logger = logging.getLogger(__name__)
+
+
+def surt_url(url:str) -> str:
+    ''' turns a url into its SURT form (`https://www.Example.com/a?b=1&a=2` -> `com,example)/a?a=2&b=1`),
+    so urls sort by host and then path, like every CDX / CDXJ index does
+
+    @param url - the url
+    @return the SURT form of the url
+    '''
+
+    split_url = urllib.parse.urlsplit(url.strip())
+
+    host = (split_url.hostname or "").lower()
+    host_part_list = host.split(".")
+    if host_part_list and host_part_list[0] == "www":
+        host_part_list = host_part_list[1:]
+
+    # an ip address doesn't get reversed
+    if host.replace(".", "").isdigit():
+        host_part_list = [host]
+
+    if split_url.port and split_url.port not in constants.WARC_INDEX_DEFAULT_PORTS:
+        host_part_list[0] = f"{host_part_list[0]}:{split_url.port}"
+
+    path = split_url.path or "/"
+    result = f"{','.join(reversed(host_part_list))}){path}"
+
+    if split_url.query:
+        result += "?" + "&".join(sorted(split_url.query.split("&")))
+
+    return result.lower()
+
+
+def parse_header_block(header_bytes:bytes) -> typing.Tuple[str, typing.Dict[str, str]]:
+    ''' parses a WARC or HTTP header block
+
+    @return the first line, and a dict of the headers with lower case keys (the first one wins)
+    '''
+
+    line_list = header_bytes.decode("utf-8", errors="replace").split("\r\n")
+
+    header_dict = {}
+    for iter_line in line_list[1:]:
+        key, sep, value = iter_line.partition(":")
+        if sep:
+            header_dict.setdefault(key.strip().lower(), value.strip())
+
+    return line_list[0], header_dict
+
+
+def _build_index_entry(head:bytes, offset:int, length:int, warc_file_name:str) -> typing.Optional[model.CdxjIndexEntry]:
+    ''' builds the index entry for a WARC record from the start of its (uncompressed) bytes
+
+    @param head - the start of the record, at least the WARC headers and the HTTP headers if it has them
+    @param offset - where the record starts in the WARC file
+    @param length - how many bytes the record takes up in the WARC file
+    @param warc_file_name - the name of the WARC file
+    @return a `model.CdxjIndexEntry`, or None if the record is not one that gets indexed
+    '''
+
+    warc_header_end = head.find(b"\r\n\r\n")
+    if warc_header_end == -1:
+        raise Exception(f"the WARC record at offset `{offset}` in `{warc_file_name}` doesn't have the end of its headers " +
+            f"in the first `{len(head)}` bytes")
+
+    version_line, warc_header_dict = parse_header_block(head[:warc_header_end])
+    if not version_line.startswith("WARC/"):
+        raise Exception(f"the record at offset `{offset}` in `{warc_file_name}` is not a WARC record, it starts with `{version_line[:40]}`")
+
+    record_type = warc_header_dict.get("warc-type")
+    if record_type not in constants.WARC_INDEX_RECORD_TYPES:
+        return None
+
+    url = warc_header_dict.get("warc-target-uri", "").strip("<>")
+    timestamp = "".join(re.findall("[0-9]", warc_header_dict.get("warc-date", "")))[:14]
+
+    mime = warc_header_dict.get("content-type", "-")
+    status = "-"
+
+    # the HTTP headers of a response / revisit, they tell us the status and the real content type
+    if record_type != constants.WARC_RECORD_TYPE_RESOURCE and mime.startswith("application/http"):
+        block = head[warc_header_end + 4:]
+        http_header_end = block.find(b"\r\n\r\n")
+        status_line, http_header_dict = parse_header_block(block if http_header_end == -1 else block[:http_header_end])
+
+        status_part_list = status_line.split(" ")
+        if len(status_part_list) > 1 and status_part_list[1].isdigit():
+            status = status_part_list[1]
+        mime = http_header_dict.get("content-type", "-").split(";")[0].strip() or "-"
+
+    if record_type == constants.WARC_RECORD_TYPE_REVISIT:
+        mime = constants.WARC_INDEX_REVISIT_MIME_TYPE
+
+    digest = warc_header_dict.get("warc-payload-digest", "-")
+    if digest.startswith(constants.WARC_PAYLOAD_DIGEST_PREFIX):
+        digest = digest[len(constants.WARC_PAYLOAD_DIGEST_PREFIX):]
+
+    return model.CdxjIndexEntry(
+        surt=surt_url(url),
+        timestamp=timestamp,
+        url=url,
+        mime=mime,
+        status=status,
+        digest=digest,
+        length=length,
+        offset=offset,
+        filename=warc_file_name)
+
+
+def _iter_gzip_records(data) -> typing.Iterator[typing.Tuple[int, int, bytes]]:
+    '''
+    walks a gzipped WARC one gzip member (so, one record) at a time, every member is decompressed
+    in chunks and only the start of it is kept, so a huge record doesn't end up in memory
+
+    @param data - the bytes of the WARC (an `mmap`)
+    @return an iterator of `(offset, length, head)` for every gzip member
+    '''
+
+    offset = 0
+    total_length = len(data)
+
+    while offset < total_length:
+
+        decompressor = zlib.decompressobj(constants.GZIP_ZLIB_WBITS)
+        head = bytearray()
+        position = offset
+
+        while not decompressor.eof:
+            if position >= total_length:
+                raise Exception(f"the WARC ends in the middle of the gzip member that starts at offset `{offset}`")
+
+            chunk = data[position:position + constants.WARC_INDEX_READ_CHUNK_BYTES]
+            position += len(chunk)
+
+            # only keep as much output as we still want, the rest of the member is decompressed and thrown away
+            # (a max_length of 0 means no limit, so never ask for 0)
+            num_wanted = constants.WARC_INDEX_HEAD_BYTES - len(head)
+            output = decompressor.decompress(chunk, num_wanted if num_wanted > 0 else constants.WARC_INDEX_READ_CHUNK_BYTES)
+            if num_wanted > 0:
+                head.extend(output)
+
+            while not decompressor.eof and decompressor.unconsumed_tail:
+                decompressor.decompress(decompressor.unconsumed_tail, constants.WARC_INDEX_READ_CHUNK_BYTES)
+
+        # whatever came after the end of the member is the start of the next one
+        member_end = position - len(decompressor.unused_data)
+
+        yield offset, member_end - offset, bytes(head)
+
+        offset = member_end
+
+
+def _iter_uncompressed_records(data) -> typing.Iterator[typing.Tuple[int, int, bytes]]:
+    ''' walks an uncompressed WARC using the `Content-Length` of every record, see `_iter_gzip_records` '''
+
+    offset = 0
+    total_length = len(data)
+
+    while offset < total_length:
+
+        head = bytes(data[offset:offset + constants.WARC_INDEX_HEAD_BYTES])
+        warc_header_end = head.find(b"\r\n\r\n")
+        if warc_header_end == -1:
+            raise Exception(f"the WARC record at offset `{offset}` doesn't have the end of its headers in the first `{len(head)}` bytes")
+
+        _, warc_header_dict = parse_header_block(head[:warc_header_end])
+        content_length = int(warc_header_dict.get("content-length", "0"))
+
+        # headers, the `\r\n\r\n` after them, the block, and the `\r\n\r\n` after the record
+        length = warc_header_end + 4 + content_length + 4
+
+        yield offset, length, head
+
+        offset += length
+
+
+def iter_warc_record_heads(warc_path) -> typing.Iterator[typing.Tuple[int, int, bytes]]:
+    ''' reads a WARC once, front to back, and yields the start of every record
+
+    @param warc_path - the path to the WARC, gzipped (one gzip member per record) or not
+    @return an iterator of `(offset, length, head)`, where `head` is (up to) the first `constants.WARC_INDEX_HEAD_BYTES`
+        uncompressed bytes of the record, and can run on into the next record for an uncompressed WARC
+    '''
+
+    if warc_path.stat().st_size == 0:
+        return
+
+    with open(warc_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+        record_iter = _iter_gzip_records(data) if warc_path.name.endswith(".gz") else _iter_uncompressed_records(data)
+
+        yield from record_iter
+
+
+def iter_warc_index_entries(warc_path) -> typing.Iterator[model.CdxjIndexEntry]:
+    ''' reads a WARC once, front to back, and yields the index entry of every record that gets indexed
+
+    @param warc_path - the path to the WARC, gzipped (one gzip member per record) or not
+    @return an iterator of `model.CdxjIndexEntry`, in the order they are in the WARC
+    '''
+
+    for iter_offset, iter_length, iter_head in iter_warc_record_heads(warc_path):
+        iter_entry = _build_index_entry(iter_head, iter_offset, iter_length, warc_path.name)
+        if iter_entry is not None:
+            yield iter_entry
+
+
+def format_cdxj_line(entry:model.CdxjIndexEntry, filename:typing.Optional[str]=None) -> str:
+    ''' @return the CDXJ line for an index entry (without the newline), `<surt> <timestamp> <json>` '''
+
+    json_dict = {
+        "url": entry.url,
+        "mime": entry.mime,
+        "status": entry.status,
+        "digest": entry.digest,
+        "length": str(entry.length),
+        "offset": str(entry.offset),
+        "filename": filename if filename is not None else entry.filename,
+    }
+
+    return f"{entry.surt} {entry.timestamp} {json.dumps(json_dict)}"
+
+
+def get_cdxj_index_path(warc_path):
+    ''' @return the path of the CDXJ index that goes next to a WARC '''
+
+    return warc_path.with_name(f"{warc_path.name}{constants.CDXJ_FILE_EXTENSION}")
+
+
+def write_warc_cdxj_index(warc_path) -> int:
+    ''' indexes a WARC and writes the sorted CDXJ index next to it
+
+    @param warc_path - the path to the WARC
+    @return the number of lines in the index
+    '''
+
+    index_path = get_cdxj_index_path(warc_path)
+    logger.info("indexing the WARC `%s` to `%s`", warc_path, index_path)
+
+    line_list = sorted(format_cdxj_line(iter_entry) for iter_entry in iter_warc_index_entries(warc_path))
+
+    # write to a temporary file first so a half written index never looks like a real one
+    temp_path = index_path.with_name(f"{index_path.name}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for iter_line in line_list:
+            f.write(f"{iter_line}\n")
+    os.replace(temp_path, index_path)
+
+    logger.info("indexing the WARC was successful, `%s` record(s)", len(line_list))
+
+    return len(line_list)
+
+
+def find_warc_files(folder) -> typing.List:
+    ''' @return the WARCs in a folder, sorted '''
+
+    return sorted(iter_path for iter_path in folder.iterdir()
+        if iter_path.is_file() and iter_path.name.endswith(tuple(constants.WARC_FILE_EXTENSIONS)))
+
+
+def index_warcs_in_folder(folder, only_if_stale:bool=False) -> int:
+    ''' writes the CDXJ index of every WARC in a folder
+
+    @param folder - the folder with the WARCs, usually a day's `warc` folder
+    @param only_if_stale - only index a WARC if it has no index, or the index is older than the WARC
+    @return the number of WARCs that were indexed
+    '''
+
+    num_indexed = 0
+
+    for iter_warc_path in find_warc_files(folder):
+        iter_index_path = get_cdxj_index_path(iter_warc_path)
+
+        if only_if_stale and iter_index_path.exists() and iter_index_path.stat().st_mtime >= iter_warc_path.stat().st_mtime:
+            logger.debug("the index `%s` is up to date, skipping it", iter_index_path)
+            continue
+
+        write_warc_cdxj_index(iter_warc_path)
+        num_indexed += 1
+
+    return num_indexed
+
+
+def _iter_cdxj_lines_with_relative_filename(index_path, root_folder) -> typing.Iterator[str]:
+    ''' reads a per WARC index, and makes its filenames relative to the root output folder '''
+
+    relative_warc_path = (index_path.parent / index_path.name[:-len(constants.CDXJ_FILE_EXTENSION)]).relative_to(root_folder).as_posix()
+
+    with open(index_path, "r", encoding="utf-8") as f:
+        for iter_line in f:
+            iter_surt, iter_timestamp, iter_json = iter_line.rstrip("\n").split(" ", 2)
+            iter_json_dict = json.loads(iter_json)
+            iter_json_dict["filename"] = relative_warc_path
+            yield f"{iter_surt} {iter_timestamp} {json.dumps(iter_json_dict)}"
+
+
+def build_merged_cdxj_index(root_folder) -> int:
+    '''
+    indexes any WARC in any day folder that doesn't have an up to date index yet, and then merges every
+    day's indexes into one sorted index in the root output folder
+
+    the per WARC indexes are already sorted, so they are merged without reading all of them into memory
+
+    @param root_folder - the root output folder
+    @return the number of lines in the merged index
+    '''
+
+    warc_folder_list = sorted(iter_path for iter_path in root_folder.glob(f"*/{constants.DAY_WARC_FOLDER_NAME}") if iter_path.is_dir())
+
+    for iter_warc_folder in warc_folder_list:
+        index_warcs_in_folder(iter_warc_folder, only_if_stale=True)
+
+    index_path_list = sorted(iter_index_path for iter_warc_folder in warc_folder_list
+        for iter_index_path in iter_warc_folder.glob(f"*{constants.CDXJ_FILE_EXTENSION}"))
+
+    merged_index_path = root_folder / constants.MERGED_CDXJ_INDEX_FILE_NAME
+    logger.info("merging `%s` CDXJ index(es) into `%s`", len(index_path_list), merged_index_path)
+
+    num_lines = 0
+    temp_path = merged_index_path.with_name(f"{merged_index_path.name}.tmp")
+
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for iter_line in heapq.merge(*[_iter_cdxj_lines_with_relative_filename(iter_index_path, root_folder)
+                for iter_index_path in index_path_list]):
+            f.write(f"{iter_line}\n")
+            num_lines += 1
+
+    os.replace(temp_path, merged_index_path)
+
+    logger.info("merging the CDXJ indexes was successful, `%s` record(s)", num_lines)
+
+    return num_lines
+
+
+def lookup_cdxj_index(index_path, url:str, from_timestamp:typing.Optional[str]=None, to_timestamp:typing.Optional[str]=None) -> typing.List[str]:
+    ''' finds every capture of a url in a sorted CDXJ index with a binary search, without reading the whole index
+
+    @param index_path - the path to the sorted CDXJ index
+    @param url - the url to look up
+    @param from_timestamp - if not None, only captures at or after this timestamp (a prefix like `2021` or `20210115` works)
+    @param to_timestamp - if not None, only captures at or before this timestamp (a prefix works here too)
+    @return the matching CDXJ lines, oldest first
+    '''
+
+    key = f"{surt_url(url)} ".encode("utf-8")
+    result = []
+
+    if index_path.stat().st_size == 0:
+        return result
+
+    with open(index_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+        # find the first line that is >= the key, `low` is always at the start of a line
+        low = 0
+        high = len(data)
+        while low < high:
+            middle = (low + high) // 2
+            line_start = data.rfind(b"\n", 0, middle) + 1
+            line_end = data.find(b"\n", line_start)
+            line_end = len(data) if line_end == -1 else line_end
+
+            if data[line_start:line_end] < key:
+                low = line_end + 1
+            else:
+                high = line_start
+
+        position = low
+        while position < len(data):
+            line_end = data.find(b"\n", position)
+            line_end = len(data) if line_end == -1 else line_end
+            line = data[position:line_end]
+
+            if not line.startswith(key):
+                break
+
+            timestamp = line[len(key):].split(b" ", 1)[0].decode("utf-8")
+            if (from_timestamp is None or timestamp >= from_timestamp) and \
+                (to_timestamp is None or timestamp[:len(to_timestamp)] <= to_timestamp):
+                result.append(line.decode("utf-8"))
+
+            position = line_end + 1
+
+    return result
+
+
+def run_index_command(args) -> int:
+    ''' the `index` subcommand, builds the merged CDXJ index of every day in the root output folder
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @return the exit code
+    '''
+
+    build_merged_cdxj_index(args.root_output_folder)
+
+    return 0
+
+
+def run_lookup_command(args) -> int:
+    ''' the `lookup` subcommand, prints every capture of a url from the merged CDXJ index
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @return the exit code, 0 if there was at least one capture, 1 if there were none
+    '''
+
+    merged_index_path = args.root_output_folder / constants.MERGED_CDXJ_INDEX_FILE_NAME
+    if not merged_index_path.exists():
+        raise Exception(f"there is no merged index `{merged_index_path}`, run the `{constants.CLI_SUBCOMMAND_INDEX}` subcommand first")
+
+    line_list = lookup_cdxj_index(merged_index_path, args.url, args.from_timestamp, args.to_timestamp)
+
+    logger.info("found `%s` capture(s) of `%s` in `%s`", len(line_list), args.url, merged_index_path)
+
+    for iter_line in line_list:
+        print(iter_line)
+
+    return 0 if line_list else 1
@@ -0,0 +1,356 @@
+import base64
+import concurrent.futures
+import hashlib
+import json
+import logging
+import mmap
+import time
+import typing
+import zlib
+
+import arrow
+import attr
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import warc as warc
+
+logger = logging.getLogger(__name__)
+
+
+class TruncatedWarcError(Exception):
+    ''' the WARC ends in the middle of a gzip member or a record '''
+    pass
+
+
+def _new_digest_checker(label:str, digest_header_value:typing.Optional[str]):
+    ''' @return `(hasher, expected digest bytes)` for a `WARC-*-Digest` header value like `sha1:<base32>`, or None if we can't check it '''
+
+    if not digest_header_value:
+        return None
+
+    algorithm, sep, encoded_digest = digest_header_value.partition(":")
+    if not sep:
+        return None
+
+    try:
+        hasher = hashlib.new(algorithm.lower())
+    except ValueError:
+        logger.debug("can't check the `%s` digest `%s`, unknown algorithm", label, digest_header_value)
+        return None
+
+    # base32 is what everyone writes, but base16 is allowed too
+    try:
+        if len(encoded_digest) == hasher.digest_size * 2:
+            expected_digest = base64.b16decode(encoded_digest.upper())
+        else:
+            expected_digest = base64.b32decode(encoded_digest.upper())
+    except ValueError:
+        return None
+
+    return hasher, expected_digest
+
+
+class WarcRecordStreamChecker:
+    '''
+    checks the `WARC-Block-Digest` and `WARC-Payload-Digest` of every record in the (uncompressed) bytes of
+    a WARC, which get fed in as chunks of any size, so only the headers of one record are ever held in memory
+    '''
+
+    def __init__(self, warc_file_name:str):
+
+        self.warc_file_name = warc_file_name
+
+        self.num_records = 0
+        self.num_digests_checked = 0
+        self.problem_list = []
+
+        # the uncompressed offset of the record we are in, for the problem messages
+        self._offset = 0
+        self._record_offset = 0
+
+        self._header_buffer = bytearray()
+        self._in_block = False
+        self._trailer_remaining = 0
+        self._block_remaining = 0
+        self._record_headers = None
+        self._block_checker = None
+        self._payload_checker = None
+
+        # for records with HTTP headers, the payload is the part of the block after them
+        self._http_header_buffer = None
+
+    def _start_record(self):
+
+        header_end = self._header_buffer.find(b"\r\n\r\n")
+        version_line, self._record_headers = warc.parse_header_block(bytes(self._header_buffer[:header_end]))
+
+        if not version_line.startswith("WARC/"):
+            raise Exception(f"the record at uncompressed offset `{self._record_offset}` in `{self.warc_file_name}` is not a " +
+                f"WARC record, it starts with `{version_line[:40]}`")
+
+        self._block_remaining = int(self._record_headers.get("content-length", "0"))
+        self._block_checker = _new_digest_checker("block", self._record_headers.get("warc-block-digest"))
+
+        record_type = self._record_headers.get("warc-type")
+        is_http = self._record_headers.get("content-type", "").startswith("application/http")
+
+        # a revisit's payload digest is the one of the record it points to, there is no payload to check
+        self._payload_checker = None
+        self._http_header_buffer = None
+        if record_type != constants.WARC_RECORD_TYPE_REVISIT:
+            self._payload_checker = _new_digest_checker("payload", self._record_headers.get("warc-payload-digest"))
+            if self._payload_checker is not None and is_http:
+                self._http_header_buffer = bytearray()
+
+        leftover = bytes(self._header_buffer[header_end + 4:])
+        self._header_buffer.clear()
+        self._in_block = True
+
+        return leftover
+
+    def _update_block(self, data:bytes):
+
+        if self._block_checker is not None:
+            self._block_checker[0].update(data)
+
+        if self._payload_checker is None:
+            return
+
+        if self._http_header_buffer is None:
+            self._payload_checker[0].update(data)
+            return
+
+        # still looking for the end of the HTTP headers
+        self._http_header_buffer.extend(data)
+        http_header_end = self._http_header_buffer.find(b"\r\n\r\n")
+
+        if http_header_end != -1:
+            self._payload_checker[0].update(self._http_header_buffer[http_header_end + 4:])
+            self._http_header_buffer = None
+
+        elif len(self._http_header_buffer) > constants.WARC_INDEX_HEAD_BYTES:
+            self.problem_list.append(f"the HTTP headers of the record at uncompressed offset `{self._record_offset}` are longer than " +
+                f"`{constants.WARC_INDEX_HEAD_BYTES}` bytes, not checking its payload digest")
+            self._payload_checker = None
+            self._http_header_buffer = None
+
+    def _finish_record(self):
+
+        record_id = self._record_headers.get("warc-record-id", "?")
+
+        for iter_label, iter_checker in [("WARC-Block-Digest", self._block_checker), ("WARC-Payload-Digest", self._payload_checker)]:
+            if iter_checker is None:
+                continue
+
+            self.num_digests_checked += 1
+            hasher, expected_digest = iter_checker
+            if hasher.digest() != expected_digest:
+                self.problem_list.append(f"the `{iter_label}` of the record `{record_id}` at uncompressed offset `{self._record_offset}` " +
+                    f"doesn't match, expected `{base64.b32encode(expected_digest).decode('ascii')}`, got `{base64.b32encode(hasher.digest()).decode('ascii')}`")
+
+        self.num_records += 1
+        self._in_block = False
+        self._trailer_remaining = 4
+
+    def feed(self, data:bytes):
+        ''' feed the next chunk of the uncompressed WARC '''
+
+        while data:
+
+            if self._trailer_remaining:
+                # the `\r\n\r\n` after a record
+                num_skipped = min(self._trailer_remaining, len(data))
+                data = data[num_skipped:]
+                self._trailer_remaining -= num_skipped
+                self._offset += num_skipped
+                continue
+
+            if not self._in_block:
+                if not self._header_buffer:
+                    self._record_offset = self._offset
+
+                self._header_buffer.extend(data)
+                self._offset += len(data)
+
+                if self._header_buffer.find(b"\r\n\r\n") == -1:
+                    if len(self._header_buffer) > constants.WARC_INDEX_HEAD_BYTES:
+                        raise Exception(f"the WARC record at uncompressed offset `{self._record_offset}` in `{self.warc_file_name}` " +
+                            f"doesn't have the end of its headers in the first `{constants.WARC_INDEX_HEAD_BYTES}` bytes")
+                    return
+
+                # whatever came after the headers is the start of the block
+                data = self._start_record()
+                self._offset -= len(data)
+
+                if self._block_remaining == 0:
+                    self._finish_record()
+                continue
+
+            block_data = data[:self._block_remaining]
+            self._update_block(block_data)
+            self._block_remaining -= len(block_data)
+            self._offset += len(block_data)
+            data = data[len(block_data):]
+
+            if self._block_remaining == 0:
+                self._finish_record()
+
+    def finish(self):
+        ''' call this at the end of the WARC
+
+        @throws TruncatedWarcError if the WARC ended in the middle of a record
+        '''
+
+        if self._in_block or self._header_buffer.strip():
+            raise TruncatedWarcError(f"`{self.warc_file_name}` ends in the middle of the record at uncompressed offset `{self._record_offset}`")
+
+
+def _feed_gzip_members(data, checker:WarcRecordStreamChecker):
+    '''
+    decompresses a gzipped WARC one gzip member at a time, in chunks, and feeds the output to `checker`. zlib checks
+    the CRC32 and size at the end of every member for us
+
+    @throws TruncatedWarcError if the data ends in the middle of a gzip member
+    @throws zlib.error if a gzip member is corrupt
+    '''
+
+    offset = 0
+    total_length = len(data)
+
+    while offset < total_length:
+
+        decompressor = zlib.decompressobj(constants.GZIP_ZLIB_WBITS)
+        position = offset
+
+        while not decompressor.eof:
+            if position >= total_length:
+                raise TruncatedWarcError(f"`{checker.warc_file_name}` ends in the middle of the gzip member that starts at offset `{offset}`")
+
+            chunk = data[position:position + constants.WARC_INDEX_READ_CHUNK_BYTES]
+            position += len(chunk)
+
+            # max_length keeps a member that is mostly zeros from blowing up into a huge buffer
+            checker.feed(decompressor.decompress(chunk, constants.WARC_INDEX_READ_CHUNK_BYTES))
+            while not decompressor.eof and decompressor.unconsumed_tail:
+                checker.feed(decompressor.decompress(decompressor.unconsumed_tail, constants.WARC_INDEX_READ_CHUNK_BYTES))
+
+        offset = position - len(decompressor.unused_data)
+
+
+def verify_warc(warc_path) -> model.WarcVerifyResult:
+    ''' checks the gzip members (if it is gzipped) and the block / payload digests of every record in a WARC
+
+    @param warc_path - the path to the WARC
+    @return a `model.WarcVerifyResult`
+    '''
+
+    start_time = time.monotonic()
+    checker = WarcRecordStreamChecker(warc_path.name)
+    truncated = False
+    problem_list = []
+
+    size_bytes = warc_path.stat().st_size
+
+    try:
+        if size_bytes > 0:
+            with open(warc_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+                if warc_path.name.endswith(".gz"):
+                    _feed_gzip_members(data, checker)
+                else:
+                    for iter_position in range(0, len(data), constants.WARC_INDEX_READ_CHUNK_BYTES):
+                        checker.feed(data[iter_position:iter_position + constants.WARC_INDEX_READ_CHUNK_BYTES])
+
+        checker.finish()
+
+    except TruncatedWarcError as e:
+        truncated = True
+        problem_list.append(str(e))
+
+    except zlib.error as e:
+        problem_list.append(f"corrupt gzip data in `{warc_path.name}`: `{e}`")
+
+    except Exception as e:
+        problem_list.append(f"couldn't read `{warc_path.name}`: `{e}`")
+
+    return model.WarcVerifyResult(
+        warc_path=str(warc_path),
+        size_bytes=size_bytes,
+        num_records=checker.num_records,
+        num_digests_checked=checker.num_digests_checked,
+        problem_list=checker.problem_list + problem_list,
+        truncated=truncated,
+        elapsed_seconds=time.monotonic() - start_time)
+
+
+def _get_megabytes_per_second(size_bytes:int, elapsed_seconds:float) -> float:
+
+    return size_bytes / (1024 * 1024) / elapsed_seconds if elapsed_seconds > 0 else 0.0
+
+
+def run_verify_command(args) -> int:
+    ''' the `verify` subcommand, checks every WARC in every day of the root output folder, one process per WARC
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @return the exit code, 0 if every WARC is fine, 1 if any of them are truncated or have problems
+    '''
+
+    warc_path_list = []
+    for iter_warc_folder in sorted(args.root_output_folder.glob(f"*/{constants.DAY_WARC_FOLDER_NAME}")):
+        warc_path_list.extend(warc.find_warc_files(iter_warc_folder))
+
+    # biggest first, so one huge WARC doesn't start last and hold up the whole run
+    warc_path_list.sort(key=lambda x: x.stat().st_size, reverse=True)
+
+    logger.info("verify: checking `%s` WARC(s) under `%s` with `%s` worker(s)", len(warc_path_list), args.root_output_folder, args.verify_workers)
+
+    start_time = time.monotonic()
+    result_list = []
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.verify_workers) as executor:
+
+        future_to_path = {executor.submit(verify_warc, iter_path): iter_path for iter_path in warc_path_list}
+
+        for iter_future in concurrent.futures.as_completed(future_to_path):
+            iter_result = iter_future.result()
+            result_list.append(iter_result)
+
+            if iter_result.problem_list:
+                logger.error("verify: [`%s`] `%s` - `%s` record(s), `%s` problem(s):\n%s",
+                    "TRUNCATED" if iter_result.truncated else "FAILED", iter_result.warc_path, iter_result.num_records,
+                    len(iter_result.problem_list), "\n".join(iter_result.problem_list))
+            else:
+                logger.info("verify: [`OK`] `%s` - `%s` record(s), `%s` digest(s) checked, `%.1f` MB/s",
+                    iter_result.warc_path, iter_result.num_records, iter_result.num_digests_checked,
+                    _get_megabytes_per_second(iter_result.size_bytes, iter_result.elapsed_seconds))
+
+    elapsed_seconds = time.monotonic() - start_time
+    total_bytes = sum(iter_result.size_bytes for iter_result in result_list)
+    failed_result_list = [iter_result for iter_result in result_list if iter_result.problem_list]
+
+    #########################################################################
+    # write the report
+    #########################################################################
+    report_path = args.root_output_folder / constants.VERIFY_REPORT_FILE_FORMAT.format(arrow.utcnow().format(constants.ARROW_FILENAME_TIMESTAMP_FORMAT))
+    logger.info("verify: writing report to `%s`", report_path)
+
+    with open(report_path, "w", encoding="utf-8") as f:
+
+        report_dict = {
+            "total": len(result_list),
+            "ok": len(result_list) - len(failed_result_list),
+            "failed": len(failed_result_list),
+            "truncated": len([iter_result for iter_result in result_list if iter_result.truncated]),
+            "total_bytes": total_bytes,
+            "elapsed_seconds": elapsed_seconds,
+            "megabytes_per_second": _get_megabytes_per_second(total_bytes, elapsed_seconds),
+            "warcs": [attr.asdict(iter_result) for iter_result in sorted(result_list, key=lambda x: x.warc_path)],
+        }
+        f.write(json.dumps(report_dict, indent=4))
+
+    logger.info("verify: `%s` of `%s` WARC(s) OK, `%s` byte(s) in `%.1f` seconds, `%.1f` MB/s",
+        len(result_list) - len(failed_result_list), len(result_list), total_bytes, elapsed_seconds,
+        _get_megabytes_per_second(total_bytes, elapsed_seconds))
+
+    return 1 if failed_result_list else 0
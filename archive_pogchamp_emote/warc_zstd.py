@@ -0,0 +1,357 @@
+import concurrent.futures
+import logging
+import mmap
+import os
+import struct
+import time
+import typing
+import zlib
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import warc as warc
+
+logger = logging.getLogger(__name__)
+
+# NOTE: zstandard is an optional dependency (the `zstd` extra), it is only imported once we know `--zstd-recompress`
+# was given or the `zstd` subcommand is running, see `check_zstd_dependencies()`
+
+
+def check_zstd_dependencies():
+    ''' make sure the optional dependency for recompressing WARCs with zstd is installed
+
+    @throws Exception with a message saying how to install it if it isn't
+    '''
+
+    try:
+        import zstandard
+    except ImportError as e:
+        raise Exception(f"recompressing WARCs with zstd needs the optional `zstd` dependency (zstandard), " +
+            f"install it with `poetry install --extras zstd`: `{e}`") from e
+
+
+def get_zstd_warc_path(warc_path):
+    ''' @return the path of the `.warc.zst` that goes next to a `.warc.gz` or `.warc` '''
+
+    base_name = warc_path.name[:-len(".gz")] if warc_path.name.endswith(".gz") else warc_path.name
+    return warc_path.with_name(f"{base_name[:-len('.warc')]}{constants.ZSTD_WARC_FILE_EXTENSION}")
+
+
+def find_dictionary_sample_warcs(root_output_folder) -> typing.List:
+    ''' @return the WARCs of the most recent `constants.ZSTD_DICTIONARY_SAMPLE_DAYS` days in the root output folder '''
+
+    # the day folders are named `YYYY-MM-DD`, so the newest sort last
+    warc_folder_list = sorted(root_output_folder.glob(f"*/{constants.DAY_WARC_FOLDER_NAME}"), reverse=True)
+
+    result = []
+    for iter_warc_folder in warc_folder_list[:constants.ZSTD_DICTIONARY_SAMPLE_DAYS]:
+        result.extend(warc.find_warc_files(iter_warc_folder))
+
+    return result
+
+
+def train_warc_dictionary(warc_path_list:typing.Sequence) -> typing.Optional[bytes]:
+    '''
+    trains a zstd dictionary on the start of every record in the WARCs. the daily WARCs are mostly the same
+    WARC / HTTP headers and similar images, which is what the dictionary picks up
+
+    @param warc_path_list - the WARCs to sample
+    @return the dictionary, or None if there weren't enough samples to train one
+    '''
+
+    import zstandard
+
+    sample_list = []
+
+    for iter_warc_path in warc_path_list:
+        is_gzipped = iter_warc_path.name.endswith(".gz")
+
+        for iter_offset, iter_length, iter_head in warc.iter_warc_record_heads(iter_warc_path):
+            # the head of an uncompressed record can run on into the next one
+            sample_list.append(iter_head if is_gzipped else iter_head[:iter_length])
+
+    dictionary_size = min(max(sum(len(iter_sample) for iter_sample in sample_list) // constants.ZSTD_DICTIONARY_SAMPLE_RATIO,
+        constants.ZSTD_DICTIONARY_MIN_SIZE_BYTES), constants.ZSTD_DICTIONARY_MAX_SIZE_BYTES)
+
+    logger.info("training a `%s` byte zstd dictionary on `%s` record(s) from `%s` WARC(s)",
+        dictionary_size, len(sample_list), len(warc_path_list))
+
+    try:
+        dictionary = zstandard.train_dictionary(dictionary_size, sample_list)
+    except zstandard.ZstdError as e:
+        logger.warning("training the zstd dictionary failed, probably not enough records yet, " +
+            "the WARCs will be compressed without one: `%s`", e)
+        return None
+
+    return dictionary.as_bytes()
+
+
+def get_or_train_dictionary(root_output_folder, retrain:bool=False) -> typing.Optional[bytes]:
+    '''
+    loads the zstd dictionary from the root output folder, or trains one from the most recent days' WARCs
+    and saves it there if there isn't one yet
+
+    @param root_output_folder - the root output folder
+    @param retrain - train a new dictionary even if there already is one
+    @return the dictionary, or None if there isn't one and one couldn't be trained
+    '''
+
+    dictionary_path = root_output_folder / constants.ZSTD_DICTIONARY_FILE_NAME
+
+    if dictionary_path.exists() and not retrain:
+        logger.debug("using the zstd dictionary `%s`", dictionary_path)
+        return dictionary_path.read_bytes()
+
+    dictionary = train_warc_dictionary(find_dictionary_sample_warcs(root_output_folder))
+
+    if dictionary is not None:
+        temp_path = dictionary_path.with_name(f"{dictionary_path.name}{constants.ZSTD_TEMP_FILE_SUFFIX}")
+        temp_path.write_bytes(dictionary)
+        os.replace(temp_path, dictionary_path)
+
+        logger.info("wrote the zstd dictionary to `%s`", dictionary_path)
+
+    return dictionary
+
+
+def _compress_record(compressor, chunk_iter:typing.Iterable[bytes], output_file, size:int=-1):
+    ''' writes one zstd frame with the record's bytes to `output_file` '''
+
+    compress_obj = compressor.compressobj(size=size)
+
+    for iter_chunk in chunk_iter:
+        output_file.write(compress_obj.compress(iter_chunk))
+
+    output_file.write(compress_obj.flush())
+
+
+def _iter_gzip_member_chunks(data, offset:int, member_end_list:list) -> typing.Iterator[bytes]:
+    '''
+    decompresses the gzip member that starts at `offset` in bounded chunks, and appends where the member ends to
+    `member_end_list` once it is done
+    '''
+
+    decompressor = zlib.decompressobj(constants.GZIP_ZLIB_WBITS)
+    position = offset
+
+    while not decompressor.eof:
+        if position >= len(data):
+            raise Exception(f"the WARC ends in the middle of the gzip member that starts at offset `{offset}`")
+
+        chunk = data[position:position + constants.WARC_INDEX_READ_CHUNK_BYTES]
+        position += len(chunk)
+
+        yield decompressor.decompress(chunk, constants.WARC_INDEX_READ_CHUNK_BYTES)
+        while not decompressor.eof and decompressor.unconsumed_tail:
+            yield decompressor.decompress(decompressor.unconsumed_tail, constants.WARC_INDEX_READ_CHUNK_BYTES)
+
+    member_end_list.append(position - len(decompressor.unused_data))
+
+
+def recompress_warc(warc_path, dictionary:typing.Optional[bytes], level:int, zstd_path=None) -> model.WarcRecompressResult:
+    '''
+    recompresses a WARC to a `.warc.zst`, with every record in its own zstd frame (one per gzip member, for
+    a gzipped WARC) and the dictionary, if there is one, in a skippable frame at the start of the file
+
+    @param warc_path - the path to the `.warc.gz` or `.warc`
+    @param dictionary - the zstd dictionary to compress with, or None
+    @param level - the zstd compression level
+    @param zstd_path - where to write the `.warc.zst`, next to the WARC if this isn't given
+    @return a `model.WarcRecompressResult`
+    '''
+
+    import zstandard
+
+    start_time = time.monotonic()
+    zstd_path = zstd_path if zstd_path is not None else get_zstd_warc_path(warc_path)
+    temp_path = zstd_path.with_name(f"{zstd_path.name}{constants.ZSTD_TEMP_FILE_SUFFIX}")
+    num_records = 0
+
+    compressor = zstandard.ZstdCompressor(level=level,
+        dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None)
+
+    # write to a temporary file first so a half written `.warc.zst` never looks like a real one
+    try:
+        with open(temp_path, "wb") as output_file:
+
+            if dictionary is not None:
+                # the spec allows the embedded dictionary to be zstd compressed itself (without a dictionary)
+                embedded_dictionary = zstandard.ZstdCompressor(level=level).compress(dictionary)
+                output_file.write(struct.pack("<II", constants.ZSTD_SKIPPABLE_FRAME_MAGIC, len(embedded_dictionary)))
+                output_file.write(embedded_dictionary)
+
+            if warc_path.stat().st_size > 0:
+                with open(warc_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+                    if warc_path.name.endswith(".gz"):
+                        offset = 0
+                        while offset < len(data):
+                            member_end_list = []
+                            _compress_record(compressor, _iter_gzip_member_chunks(data, offset, member_end_list), output_file)
+                            offset = member_end_list[0]
+                            num_records += 1
+
+                    else:
+                        for iter_offset, iter_length, _ in warc.iter_warc_record_heads(warc_path):
+                            chunk_iter = (data[iter_position:min(iter_position + constants.WARC_INDEX_READ_CHUNK_BYTES, iter_offset + iter_length)]
+                                for iter_position in range(iter_offset, iter_offset + iter_length, constants.WARC_INDEX_READ_CHUNK_BYTES))
+                            _compress_record(compressor, chunk_iter, output_file, size=iter_length)
+                            num_records += 1
+
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(temp_path, zstd_path)
+
+    return model.WarcRecompressResult(
+        warc_path=str(warc_path),
+        zstd_path=str(zstd_path),
+        num_records=num_records,
+        input_bytes=warc_path.stat().st_size,
+        output_bytes=zstd_path.stat().st_size,
+        used_dictionary=dictionary is not None,
+        elapsed_seconds=time.monotonic() - start_time)
+
+
+def read_warc_zstd_dictionary(zstd_path) -> typing.Tuple[typing.Optional[bytes], int]:
+    ''' reads the dictionary out of the skippable frame at the start of a `.warc.zst`
+
+    @param zstd_path - the path to the `.warc.zst`
+    @return `(dictionary, offset of the first record's frame)`, the dictionary is None if the file doesn't have one
+    '''
+
+    import zstandard
+
+    with open(zstd_path, "rb") as f:
+        frame_header = f.read(8)
+
+        if len(frame_header) < 8:
+            return None, 0
+
+        magic, frame_size = struct.unpack("<II", frame_header)
+        if magic != constants.ZSTD_SKIPPABLE_FRAME_MAGIC:
+            return None, 0
+
+        dictionary = f.read(frame_size)
+
+    # `recompress_warc` compresses it, but the spec allows it not to be
+    if struct.unpack("<I", dictionary[:4])[0] == constants.ZSTD_FRAME_MAGIC:
+        dictionary = zstandard.ZstdDecompressor().decompressobj().decompress(dictionary)
+
+    return dictionary, 8 + frame_size
+
+
+def iter_warc_zstd_chunks(zstd_path) -> typing.Iterator[bytes]:
+    ''' @return an iterator of the decompressed bytes of a `.warc.zst`, in chunks '''
+
+    import zstandard
+
+    dictionary, first_frame_offset = read_warc_zstd_dictionary(zstd_path)
+
+    decompressor = zstandard.ZstdDecompressor(
+        dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None)
+
+    with open(zstd_path, "rb") as f:
+        f.seek(first_frame_offset)
+
+        with decompressor.stream_reader(f, read_across_frames=True) as reader:
+            while True:
+                chunk = reader.read(constants.WARC_INDEX_READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def _format_result(result:model.WarcRecompressResult) -> str:
+
+    ratio = result.input_bytes / result.output_bytes if result.output_bytes else 0.0
+    megabytes_per_second = result.input_bytes / (1024 * 1024) / result.elapsed_seconds if result.elapsed_seconds > 0 else 0.0
+
+    return (f"`{result.warc_path}` -> `{result.zstd_path}`: `{result.num_records}` record(s), `{result.input_bytes}` -> " +
+        f"`{result.output_bytes}` bytes (`{ratio:.2f}`x smaller), dictionary: `{result.used_dictionary}`, `{megabytes_per_second:.1f}` MB/s")
+
+
+def recompress_warcs(warc_path_list:typing.Sequence, dictionary:typing.Optional[bytes], level:int, max_workers:int,
+    only_if_stale:bool=False) -> typing.Tuple[typing.List[model.WarcRecompressResult], int]:
+    ''' recompresses WARCs to `.warc.zst`, each one in its own process
+
+    @param warc_path_list - the WARCs to recompress
+    @param dictionary - the zstd dictionary to compress with, or None
+    @param level - the zstd compression level
+    @param max_workers - how many WARCs get recompressed at the same time
+    @param only_if_stale - only recompress a WARC if it has no `.warc.zst`, or the `.warc.zst` is older than the WARC
+    @return a tuple of `(the model.WarcRecompressResult of every WARC that was recompressed, the number that failed)`
+    '''
+
+    path_list = []
+    zstd_path_set = set()
+    for iter_warc_path in warc_path_list:
+        iter_zstd_path = get_zstd_warc_path(iter_warc_path)
+
+        # `x.warc` and `x.warc.gz` would both be `x.warc.zst`
+        if iter_zstd_path in zstd_path_set:
+            logger.warning("`%s` would be recompressed to the same `%s` as another WARC, skipping it", iter_warc_path, iter_zstd_path)
+            continue
+        zstd_path_set.add(iter_zstd_path)
+
+        if only_if_stale and iter_zstd_path.exists() and iter_zstd_path.stat().st_mtime >= iter_warc_path.stat().st_mtime:
+            logger.debug("`%s` is up to date, skipping it", iter_zstd_path)
+            continue
+
+        path_list.append(iter_warc_path)
+
+    result_list = []
+    num_failed = 0
+
+    if not path_list:
+        return result_list, num_failed
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+        future_dict = {executor.submit(recompress_warc, iter_path, dictionary, level): iter_path for iter_path in path_list}
+
+        for idx, iter_future in enumerate(concurrent.futures.as_completed(future_dict), start=1):
+            iter_path = future_dict[iter_future]
+
+            try:
+                iter_result = iter_future.result()
+            except Exception as e:
+                logger.error("[`%s/%s`] - recompressing `%s` with zstd failed: `%s`", idx, len(path_list), iter_path, e)
+                num_failed += 1
+                continue
+
+            logger.info("[`%s/%s`] - %s", idx, len(path_list), _format_result(iter_result))
+            result_list.append(iter_result)
+
+    return result_list, num_failed
+
+
+def run_zstd_command(args) -> int:
+    '''
+    the `zstd` subcommand, recompresses the WARCs of every day in the root output folder that don't have an up
+    to date `.warc.zst` yet, training the dictionary first if there isn't one
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @return the exit code, 0 if every WARC was recompressed, 1 if any failed
+    '''
+
+    check_zstd_dependencies()
+
+    dictionary = get_or_train_dictionary(args.root_output_folder, retrain=args.zstd_retrain_dictionary)
+
+    warc_path_list = []
+    for iter_warc_folder in sorted(args.root_output_folder.glob(f"*/{constants.DAY_WARC_FOLDER_NAME}")):
+        warc_path_list.extend(warc.find_warc_files(iter_warc_folder))
+
+    # with a new dictionary, every WARC gets redone so they all use it
+    result_list, num_failed = recompress_warcs(warc_path_list, dictionary, args.zstd_level, args.zstd_workers,
+        only_if_stale=not args.zstd_retrain_dictionary)
+
+    input_bytes = sum(iter_result.input_bytes for iter_result in result_list)
+    output_bytes = sum(iter_result.output_bytes for iter_result in result_list)
+
+    logger.info("recompressed `%s` WARC(s) with zstd, `%s` failed, `%s` -> `%s` bytes",
+        len(result_list), num_failed, input_bytes, output_bytes)
+
+    return 1 if num_failed else 0
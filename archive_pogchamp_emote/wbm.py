@@ -0,0 +1,415 @@
+import contextlib
+import logging
+import random
+import threading
+import time
+import typing
+import concurrent.futures
+import functools
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import utils as utils
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketRateLimiter:
+    '''
+    a thread safe token bucket
+
+    tokens get added to the bucket at `rate` tokens per second, up to `capacity` tokens,
+    and every call to `acquire()` takes one token out, blocking until one is available
+    '''
+
+    def __init__(self, rate:float, capacity:int, clock:typing.Callable[[], float]=time.monotonic,
+        sleep:typing.Callable[[float], None]=time.sleep):
+        '''
+        @param rate - how many tokens get added to the bucket per second
+        @param capacity - the max number of tokens the bucket can hold (aka the burst size)
+        @param clock - returns the current time in seconds, `time.monotonic` unless we are testing
+        @param sleep - sleeps for the given number of seconds, `time.sleep` unless we are testing
+        '''
+
+        if rate <= 0:
+            raise ValueError(f"rate must be greater than 0, got `{rate}`")
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got `{capacity}`")
+
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+
+        self._tokens = float(capacity)
+        self._last_refill = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        ''' add any tokens that have accumulated since the last refill, must be called with the lock held '''
+
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + ((now - self._last_refill) * self.rate))
+        self._last_refill = now
+
+    def acquire(self):
+        ''' take a token out of the bucket, sleeping until one is available '''
+
+        while True:
+            with self._lock:
+                self._refill()
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                # sleep outside of the lock for however long it takes for the next token to show up
+                time_until_next_token = (1 - self._tokens) / self.rate
+
+            self._sleep(time_until_next_token)
+
+
+class PerHostRateLimiter:
+    '''
+    hands out a separate `TokenBucketRateLimiter` for every hostname, so that
+    a slow host doesn't eat the budget of another one
+    '''
+
+    def __init__(self, rate:float, capacity:int, clock:typing.Callable[[], float]=time.monotonic,
+        sleep:typing.Callable[[float], None]=time.sleep):
+        '''
+        @param rate - how many requests per second we allow for a single host
+        @param capacity - the burst size for a single host
+        @param clock - passed to every `TokenBucketRateLimiter`
+        @param sleep - passed to every `TokenBucketRateLimiter`
+        '''
+
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, hostname:str):
+        ''' blocks until we are allowed to send a request to the given hostname
+
+        @param hostname - the hostname we are about to send a request to
+        '''
+
+        with self._lock:
+            bucket = self._buckets.get(hostname)
+            if bucket is None:
+                bucket = TokenBucketRateLimiter(self.rate, self.capacity, self._clock, self._sleep)
+                self._buckets[hostname] = bucket
+
+        logger.debug("acquiring rate limiter token for host `%s`", hostname)
+        bucket.acquire()
+
+
+class WbmSaveScheduler:
+    '''
+    saves urls in the wayback machine on a thread pool, where every attempt is a separate job
+
+    when an attempt fails in a way that is worth retrying, the retry is scheduled on a timer instead
+    of sleeping in the worker thread, so the worker is free to work on other urls while one url waits
+    '''
+
+    def __init__(self, max_workers:int, rate_limiter:PerHostRateLimiter,
+        backoff_policy:model.BackoffPolicy=constants.WAYBACK_MACHINE_DEFAULT_BACKOFF_POLICY,
+        hashflags_backoff_policy:model.BackoffPolicy=constants.WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_POLICY,
+        max_attempts:int=constants.WAYBACK_ATTEMPT_MAX,
+        http_session=None,
+        metrics_recorder=None,
+        timer_factory:typing.Callable[..., threading.Timer]=threading.Timer,
+        random_source=random):
+        '''
+        @param max_workers - the max number of attempts that run at the same time
+        @param rate_limiter - the `PerHostRateLimiter` that every request to the wayback machine goes through
+        @param backoff_policy - the `model.BackoffPolicy` for retrying after a `utils.WbmSaveError`
+        @param hashflags_backoff_policy - the `model.BackoffPolicy` for retrying after getting a hashflags url back
+        @param max_attempts - how many times we try a url before giving up on it
+        @param http_session - the `wbm_http.WbmHttpSession` to send the requests with, if None then the one for this process
+        @param metrics_recorder - if not None, a `metrics.MetricsRecorder` that gets a span for every attempt and every
+            wait before a retry, and a count of the retries
+        @param timer_factory - creates the timer that starts a retry, called like `threading.Timer(delay, function)`
+        @param random_source - where the backoff jitter comes from, see `utils.compute_backoff_delay()`
+        '''
+
+        self.rate_limiter = rate_limiter
+        self.backoff_policy = backoff_policy
+        self.hashflags_backoff_policy = hashflags_backoff_policy
+        self.max_attempts = max_attempts
+        self.http_session = http_session
+        self.metrics_recorder = metrics_recorder
+        self._timer_factory = timer_factory
+        self._random_source = random_source
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wbm")
+        self._lock = threading.Lock()
+        self._timers = set()
+        self._unfinished_futures = set()
+        self._is_shutdown = False
+
+    def submit(self, save_request:model.WbmSaveRequest) -> concurrent.futures.Future:
+        ''' start saving a url in the wayback machine
+
+        @param save_request - the `model.WbmSaveRequest` to save
+        @return a `concurrent.futures.Future` that gets the archive url once the url is saved, or the
+            exception if we ran out of attempts
+        '''
+
+        logger.info("[`%s/%s`] - saving an archive of the url `%s` in the wayback machine",
+            save_request.idx, save_request.total, save_request.url)
+
+        result_future = concurrent.futures.Future()
+        result_future.set_running_or_notify_cancel()
+
+        with self._lock:
+            self._unfinished_futures.add(result_future)
+        result_future.add_done_callback(self._on_result_future_done)
+
+        self._submit_attempt(save_request, 1, result_future, [])
+
+        return result_future
+
+    def _on_result_future_done(self, result_future):
+
+        with self._lock:
+            self._unfinished_futures.discard(result_future)
+
+    def _submit_attempt(self, save_request, attempt, result_future, error_list, timer=None, wait_start=None):
+        ''' queues an attempt on the thread pool, this gets called directly for the first attempt, and by a timer for retries
+
+        @param wait_start - for a retry, a tuple of `(unix timestamp, time.monotonic())` of when the timer was started
+        '''
+
+        if wait_start is not None and self.metrics_recorder is not None:
+            self.metrics_recorder.record_span(constants.METRICS_SPAN_WBM_RETRY_WAIT, wait_start[0], time.monotonic() - wait_start[1],
+                url=save_request.url, attempt=attempt)
+
+        with self._lock:
+            if timer is not None:
+                self._timers.discard(timer)
+
+            if self._is_shutdown:
+                return
+
+            self._executor.submit(self._run_attempt, save_request, attempt, result_future, error_list)
+
+    def _run_attempt(self, save_request, attempt, result_future, error_list):
+        ''' runs a single attempt on the thread pool, and schedules a retry if it failed '''
+
+        logger.debug("try `%s/%s` on url `%s`", attempt, self.max_attempts, save_request.url)
+
+        attempt_span = contextlib.nullcontext()
+        if self.metrics_recorder is not None:
+            attempt_span = self.metrics_recorder.span(constants.METRICS_SPAN_WBM_SAVE_ATTEMPT, url=save_request.url, attempt=attempt)
+
+        try:
+            with attempt_span:
+                archive_url = utils.attempt_save_archive_of_webpage_in_wbm(save_request.url, self.rate_limiter, self.http_session)
+
+        except utils.WbmRetryableError as e:
+            error_list.append(e)
+
+            if attempt >= self.max_attempts:
+                result_future.set_exception(Exception(
+                    f"did not get a good result when trying to save the url `{save_request.url}` in the wayback machine, errors: `{error_list}`"))
+                return
+
+            delay = utils.compute_backoff_delay(self.hashflags_backoff_policy if e.is_hashflags else self.backoff_policy, attempt,
+                self._random_source)
+            logger.info("[`%s/%s`] - %s, trying again in `%.1f` seconds (try `%s/%s`)",
+                save_request.idx, save_request.total, e, delay, attempt + 1, self.max_attempts)
+
+            with self._lock:
+                if self._is_shutdown:
+                    return
+
+                timer = self._timer_factory(delay, self._submit_attempt)
+                timer.args = (save_request, attempt + 1, result_future, error_list, timer, (time.time(), time.monotonic()))
+                timer.daemon = True
+                self._timers.add(timer)
+                timer.start()
+
+            if self.metrics_recorder is not None:
+                self.metrics_recorder.increment(constants.METRICS_COUNTER_RETRIES, source=constants.METRICS_SOURCE_WBM_SAVE)
+
+            return
+
+        except Exception as e:
+            result_future.set_exception(e)
+            return
+
+        result_future.set_result(archive_url)
+
+    def shutdown(self, cancel:bool=False):
+        ''' shuts down the thread pool
+
+        @param cancel - if True, pending retries are cancelled and their futures get a `concurrent.futures.CancelledError`
+        '''
+
+        with self._lock:
+            self._is_shutdown = True
+
+            if cancel:
+                for iter_timer in self._timers:
+                    iter_timer.cancel()
+                self._timers.clear()
+
+            unfinished_futures = list(self._unfinished_futures)
+
+        if cancel:
+            for iter_future in unfinished_futures:
+                try:
+                    iter_future.set_exception(concurrent.futures.CancelledError("the wayback machine save was cancelled"))
+                except concurrent.futures.InvalidStateError:
+                    # it finished while we were cancelling it
+                    pass
+
+        self._executor.shutdown(wait=True)
+
+
+def save_urls_in_wbm_concurrently(
+    save_request_list:typing.Sequence[model.WbmSaveRequest],
+    max_workers:int,
+    rate_limiter:PerHostRateLimiter,
+    dry_run:bool=False,
+    result_cache=None,
+    checkpoint_journal=None,
+    backoff_policy:model.BackoffPolicy=constants.WAYBACK_MACHINE_DEFAULT_BACKOFF_POLICY,
+    hashflags_backoff_policy:model.BackoffPolicy=constants.WAYBACK_MACHINE_DEFAULT_HASHFLAGS_BACKOFF_POLICY,
+    failure_callback:typing.Optional[typing.Callable[[model.WbmSaveRequest, Exception], None]]=None,
+    cdx_client=None,
+    http_session=None,
+    metrics_recorder=None) -> typing.List[typing.Optional[str]]:
+    '''
+    saves all of the given urls in the wayback machine, at most `max_workers` at a time
+
+    @param save_request_list - the list of `model.WbmSaveRequest` objects to save
+    @param max_workers - the max number of urls that we save at the same time
+    @param rate_limiter - the `PerHostRateLimiter` that every request to the wayback machine goes through
+    @param dry_run - whether we should actually save the urls, or just log what we would do
+    @param result_cache - if not None, a `wbm_cache.WbmResultCache`, urls with a fresh result in the cache
+        are not saved again, and new results get added to it
+    @param checkpoint_journal - if not None, a `checkpoint.CheckpointJournal`, urls that were already saved during
+        an earlier run of this day are not saved again, and new results get recorded in it
+    @param backoff_policy - the `model.BackoffPolicy` for retrying after a `utils.WbmSaveError`
+    @param hashflags_backoff_policy - the `model.BackoffPolicy` for retrying after getting a hashflags url back
+    @param failure_callback - if None, the first url that fails aborts the rest. if not None, a url that fails gets
+        passed to this along with the exception, its archive url is None, and the other urls keep going
+    @param cdx_client - if not None, a `cdx.WbmCdxClient`, urls that the wayback machine captured recently
+        reuse that capture instead of getting saved again
+    @param http_session - the `wbm_http.WbmHttpSession` to send the requests with, if None then the one for this process
+    @param metrics_recorder - if not None, a `metrics.MetricsRecorder` for the attempts and retries, see `WbmSaveScheduler`
+    @return a list of the archive urls, in the same order as `save_request_list`
+    '''
+
+    logger.info("saving `%s` url(s) in the wayback machine with `%s` worker(s)", len(save_request_list), max_workers)
+
+    if not save_request_list:
+        return []
+
+    archive_url_list = [None] * len(save_request_list)
+
+    if dry_run:
+        for iter_request in save_request_list:
+            logger.info("[`%s/%s`] DRY RUN: - would have saved the url `%s` in the wayback machine",
+                iter_request.idx, iter_request.total, iter_request.url)
+        return archive_url_list
+
+    def _record_result(save_request, result_future):
+        ''' done callback, records the result as soon as a url is saved rather than when we get around to waiting on it '''
+
+        if result_future.cancelled() or result_future.exception() is not None:
+            return
+
+        archive_url = result_future.result()
+        if result_cache is not None:
+            result_cache.put(save_request.url, archive_url)
+        if checkpoint_journal is not None:
+            checkpoint_journal.record_wbm_result(save_request.url, archive_url)
+
+    scheduler = WbmSaveScheduler(max_workers, rate_limiter, backoff_policy, hashflags_backoff_policy, http_session=http_session,
+        metrics_recorder=metrics_recorder)
+    future_dict = {}
+    num_failed = 0
+
+    try:
+        # list indexes of the urls that we still need an archive url for after checking the journal and the cache
+        unresolved_list_idx_list = []
+
+        for list_idx, iter_request in enumerate(save_request_list):
+
+            journal_archive_url = checkpoint_journal.get_wbm_result(iter_request.url) if checkpoint_journal is not None else None
+            cache_entry = result_cache.get(iter_request.url) if result_cache is not None else None
+
+            if journal_archive_url is not None:
+                logger.info("[`%s/%s`] - the url `%s` was already saved during an earlier run: `%s`",
+                    iter_request.idx, iter_request.total, iter_request.url, journal_archive_url)
+                archive_url_list[list_idx] = journal_archive_url
+            elif cache_entry is not None:
+                logger.info("[`%s/%s`] - using the cached archive of the url `%s` from `%s`: `%s`",
+                    iter_request.idx, iter_request.total, iter_request.url, cache_entry.capture_timestamp, cache_entry.archive_url)
+                archive_url_list[list_idx] = cache_entry.archive_url
+
+                if checkpoint_journal is not None:
+                    checkpoint_journal.record_wbm_result(iter_request.url, cache_entry.archive_url)
+            else:
+                unresolved_list_idx_list.append(list_idx)
+
+        # one batch of CDX lookups for everything left, a recent enough capture is used as is
+        recent_captures = {}
+        if cdx_client is not None:
+            recent_captures = cdx_client.find_recent_captures(
+                list(dict.fromkeys(save_request_list[list_idx].url for list_idx in unresolved_list_idx_list)))
+
+        for list_idx in unresolved_list_idx_list:
+            iter_request = save_request_list[list_idx]
+            recent_archive_url = recent_captures.get(iter_request.url)
+
+            if recent_archive_url is not None:
+                logger.info("[`%s/%s`] - the url `%s` was captured recently, using that instead of saving it again: `%s`",
+                    iter_request.idx, iter_request.total, iter_request.url, recent_archive_url)
+                archive_url_list[list_idx] = recent_archive_url
+
+                if result_cache is not None:
+                    result_cache.put(iter_request.url, recent_archive_url)
+                if checkpoint_journal is not None:
+                    checkpoint_journal.record_wbm_result(iter_request.url, recent_archive_url)
+            else:
+                iter_future = scheduler.submit(iter_request)
+                iter_future.add_done_callback(functools.partial(_record_result, iter_request))
+                future_dict[list_idx] = iter_future
+
+        # wait on the futures in the order they were submitted, so the caller gets
+        # the archive urls back in a deterministic order no matter which save finished first
+        for list_idx, iter_future in future_dict.items():
+            try:
+                archive_url_list[list_idx] = iter_future.result()
+            except Exception as e:
+                if failure_callback is None:
+                    raise
+
+                failed_request = save_request_list[list_idx]
+                logger.error("[`%s/%s`] - saving the url `%s` in the wayback machine failed: `%s`",
+                    failed_request.idx, failed_request.total, failed_request.url, e)
+                failure_callback(failed_request, e)
+                num_failed += 1
+
+    except Exception as e:
+        # don't wait around for the rest of the urls to get saved if one of them failed
+        logger.error("saving a url in the wayback machine failed, cancelling the remaining saves")
+        scheduler.shutdown(cancel=True)
+        raise e
+
+    scheduler.shutdown()
+
+    if num_failed:
+        logger.warning("saving `%s` of `%s` url(s) in the wayback machine failed", num_failed, len(save_request_list))
+    else:
+        logger.info("saving `%s` url(s) in the wayback machine was successful", len(save_request_list))
+
+    return archive_url_list
@@ -0,0 +1,123 @@
+import logging
+import sqlite3
+import threading
+import typing
+
+import arrow
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+
+logger = logging.getLogger(__name__)
+
+
+def get_capture_timestamp_from_archive_url(archive_url:str) -> typing.Optional[arrow.Arrow]:
+    ''' gets the capture timestamp out of a wayback machine archive url, aka the `20210115010042` in
+    `https://web.archive.org/web/20210115010042/https://twitter.com/twitch`
+
+    @param archive_url - the wayback machine archive url
+    @return the capture timestamp as an `arrow.Arrow`, or None if the url doesn't have one
+    '''
+
+    re_result = constants.WAYBACK_MACHINE_ARCHIVE_URL_TIMESTAMP_REGEX.search(archive_url)
+
+    if not re_result:
+        return None
+
+    return arrow.get(re_result.group("timestamp"), constants.ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT)
+
+
+class WbmResultCache:
+    '''
+    a SQLite backed cache of the results of saving urls in the wayback machine, so that
+    re-running a day (or two days that share urls) doesn't save the same url over and over
+    '''
+
+    def __init__(self, database_path, freshness_seconds:float, max_age_seconds:float):
+        '''
+        @param database_path - the path to the SQLite database, gets created if it doesn't exist
+        @param freshness_seconds - a cached capture older than this is not used
+        @param max_age_seconds - a cached capture older than this is deleted from the database
+        '''
+
+        self.database_path = database_path
+        self.freshness_seconds = freshness_seconds
+        self.max_age_seconds = max_age_seconds
+
+        logger.info("opening wayback machine result cache `%s`", database_path)
+
+        # we get called from the wbm thread pool, so share the connection and serialize access to it ourselves
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(database_path), timeout=constants.SQLITE_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS wbm_results (
+                    url TEXT PRIMARY KEY NOT NULL,
+                    archive_url TEXT NOT NULL,
+                    capture_timestamp INTEGER NOT NULL
+                )''')
+
+        self.evict_old_entries()
+
+    def get(self, url:str) -> typing.Optional[model.WbmCacheEntry]:
+        ''' look up the cached result for a url
+
+        @param url - the url that was saved in the wayback machine
+        @return a `model.WbmCacheEntry` if we have a capture that is newer than `freshness_seconds`, else None
+        '''
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT archive_url, capture_timestamp FROM wbm_results WHERE url = ?", (url,)).fetchone()
+
+        if row is None:
+            logger.debug("wbm cache miss for url `%s`", url)
+            return None
+
+        archive_url, capture_timestamp = row
+        capture_time = arrow.get(capture_timestamp)
+
+        if (arrow.utcnow() - capture_time).total_seconds() > self.freshness_seconds:
+            logger.debug("wbm cache entry for url `%s` is stale, captured at `%s`", url, capture_time)
+            return None
+
+        logger.debug("wbm cache hit for url `%s`: `%s`", url, archive_url)
+        return model.WbmCacheEntry(url=url, archive_url=archive_url, capture_timestamp=capture_time)
+
+    def put(self, url:str, archive_url:str):
+        ''' store the result of saving a url in the wayback machine
+
+        @param url - the url that was saved in the wayback machine
+        @param archive_url - the archive url we got back
+        '''
+
+        capture_time = get_capture_timestamp_from_archive_url(archive_url)
+        if capture_time is None:
+            logger.debug("archive url `%s` doesn't have a timestamp in it, using the current time", archive_url)
+            capture_time = arrow.utcnow()
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO wbm_results (url, archive_url, capture_timestamp) VALUES (?, ?, ?)",
+                (url, archive_url, capture_time.int_timestamp))
+
+    def evict_old_entries(self) -> int:
+        ''' delete every entry that is older than `max_age_seconds`
+
+        @return the number of entries that were deleted
+        '''
+
+        cutoff = int(arrow.utcnow().int_timestamp - self.max_age_seconds)
+
+        with self._lock, self._connection:
+            cursor = self._connection.execute("DELETE FROM wbm_results WHERE capture_timestamp < ?", (cutoff,))
+
+        logger.info("evicted `%s` entries older than `%s` seconds from the wayback machine result cache", cursor.rowcount, self.max_age_seconds)
+
+        return cursor.rowcount
+
+    def close(self):
+
+        with self._lock:
+            self._connection.close()
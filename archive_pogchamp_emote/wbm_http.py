@@ -0,0 +1,151 @@
+import logging
+import statistics
+import threading
+import time
+import typing
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+
+logger = logging.getLogger(__name__)
+
+
+class RequestLatencyRecorder:
+    ''' keeps track of how long every request took, grouped by a label like `save` or `cdx` '''
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+
+    def record(self, label:str, elapsed_seconds:float):
+
+        with self._lock:
+            self._latencies.setdefault(label, []).append(elapsed_seconds)
+
+    def get_summary_list(self) -> typing.List[model.RequestLatencySummary]:
+        ''' @return a `model.RequestLatencySummary` for every label that has had a request, sorted by label '''
+
+        with self._lock:
+            latencies = {label: list(latency_list) for label, latency_list in self._latencies.items()}
+
+        summary_list = []
+        for iter_label, iter_latency_list in sorted(latencies.items()):
+
+            iter_latency_list.sort()
+            summary_list.append(model.RequestLatencySummary(
+                label=iter_label,
+                count=len(iter_latency_list),
+                total_seconds=sum(iter_latency_list),
+                mean_seconds=statistics.mean(iter_latency_list),
+                p50_seconds=iter_latency_list[int(0.50 * (len(iter_latency_list) - 1))],
+                p95_seconds=iter_latency_list[int(0.95 * (len(iter_latency_list) - 1))],
+                max_seconds=iter_latency_list[-1]))
+
+        return summary_list
+
+    def log_summary(self):
+
+        for iter_summary in self.get_summary_list():
+            logger.info("wayback machine `%s` requests: count: `%s`, total: `%.2f`s, mean: `%.2f`s, p50: `%.2f`s, p95: `%.2f`s, max: `%.2f`s",
+                iter_summary.label, iter_summary.count, iter_summary.total_seconds, iter_summary.mean_seconds,
+                iter_summary.p50_seconds, iter_summary.p95_seconds, iter_summary.max_seconds)
+
+
+class WbmHttpSession:
+    '''
+    a `requests.Session` with a keep-alive connection pool for all of our traffic to the wayback machine, so
+    every save / CDX query / retry reuses a connection instead of doing a new TCP and TLS handshake
+
+    see `get_shared_wbm_http_session()` to get the one for this process
+    '''
+
+    def __init__(self, pool_size:int, base_url:str=constants.WAYBACK_MACHINE_BASE_URL):
+        '''
+        @param pool_size - the max number of connections we keep open to a single host, requests past this
+            still work but their connection gets thrown away afterwards
+        @param base_url - the wayback machine that save page now requests go to, `constants.WAYBACK_MACHINE_BASE_URL`
+            unless we are testing
+        '''
+
+        # requests is only imported when we actually talk to the wayback machine, see `benchmarks/import_time.py`
+        import requests
+        import requests.adapters
+        import urllib3.util.retry
+
+        self.pool_size = pool_size
+        self.base_url = base_url
+        self.latency_recorder = RequestLatencyRecorder()
+
+        # this is the same retry that waybackpy used for every request, connection errors and 5xx
+        # responses are retried here, our own backoff is for when the wayback machine gives us a bad result
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=constants.WAYBACK_MACHINE_HTTP_POOL_CONNECTIONS,
+            pool_maxsize=pool_size,
+            max_retries=urllib3.util.retry.Retry(
+                total=constants.WAYBACK_MACHINE_HTTP_RETRIES,
+                backoff_factor=constants.WAYBACK_MACHINE_HTTP_RETRY_BACKOFF_FACTOR,
+                status_forcelist=[500, 502, 503, 504]))
+
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = constants.HTTP_USER_AGENT
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def get(self, label:str, url:str, **kwargs):
+        ''' sends a GET request through the pool and records how long it took
+
+        @param label - what kind of request this is, latencies are grouped by this
+        @param url - the url to GET
+        @param kwargs - passed to `requests.Session.get`
+        @return the `requests.Response`
+        '''
+
+        start_time = time.monotonic()
+        status_code = None
+
+        try:
+            response = self._session.get(url, **kwargs)
+            status_code = response.status_code
+            return response
+
+        finally:
+            elapsed_seconds = time.monotonic() - start_time
+            self.latency_recorder.record(label, elapsed_seconds)
+            logger.debug("`%s` request to `%s` took `%.3f` seconds, status code: `%s`", label, url, elapsed_seconds, status_code)
+
+
+# the session for this process, see `get_shared_wbm_http_session()`
+_shared_session_lock = threading.Lock()
+_shared_session = None
+_shared_session_pool_size = constants.WAYBACK_MACHINE_HTTP_DEFAULT_POOL_SIZE
+
+
+def set_shared_wbm_http_pool_size(pool_size:int):
+    ''' sets the pool size of the session that `get_shared_wbm_http_session()` creates, the session is only created
+    once per process, so this only does anything before the first call to `get_shared_wbm_http_session()`
+
+    @param pool_size - see `WbmHttpSession`
+    '''
+
+    global _shared_session_pool_size
+
+    with _shared_session_lock:
+        if _shared_session is not None and _shared_session.pool_size != pool_size:
+            logger.warning("the wayback machine http session for this process already has a pool size of `%s`, ignoring the pool size `%s`",
+                _shared_session.pool_size, pool_size)
+
+        _shared_session_pool_size = pool_size
+
+
+def get_shared_wbm_http_session() -> WbmHttpSession:
+    ''' @return the `WbmHttpSession` for this process, every batch day that runs in the same worker process shares it '''
+
+    global _shared_session
+
+    with _shared_session_lock:
+        if _shared_session is None:
+            logger.debug("creating wayback machine http session with a pool size of `%s`", _shared_session_pool_size)
+            _shared_session = WbmHttpSession(_shared_session_pool_size)
+
+        return _shared_session
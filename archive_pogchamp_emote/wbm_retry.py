@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import typing
+
+import arrow
+
+from archive_pogchamp_emote import cdx as cdx
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import wbm as wbm
+from archive_pogchamp_emote import wbm_cache as wbm_cache
+from archive_pogchamp_emote import wbm_http as wbm_http
+
+logger = logging.getLogger(__name__)
+
+WBM_MANIFEST_VERSION = 1
+
+
+class WbmRetryQueue:
+    '''
+    a SQLite backed queue of the urls that we failed to save in the wayback machine, so that a day's run
+    can finish without them, and `retry-wbm` can save them later for every day at once
+
+    every entry points at the wbm manifest of the day it belongs to, which is where the archive url
+    gets written once the url is saved
+    '''
+
+    def __init__(self, database_path):
+        '''
+        @param database_path - the path to the SQLite database, gets created if it doesn't exist
+        '''
+
+        self.database_path = database_path
+
+        logger.info("opening wayback machine retry queue `%s`", database_path)
+
+        # batch mode runs several days in different processes, they all share this database
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(database_path), timeout=constants.SQLITE_BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute('''
+                CREATE TABLE IF NOT EXISTS pending_wbm_saves (
+                    url TEXT NOT NULL,
+                    manifest_path TEXT NOT NULL,
+                    enqueued_timestamp INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT NOT NULL,
+                    PRIMARY KEY (url, manifest_path)
+                )''')
+
+    def enqueue(self, url:str, manifest_path, error:str):
+        ''' add a url that failed to save, or update the error if it is already in the queue
+
+        @param url - the url that we failed to save in the wayback machine
+        @param manifest_path - the path to the wbm manifest of the day that the url belongs to
+        @param error - why saving the url failed
+        '''
+
+        logger.info("adding the url `%s` to the wayback machine retry queue", url)
+
+        with self._lock, self._connection:
+            self._connection.execute('''
+                INSERT INTO pending_wbm_saves (url, manifest_path, enqueued_timestamp, attempts, last_error) VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (url, manifest_path) DO UPDATE SET attempts = attempts + 1, last_error = excluded.last_error''',
+                (url, str(manifest_path), arrow.utcnow().int_timestamp, error))
+
+    def get_pending(self) -> typing.List[model.WbmRetryQueueEntry]:
+        ''' @return every entry in the queue, oldest first '''
+
+        with self._lock:
+            row_list = self._connection.execute('''
+                SELECT url, manifest_path, enqueued_timestamp, attempts, last_error
+                FROM pending_wbm_saves ORDER BY enqueued_timestamp, url''').fetchall()
+
+        return [model.WbmRetryQueueEntry(
+                url=url,
+                manifest_path=pathlib.Path(manifest_path),
+                enqueued_timestamp=arrow.get(enqueued_timestamp),
+                attempts=attempts,
+                last_error=last_error)
+            for url, manifest_path, enqueued_timestamp, attempts, last_error in row_list]
+
+    def remove(self, url:str, manifest_path):
+        ''' remove an entry once its archive url has been written to the manifest '''
+
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM pending_wbm_saves WHERE url = ? AND manifest_path = ?", (url, str(manifest_path)))
+
+    def close(self):
+
+        with self._lock:
+            self._connection.close()
+
+
+def _write_wbm_manifest_dict(manifest_path, manifest_dict):
+    ''' writes to a temporary file first and then renames it, like `checkpoint.CheckpointJournal` does '''
+
+    temp_path = manifest_path.with_name(f"{manifest_path.name}.tmp")
+
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(manifest_dict, indent=4))
+
+    os.replace(temp_path, manifest_path)
+
+
+def _read_wbm_manifest_dict(manifest_path) -> typing.Optional[dict]:
+
+    if not manifest_path.exists():
+        return None
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_wbm_manifest(manifest_path, emote_date:str, entry_list:typing.Sequence[dict]):
+    '''
+    writes the day's wbm manifest, which has every url we saved in the wayback machine, the WARC
+    header that its archive url went into, and the archive url (None if it is still in the retry queue)
+
+    if the manifest already exists, archive urls that `retry-wbm` filled in are kept
+
+    @param manifest_path - the path to the manifest
+    @param emote_date - the emote date, formatted with `constants.ARROW_DATE_FORMAT`
+    @param entry_list - a list of dicts with the keys `url`, `warc_header_key` and `archive_url`
+    '''
+
+    existing_manifest_dict = _read_wbm_manifest_dict(manifest_path)
+    retried_entries = {}
+    if existing_manifest_dict is not None:
+        # keyed by url, since `patch_wbm_manifest` doesn't know the WARC header key if it had to create the manifest
+        retried_entries = {iter_entry["url"]: iter_entry for iter_entry in existing_manifest_dict["wbm_results"]
+            if iter_entry.get("retried_at") is not None}
+
+    result_entry_list = []
+    for iter_entry in entry_list:
+        iter_retried_entry = retried_entries.get(iter_entry["url"])
+
+        if iter_entry["archive_url"] is None and iter_retried_entry is not None:
+            result_entry_list.append(dict(iter_entry,
+                archive_url=iter_retried_entry["archive_url"], retried_at=iter_retried_entry["retried_at"]))
+        else:
+            result_entry_list.append(dict(iter_entry, retried_at=None))
+
+    logger.info("writing wbm manifest `%s`", manifest_path)
+
+    _write_wbm_manifest_dict(manifest_path, {
+        "version": WBM_MANIFEST_VERSION,
+        "emote_date": emote_date,
+        "wbm_results": result_entry_list,
+    })
+
+
+def patch_wbm_manifest(manifest_path, url:str, archive_url:str) -> int:
+    ''' fills in the archive url of every pending entry for the url in a day's wbm manifest
+
+    @param manifest_path - the path to the manifest
+    @param url - the url that was saved in the wayback machine
+    @param archive_url - the archive url we got back
+    @return the number of entries that were patched
+    '''
+
+    manifest_dict = _read_wbm_manifest_dict(manifest_path)
+
+    if manifest_dict is None:
+        # the day's run failed or is still going before it got to write the manifest, the entry
+        # we add here gets merged in by `write_wbm_manifest` when it does
+        logger.info("wbm manifest `%s` doesn't exist yet, creating it", manifest_path)
+        manifest_dict = {"version": WBM_MANIFEST_VERSION, "emote_date": None, "wbm_results": [
+            {"url": url, "warc_header_key": None, "archive_url": None, "retried_at": None}]}
+
+    num_patched = 0
+    for iter_entry in manifest_dict["wbm_results"]:
+        if iter_entry["url"] == url and iter_entry["archive_url"] is None:
+            iter_entry["archive_url"] = archive_url
+            iter_entry["retried_at"] = arrow.utcnow().isoformat()
+            num_patched += 1
+
+    _write_wbm_manifest_dict(manifest_path, manifest_dict)
+
+    return num_patched
+
+
+def get_archive_url_from_wbm_manifest(manifest_path, url:str) -> typing.Optional[str]:
+    ''' @return the archive url for the url in a day's wbm manifest, or None if it is not in there or still pending '''
+
+    manifest_dict = _read_wbm_manifest_dict(manifest_path)
+
+    if manifest_dict is None:
+        return None
+
+    for iter_entry in manifest_dict["wbm_results"]:
+        if iter_entry["url"] == url and iter_entry["archive_url"] is not None:
+            return iter_entry["archive_url"]
+
+    return None
+
+
+def retry_pending_wbm_saves(args) -> int:
+    '''
+    saves every url in the retry queue in the wayback machine, for every day at once, and patches the
+    archive urls into each day's wbm manifest
+
+    a url that is pending for more than one day only gets saved once
+
+    @param args - the namespace object we get from argparse.parse_args()
+    @return the exit code, 0 if the queue is empty afterwards, 1 if any url failed again
+    '''
+
+    retry_queue = WbmRetryQueue(args.root_output_folder / constants.WBM_RETRY_QUEUE_FILE_NAME)
+
+    result_cache = None
+    if args.wbm_cache_file:
+        result_cache = wbm_cache.WbmResultCache(args.wbm_cache_file,
+            freshness_seconds=args.wbm_cache_freshness_hours * 60 * 60,
+            max_age_seconds=args.wbm_cache_max_age_days * 24 * 60 * 60)
+
+    try:
+        # url -> the manifests it needs to be patched into
+        manifest_paths_by_url = {}
+        for iter_entry in retry_queue.get_pending():
+
+            # a re-run of the day might have saved it already
+            if get_archive_url_from_wbm_manifest(iter_entry.manifest_path, iter_entry.url) is not None:
+                logger.info("the url `%s` already has an archive url in `%s`, removing it from the retry queue",
+                    iter_entry.url, iter_entry.manifest_path)
+                retry_queue.remove(iter_entry.url, iter_entry.manifest_path)
+                continue
+
+            logger.debug("pending: `%s`", iter_entry)
+            manifest_paths_by_url.setdefault(iter_entry.url, []).append(iter_entry.manifest_path)
+
+        logger.info("`%s` url(s) in the wayback machine retry queue", len(manifest_paths_by_url))
+
+        if not manifest_paths_by_url:
+            return 0
+
+        wbm_http.set_shared_wbm_http_pool_size(args.wbm_http_pool_size)
+        http_session = wbm_http.get_shared_wbm_http_session()
+
+        save_request_list = [model.WbmSaveRequest(url=iter_url, idx=idx, total=len(manifest_paths_by_url))
+            for idx, iter_url in enumerate(manifest_paths_by_url.keys())]
+
+        failed_url_list = []
+
+        def _on_save_failed(save_request, error):
+            failed_url_list.append(save_request.url)
+            for iter_manifest_path in manifest_paths_by_url[save_request.url]:
+                retry_queue.enqueue(save_request.url, iter_manifest_path, str(error))
+
+        archive_url_list = wbm.save_urls_in_wbm_concurrently(
+            save_request_list, args.wbm_concurrency,
+            wbm.PerHostRateLimiter(args.wbm_rate_limit, args.wbm_rate_limit_burst),
+            result_cache=result_cache,
+            backoff_policy=model.BackoffPolicy(
+                base_seconds=args.wbm_backoff_base_seconds,
+                multiplier=constants.WAYBACK_MACHINE_BACKOFF_MULTIPLIER,
+                max_seconds=args.wbm_backoff_max_seconds,
+                jitter_fraction=constants.WAYBACK_MACHINE_BACKOFF_JITTER_FRACTION),
+            hashflags_backoff_policy=model.BackoffPolicy(
+                base_seconds=args.wbm_hashflags_backoff_base_seconds,
+                multiplier=constants.WAYBACK_MACHINE_BACKOFF_MULTIPLIER,
+                max_seconds=args.wbm_hashflags_backoff_max_seconds,
+                jitter_fraction=constants.WAYBACK_MACHINE_BACKOFF_JITTER_FRACTION),
+            failure_callback=_on_save_failed,
+            cdx_client=cdx.build_cdx_client_from_argparse_args(args, wbm.PerHostRateLimiter(
+                constants.WAYBACK_MACHINE_CDX_RATE_LIMIT_PER_SECOND, constants.WAYBACK_MACHINE_CDX_RATE_LIMIT_BURST), http_session),
+            http_session=http_session)
+
+        http_session.latency_recorder.log_summary()
+
+        for iter_save_request, iter_archive_url in zip(save_request_list, archive_url_list):
+            if iter_archive_url is None:
+                continue
+
+            for iter_manifest_path in manifest_paths_by_url[iter_save_request.url]:
+                num_patched = patch_wbm_manifest(iter_manifest_path, iter_save_request.url, iter_archive_url)
+                logger.info("patched `%s` entry(s) for the url `%s` in `%s`", num_patched, iter_save_request.url, iter_manifest_path)
+                retry_queue.remove(iter_save_request.url, iter_manifest_path)
+
+        logger.info("retried `%s` url(s), `%s` failed again and are still in the retry queue",
+            len(save_request_list), len(failed_url_list))
+
+        return 1 if failed_url_list else 0
+
+    finally:
+        if result_cache is not None:
+            result_cache.close()
+        retry_queue.close()
@@ -0,0 +1,313 @@
+import logging
+import sqlite3
+import threading
+import time
+import typing
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+
+logger = logging.getLogger(__name__)
+
+
+def _connect_read_only(database_path) -> sqlite3.Connection:
+    ''' read only, so we can never take a write lock that wpull would have to wait on '''
+
+    return sqlite3.connect(f"{database_path.resolve().as_uri()}?mode=ro", uri=True,
+        timeout=constants.SQLITE_BUSY_TIMEOUT_SECONDS)
+
+
+def _get_queue_table_name(connection) -> typing.Optional[str]:
+    ''' @return the name of wpull's queue table, or None if wpull hasn't created it yet '''
+
+    table_name_list = [iter_row[0] for iter_row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return next((iter_name for iter_name in constants.WPULL_DATABASE_QUEUE_TABLE_NAMES if iter_name in table_name_list), None)
+
+
+def _get_total_file_size(path_iterable) -> int:
+    ''' @return the total size of the files, skipping the ones that are gone by the time we get to them '''
+
+    result = 0
+    for iter_path in path_iterable:
+        try:
+            result += iter_path.stat().st_size
+        except FileNotFoundError:
+            # wpull renamed or deleted it out from under us
+            pass
+
+    return result
+
+
+def read_wpull_database_progress(database_path, warc_output_folder, warc_file_prefix:str,
+    warc_tempdir_folder=None) -> typing.Optional[model.WpullDatabaseProgress]:
+    ''' reads how far along wpull is from its SQLite database, without getting in its way
+
+    @param database_path - the path to wpull's `--database`
+    @param warc_output_folder - the folder wpull writes its WARC(s) to
+    @param warc_file_prefix - wpull's `--warc-file`, the WARC(s) are named this plus a suffix
+    @param warc_tempdir_folder - wpull's `--warc-tempdir`, or None to not count its temp files
+    @return a `model.WpullDatabaseProgress`, or None if wpull hasn't created its queue yet
+    '''
+
+    if not database_path.exists():
+        return None
+
+    connection = _connect_read_only(database_path)
+
+    try:
+        queue_table_name = _get_queue_table_name(connection)
+
+        if queue_table_name is None:
+            return None
+
+        status_counts = dict(connection.execute(f"SELECT status, COUNT(*) FROM {queue_table_name} GROUP BY status").fetchall())
+
+    finally:
+        connection.close()
+
+    warc_bytes = _get_total_file_size(warc_output_folder.glob(f"{warc_file_prefix}*"))
+    temp_bytes = 0 if warc_tempdir_folder is None else _get_total_file_size(warc_tempdir_folder.glob(constants.WPULL_TEMP_FILE_GLOB))
+
+    return model.WpullDatabaseProgress(
+        todo=status_counts.get(constants.WPULL_DATABASE_STATUS_TODO, 0),
+        in_progress=status_counts.get(constants.WPULL_DATABASE_STATUS_IN_PROGRESS, 0),
+        done=status_counts.get(constants.WPULL_DATABASE_STATUS_DONE, 0),
+        error=status_counts.get(constants.WPULL_DATABASE_STATUS_ERROR, 0),
+        skipped=status_counts.get(constants.WPULL_DATABASE_STATUS_SKIPPED, 0),
+        warc_bytes=warc_bytes,
+        temp_bytes=temp_bytes)
+
+
+def read_wpull_database_unfinished_urls(database_path) -> typing.List[str]:
+    ''' @return the urls in wpull's queue that are still queued or in progress, sorted '''
+
+    if not database_path.exists():
+        return []
+
+    connection = _connect_read_only(database_path)
+
+    try:
+        queue_table_name = _get_queue_table_name(connection)
+
+        if queue_table_name is None:
+            return []
+
+        column_name_list = [iter_row[1] for iter_row in connection.execute(f"PRAGMA table_info({queue_table_name})")]
+        status_list = [constants.WPULL_DATABASE_STATUS_TODO, constants.WPULL_DATABASE_STATUS_IN_PROGRESS]
+
+        url_string_id_column_name = next((iter_name for iter_name in constants.WPULL_DATABASE_URL_STRING_ID_COLUMN_NAMES
+            if iter_name in column_name_list), None)
+
+        if url_string_id_column_name is not None:
+            row_list = connection.execute(f'''
+                SELECT url_strings.url FROM {queue_table_name}
+                JOIN {constants.WPULL_DATABASE_URL_STRINGS_TABLE_NAME} AS url_strings
+                    ON url_strings.id = {queue_table_name}.{url_string_id_column_name}
+                WHERE {queue_table_name}.status IN (?, ?)''', status_list).fetchall()
+        else:
+            logger.warning("don't know how to get the urls out of the wpull database table `%s`, columns: `%s`",
+                queue_table_name, column_name_list)
+            return []
+
+    finally:
+        connection.close()
+
+    return sorted(iter_row[0] for iter_row in row_list)
+
+
+class WpullDatabaseMonitor:
+    '''
+    polls wpull's SQLite database on a background thread while wpull runs, and logs how many urls are
+    queued / in progress / done / errored, how fast urls are finishing and how big the WARC is
+
+    `stop_callback` gets called once, which should stop wpull, if:
+
+    * wpull hasn't done anything for `stall_timeout_seconds`: no url started or finished, and neither the WARC
+      nor the temp file of a response that is still downloading grew. a poll that couldn't read the database
+      doesn't count towards this
+    * the crawl goes over its `model.CrawlBudget`, for the number of urls, the WARC size or the wall time
+    '''
+
+    def __init__(self, database_path, warc_output_folder, warc_file_prefix:str, interval_seconds:float,
+        stall_timeout_seconds:typing.Optional[float], stop_callback:typing.Callable[[], None],
+        crawl_budget:model.CrawlBudget=model.CrawlBudget(), warc_tempdir_folder=None):
+        '''
+        @param database_path - the path to wpull's `--database`
+        @param warc_output_folder - the folder wpull writes its WARC(s) to
+        @param warc_file_prefix - wpull's `--warc-file`
+        @param interval_seconds - how often the database gets polled
+        @param stall_timeout_seconds - how long the crawl can go without progress before it is stopped, None to never stop it
+        @param stop_callback - gets called (on the monitor thread) when the crawl stalls or goes over its budget
+        @param crawl_budget - the `model.CrawlBudget` to enforce
+        @param warc_tempdir_folder - wpull's `--warc-tempdir`, so a big download that is still going doesn't look stalled
+        '''
+
+        self.database_path = database_path
+        self.warc_output_folder = warc_output_folder
+        self.warc_file_prefix = warc_file_prefix
+        self.warc_tempdir_folder = warc_tempdir_folder
+        self.interval_seconds = interval_seconds
+        self.stall_timeout_seconds = stall_timeout_seconds
+        self.stop_callback = stop_callback
+        self.crawl_budget = crawl_budget
+
+        self.stalled = False
+        self.exceeded_limit_list = []
+        self.last_progress = None
+        self.elapsed_seconds = 0.0
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_time = None
+
+        # the last time wpull did something, and what it looked like then, see `update_stall_check()`
+        self._last_activity_time = None
+        self._last_activity_key = None
+        self._num_failed_polls = 0
+
+    def start(self):
+
+        self._start_time = time.monotonic()
+        self._last_activity_time = self._start_time
+        self._thread = threading.Thread(target=self._run, name="wpull-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        ''' stops polling, and logs the final progress '''
+
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        self._poll_progress()
+        self.elapsed_seconds = time.monotonic() - self._start_time
+
+        if self.last_progress is not None:
+            logger.info("wpull database final progress: %s", self._format_progress(self.last_progress))
+
+    def _poll_progress(self) -> typing.Optional[model.WpullDatabaseProgress]:
+        ''' @return the progress right now, or None if the database couldn't be read, `last_progress` keeps the last one we got '''
+
+        try:
+            progress = read_wpull_database_progress(self.database_path, self.warc_output_folder, self.warc_file_prefix,
+                self.warc_tempdir_folder)
+        except sqlite3.Error as e:
+            # wpull might be in the middle of creating it, or have it locked, we'll just try again next time
+            logger.debug("reading the wpull database `%s` failed: `%s`", self.database_path, e)
+            return None
+
+        if progress is not None:
+            self.last_progress = progress
+
+        return progress
+
+    def update_stall_check(self, progress:typing.Optional[model.WpullDatabaseProgress], now:float) -> bool:
+        ''' keeps track of the last time wpull did something
+
+        @param progress - the progress from this poll, None if there wasn't any
+        @param now - the `time.monotonic()` of this poll
+        @return True if wpull hasn't done anything for `stall_timeout_seconds`
+        '''
+
+        if self._last_activity_time is None:
+            self._last_activity_time = now
+
+        # a poll without any data isn't activity, otherwise a database we can't read would turn the stall check off
+        if progress is None:
+            self._num_failed_polls += 1
+
+            if self._num_failed_polls % constants.WPULL_MONITOR_FAILED_POLL_WARNING_COUNT == 0:
+                logger.warning("couldn't read any progress from the wpull database `%s` in the last `%s` polls",
+                    self.database_path, self._num_failed_polls)
+
+        else:
+            self._num_failed_polls = 0
+
+            # the number of urls in progress changes when one starts, and the temp file grows while a big response downloads
+            activity_key = (progress.done + progress.error + progress.skipped, progress.in_progress,
+                progress.warc_bytes, progress.temp_bytes)
+
+            if activity_key != self._last_activity_key:
+                self._last_activity_key = activity_key
+                self._last_activity_time = now
+                return False
+
+        return self.stall_timeout_seconds is not None and now - self._last_activity_time >= self.stall_timeout_seconds
+
+    def get_exceeded_limit_list(self, progress:typing.Optional[model.WpullDatabaseProgress], elapsed_seconds:float) -> typing.List[str]:
+        ''' @return the names of the `model.CrawlBudget` limits that the crawl has gone over '''
+
+        result = []
+
+        if self.crawl_budget.max_wall_time_seconds is not None and elapsed_seconds >= self.crawl_budget.max_wall_time_seconds:
+            result.append("max_wall_time_seconds")
+
+        if progress is not None:
+            if self.crawl_budget.max_urls is not None and progress.done + progress.error >= self.crawl_budget.max_urls:
+                result.append("max_urls")
+
+            # wpull's `--quota` only counts the response bodies, and only between files, so this is the backstop
+            if self.crawl_budget.max_bytes is not None and progress.warc_bytes >= self.crawl_budget.max_bytes:
+                result.append("max_bytes")
+
+        return result
+
+    def build_crawl_budget_report(self) -> model.CrawlBudgetReport:
+        ''' @return a `model.CrawlBudgetReport` of what was cut from the crawl, call this after `stop()` '''
+
+        try:
+            cut_url_list = read_wpull_database_unfinished_urls(self.database_path)
+        except sqlite3.Error as e:
+            logger.warning("reading the unfinished urls from the wpull database `%s` failed: `%s`", self.database_path, e)
+            cut_url_list = []
+
+        return model.CrawlBudgetReport(
+            crawl_budget=self.crawl_budget,
+            exceeded_limit_list=list(self.exceeded_limit_list),
+            elapsed_seconds=self.elapsed_seconds,
+            final_progress=self.last_progress,
+            cut_url_list=cut_url_list)
+
+    @staticmethod
+    def _format_progress(progress:model.WpullDatabaseProgress) -> str:
+
+        return (f"queued: `{progress.todo}`, in progress: `{progress.in_progress}`, done: `{progress.done}`, "
+            f"error: `{progress.error}`, skipped: `{progress.skipped}`, WARC bytes: `{progress.warc_bytes}`, "
+            f"temp file bytes: `{progress.temp_bytes}`")
+
+    def _run(self):
+
+        start_time = self._start_time
+        previous_time = start_time
+        previous_finished = 0
+
+        while not self._stop_event.wait(self.interval_seconds):
+
+            progress = self._poll_progress()
+            now = time.monotonic()
+            self.elapsed_seconds = now - start_time
+
+            if progress is not None:
+                finished = progress.done + progress.error + progress.skipped
+
+                logger.info("wpull database progress: %s, urls/s: `%.2f` (average `%.2f`)",
+                    self._format_progress(progress),
+                    (finished - previous_finished) / (now - previous_time),
+                    finished / (now - start_time))
+
+                previous_time = now
+                previous_finished = finished
+
+            exceeded_limit_list = self.get_exceeded_limit_list(progress, self.elapsed_seconds)
+            if exceeded_limit_list:
+                logger.warning("wpull went over the crawl budget `%s` for `%s`, stopping it", self.crawl_budget, exceeded_limit_list)
+                self.exceeded_limit_list = exceeded_limit_list
+                self.stop_callback()
+                return
+
+            if self.update_stall_check(progress, now):
+                logger.warning("wpull hasn't done anything in `%.0f` seconds, stopping it", now - self._last_activity_time)
+                self.stalled = True
+                self.stop_callback()
+                return
@@ -0,0 +1,126 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import process as process
+
+logger = logging.getLogger(__name__)
+
+
+class WpullRunner:
+    '''
+    runs the wpull PEX, with an optional persistent PEX_ROOT so the PEX is only unpacked once and
+    every later run (including the other days of a batch run) starts from the already extracted copy
+
+    every run is still its own wpull process, with its own arguments file, database and WARC, since a
+    wpull process only writes one WARC with one set of `--warc-header`s
+    '''
+
+    def __init__(self, wpull_pex_path, pex_root=None):
+        '''
+        @param wpull_pex_path - the path to the wpull PEX
+        @param pex_root - the folder the PEX gets extracted to, or None to use PEX's default (`~/.pex`)
+        '''
+
+        self.wpull_pex_path = wpull_pex_path
+        self.pex_root = pex_root
+
+        self._process_runner = None
+
+    def _get_environment(self):
+        ''' @return the environment for the wpull process '''
+
+        env = os.environ.copy()
+
+        # with a POSIX / C locale, wpull would escape the quotes in its log lines and
+        # `process.WpullProgressCounters` would have to deal with `\u2018` instead of `‘`
+        env[constants.PYTHONIOENCODING_ENVIRONMENT_VARIABLE] = constants.WPULL_PYTHONIOENCODING
+
+        if self.pex_root is not None:
+            env[constants.PEX_ROOT_ENVIRONMENT_VARIABLE] = str(self.pex_root)
+
+        return env
+
+    def _get_argument_list(self, *wpull_argument_list):
+
+        return [sys.executable, str(self.wpull_pex_path), *wpull_argument_list]
+
+    def warm_up(self):
+        '''
+        runs `wpull --version` once so the PEX gets extracted to the PEX_ROOT now, rather than by several
+        days at the same time when a batch run starts
+
+        a failure is only logged, the real run will fail with a better error if something is actually wrong
+        '''
+
+        if self.pex_root is not None:
+            self.pex_root.mkdir(parents=True, exist_ok=True)
+
+        logger.info("warming up the wpull PEX `%s` with the PEX_ROOT `%s`", self.wpull_pex_path, self.pex_root)
+
+        start_time = time.monotonic()
+        runner = process.StreamingProcessRunner(self._get_argument_list(constants.WPULL_ARGUMENT_VERSION),
+            logger.getChild("warm_up"), env=self._get_environment())
+        result = runner.run()
+
+        if result.returncode != 0:
+            logger.warning("warming up the wpull PEX exited with the code `%s`, output: `%s`, stderr: `%s`",
+                result.returncode, result.stdout, result.stderr)
+        else:
+            logger.info("warming up the wpull PEX took `%.1f` seconds", time.monotonic() - start_time)
+
+    def start(self, wpull_arguments_path, output_logger, line_callback=None):
+        ''' starts wpull with an arguments file, see `wait()`, `stop()` and `terminate()`
+
+        @param wpull_arguments_path - the path to the wpull arguments file, passed as `@<path>`
+        @param output_logger - the logger that every line of wpull output gets logged to
+        @param line_callback - if not None, gets called with every line of wpull output
+        '''
+
+        wpull_argument_list = self._get_argument_list(f"@{wpull_arguments_path}")
+
+        logger.info("executing wpull with the arguments: `%s`", wpull_argument_list)
+
+        self._process_runner = process.StreamingProcessRunner(wpull_argument_list, output_logger,
+            line_callback=line_callback, env=self._get_environment())
+        self._process_runner.start()
+
+    def terminate(self):
+        ''' stops the running wpull right away, see `constants.WPULL_FORCED_STOP_EXIT_CODE` '''
+
+        if self._process_runner is not None:
+            self._process_runner.terminate()
+
+    def stop(self, grace_seconds:float=constants.WPULL_STOP_DEFAULT_GRACE_SECONDS):
+        '''
+        stops the running wpull early, letting it finish the requests it is in the middle of and close its WARC,
+        and if it is still going after `grace_seconds`, `terminate()`s it
+
+        @param grace_seconds - how long wpull gets to stop on its own
+        '''
+
+        if self._process_runner is None:
+            return
+
+        self._process_runner.interrupt()
+
+        if not self._process_runner.wait_for_exit(grace_seconds):
+            logger.warning("wpull didn't stop within `%s` seconds of being interrupted, terminating it", grace_seconds)
+            self._process_runner.terminate()
+
+    def wait(self) -> subprocess.CompletedProcess:
+        ''' @return the `subprocess.CompletedProcess` once wpull exits, see `process.StreamingProcessRunner.wait()` '''
+
+        return self._process_runner.wait()
+
+    def run(self, wpull_arguments_path, output_logger, line_callback=None) -> subprocess.CompletedProcess:
+        ''' runs wpull with an arguments file and waits for it to finish, see `start()` for the parameters
+
+        @return the `subprocess.CompletedProcess`, see `wait()`
+        '''
+
+        self.start(wpull_arguments_path, output_logger, line_callback)
+        return self.wait()
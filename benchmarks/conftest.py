@@ -0,0 +1,93 @@
+'''
+shared fixtures for the pytest-benchmark suite, see `test_bench_*.py`
+
+a plain `python -m pytest` only runs the unit tests in `tests/`, the benchmarks run with
+`python -m pytest benchmarks --benchmark-autosave`, which saves the results to `.benchmarks/`. compare a
+run against the last saved one with `python -m pytest benchmarks --benchmark-compare`, or fail on a
+regression with `python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%`
+'''
+
+# library imports
+import argparse
+import pathlib
+import sys
+
+import pytest
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import utils as utils
+
+# a day's config with every optional section filled in, so the builder does all of its work
+SAMPLE_HOCON_CONFIG = '''
+archive_pogchamp_emote {
+  date = "2021-01-15"
+  twitch_emote_id = 300354391
+  twitch_twitter_post_url = "https://twitter.com/Twitch/status/1350155593245880321"
+  twitch_twitter_post_is_video = true
+  streamer_social_media_urls = [
+    "https://twitter.com/example_streamer",
+    "https://www.instagram.com/example_streamer/",
+    "https://www.youtube.com/c/example_streamer",
+  ]
+  streamer_twitch_url = "https://www.twitch.tv/example_streamer"
+  streamer_name = "example_streamer"
+  extra_warc_headers {
+    X-Example-Header-One = "one"
+    X-Example-Header-Two = "two"
+  }
+  additional_urls_to_include_in_warc = [
+    "https://example.com/one",
+    "https://example.com/two",
+  ]
+  additional_urls_to_save_via_wbm = [
+    "https://example.com/three",
+  ]
+  additional_urls_to_save_via_youtube_dl = [
+    "https://example.com/four",
+  ]
+}
+'''
+
+
+@pytest.fixture
+def sample_hocon_config_path(tmp_path):
+    ''' @return the path of `SAMPLE_HOCON_CONFIG` written to a file '''
+
+    config_path = tmp_path / "sample_config.conf"
+    config_path.write_text(SAMPLE_HOCON_CONFIG, encoding="utf-8")
+    return config_path
+
+
+@pytest.fixture
+def sample_args(sample_hocon_config_path, tmp_path):
+    ''' @return the parts of the `archive` argparse namespace that building the config and the wpull arguments file use '''
+
+    return argparse.Namespace(
+        config_file=utils.hocon_config_file_type(str(sample_hocon_config_path)),
+        root_output_folder=tmp_path,
+        no_wbm_save=False)
+
+
+@pytest.fixture
+def sample_emote_config(sample_args):
+    ''' @return the `model.DailyPogchampEmoteConfig` for `SAMPLE_HOCON_CONFIG` '''
+
+    return utils.build_emote_config_from_argparse_args(sample_args)
+
+
+@pytest.fixture
+def sample_wbm_archive_urls(sample_emote_config):
+    ''' @return a `model.WbmArchiveUrls` as if every url was saved in the wayback machine, except for the last one '''
+
+    def _archive_url(url):
+        return f"https://web.archive.org/web/20210115000000/{url}"
+
+    additional_archive_urls = [_archive_url(iter_url) for iter_url in sample_emote_config.additional_urls_to_save_via_wbm]
+
+    return model.WbmArchiveUrls(
+        streamer_social_media_archive_urls=[_archive_url(iter_url) for iter_url in sample_emote_config.streamer_social_media_urls],
+        twitch_twitter_post_archive_url=_archive_url(sample_emote_config.twitch_twitter_post_url),
+        additional_archive_urls=additional_archive_urls[:-1] + [None])
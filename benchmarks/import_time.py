@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+'''
+measures how long it takes to import the `cli.py` entry point using `python -X importtime`,
+and fails if it goes over the startup budget, or if any of the heavy dependencies that should
+only be imported on first use get imported at startup
+
+usage: python benchmarks/import_time.py [--budget-ms 250] [--runs 5]
+'''
+
+# library imports
+import argparse
+import pathlib
+import re
+import subprocess
+import sys
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+# `import time: self [us] | cumulative | imported package`
+# `import time:       359 |     123721 | cli`
+IMPORT_TIME_LINE_REGEX = re.compile(r"^import time:\s+(?P<self_us>[0-9]+) \|\s+(?P<cumulative_us>[0-9]+) \| (?P<indent>\s*)(?P<module>\S+)$")
+
+DEFAULT_BUDGET_MS = 250
+DEFAULT_RUNS = 5
+
+# these are imported on first use, see the NOTEs at the top of `archive_pogchamp_emote/utils.py`
+# and `archive_pogchamp_emote/native_fetch.py` / `archive_pogchamp_emote/warc_zstd.py`
+MODULES_THAT_SHOULD_NOT_BE_IMPORTED_AT_STARTUP = [
+    "youtube_dl",
+    "pyhocon",
+    "bfa",
+    "requests",
+    "logging_tree",
+    "asyncio",
+    "aiohttp",
+    "warcio",
+    "zstandard",
+]
+
+
+def parse_importtime_output(stderr):
+    ''' parses the output of `python -X importtime`
+
+    @param stderr - the stderr of the python process, as a string
+    @return a dict of `module name -> (self microseconds, cumulative microseconds)`
+    '''
+
+    result = {}
+
+    for iter_line in stderr.splitlines():
+        re_result = IMPORT_TIME_LINE_REGEX.match(iter_line)
+        if re_result:
+            result[re_result.group("module")] = (int(re_result.group("self_us")), int(re_result.group("cumulative_us")))
+
+    return result
+
+
+def measure_cli_import_time():
+    ''' imports `cli` in a fresh interpreter with `-X importtime`
+
+    @return a dict of `module name -> (self microseconds, cumulative microseconds)`
+    '''
+
+    completed_process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import cli"],
+        cwd=REPO_ROOT, capture_output=True, check=True)
+
+    return parse_importtime_output(completed_process.stderr.decode("utf-8"))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="guards the startup time of the cli.py entry point")
+
+    parser.add_argument("--budget-ms", dest="budget_ms", type=float, default=DEFAULT_BUDGET_MS,
+        help="fail if importing `cli` takes longer than this many milliseconds")
+    parser.add_argument("--runs", dest="runs", type=int, default=DEFAULT_RUNS,
+        help="how many times to measure, the fastest run is the one that counts")
+    parser.add_argument("--top", dest="top", type=int, default=10,
+        help="how many of the slowest modules to print out")
+
+    parsed_args = parser.parse_args()
+
+    # the fastest run is the one least affected by whatever else the machine is doing
+    best_import_times = None
+    for _ in range(parsed_args.runs):
+        iter_import_times = measure_cli_import_time()
+        if best_import_times is None or iter_import_times["cli"][1] < best_import_times["cli"][1]:
+            best_import_times = iter_import_times
+
+    cli_cumulative_ms = best_import_times["cli"][1] / 1000
+
+    print(f"importing `cli` took {cli_cumulative_ms:.1f} ms (budget: {parsed_args.budget_ms:.1f} ms, best of {parsed_args.runs})")
+    print(f"slowest {parsed_args.top} modules by self time:")
+    for iter_module, (iter_self_us, iter_cumulative_us) in sorted(
+        best_import_times.items(), key=lambda item: item[1][0], reverse=True)[:parsed_args.top]:
+        print(f"    {iter_self_us / 1000:8.1f} ms self {iter_cumulative_us / 1000:8.1f} ms cumulative   {iter_module}")
+
+    failed = False
+
+    eagerly_imported = [iter_module for iter_module in MODULES_THAT_SHOULD_NOT_BE_IMPORTED_AT_STARTUP if iter_module in best_import_times]
+    if eagerly_imported:
+        print(f"FAIL: these modules should only be imported on first use, but were imported at startup: {eagerly_imported}")
+        failed = True
+
+    if cli_cumulative_ms > parsed_args.budget_ms:
+        print(f"FAIL: importing `cli` went over the budget by {cli_cumulative_ms - parsed_args.budget_ms:.1f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+'''
+benchmarks importing the `cli.py` entry point in a fresh interpreter, see `import_time.py` for the
+startup budget check, this one is for comparing the import time between versions
+'''
+
+import import_time
+
+
+def test_cli_import_time(benchmark):
+
+    # every round starts a new interpreter, so there is nothing to gain from more than one iteration per round
+    import_times = benchmark.pedantic(import_time.measure_cli_import_time, rounds=5, iterations=1, warmup_rounds=1)
+
+    # the wall clock time above includes starting the interpreter, this is just the `import cli` part
+    benchmark.extra_info["cli_cumulative_import_ms"] = import_times["cli"][1] / 1000
+
+    eagerly_imported = [iter_module for iter_module in import_time.MODULES_THAT_SHOULD_NOT_BE_IMPORTED_AT_STARTUP
+        if iter_module in import_times]
+    assert not eagerly_imported
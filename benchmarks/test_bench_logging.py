@@ -0,0 +1,78 @@
+'''
+benchmarks for the per log record and per progress callback costs, these get paid for every line
+wpull / youtube-dl cause us to log, and for every chunk youtube-dl downloads
+'''
+
+import logging
+
+import pytest
+
+from archive_pogchamp_emote import utils as utils
+
+# the same format that `main.py` uses
+LOGGING_FORMAT = "%(asctime)s %(threadName)-10s %(name)-40s %(levelname)-8s: %(message)s"
+
+
+@pytest.fixture
+def log_record():
+
+    return logging.LogRecord(name="archive_pogchamp_emote.application", level=logging.INFO, pathname=__file__,
+        lineno=1, msg="wpull exited with `%s`, fetched `%s` bytes", args=(0, 123456), exc_info=None)
+
+
+@pytest.mark.parametrize("formatter_class", [utils.ArrowLoggingFormatter, utils.LocalTimeIsoLoggingFormatter],
+    ids=lambda formatter_class: formatter_class.__name__)
+def test_logging_formatter_format(benchmark, formatter_class, log_record):
+
+    formatter = formatter_class(LOGGING_FORMAT)
+
+    formatted = benchmark(formatter.format, log_record)
+
+    assert formatted.endswith("wpull exited with `0`, fetched `123456` bytes")
+
+
+@pytest.fixture
+def progress_logger():
+    ''' a logger that goes through all of the logging machinery, but doesn't write anything anywhere '''
+
+    progress_logger = logging.getLogger("benchmarks.youtube_dl_progress")
+    progress_logger.propagate = False
+    progress_logger.setLevel(logging.INFO)
+    progress_logger.addHandler(logging.NullHandler())
+    return progress_logger
+
+
+def _downloading_progress_dictionary(fragment_index):
+
+    return {
+        "status": "downloading",
+        "filename": "video.mp4",
+        "tmpfilename": "video.mp4.part",
+        "downloaded_bytes": fragment_index * 65536,
+        "total_bytes_estimate": 1000 * 65536,
+        "elapsed": 1.5,
+        "eta": 30,
+        "speed": 1048576.0,
+        "fragment_index": fragment_index,
+        "fragment_count": 1000,
+    }
+
+
+@pytest.mark.parametrize("interval_seconds", [0, 60], ids=["logs_every_call", "throttled"])
+def test_youtube_dl_progress_hook_downloading(benchmark, progress_logger, interval_seconds):
+    ''' the call youtube-dl makes for every chunk / fragment, either logging a line or skipping it because of the interval '''
+
+    progress_hook = utils.youtube_dl_progress_hook(progress_logger, 1, 1, interval_seconds)
+    progress_dictionary = _downloading_progress_dictionary(500)
+
+    benchmark(progress_hook, progress_dictionary)
+
+
+def test_youtube_dl_progress_hook_finished(benchmark, progress_logger):
+
+    progress_hook = utils.youtube_dl_progress_hook(progress_logger, 1, 1)
+    progress_dictionary = {"status": "finished", "filename": "video.mp4", "total_bytes": 1000 * 65536, "elapsed": 30.0}
+
+    benchmark(progress_hook, progress_dictionary)
+
+    assert progress_hook.total_bytes_downloaded > 0
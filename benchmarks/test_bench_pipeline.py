@@ -0,0 +1,57 @@
+'''
+benchmarks for the CPU-side work `Application.run` does before it starts any downloads: parsing the
+HOCON config, building the `model.DailyPogchampEmoteConfig` with bfa, and generating the wpull arguments file
+'''
+
+from archive_pogchamp_emote import application as application
+from archive_pogchamp_emote import utils as utils
+
+
+def test_parse_hocon_config(benchmark, sample_hocon_config_path):
+
+    config = benchmark(utils.hocon_config_file_type, str(sample_hocon_config_path))
+
+    assert config["archive_pogchamp_emote"]["streamer_name"] == "example_streamer"
+
+
+def test_build_emote_config_from_argparse_args(benchmark, sample_args):
+
+    emote_config = benchmark(utils.build_emote_config_from_argparse_args, sample_args)
+
+    assert emote_config.streamer_name == "example_streamer"
+
+
+def test_parse_hocon_config_and_build_emote_config(benchmark, sample_args, sample_hocon_config_path):
+    ''' the whole of what `archive` does with `--config-file`, from the file on disk to the config object '''
+
+    def _parse_and_build():
+        sample_args.config_file = utils.hocon_config_file_type(str(sample_hocon_config_path))
+        return utils.build_emote_config_from_argparse_args(sample_args)
+
+    emote_config = benchmark(_parse_and_build)
+
+    assert emote_config.streamer_name == "example_streamer"
+
+
+def test_build_warc_header_list(benchmark, sample_args, sample_emote_config, sample_wbm_archive_urls):
+
+    app = application.Application(sample_args)
+
+    warc_header_list = benchmark(app.build_warc_header_list, sample_emote_config, sample_wbm_archive_urls)
+
+    assert warc_header_list
+
+
+def test_write_wpull_arguments_file(benchmark, sample_args, sample_emote_config, sample_wbm_archive_urls, tmp_path):
+    ''' building the WARC headers and writing the wpull arguments file, the same way `Application.run` does '''
+
+    app = application.Application(sample_args)
+    wpull_arguments_path = tmp_path / sample_emote_config.warc_arguments_file_name
+
+    def _build_and_write():
+        warc_header_list = app.build_warc_header_list(sample_emote_config, sample_wbm_archive_urls)
+        application.write_wpull_arguments_file(wpull_arguments_path, sample_emote_config, warc_header_list)
+
+    benchmark(_build_and_write)
+
+    assert "--warc-header" in wpull_arguments_path.read_text(encoding="utf-8")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+'''
+compares the gzipped WARCs in a root output folder against recompressing them with zstd (see
+`archive_pogchamp_emote/warc_zstd.py`), with and without a trained dictionary, and reports the size
+ratio and how fast each one decompresses. nothing in the root output folder is changed, the `.warc.zst`
+files are written to a temporary folder
+
+needs the `zstd` extra
+
+usage: python benchmarks/warc_zstd.py --root-output-folder <folder> [--level 19] [--runs 3]
+'''
+
+# library imports
+import argparse
+import gzip
+import pathlib
+import sys
+import tempfile
+import time
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import warc as warc
+from archive_pogchamp_emote import warc_zstd as warc_zstd
+
+DEFAULT_RUNS = 3
+
+
+def time_gzip_decompression(warc_path):
+    ''' @return `(uncompressed bytes, seconds)` to decompress every gzip member of a `.warc.gz` '''
+
+    num_bytes = 0
+    start_time = time.perf_counter()
+
+    with gzip.open(warc_path, "rb") as f:
+        while True:
+            chunk = f.read(constants.WARC_INDEX_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            num_bytes += len(chunk)
+
+    return num_bytes, time.perf_counter() - start_time
+
+
+def time_zstd_decompression(zstd_path):
+    ''' @return `(uncompressed bytes, seconds)` to decompress every frame of a `.warc.zst`, including reading its dictionary '''
+
+    num_bytes = 0
+    start_time = time.perf_counter()
+
+    for iter_chunk in warc_zstd.iter_warc_zstd_chunks(zstd_path):
+        num_bytes += len(iter_chunk)
+
+    return num_bytes, time.perf_counter() - start_time
+
+
+def best_of(runs, func, *args):
+    ''' @return the result of `func(*args)` with the smallest time, out of `runs` tries '''
+
+    return min((func(*args) for _ in range(runs)), key=lambda x: x[1])
+
+
+def megabytes_per_second(num_bytes, seconds):
+
+    return num_bytes / (1024 * 1024) / seconds if seconds > 0 else 0.0
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="compares the size and decompression speed of gzipped WARCs against recompressing them with zstd")
+
+    parser.add_argument("--root-output-folder", dest="root_output_folder", type=pathlib.Path, required=True,
+        help="the root folder that was passed to `archive`, every `.warc.gz` in its days gets benchmarked")
+    parser.add_argument("--level", dest="level", type=int, default=constants.ZSTD_DEFAULT_LEVEL,
+        help="the zstd compression level")
+    parser.add_argument("--runs", dest="runs", type=int, default=DEFAULT_RUNS,
+        help="how many times to decompress each file, the fastest run is the one that counts")
+
+    parsed_args = parser.parse_args()
+
+    warc_zstd.check_zstd_dependencies()
+
+    warc_path_list = [iter_path for iter_path in warc_zstd.find_dictionary_sample_warcs(parsed_args.root_output_folder)
+        if iter_path.name.endswith(".warc.gz")]
+
+    if not warc_path_list:
+        print(f"FAIL: no `.warc.gz` files found in the days of `{parsed_args.root_output_folder}`")
+        sys.exit(1)
+
+    # the same dictionary that `--zstd-recompress` would train, without writing it to the root output folder
+    dictionary = warc_zstd.train_warc_dictionary(warc_path_list)
+    print(f"dictionary: {len(dictionary) if dictionary is not None else 0} bytes, trained on {len(warc_path_list)} WARC(s)")
+
+    totals = {"gzip": 0, "zstd": 0, "zstd_no_dictionary": 0, "uncompressed": 0, "gzip_seconds": 0.0, "zstd_seconds": 0.0}
+
+    print(f"{'WARC':<60} {'gzip':>12} {'zstd+dict':>12} {'zstd':>12} {'ratio':>7} {'gzip MB/s':>10} {'zstd MB/s':>10}")
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+
+        for iter_warc_path in warc_path_list:
+
+            iter_zstd_path = pathlib.Path(temp_folder) / warc_zstd.get_zstd_warc_path(iter_warc_path).name
+            iter_no_dictionary_path = iter_zstd_path.with_name(f"no_dictionary_{iter_zstd_path.name}")
+
+            iter_result = warc_zstd.recompress_warc(iter_warc_path, dictionary, parsed_args.level, zstd_path=iter_zstd_path)
+            iter_no_dictionary_result = warc_zstd.recompress_warc(iter_warc_path, None, parsed_args.level, zstd_path=iter_no_dictionary_path)
+
+            gzip_bytes, gzip_seconds = best_of(parsed_args.runs, time_gzip_decompression, iter_warc_path)
+            zstd_bytes, zstd_seconds = best_of(parsed_args.runs, time_zstd_decompression, iter_zstd_path)
+
+            if gzip_bytes != zstd_bytes:
+                print(f"FAIL: `{iter_warc_path}` decompressed to {gzip_bytes} bytes from gzip but {zstd_bytes} bytes from zstd")
+                sys.exit(1)
+
+            print(f"{iter_warc_path.relative_to(parsed_args.root_output_folder).as_posix()[-60:]:<60} {iter_result.input_bytes:>12} "
+                f"{iter_result.output_bytes:>12} {iter_no_dictionary_result.output_bytes:>12} "
+                f"{iter_result.input_bytes / iter_result.output_bytes:>6.2f}x "
+                f"{megabytes_per_second(gzip_bytes, gzip_seconds):>10.1f} {megabytes_per_second(zstd_bytes, zstd_seconds):>10.1f}")
+
+            totals["gzip"] += iter_result.input_bytes
+            totals["zstd"] += iter_result.output_bytes
+            totals["zstd_no_dictionary"] += iter_no_dictionary_result.output_bytes
+            totals["uncompressed"] += gzip_bytes
+            totals["gzip_seconds"] += gzip_seconds
+            totals["zstd_seconds"] += zstd_seconds
+
+    print(f"{'total':<60} {totals['gzip']:>12} {totals['zstd']:>12} {totals['zstd_no_dictionary']:>12} "
+        f"{totals['gzip'] / totals['zstd']:>6.2f}x "
+        f"{megabytes_per_second(totals['uncompressed'], totals['gzip_seconds']):>10.1f} "
+        f"{megabytes_per_second(totals['uncompressed'], totals['zstd_seconds']):>10.1f}")
+    print(f"zstd with the dictionary is {totals['gzip'] / totals['zstd']:.2f}x smaller than gzip "
+        f"({totals['gzip'] / totals['zstd_no_dictionary']:.2f}x without it), and decompresses "
+        f"{totals['gzip_seconds'] / totals['zstd_seconds'] if totals['zstd_seconds'] > 0 else 0.0:.2f}x as fast")
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import types
+import uuid
+
+import pytest
+
+from archive_pogchamp_emote import application as application
+from archive_pogchamp_emote import batch as batch
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import utils as utils
+from archive_pogchamp_emote import wpull_runner as wpull_runner
+
+# how long every stub wpull / youtube-dl job takes, long enough that jobs which aren't capped overlap
+JOB_SECONDS = 0.25
+
+VIDEOS_PER_DAY = 2
+
+ACTIVITY_FOLDER_NAME = "activity"
+
+# the stubs are monkeypatched in here, and only get to the worker processes if they are forked from this one
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+    reason="the stubs only get to the worker processes with the `fork` start method")
+
+
+class StubWpullRunner:
+    ''' stands in for `wpull_runner.WpullRunner`, there is no PEX to warm up '''
+
+    def __init__(self, wpull_pex_path, wpull_pex_root):
+
+        pass
+
+    def warm_up(self):
+
+        pass
+
+
+def _record_job(activity_folder, job_kind):
+    '''
+    stands in for a wpull / youtube-dl job, it appends how many jobs of its kind were running when it started
+    to `<job_kind>.log` in the activity folder, which works across processes
+    '''
+
+    marker_path = activity_folder / f"{job_kind}-{os.getpid()}-{uuid.uuid4().hex}"
+    marker_path.touch()
+
+    try:
+        num_running = len(list(activity_folder.glob(f"{job_kind}-*")))
+        with open(activity_folder / f"{job_kind}.log", "a", encoding="utf-8") as f:
+            f.write(f"{num_running}\n")
+
+        time.sleep(JOB_SECONDS)
+    finally:
+        marker_path.unlink()
+
+
+def _read_job_log(activity_folder, job_kind):
+
+    return [int(iter_line) for iter_line in (activity_folder / f"{job_kind}.log").read_text(encoding="utf-8").split()]
+
+
+def _stub_save_video_with_youtube_dl(root_videos_folder, url, ytdl_args_file_format, idx, total, dry_run=False,
+    progress_interval_seconds=None):
+    ''' stands in for `utils.save_video_with_youtube_dl`, runs in a youtube-dl worker process of a batch worker process '''
+
+    _record_job(root_videos_folder, "youtube_dl")
+    return root_videos_folder
+
+
+class StubApplication(application.Application):
+    '''
+    stands in for `application.Application` in the batch worker processes, it runs one wpull job and downloads
+    `VIDEOS_PER_DAY` videos in the real youtube-dl process pool, or fails if the day's config has `fail = true`
+    '''
+
+    def run(self):
+
+        day_config = self.args.config_file[constants.CONFIG_PATH_ROOT_SECTION]
+        if day_config.get("fail", False):
+            raise Exception(f"the day `{day_config[constants.CONFIG_PATH_DATE]}` failed")
+
+        activity_folder = self.args.root_output_folder / ACTIVITY_FOLDER_NAME
+
+        with self.job_limits.wpull:
+            _record_job(activity_folder, "wpull")
+
+        self.download_videos_in_process_pool(
+            types.SimpleNamespace(youtube_dl_output_folder=activity_folder, ytdl_arguments_file_name="ytdl_args.txt"),
+            [model.VideoDownloadRequest(url=f"https://clips.twitch.tv/{idx}", idx=idx, total=VIDEOS_PER_DAY)
+                for idx in range(1, VIDEOS_PER_DAY + 1)])
+
+
+def _stub_run_day(args, config_path):
+    ''' stands in for `batch._run_day`, the `crash` config raises out of the worker instead of returning a result '''
+
+    if config_path.stem == "crash":
+        raise Exception("the worker process died")
+
+    return model.BatchDayResult(config_file=str(config_path), emote_date=config_path.stem, success=True, error=None, elapsed_seconds=1.0)
+
+
+def _write_config(config_folder, emote_date, fail=False):
+
+    config_folder.mkdir(parents=True, exist_ok=True)
+    (config_folder / f"{emote_date}.conf").write_text(
+        f"{constants.CONFIG_PATH_ROOT_SECTION} {{\n    {constants.CONFIG_PATH_DATE} = \"{emote_date}\"\n    fail = {str(fail).lower()}\n}}\n",
+        encoding="utf-8")
+
+
+def _make_args(tmp_path, batch_workers=3, max_concurrent_wpull=1, max_concurrent_youtube_dl=1):
+
+    return argparse.Namespace(
+        config_dir=tmp_path / "configs",
+        config_glob="*.conf",
+        root_output_folder=tmp_path,
+        batch_workers=batch_workers,
+        max_concurrent_wpull=max_concurrent_wpull,
+        max_concurrent_youtube_dl=max_concurrent_youtube_dl,
+        wpull_pex_path=None,
+        wpull_pex_root=None,
+        youtube_dl_workers=VIDEOS_PER_DAY,
+        youtube_dl_progress_interval=constants.YOUTUBE_DL_PROGRESS_DEFAULT_INTERVAL_SECONDS,
+        no_youtube_dl=True)
+
+
+def _read_summary(root_output_folder):
+
+    summary_path_list = list(root_output_folder.glob(constants.BATCH_SUMMARY_FILE_FORMAT.format("*")))
+    assert len(summary_path_list) == 1
+
+    with open(summary_path_list[0], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def stub_jobs(monkeypatch):
+
+    monkeypatch.setattr(wpull_runner, "WpullRunner", StubWpullRunner)
+    monkeypatch.setattr(application, "Application", StubApplication)
+    monkeypatch.setattr(utils, "save_video_with_youtube_dl", _stub_save_video_with_youtube_dl)
+
+
+def test_a_failing_day_does_not_stop_the_other_days(tmp_path, stub_jobs):
+
+    _write_config(tmp_path / "configs", "2021-01-15")
+    _write_config(tmp_path / "configs", "2021-01-16", fail=True)
+    _write_config(tmp_path / "configs", "2021-01-17")
+    (tmp_path / ACTIVITY_FOLDER_NAME).mkdir()
+
+    assert batch.run_batch(_make_args(tmp_path)) == 1
+
+    summary_dict = _read_summary(tmp_path)
+
+    assert (summary_dict["total"], summary_dict["succeeded"], summary_dict["failed"]) == (3, 2, 1)
+    assert [(iter_day["config_file"], iter_day["emote_date"], iter_day["success"]) for iter_day in summary_dict["days"]] == [
+        (str(tmp_path / "configs" / "2021-01-15.conf"), "2021-01-15", True),
+        (str(tmp_path / "configs" / "2021-01-16.conf"), "2021-01-16", False),
+        (str(tmp_path / "configs" / "2021-01-17.conf"), "2021-01-17", True),
+    ]
+    assert "the day `2021-01-16` failed" in summary_dict["days"][1]["error"]
+    assert summary_dict["days"][0]["error"] is None
+
+    # both of the days that worked got all the way through their youtube-dl process pool
+    assert len(_read_job_log(tmp_path / ACTIVITY_FOLDER_NAME, "wpull")) == 2
+    assert len(_read_job_log(tmp_path / ACTIVITY_FOLDER_NAME, "youtube_dl")) == 2 * VIDEOS_PER_DAY
+
+
+def test_the_job_limits_are_shared_by_every_day(tmp_path, stub_jobs):
+
+    for iter_emote_date in ["2021-01-15", "2021-01-16", "2021-01-17"]:
+        _write_config(tmp_path / "configs", iter_emote_date)
+    (tmp_path / ACTIVITY_FOLDER_NAME).mkdir()
+
+    assert batch.run_batch(_make_args(tmp_path, batch_workers=3, max_concurrent_wpull=1, max_concurrent_youtube_dl=1)) == 0
+
+    # three days at once, each with `VIDEOS_PER_DAY` youtube-dl workers, but only one job of each kind ever ran at a time
+    assert _read_job_log(tmp_path / ACTIVITY_FOLDER_NAME, "wpull") == [1] * 3
+    assert _read_job_log(tmp_path / ACTIVITY_FOLDER_NAME, "youtube_dl") == [1] * 3 * VIDEOS_PER_DAY
+
+
+def test_without_tight_job_limits_the_days_overlap(tmp_path, stub_jobs):
+
+    for iter_emote_date in ["2021-01-15", "2021-01-16"]:
+        _write_config(tmp_path / "configs", iter_emote_date)
+    (tmp_path / ACTIVITY_FOLDER_NAME).mkdir()
+
+    assert batch.run_batch(_make_args(tmp_path, batch_workers=2, max_concurrent_wpull=2, max_concurrent_youtube_dl=4)) == 0
+
+    # the youtube-dl downloads of a day run in parallel, so the one job at a time above is the limits' doing
+    assert max(_read_job_log(tmp_path / ACTIVITY_FOLDER_NAME, "youtube_dl")) > 1
+
+
+def test_a_worker_that_dies_is_a_failed_day(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(wpull_runner, "WpullRunner", StubWpullRunner)
+    monkeypatch.setattr(batch, "_run_day", _stub_run_day)
+
+    for iter_name in ["2021-01-15", "crash", "2021-01-17"]:
+        _write_config(tmp_path / "configs", iter_name)
+
+    assert batch.run_batch(_make_args(tmp_path)) == 1
+
+    summary_dict = _read_summary(tmp_path)
+
+    # in the order of the config files
+    assert [(iter_day["emote_date"], iter_day["success"]) for iter_day in summary_dict["days"]] == [
+        ("2021-01-15", True), ("2021-01-17", True), (None, False)]
+    assert "the worker process died" in summary_dict["days"][2]["error"]
+
+
+def test_no_config_files_is_an_error(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(wpull_runner, "WpullRunner", StubWpullRunner)
+    (tmp_path / "configs").mkdir()
+
+    assert batch.run_batch(_make_args(tmp_path)) == 1
+    assert list(tmp_path.glob(constants.BATCH_SUMMARY_FILE_FORMAT.format("*"))) == []
@@ -0,0 +1,191 @@
+import argparse
+import os
+
+import pytest
+
+from archive_pogchamp_emote import blob_store as blob_store
+from archive_pogchamp_emote import constants as constants
+
+VIDEO_BYTES = b"the same video, posted on two days" * 100
+
+
+def _write_file(path, data):
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+class RecordingLink:
+    ''' stands in for one of the link functions in `blob_store.link_file()`, fails with `error` if it is given '''
+
+    def __init__(self, error=None):
+
+        self.error = error
+        self.call_list = []
+
+    def __call__(self, source_path, destination_path):
+
+        self.call_list.append((source_path, destination_path))
+
+        if self.error is not None:
+            raise self.error
+
+        os.link(source_path, destination_path)
+
+
+@pytest.fixture
+def store(tmp_path):
+
+    result = blob_store.BlobStore(tmp_path / constants.BLOB_STORE_FOLDER_NAME)
+
+    try:
+        yield result
+    finally:
+        result.close()
+
+
+def test_add_file_makes_the_first_copy_the_blob_and_replaces_later_copies_with_a_link(tmp_path, store):
+
+    first_path = _write_file(tmp_path / "2021-01-15" / "video.mp4", VIDEO_BYTES)
+    second_path = _write_file(tmp_path / "2021-01-16" / "video.mp4", VIDEO_BYTES)
+
+    first_result = store.add_file(first_path)
+
+    assert first_result.is_new_blob
+    assert first_result.bytes_saved == 0
+    assert os.path.samefile(first_path, store.get_blob_path(first_result.sha256))
+
+    second_result = store.add_file(second_path)
+
+    assert not second_result.is_new_blob
+    assert second_result.link_method == constants.BLOB_STORE_LINK_MODE_HARDLINK
+    assert second_result.bytes_saved == len(VIDEO_BYTES)
+    assert os.path.samefile(second_path, first_path)
+    assert second_path.read_bytes() == VIDEO_BYTES
+    assert not second_path.with_name(f"{second_path.name}{constants.BLOB_STORE_TEMP_FILE_SUFFIX}").exists()
+
+    # adding a file that already is the blob doesn't do anything
+    third_result = store.add_file(second_path)
+    assert third_result.link_method is None
+    assert third_result.bytes_saved == 0
+
+
+def test_add_file_replaces_a_leftover_temp_file(tmp_path, store):
+
+    first_path = _write_file(tmp_path / "2021-01-15" / "video.mp4", VIDEO_BYTES)
+    second_path = _write_file(tmp_path / "2021-01-16" / "video.mp4", VIDEO_BYTES)
+    # a run that got killed between linking and renaming
+    _write_file(second_path.with_name(f"{second_path.name}{constants.BLOB_STORE_TEMP_FILE_SUFFIX}"), b"half done")
+
+    store.add_file(first_path)
+    store.add_file(second_path)
+
+    assert os.path.samefile(second_path, first_path)
+
+
+def test_add_file_refuses_a_blob_with_a_different_size(tmp_path, store):
+
+    path = _write_file(tmp_path / "video.mp4", VIDEO_BYTES)
+    sha256 = blob_store.hash_file(path)
+    _write_file(store.get_blob_path(sha256), b"not the same")
+
+    with pytest.raises(Exception, match="different size"):
+        store.add_file(path, sha256=sha256)
+
+    # and the file is left alone
+    assert path.read_bytes() == VIDEO_BYTES
+
+
+def test_link_file_falls_back_from_reflink_to_hardlink(tmp_path, monkeypatch):
+
+    failing_reflink = RecordingLink(OSError("Operation not supported"))
+    monkeypatch.setattr(blob_store, "_reflink", failing_reflink)
+
+    source_path = _write_file(tmp_path / "source", VIDEO_BYTES)
+
+    link_method = blob_store.link_file(source_path, tmp_path / "destination", constants.BLOB_STORE_LINK_MODE_REFLINK)
+
+    assert link_method == constants.BLOB_STORE_LINK_MODE_HARDLINK
+    assert len(failing_reflink.call_list) == 1
+    assert os.path.samefile(source_path, tmp_path / "destination")
+
+
+def test_link_file_only_tries_the_other_mode_if_the_first_one_fails(tmp_path, monkeypatch):
+
+    reflink = RecordingLink()
+    monkeypatch.setattr(blob_store, "_reflink", reflink)
+
+    source_path = _write_file(tmp_path / "source", VIDEO_BYTES)
+
+    assert blob_store.link_file(source_path, tmp_path / "a", constants.BLOB_STORE_LINK_MODE_REFLINK) == constants.BLOB_STORE_LINK_MODE_REFLINK
+    assert blob_store.link_file(source_path, tmp_path / "b", constants.BLOB_STORE_LINK_MODE_HARDLINK) == constants.BLOB_STORE_LINK_MODE_HARDLINK
+    assert reflink.call_list == [(source_path, tmp_path / "a")]
+
+
+def test_link_file_raises_if_no_link_mode_works(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(blob_store, "_reflink", RecordingLink(OSError("Operation not supported")))
+    monkeypatch.setattr(blob_store.os, "link", RecordingLink(OSError("Invalid cross-device link")))
+
+    source_path = _write_file(tmp_path / "source", VIDEO_BYTES)
+
+    with pytest.raises(OSError, match="could not link"):
+        blob_store.link_file(source_path, tmp_path / "destination", constants.BLOB_STORE_LINK_MODE_REFLINK)
+
+
+def test_link_file_does_not_try_the_other_mode_if_the_destination_exists(tmp_path, monkeypatch):
+
+    reflink = RecordingLink()
+    monkeypatch.setattr(blob_store, "_reflink", reflink)
+
+    source_path = _write_file(tmp_path / "source", VIDEO_BYTES)
+    destination_path = _write_file(tmp_path / "destination", b"already here")
+
+    with pytest.raises(FileExistsError):
+        blob_store.link_file(source_path, destination_path, constants.BLOB_STORE_LINK_MODE_HARDLINK)
+
+    assert reflink.call_list == []
+    assert destination_path.read_bytes() == b"already here"
+
+
+def test_dedup_archive_tree_links_repeated_videos_and_indexes_the_wpull_cdx_files(tmp_path):
+
+    first_video_path = _write_file(tmp_path / "2021-01-15" / constants.DAY_VIDEOS_FOLDER_NAME / "abc" / "abc.mp4", VIDEO_BYTES)
+    second_video_path = _write_file(tmp_path / "2021-01-16" / constants.DAY_VIDEOS_FOLDER_NAME / "abc" / "abc.mp4", VIDEO_BYTES)
+    other_video_path = _write_file(tmp_path / "2021-01-16" / constants.DAY_VIDEOS_FOLDER_NAME / "def" / "def.mp4", b"only posted once")
+
+    warc_folder = tmp_path / "2021-01-15" / constants.DAY_WARC_FOLDER_NAME
+    _write_file(warc_folder / "2021-01-15_twitch-tv_pogchamp_emote_wpull_warc.cdx", "\n".join([
+        " CDX a b m s k S V g u",
+        "https://example.com/ 20210115000000 text/html 200 SHA1:AAAA 100 0 x.warc.gz <urn:uuid:1>",
+        "https://example.com/a.png 20210115000001 image/png 200 SHA1:BBBB 100 100 x.warc.gz <urn:uuid:2>",
+        "https://example.com/again 20210115000002 warc/revisit 200 SHA1:AAAA 100 200 x.warc.gz <urn:uuid:3>",
+        "https://example.com/request 20210115000003 - - - 100 300 x.warc.gz <urn:uuid:4>",
+    ]).encode("utf-8"))
+    # the CDX file we wrote for wpull's `--warc-dedup` is a copy of the index, it doesn't get indexed
+    _write_file(warc_folder / constants.WPULL_DEDUP_CDX_FILE_FORMAT.format("2021-01-15"), "\n".join([
+        f" CDX {constants.CDX_FIELD_ORIGINAL_URL} {constants.CDX_FIELD_PAYLOAD_DIGEST} {constants.CDX_FIELD_RECORD_ID}",
+        "https://example.com/old SHA1:CCCC <urn:uuid:5>",
+    ]).encode("utf-8"))
+
+    args = argparse.Namespace(root_output_folder=tmp_path, blob_store_link_mode=constants.BLOB_STORE_LINK_MODE_HARDLINK, dedup_workers=2)
+
+    assert blob_store.dedup_archive_tree(args) == 0
+
+    assert os.path.samefile(first_video_path, second_video_path)
+    assert not os.path.samefile(first_video_path, other_video_path)
+    assert second_video_path.read_bytes() == VIDEO_BYTES
+
+    store = blob_store.BlobStore(blob_store.get_blob_store_folder(tmp_path))
+
+    try:
+        assert store.get_warc_payload("SHA1:AAAA").url == "https://example.com/"
+        assert store.get_warc_payload("SHA1:BBBB").warc_record_id == "<urn:uuid:2>"
+        assert store.get_warc_payload("SHA1:CCCC") is None
+    finally:
+        store.close()
+
+    # running it again is fine, the files already are their blobs
+    assert blob_store.dedup_archive_tree(args) == 0
+    assert os.path.samefile(first_video_path, second_video_path)
@@ -0,0 +1,185 @@
+import http.server
+import json
+import threading
+import urllib.parse
+
+import arrow
+import pytest
+
+from archive_pogchamp_emote import cdx as cdx
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import wbm as wbm
+from archive_pogchamp_emote import wbm_http as wbm_http
+
+WINDOW_SECONDS = 6 * 60 * 60
+
+RECENT_URL = "https://static-cdn.jtvnw.net/emoticons/v1/300354391/1.0"
+OLD_URL = "https://twitter.com/example_streamer"
+NEVER_CAPTURED_URL = "https://example.com/never-captured"
+MALFORMED_URL = "https://example.com/malformed"
+EMPTY_URL = "https://example.com/empty"
+
+
+class StubWaybackMachine(http.server.ThreadingHTTPServer):
+    '''
+    stands in for web.archive.org, answers CDX queries with whatever is in `cdx_body_dict` (keyed on the `url`
+    param) and save page now requests with a `Content-Location` header, and keeps track of what was asked for
+    '''
+
+    def __init__(self):
+
+        super().__init__(("127.0.0.1", 0), StubWaybackMachineRequestHandler)
+
+        self.cdx_body_dict = {}
+        self.cdx_query_list = []
+        self.saved_url_list = []
+        self.save_timestamp = arrow.utcnow().format(constants.ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubWaybackMachineRequestHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+
+        split_path = urllib.parse.urlsplit(self.path)
+
+        if split_path.path == "/cdx/search/cdx":
+            url = urllib.parse.parse_qs(split_path.query)["url"][0]
+            with self.server._lock:
+                self.server.cdx_query_list.append(url)
+            self._respond(200, {}, self.server.cdx_body_dict.get(url, ""))
+
+        elif split_path.path.startswith("/save/"):
+            url = self.path[len("/save/"):]
+            with self.server._lock:
+                self.server.saved_url_list.append(url)
+            self._respond(200, {"Content-Location": f"/web/{self.server.save_timestamp}/{url}"}, "saved")
+
+        else:
+            self._respond(404, {}, "not found")
+
+    def _respond(self, status_code, header_dict, body):
+
+        body_bytes = body.encode("utf-8")
+        self.send_response(status_code)
+        for iter_key, iter_value in header_dict.items():
+            self.send_header(iter_key, iter_value)
+        self.send_header("Content-Length", str(len(body_bytes)))
+        self.end_headers()
+        self.wfile.write(body_bytes)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _cdx_body(*timestamp_url_list):
+    ''' @return a CDX API response with `output=json`, a header row and then a row for every capture '''
+
+    return json.dumps([["timestamp", "original", "statuscode"]] +
+        [[iter_timestamp.format(constants.ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT), iter_url, "200"]
+            for iter_timestamp, iter_url in timestamp_url_list])
+
+
+@pytest.fixture
+def stub_wayback_machine():
+
+    server = StubWaybackMachine()
+    server_thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    server_thread.start()
+
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def http_session(stub_wayback_machine):
+
+    return wbm_http.WbmHttpSession(pool_size=4, base_url=stub_wayback_machine.base_url)
+
+
+@pytest.fixture
+def cdx_client(stub_wayback_machine, http_session):
+
+    return cdx.WbmCdxClient(f"{stub_wayback_machine.base_url}/cdx/search/cdx", window_seconds=WINDOW_SECONDS, max_workers=4,
+        rate_limiter=None, http_session=http_session)
+
+
+def test_find_recent_captures_only_uses_captures_inside_the_window(stub_wayback_machine, cdx_client):
+
+    now = arrow.utcnow().replace(microsecond=0)
+    recent_timestamp = now.shift(hours=-1)
+
+    stub_wayback_machine.cdx_body_dict = {
+        # the most recent capture is the last row
+        RECENT_URL: _cdx_body((now.shift(hours=-5), RECENT_URL), (recent_timestamp, RECENT_URL)),
+        # the stub ignores `from`, so the client has to check the capture time itself
+        OLD_URL: _cdx_body((now.shift(days=-2), OLD_URL)),
+        # nothing matched, just the header row
+        NEVER_CAPTURED_URL: _cdx_body(),
+    }
+
+    result = cdx_client.find_recent_captures([RECENT_URL, OLD_URL, NEVER_CAPTURED_URL])
+
+    assert result == {RECENT_URL: constants.WAYBACK_MACHINE_ARCHIVE_URL_FORMAT.format(
+        recent_timestamp.format(constants.ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT), RECENT_URL)}
+    assert sorted(stub_wayback_machine.cdx_query_list) == sorted([RECENT_URL, OLD_URL, NEVER_CAPTURED_URL])
+
+
+def test_find_recent_captures_treats_malformed_and_empty_responses_as_no_capture(stub_wayback_machine, cdx_client):
+
+    stub_wayback_machine.cdx_body_dict = {
+        MALFORMED_URL: "<html>the CDX server is having a bad day</html>",
+        EMPTY_URL: "",
+    }
+
+    assert cdx_client.find_recent_captures([MALFORMED_URL, EMPTY_URL]) == {}
+
+    # on its own, an empty body is no capture, and a malformed one is an error
+    assert cdx_client.find_recent_capture(EMPTY_URL) is None
+    with pytest.raises(ValueError):
+        cdx_client.find_recent_capture(MALFORMED_URL)
+
+
+def test_save_urls_in_wbm_concurrently_skips_the_save_for_a_reused_capture(stub_wayback_machine, cdx_client, http_session):
+
+    recent_timestamp = arrow.utcnow().shift(hours=-1)
+    stub_wayback_machine.cdx_body_dict = {
+        RECENT_URL: _cdx_body((recent_timestamp, RECENT_URL)),
+        OLD_URL: _cdx_body((arrow.utcnow().shift(days=-2), OLD_URL)),
+    }
+
+    archive_url_list = wbm.save_urls_in_wbm_concurrently(
+        [model.WbmSaveRequest(url=RECENT_URL, idx=1, total=2), model.WbmSaveRequest(url=OLD_URL, idx=2, total=2)],
+        max_workers=2, rate_limiter=None, cdx_client=cdx_client, http_session=http_session)
+
+    # only the url without a recent capture went through save page now
+    assert stub_wayback_machine.saved_url_list == [OLD_URL]
+    assert archive_url_list == [
+        constants.WAYBACK_MACHINE_ARCHIVE_URL_FORMAT.format(
+            recent_timestamp.format(constants.ARROW_WAYBACK_MACHINE_TIMESTAMP_FORMAT), RECENT_URL),
+        constants.WAYBACK_MACHINE_ARCHIVE_URL_FORMAT.format(stub_wayback_machine.save_timestamp, OLD_URL),
+    ]
+
+
+def test_get_shared_wbm_http_session_returns_one_session_per_process(monkeypatch):
+
+    monkeypatch.setattr(wbm_http, "_shared_session", None)
+    monkeypatch.setattr(wbm_http, "_shared_session_pool_size", constants.WAYBACK_MACHINE_HTTP_DEFAULT_POOL_SIZE)
+
+    wbm_http.set_shared_wbm_http_pool_size(7)
+    shared_session = wbm_http.get_shared_wbm_http_session()
+
+    # a different pool size after the session exists doesn't make a second session
+    wbm_http.set_shared_wbm_http_pool_size(constants.WAYBACK_MACHINE_HTTP_DEFAULT_POOL_SIZE)
+
+    assert wbm_http.get_shared_wbm_http_session() is shared_session
+    assert shared_session.pool_size == 7
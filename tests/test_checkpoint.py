@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+
+import pytest
+
+from archive_pogchamp_emote import application as application
+from archive_pogchamp_emote import checkpoint as checkpoint
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import stages as stages
+
+
+class KilledError(Exception):
+    ''' stands in for the process getting killed in the middle of a stage '''
+
+
+def _run_two_stages(journal_path, ran_list, kill_during_second_stage):
+    ''' runs the youtube-dl stage and then the wpull stage through `Application._checkpointed_stage`, the same way `Application.run` does '''
+
+    app = application.Application(argparse.Namespace(no_youtube_dl=False, no_wbm_save=False))
+    app.checkpoint_journal = checkpoint.CheckpointJournal(journal_path, resume=True)
+
+    def _first_stage(results):
+        ran_list.append(constants.STAGE_YOUTUBE_DL)
+
+    def _second_stage(results):
+        ran_list.append(constants.STAGE_WPULL)
+        if kill_during_second_stage:
+            raise KilledError()
+
+    scheduler = stages.StageScheduler()
+    scheduler.add_stage(constants.STAGE_YOUTUBE_DL, app._checkpointed_stage(constants.STAGE_YOUTUBE_DL, _first_stage))
+    scheduler.add_stage(constants.STAGE_WPULL, app._checkpointed_stage(constants.STAGE_WPULL, _second_stage),
+        dependencies=[constants.STAGE_YOUTUBE_DL])
+    scheduler.run()
+
+
+def test_rerun_only_runs_the_stage_that_did_not_complete(tmp_path):
+
+    journal_path = tmp_path / "checkpoint.json"
+
+    first_run_list = []
+    with pytest.raises(KilledError):
+        _run_two_stages(journal_path, first_run_list, kill_during_second_stage=True)
+
+    assert first_run_list == [constants.STAGE_YOUTUBE_DL, constants.STAGE_WPULL]
+    assert json.loads(journal_path.read_text(encoding="utf-8"))["completed_stages"] == [constants.STAGE_YOUTUBE_DL]
+
+    second_run_list = []
+    _run_two_stages(journal_path, second_run_list, kill_during_second_stage=False)
+
+    assert second_run_list == [constants.STAGE_WPULL]
+    assert json.loads(journal_path.read_text(encoding="utf-8"))["completed_stages"] == [constants.STAGE_YOUTUBE_DL, constants.STAGE_WPULL]
+
+
+def test_journal_is_replaced_atomically(tmp_path, monkeypatch):
+
+    journal_path = tmp_path / "checkpoint.json"
+    replace_list = []
+    real_replace = os.replace
+
+    def _recording_replace(src, dst):
+        # the journal that is on disk right before the rename is still a complete one
+        if dst.exists():
+            json.loads(dst.read_text(encoding="utf-8"))
+        replace_list.append((src, dst))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(checkpoint.os, "replace", _recording_replace)
+
+    second_run_list = []
+    with pytest.raises(KilledError):
+        _run_two_stages(journal_path, [], kill_during_second_stage=True)
+    _run_two_stages(journal_path, second_run_list, kill_during_second_stage=False)
+
+    # one rewrite per completed stage, each one through a temporary file next to the journal
+    assert replace_list == [(journal_path.with_name(f"{journal_path.name}.tmp"), journal_path)] * 2
+    assert not journal_path.with_name(f"{journal_path.name}.tmp").exists()
+
+
+def test_crash_while_writing_keeps_the_old_journal(tmp_path, monkeypatch):
+
+    journal_path = tmp_path / "checkpoint.json"
+
+    journal = checkpoint.CheckpointJournal(journal_path)
+    journal.mark_stage_complete(constants.STAGE_YOUTUBE_DL)
+
+    def _crashing_replace(src, dst):
+        raise KilledError()
+
+    monkeypatch.setattr(checkpoint.os, "replace", _crashing_replace)
+
+    with pytest.raises(KilledError):
+        journal.mark_stage_complete(constants.STAGE_WPULL)
+
+    monkeypatch.undo()
+
+    reloaded_journal = checkpoint.CheckpointJournal(journal_path)
+    assert reloaded_journal.is_stage_complete(constants.STAGE_YOUTUBE_DL)
+    assert not reloaded_journal.is_stage_complete(constants.STAGE_WPULL)
+
+
+def test_no_resume_ignores_the_existing_journal(tmp_path):
+
+    journal_path = tmp_path / "checkpoint.json"
+
+    journal = checkpoint.CheckpointJournal(journal_path)
+    journal.mark_stage_complete(constants.STAGE_YOUTUBE_DL)
+    journal.record_wbm_result("https://example.com", "https://web.archive.org/web/20210115000000/https://example.com")
+
+    fresh_journal = checkpoint.CheckpointJournal(journal_path, resume=False)
+    assert not fresh_journal.is_stage_complete(constants.STAGE_YOUTUBE_DL)
+    assert fresh_journal.get_wbm_result("https://example.com") is None
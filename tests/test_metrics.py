@@ -0,0 +1,214 @@
+import json
+import re
+import time
+
+import pytest
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import metrics as metrics
+
+EMOTE_DATE = "2021-01-15"
+
+# 2021-01-15T00:00:00+00:00
+START_TIMESTAMP = 1610668800
+
+PROMETHEUS_NAME_PATTERN = "[a-zA-Z_:][a-zA-Z0-9_:]*"
+PROMETHEUS_LABEL_PATTERN = f"[a-zA-Z_][a-zA-Z0-9_]*=\"(?:[^\"\\\\\\n]|\\\\[\"\\\\n])*\""
+PROMETHEUS_SAMPLE_REGEX = re.compile(
+    f"^(?P<name>{PROMETHEUS_NAME_PATTERN})"
+    f"(?:\\{{(?P<labels>{PROMETHEUS_LABEL_PATTERN}(?:,{PROMETHEUS_LABEL_PATTERN})*)\\}})?"
+    " (?P<value>[-+]?(?:[0-9]*\\.?[0-9]+(?:[eE][-+]?[0-9]+)?|NaN|[-+]?Inf))$")
+PROMETHEUS_LABEL_REGEX = re.compile(f"(?P<key>[a-zA-Z_][a-zA-Z0-9_]*)=\"(?P<value>(?:[^\"\\\\\\n]|\\\\[\"\\\\n])*)\"")
+PROMETHEUS_COMMENT_REGEX = re.compile(f"^# (?P<keyword>HELP|TYPE) (?P<name>{PROMETHEUS_NAME_PATTERN}) (?P<text>.*)$")
+PROMETHEUS_SAMPLE_SUFFIX_DICT = {"counter": [""], "gauge": [""], "summary": ["", "_sum", "_count"]}
+
+
+def parse_prometheus_textfile(text):
+    '''
+    checks that the text follows the prometheus text exposition format: every metric has a `# HELP` and a `# TYPE`
+    before its samples, every sample belongs to the metric above it and is `name{labels} value`
+
+    @return a dict of `metric name -> (type, list of (sample name, labels dict, value))`
+    '''
+
+    assert text.endswith("\n")
+
+    result = {}
+    metric_name = None
+
+    for iter_line in text[:-1].split("\n"):
+        comment_re_result = PROMETHEUS_COMMENT_REGEX.match(iter_line)
+
+        if comment_re_result:
+            if comment_re_result.group("keyword") == "HELP":
+                metric_name = comment_re_result.group("name")
+                assert metric_name not in result, f"metric `{metric_name}` is in the textfile twice"
+            else:
+                assert comment_re_result.group("name") == metric_name
+                assert comment_re_result.group("text") in PROMETHEUS_SAMPLE_SUFFIX_DICT
+                result[metric_name] = (comment_re_result.group("text"), [])
+            continue
+
+        sample_re_result = PROMETHEUS_SAMPLE_REGEX.match(iter_line)
+        assert sample_re_result, f"`{iter_line}` is not a prometheus sample"
+
+        metric_type, sample_list = result[metric_name]
+        assert sample_re_result.group("name") in [f"{metric_name}{iter_suffix}" for iter_suffix in PROMETHEUS_SAMPLE_SUFFIX_DICT[metric_type]]
+
+        label_dict = {iter_match.group("key"): iter_match.group("value")
+            for iter_match in PROMETHEUS_LABEL_REGEX.finditer(sample_re_result.group("labels") or "")}
+        sample_list.append((sample_re_result.group("name"), label_dict, float(sample_re_result.group("value"))))
+
+    return result
+
+
+def _metric_name(name):
+
+    return f"{constants.METRICS_PROMETHEUS_PREFIX}_{name}"
+
+
+@pytest.fixture
+def recorder():
+
+    result = metrics.MetricsRecorder()
+
+    result.record_span(constants.METRICS_SPAN_WBM_SAVE_ATTEMPT, START_TIMESTAMP + 2, 1.5, url="https://example.com/", attempt=1)
+    result.record_span(constants.METRICS_SPAN_WBM_SAVE_ATTEMPT, START_TIMESTAMP + 1, 3.0, success=False, url="https://example.com/", attempt=2)
+    result.record_span(constants.METRICS_SPAN_STAGE_FORMAT.format(constants.STAGE_WPULL), START_TIMESTAMP, 10.0)
+
+    result.increment(constants.METRICS_COUNTER_BYTES_DOWNLOADED, 100, source=constants.METRICS_SOURCE_WPULL)
+    result.increment(constants.METRICS_COUNTER_BYTES_DOWNLOADED, 50, source=constants.METRICS_SOURCE_WPULL)
+    result.increment(constants.METRICS_COUNTER_BYTES_DOWNLOADED, 7, source=constants.METRICS_SOURCE_YOUTUBE_DL)
+    result.increment(constants.METRICS_COUNTER_RETRIES, source=constants.METRICS_SOURCE_WBM_SAVE)
+
+    return result
+
+
+def test_timed_call():
+
+    before = time.time()
+    result, start_timestamp, duration_seconds = metrics.timed_call(lambda a, b=0: a + b, 1, b=2)
+
+    assert result == 3
+    assert before <= start_timestamp <= time.time()
+    assert duration_seconds >= 0
+
+
+def test_timed_call_passes_exceptions_through():
+
+    with pytest.raises(ValueError):
+        metrics.timed_call(int, "not a number")
+
+
+def test_span_records_success_and_failure():
+
+    recorder = metrics.MetricsRecorder()
+
+    with recorder.span(constants.METRICS_SPAN_RUN, emote="PogChamp"):
+        pass
+
+    with pytest.raises(ValueError):
+        with recorder.span(constants.METRICS_SPAN_RUN):
+            raise ValueError("the run failed")
+
+    span_list = recorder.get_span_list()
+
+    assert [(iter_span.name, iter_span.labels, iter_span.success) for iter_span in span_list] == [
+        (constants.METRICS_SPAN_RUN, {"emote": "PogChamp"}, True),
+        (constants.METRICS_SPAN_RUN, {}, False),
+    ]
+    assert all(iter_span.duration_seconds >= 0 for iter_span in span_list)
+
+
+def test_write_json(tmp_path, recorder):
+
+    metrics_path = tmp_path / constants.METRICS_FILE_FORMAT.format(EMOTE_DATE)
+    recorder.write_json(metrics_path, EMOTE_DATE, success=True)
+
+    metrics_dict = json.loads(metrics_path.read_text(encoding="utf-8"))
+
+    assert sorted(metrics_dict.keys()) == ["counters", "elapsed_seconds", "emote_date", "span_summaries", "spans", "started_at", "success"]
+    assert (metrics_dict["emote_date"], metrics_dict["success"]) == (EMOTE_DATE, True)
+
+    # sorted by when they started, the labels are strings
+    assert metrics_dict["spans"] == [
+        {"name": "stage_wpull", "labels": {}, "start_time": "2021-01-15T00:00:00+00:00", "duration_seconds": 10.0, "success": True},
+        {"name": "wbm_save_attempt", "labels": {"url": "https://example.com/", "attempt": "2"}, "start_time": "2021-01-15T00:00:01+00:00",
+            "duration_seconds": 3.0, "success": False},
+        {"name": "wbm_save_attempt", "labels": {"url": "https://example.com/", "attempt": "1"}, "start_time": "2021-01-15T00:00:02+00:00",
+            "duration_seconds": 1.5, "success": True},
+    ]
+
+    assert metrics_dict["span_summaries"] == [
+        {"name": "stage_wpull", "count": 1, "failed": 0, "total_seconds": 10.0, "max_seconds": 10.0},
+        {"name": "wbm_save_attempt", "count": 2, "failed": 1, "total_seconds": 4.5, "max_seconds": 3.0},
+    ]
+
+    # every different set of labels is its own counter
+    assert metrics_dict["counters"] == [
+        {"name": "bytes_downloaded", "labels": {"source": "wpull"}, "value": 150},
+        {"name": "bytes_downloaded", "labels": {"source": "youtube_dl"}, "value": 7},
+        {"name": "retries", "labels": {"source": "wbm_save"}, "value": 1},
+    ]
+
+
+def test_write_prometheus_textfile(tmp_path, recorder):
+
+    textfile_path = tmp_path / "archive_pogchamp_emote.prom"
+    recorder.write_prometheus_textfile(textfile_path, EMOTE_DATE, success=False)
+
+    assert not textfile_path.with_name(f"{textfile_path.name}.tmp").exists()
+
+    metric_dict = parse_prometheus_textfile(textfile_path.read_text(encoding="utf-8"))
+
+    assert sorted(metric_dict.keys()) == sorted(_metric_name(iter_name) for iter_name in [
+        "run_success", "run_start_timestamp_seconds", "run_duration_seconds", "span_duration_seconds",
+        "span_max_duration_seconds", "span_failed", "bytes_downloaded_total", "retries_total"])
+
+    # every sample has the day as a label
+    for _, iter_sample_list in metric_dict.values():
+        assert all(iter_labels["emote_date"] == EMOTE_DATE for _, iter_labels, _ in iter_sample_list)
+
+    assert metric_dict[_metric_name("run_success")] == ("gauge", [(_metric_name("run_success"), {"emote_date": EMOTE_DATE}, 0)])
+    assert metric_dict[_metric_name("run_start_timestamp_seconds")][1][0][2] == pytest.approx(recorder.start_timestamp)
+
+    assert metric_dict[_metric_name("span_duration_seconds")] == ("summary", [
+        (_metric_name("span_duration_seconds_sum"), {"emote_date": EMOTE_DATE, "span": "stage_wpull"}, 10.0),
+        (_metric_name("span_duration_seconds_count"), {"emote_date": EMOTE_DATE, "span": "stage_wpull"}, 1),
+        (_metric_name("span_duration_seconds_sum"), {"emote_date": EMOTE_DATE, "span": "wbm_save_attempt"}, 4.5),
+        (_metric_name("span_duration_seconds_count"), {"emote_date": EMOTE_DATE, "span": "wbm_save_attempt"}, 2),
+    ])
+    assert metric_dict[_metric_name("span_failed")][1][1] == (_metric_name("span_failed"), {"emote_date": EMOTE_DATE, "span": "wbm_save_attempt"}, 1)
+
+    assert metric_dict[_metric_name("bytes_downloaded_total")] == ("counter", [
+        (_metric_name("bytes_downloaded_total"), {"emote_date": EMOTE_DATE, "source": "wpull"}, 150),
+        (_metric_name("bytes_downloaded_total"), {"emote_date": EMOTE_DATE, "source": "youtube_dl"}, 7),
+    ])
+
+
+def test_write_prometheus_textfile_escapes_label_values(tmp_path):
+
+    recorder = metrics.MetricsRecorder()
+    recorder.increment(constants.METRICS_COUNTER_RETRIES, source="a \"quoted\" back\\slash\nnewline")
+
+    textfile_path = tmp_path / "archive_pogchamp_emote.prom"
+    recorder.write_prometheus_textfile(textfile_path, EMOTE_DATE, success=True)
+
+    text = textfile_path.read_text(encoding="utf-8")
+    metric_dict = parse_prometheus_textfile(text)
+
+    assert "source=\"a \\\"quoted\\\" back\\\\slash\\nnewline\"" in text
+    assert len(metric_dict[_metric_name("retries_total")][1]) == 1
+
+
+def test_write_prometheus_textfile_without_any_spans_or_counters(tmp_path):
+
+    recorder = metrics.MetricsRecorder()
+
+    textfile_path = tmp_path / "archive_pogchamp_emote.prom"
+    recorder.write_prometheus_textfile(textfile_path, EMOTE_DATE, success=True)
+
+    metric_dict = parse_prometheus_textfile(textfile_path.read_text(encoding="utf-8"))
+
+    assert metric_dict[_metric_name("run_success")][1] == [(_metric_name("run_success"), {"emote_date": EMOTE_DATE}, 1)]
+    assert metric_dict[_metric_name("span_duration_seconds")] == ("summary", [])
@@ -0,0 +1,130 @@
+import pytest
+
+from archive_pogchamp_emote import blob_store as blob_store
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import native_fetch as native_fetch
+
+pytest.importorskip("aiohttp")
+warcio_archiveiterator = pytest.importorskip("warcio.archiveiterator")
+
+EMOTE_BYTES = b"\x89PNG the pogchamp emote"
+
+WARC_HEADER_LIST = [model.WarcHeader(key="archive_pogchamp_emote_emote_date", value="2021-01-15")]
+
+
+def _fetch_result(url, body=EMOTE_BYTES, status=200):
+
+    return model.NativeFetchResult(
+        url=url,
+        request_method="GET",
+        request_path=url.split("/", 3)[3],
+        request_headers=[("Host", "static-cdn.jtvnw.net")],
+        status=status,
+        reason="OK" if status == 200 else "Not Found",
+        response_headers=[("Content-Type", "image/png"), ("Transfer-Encoding", "chunked")],
+        body=body)
+
+
+def _read_response_records(warc_path):
+    ''' @return a list of `(WARC-Type, warc headers, http status, payload)` of every response / revisit record '''
+
+    result = []
+
+    with open(warc_path, "rb") as f:
+        for iter_record in warcio_archiveiterator.ArchiveIterator(f):
+            if iter_record.rec_type in [constants.WARC_RECORD_TYPE_RESPONSE, constants.WARC_RECORD_TYPE_REVISIT]:
+                result.append((iter_record.rec_type, iter_record.rec_headers, iter_record.http_headers.get_statuscode(),
+                    iter_record.content_stream().read()))
+
+    return result
+
+
+@pytest.fixture
+def store(tmp_path):
+
+    result = blob_store.BlobStore(tmp_path / constants.BLOB_STORE_FOLDER_NAME)
+
+    try:
+        yield result
+    finally:
+        result.close()
+
+
+def test_a_repeated_payload_is_a_revisit_of_the_first_one(tmp_path, store):
+
+    warc_path = tmp_path / "2021-01-15.warc.gz"
+    native_fetch.write_fetch_results_to_warc(warc_path, [
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/1.0"),
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/2.0"),
+    ], WARC_HEADER_LIST, blob_store=store)
+
+    (first_type, first_headers, _, first_payload), (second_type, second_headers, second_status, second_payload) = \
+        _read_response_records(warc_path)
+
+    assert (first_type, first_payload) == (constants.WARC_RECORD_TYPE_RESPONSE, EMOTE_BYTES)
+
+    # a revisit only has the http headers, and points at the response by its url, date and record id
+    assert (second_type, second_status, second_payload) == (constants.WARC_RECORD_TYPE_REVISIT, "200", b"")
+    assert second_headers.get_header("WARC-Refers-To-Target-URI") == "https://static-cdn.jtvnw.net/emoticons/v1/88/1.0"
+    assert second_headers.get_header("WARC-Refers-To-Date") == first_headers.get_header("WARC-Date")
+    assert second_headers.get_header("WARC-Refers-To") == first_headers.get_header("WARC-Record-ID")
+    assert second_headers.get_header("WARC-Payload-Digest") == first_headers.get_header("WARC-Payload-Digest")
+
+
+def test_a_payload_from_an_earlier_day_is_a_revisit(tmp_path, store):
+
+    first_warc_path = tmp_path / "2021-01-15.warc.gz"
+    native_fetch.write_fetch_results_to_warc(first_warc_path, [_fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/1.0")],
+        WARC_HEADER_LIST, blob_store=store)
+
+    second_warc_path = tmp_path / "2021-01-16.warc.gz"
+    native_fetch.write_fetch_results_to_warc(second_warc_path, [
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/305954156/1.0", body=b"a different emote"),
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/1.0"),
+    ], WARC_HEADER_LIST, blob_store=store)
+
+    first_headers = _read_response_records(first_warc_path)[0][1]
+    record_list = _read_response_records(second_warc_path)
+
+    assert [iter_record[0] for iter_record in record_list] == [constants.WARC_RECORD_TYPE_RESPONSE, constants.WARC_RECORD_TYPE_REVISIT]
+    assert record_list[1][1].get_header("WARC-Refers-To") == first_headers.get_header("WARC-Record-ID")
+
+
+def test_rewriting_a_days_warc_does_not_refer_to_the_old_records(tmp_path, store):
+
+    warc_path = tmp_path / "2021-01-15.warc.gz"
+    fetch_result_list = [
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/1.0"),
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/2.0"),
+    ]
+
+    native_fetch.write_fetch_results_to_warc(warc_path, fetch_result_list, WARC_HEADER_LIST, blob_store=store)
+    native_fetch.write_fetch_results_to_warc(warc_path, fetch_result_list, WARC_HEADER_LIST, blob_store=store)
+
+    (first_type, first_headers, _, _), (second_type, second_headers, _, _) = _read_response_records(warc_path)
+
+    # the first run's response is gone, so the re-run writes the payload again and refers to that one
+    assert (first_type, second_type) == (constants.WARC_RECORD_TYPE_RESPONSE, constants.WARC_RECORD_TYPE_REVISIT)
+    assert second_headers.get_header("WARC-Refers-To") == first_headers.get_header("WARC-Record-ID")
+    assert store.get_warc_payload(native_fetch.get_payload_digest(EMOTE_BYTES)).warc_record_id == first_headers.get_header("WARC-Record-ID")
+
+
+def test_without_a_blob_store_or_for_an_error_every_response_is_written(tmp_path, store):
+
+    warc_path = tmp_path / "2021-01-15.warc.gz"
+    native_fetch.write_fetch_results_to_warc(warc_path, [
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/1.0"),
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/88/2.0"),
+    ], WARC_HEADER_LIST)
+
+    assert [iter_record[0] for iter_record in _read_response_records(warc_path)] == [constants.WARC_RECORD_TYPE_RESPONSE] * 2
+
+    error_warc_path = tmp_path / "2021-01-16.warc.gz"
+    native_fetch.write_fetch_results_to_warc(error_warc_path, [
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/1/1.0", body=b"not found", status=404),
+        _fetch_result("https://static-cdn.jtvnw.net/emoticons/v1/1/2.0", body=b"not found", status=404),
+    ], WARC_HEADER_LIST, blob_store=store)
+
+    assert [iter_record[2] for iter_record in _read_response_records(error_warc_path)] == ["404", "404"]
+    assert [iter_record[0] for iter_record in _read_response_records(error_warc_path)] == [constants.WARC_RECORD_TYPE_RESPONSE] * 2
@@ -0,0 +1,119 @@
+import logging
+import sys
+import threading
+
+import pytest
+
+from archive_pogchamp_emote import process as process
+from archive_pogchamp_emote import wpull_runner as wpull_runner
+
+# the stderr of a real wpull 2.0.1 run with `--output-file` and `--verbose`, with a utf-8 stderr
+WPULL_UTF8_OUTPUT_LINES = [
+    "INFO Fetching ‘http://127.0.0.1:8780/index.html’.",
+    ".",
+    "INFO Fetched ‘http://127.0.0.1:8780/index.html’: 200 OK. Length: 53 [text/html].",
+    "INFO Fetching ‘http://127.0.0.1:8780/big.bin’.",
+    "",
+    "INFO Fetched ‘http://127.0.0.1:8780/big.bin’: 200 OK. Length: 5000 [application/octet-stream].",
+    "INFO Fetching ‘http://127.0.0.1:8780/missing.html’.",
+    "INFO Fetched ‘http://127.0.0.1:8780/missing.html’: 404 File not found. Length: 335 [text/html;charset=utf-8].",
+    "INFO Fetching ‘http://127.0.0.1:8780/chunked’.",
+    "INFO Fetched ‘http://127.0.0.1:8780/chunked’: 200 OK. Length: unspecified [text/html].",
+    "INFO Fetching ‘http://127.0.0.1:8799/refused’.",
+    "ERROR Fetching ‘http://127.0.0.1:8799/refused’ encountered an error: [Errno 111] Connection refused",
+    "INFO FINISHED.",
+    "INFO Duration: 0:00:01. Speed: 349.3 B/s.",
+    "INFO Downloaded: 4 files, 5.3 KiB.",
+]
+
+# stands in for the wpull PEX, says it is ready and then runs until it gets stopped, it finishes up on SIGINT unless
+# `ignore_sigint` is True
+FAKE_WPULL_SCRIPT_FORMAT = """
+import signal, sys, time
+if {ignore_sigint}:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+else:
+    signal.signal(signal.SIGINT, lambda signum, frame: sys.exit(0))
+print("ready", file=sys.stderr, flush=True)
+time.sleep(60)
+"""
+
+# the same run with a POSIX locale, where wpull escapes the quotes
+WPULL_ASCII_OUTPUT_LINES = [iter_line.replace("‘", "\\u2018").replace("’", "\\u2019") for iter_line in WPULL_UTF8_OUTPUT_LINES]
+
+
+@pytest.mark.parametrize("line_list", [WPULL_UTF8_OUTPUT_LINES, WPULL_ASCII_OUTPUT_LINES], ids=["utf8", "ascii"])
+def test_wpull_progress_counters_parse_real_wpull_output(line_list):
+
+    counters = process.WpullProgressCounters()
+
+    for iter_line in line_list:
+        counters.parse_line(iter_line)
+
+    assert counters.urls_fetching == 5
+    assert counters.urls_fetched == 4
+    assert counters.bytes_fetched == 53 + 5000 + 335
+    assert counters.errors == 1
+
+
+def test_wpull_progress_counters_parse_lengths_with_commas():
+
+    counters = process.WpullProgressCounters()
+    counters.parse_line("INFO Fetched ‘https://example.com/’: 200 OK. Length: 1,270 [text/html].")
+
+    assert counters.bytes_fetched == 1270
+
+
+def test_streaming_process_runner_passes_stderr_lines_to_the_callback():
+
+    counters = process.WpullProgressCounters()
+    output = "\n".join(WPULL_UTF8_OUTPUT_LINES) + "\n"
+
+    runner = process.StreamingProcessRunner(
+        [sys.executable, "-c", f"import sys\nsys.stderr.buffer.write({output.encode('utf-8')!r})\n"],
+        logging.getLogger("test"), line_callback=counters.parse_line)
+    result = runner.run()
+
+    assert result.returncode == 0
+    assert counters.urls_fetched == 4
+    assert result.stderr.splitlines()[-1] == WPULL_UTF8_OUTPUT_LINES[-1]
+
+
+def test_wpull_runner_makes_wpull_log_in_utf8(tmp_path):
+
+    env = wpull_runner.WpullRunner("wpull.pex", pex_root=tmp_path)._get_environment()
+
+    assert env["PYTHONIOENCODING"] == "utf-8"
+    assert env["PEX_ROOT"] == str(tmp_path)
+
+
+def _start_fake_wpull(tmp_path, ignore_sigint):
+
+    fake_wpull_path = tmp_path / "fake_wpull.py"
+    fake_wpull_path.write_text(FAKE_WPULL_SCRIPT_FORMAT.format(ignore_sigint=ignore_sigint))
+
+    ready_event = threading.Event()
+    runner = wpull_runner.WpullRunner(fake_wpull_path)
+    runner.start(tmp_path / "wpull_arguments.txt", logging.getLogger("test"),
+        line_callback=lambda line: ready_event.set() if line == "ready" else None)
+
+    assert ready_event.wait(10)
+    return runner
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="windows can't send SIGINT to a process")
+def test_wpull_runner_stop_lets_wpull_finish_up(tmp_path):
+
+    runner = _start_fake_wpull(tmp_path, ignore_sigint=False)
+    runner.stop(grace_seconds=10)
+
+    assert runner.wait().returncode == 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="windows can't send SIGINT to a process")
+def test_wpull_runner_stop_terminates_wpull_after_the_grace_period(tmp_path):
+
+    runner = _start_fake_wpull(tmp_path, ignore_sigint=True)
+    runner.stop(grace_seconds=0.2)
+
+    assert runner.wait().returncode != 0
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from archive_pogchamp_emote import stages as stages
+
+
+def test_dependency_results_get_passed_to_the_stage():
+
+    scheduler = stages.StageScheduler()
+    scheduler.add_stage("a", lambda results: 1)
+    scheduler.add_stage("b", lambda results: 2)
+    scheduler.add_stage("c", lambda results: results["a"] + results["b"], dependencies=["a", "b"])
+
+    assert scheduler.run() == {"a": 1, "b": 2, "c": 3}
+
+
+def test_cycle_is_rejected_before_anything_runs():
+
+    ran_list = []
+
+    scheduler = stages.StageScheduler()
+    scheduler.add_stage("start", lambda results: ran_list.append("start"))
+    scheduler.add_stage("a", lambda results: ran_list.append("a"), dependencies=["start", "c"])
+    scheduler.add_stage("b", lambda results: ran_list.append("b"), dependencies=["a"])
+    scheduler.add_stage("c", lambda results: ran_list.append("c"), dependencies=["b"])
+
+    with pytest.raises(ValueError, match="cycle"):
+        scheduler.run()
+
+    assert ran_list == []
+
+
+def test_missing_dependency_is_rejected_before_anything_runs():
+
+    ran_list = []
+
+    scheduler = stages.StageScheduler()
+    scheduler.add_stage("a", lambda results: ran_list.append("a"))
+    scheduler.add_stage("b", lambda results: ran_list.append("b"), dependencies=["does_not_exist"])
+
+    with pytest.raises(ValueError, match="does_not_exist"):
+        scheduler.run()
+
+    assert ran_list == []
+
+
+def test_duplicate_stage_name_is_rejected():
+
+    scheduler = stages.StageScheduler()
+    scheduler.add_stage("a", lambda results: None)
+
+    with pytest.raises(ValueError):
+        scheduler.add_stage("a", lambda results: None)
+
+
+def test_independent_stages_run_concurrently():
+
+    # both stages have to be inside of the barrier at the same time for either of them to get past it
+    barrier = threading.Barrier(2, timeout=10)
+
+    scheduler = stages.StageScheduler()
+    scheduler.add_stage("a", lambda results: barrier.wait())
+    scheduler.add_stage("b", lambda results: barrier.wait())
+
+    assert set(scheduler.run().keys()) == {"a", "b"}
+
+
+def test_failed_stage_cancels_its_dependents():
+
+    ran_list = []
+    failed_stage_finished = threading.Event()
+
+    def _failing_stage(results):
+        failed_stage_finished.set()
+        raise Exception("stage failed")
+
+    def _slow_independent_stage(results):
+        # still running when the other stage fails, it gets to finish
+        assert failed_stage_finished.wait(10)
+        ran_list.append("independent")
+
+    scheduler = stages.StageScheduler()
+    scheduler.add_stage("failing", _failing_stage)
+    scheduler.add_stage("independent", _slow_independent_stage)
+    scheduler.add_stage("dependent", lambda results: ran_list.append("dependent"), dependencies=["failing"])
+    scheduler.add_stage("dependent_of_dependent", lambda results: ran_list.append("dependent_of_dependent"), dependencies=["dependent"])
+
+    with pytest.raises(Exception, match="stage failed"):
+        scheduler.run()
+
+    assert ran_list == ["independent"]
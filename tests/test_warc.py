@@ -0,0 +1,243 @@
+import gzip
+import json
+import os
+import uuid
+import zlib
+
+import pytest
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import warc as warc
+
+
+def build_warc_record(record_type, url, warc_date, payload, http_status_line="HTTP/1.1 200 OK", content_type="text/html",
+    payload_digest="sha1:AAAA"):
+    ''' @return the bytes of an uncompressed WARC record, with an HTTP response block for `response` / `revisit` records '''
+
+    if record_type == constants.WARC_RECORD_TYPE_RESOURCE:
+        block = payload
+        block_content_type = content_type
+    else:
+        block = f"{http_status_line}\r\nContent-Type: {content_type}; charset=utf-8\r\n\r\n".encode("utf-8") + payload
+        block_content_type = "application/http; msgtype=response"
+
+    header_list = [
+        "WARC/1.0",
+        f"WARC-Type: {record_type}",
+        f"WARC-Target-URI: <{url}>",
+        f"WARC-Date: {warc_date}",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, url + warc_date)}>",
+        f"WARC-Payload-Digest: {payload_digest}",
+        f"Content-Type: {block_content_type}",
+        f"Content-Length: {len(block)}",
+    ]
+
+    return ("\r\n".join(header_list) + "\r\n\r\n").encode("utf-8") + block + b"\r\n\r\n"
+
+
+def build_warcinfo_record():
+
+    block = b"software: wpull 2.0.1\r\n"
+    return (f"WARC/1.0\r\nWARC-Type: warcinfo\r\nContent-Type: application/warc-fields\r\nContent-Length: {len(block)}\r\n\r\n"
+        .encode("utf-8")) + block + b"\r\n\r\n"
+
+
+def write_warc(warc_path, record_list):
+    ''' writes the records to a WARC, one gzip member per record if the name ends with `.gz`
+
+    @return a list of `(offset, length)` of every record in the file
+    '''
+
+    result = []
+    offset = 0
+
+    warc_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(warc_path, "wb") as f:
+        for iter_record in record_list:
+            iter_bytes = gzip.compress(iter_record) if warc_path.name.endswith(".gz") else iter_record
+            f.write(iter_bytes)
+            result.append((offset, len(iter_bytes)))
+            offset += len(iter_bytes)
+
+    return result
+
+
+DAY_ONE_RECORD_LIST = [
+    build_warcinfo_record(),
+    build_warc_record(constants.WARC_RECORD_TYPE_RESPONSE, "https://www.example.com/", "2021-01-15T00:00:01Z", b"<html>hi</html>"),
+    build_warc_record(constants.WARC_RECORD_TYPE_RESPONSE, "https://static-cdn.jtvnw.net/emoticons/v1/88/1.0", "2021-01-15T00:00:02Z",
+        b"\x89PNG", content_type="image/png", payload_digest="sha1:BBBB"),
+    build_warc_record(constants.WARC_RECORD_TYPE_RESPONSE, "https://example.com/missing", "2021-01-15T00:00:03Z", b"nope",
+        http_status_line="HTTP/1.1 404 Not Found"),
+]
+
+DAY_TWO_RECORD_LIST = [
+    build_warc_record(constants.WARC_RECORD_TYPE_REVISIT, "https://example.com/", "2021-01-16T00:00:01Z", b""),
+    build_warc_record(constants.WARC_RECORD_TYPE_RESOURCE, "https://example.com/video.mp4", "2021-01-16T00:00:02Z", b"video",
+        content_type="video/mp4", payload_digest="sha1:CCCC"),
+]
+
+
+@pytest.mark.parametrize("url,expected_surt", [
+    ("https://www.Example.com/a?b=1&a=2", "com,example)/a?a=2&b=1"),
+    ("http://example.com", "com,example)/"),
+    ("HTTP://EXAMPLE.COM/Path/To/Page.html", "com,example)/path/to/page.html"),
+    ("https://static-cdn.jtvnw.net/emoticons/v1/88/1.0", "net,jtvnw,static-cdn)/emoticons/v1/88/1.0"),
+    ("http://example.com:80/", "com,example)/"),
+    ("https://example.com:443/", "com,example)/"),
+    ("http://example.com:8080/", "com,example:8080)/"),
+    ("http://127.0.0.1:8780/index.html", "127.0.0.1:8780)/index.html"),
+    ("http://10.0.0.1/", "10.0.0.1)/"),
+    ("  https://twitter.com/example_streamer  ", "com,twitter)/example_streamer"),
+])
+def test_surt_url(url, expected_surt):
+
+    assert warc.surt_url(url) == expected_surt
+
+
+@pytest.mark.parametrize("warc_file_name", ["day.warc", "day.warc.gz"])
+def test_record_offsets_and_lengths(tmp_path, warc_file_name):
+
+    warc_path = tmp_path / warc_file_name
+    offset_length_list = write_warc(warc_path, DAY_ONE_RECORD_LIST)
+
+    assert [(iter_offset, iter_length) for iter_offset, iter_length, _ in warc.iter_warc_record_heads(warc_path)] == offset_length_list
+
+    # every entry points at exactly its own record, the warcinfo record doesn't get indexed
+    data = warc_path.read_bytes()
+    entry_list = list(warc.iter_warc_index_entries(warc_path))
+
+    assert [iter_entry.url for iter_entry in entry_list] == [
+        "https://www.example.com/", "https://static-cdn.jtvnw.net/emoticons/v1/88/1.0", "https://example.com/missing"]
+
+    for iter_entry, iter_record in zip(entry_list, DAY_ONE_RECORD_LIST[1:]):
+        iter_bytes = data[iter_entry.offset:iter_entry.offset + iter_entry.length]
+        assert (gzip.decompress(iter_bytes) if warc_file_name.endswith(".gz") else iter_bytes) == iter_record
+
+
+def test_gzip_records_bigger_than_the_read_chunk(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(constants, "WARC_INDEX_READ_CHUNK_BYTES", 64)
+    monkeypatch.setattr(constants, "WARC_INDEX_HEAD_BYTES", 512)
+
+    # random bytes don't compress, so every gzip member is a lot of chunks
+    record_list = [
+        build_warc_record(constants.WARC_RECORD_TYPE_RESPONSE, f"https://example.com/{idx}", "2021-01-15T00:00:01Z", os.urandom(5000))
+        for idx in range(3)]
+    warc_path = tmp_path / "day.warc.gz"
+    offset_length_list = write_warc(warc_path, record_list)
+
+    head_list = list(warc.iter_warc_record_heads(warc_path))
+
+    assert [(iter_offset, iter_length) for iter_offset, iter_length, _ in head_list] == offset_length_list
+    assert [iter_head for _, _, iter_head in head_list] == [iter_record[:512] for iter_record in record_list]
+
+
+def test_index_entry_fields(tmp_path):
+
+    warc_path = tmp_path / "day.warc.gz"
+    write_warc(warc_path, DAY_ONE_RECORD_LIST + DAY_TWO_RECORD_LIST)
+
+    entry_dict = {iter_entry.url: iter_entry for iter_entry in warc.iter_warc_index_entries(warc_path)}
+
+    png_entry = entry_dict["https://static-cdn.jtvnw.net/emoticons/v1/88/1.0"]
+    assert (png_entry.surt, png_entry.timestamp, png_entry.mime, png_entry.status, png_entry.digest, png_entry.filename) == (
+        "net,jtvnw,static-cdn)/emoticons/v1/88/1.0", "20210115000002", "image/png", "200", "BBBB", "day.warc.gz")
+
+    assert entry_dict["https://example.com/missing"].status == "404"
+    assert (entry_dict["https://example.com/"].mime, entry_dict["https://example.com/"].status) == ("warc/revisit", "200")
+    assert (entry_dict["https://example.com/video.mp4"].mime, entry_dict["https://example.com/video.mp4"].status) == ("video/mp4", "-")
+
+
+def test_an_uncompressed_warc_that_is_not_a_warc_is_an_error(tmp_path):
+
+    warc_path = tmp_path / "day.warc"
+    warc_path.write_bytes(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+
+    with pytest.raises(Exception, match="is not a WARC record"):
+        list(warc.iter_warc_index_entries(warc_path))
+
+
+def _build_two_day_tree(root_folder):
+
+    write_warc(root_folder / "2021-01-15" / constants.DAY_WARC_FOLDER_NAME / "2021-01-15.warc.gz", DAY_ONE_RECORD_LIST)
+    write_warc(root_folder / "2021-01-16" / constants.DAY_WARC_FOLDER_NAME / "2021-01-16.warc", DAY_TWO_RECORD_LIST)
+
+    return warc.build_merged_cdxj_index(root_folder)
+
+
+def test_merged_index_is_sorted_and_points_at_every_day(tmp_path):
+
+    assert _build_two_day_tree(tmp_path) == 5
+
+    line_list = (tmp_path / constants.MERGED_CDXJ_INDEX_FILE_NAME).read_text(encoding="utf-8").splitlines()
+
+    assert line_list == sorted(line_list)
+    assert [iter_line.split(" ", 2)[:2] for iter_line in line_list] == [
+        ["com,example)/", "20210115000001"],
+        ["com,example)/", "20210116000001"],
+        ["com,example)/missing", "20210115000003"],
+        ["com,example)/video.mp4", "20210116000002"],
+        ["net,jtvnw,static-cdn)/emoticons/v1/88/1.0", "20210115000002"],
+    ]
+
+    # the filenames are relative to the root output folder, and the offsets still point at the record
+    for iter_line in line_list:
+        iter_json_dict = json.loads(iter_line.split(" ", 2)[2])
+        iter_data = (tmp_path / iter_json_dict["filename"]).read_bytes()
+        iter_bytes = iter_data[int(iter_json_dict["offset"]):int(iter_json_dict["offset"]) + int(iter_json_dict["length"])]
+        if iter_json_dict["filename"].endswith(".gz"):
+            iter_bytes = zlib.decompress(iter_bytes, constants.GZIP_ZLIB_WBITS)
+        assert iter_bytes.startswith(b"WARC/1.0\r\n")
+        assert f"WARC-Target-URI: <{iter_json_dict['url']}>".encode("utf-8") in iter_bytes
+
+    assert json.loads(line_list[3].split(" ", 2)[2])["filename"] == "2021-01-16/warc/2021-01-16.warc"
+
+
+def test_lookup_finds_every_capture_of_a_url(tmp_path):
+
+    _build_two_day_tree(tmp_path)
+    index_path = tmp_path / constants.MERGED_CDXJ_INDEX_FILE_NAME
+
+    # the www. and the port don't matter, the captures come back oldest first
+    line_list = warc.lookup_cdxj_index(index_path, "http://www.example.com:80/")
+    assert [iter_line.split(" ", 2)[1] for iter_line in line_list] == ["20210115000001", "20210116000001"]
+
+    assert len(warc.lookup_cdxj_index(index_path, "https://example.com/", from_timestamp="20210116")) == 1
+    assert len(warc.lookup_cdxj_index(index_path, "https://example.com/", to_timestamp="20210115")) == 1
+    assert len(warc.lookup_cdxj_index(index_path, "https://example.com/", from_timestamp="2022")) == 0
+
+
+@pytest.mark.parametrize("url", [
+    # sorts before every entry
+    "https://aaa.com/",
+    # sorts in between entries
+    "https://example.com/not-archived",
+    # a prefix of a url that is in the index
+    "https://example.com/video",
+    # sorts after every entry
+    "https://zzz.org/",
+])
+def test_lookup_of_a_url_that_is_not_in_the_index(tmp_path, url):
+
+    _build_two_day_tree(tmp_path)
+
+    assert warc.lookup_cdxj_index(tmp_path / constants.MERGED_CDXJ_INDEX_FILE_NAME, url) == []
+
+
+def test_lookup_of_the_first_and_last_entries(tmp_path):
+
+    _build_two_day_tree(tmp_path)
+    index_path = tmp_path / constants.MERGED_CDXJ_INDEX_FILE_NAME
+
+    assert len(warc.lookup_cdxj_index(index_path, "https://example.com/")) == 2
+    assert len(warc.lookup_cdxj_index(index_path, "https://static-cdn.jtvnw.net/emoticons/v1/88/1.0")) == 1
+
+
+def test_lookup_in_an_empty_index(tmp_path):
+
+    index_path = tmp_path / constants.MERGED_CDXJ_INDEX_FILE_NAME
+    index_path.write_bytes(b"")
+
+    assert warc.lookup_cdxj_index(index_path, "https://example.com/") == []
@@ -0,0 +1,218 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+
+import pytest
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import warc_verify as warc_verify
+
+PAYLOAD = b"<html>the pogchamp emote</html>"
+
+
+def _sha1_digest(data):
+
+    return "sha1:" + base64.b32encode(hashlib.sha1(data).digest()).decode("ascii")
+
+
+def build_warc_record(url, payload, record_type=constants.WARC_RECORD_TYPE_RESPONSE, digest_payload=None):
+    ''' @return the bytes of an uncompressed response record with a correct block and payload digest
+
+    @param digest_payload - if not None, the digests are of this payload instead of `payload`, so they don't match
+    '''
+
+    http_headers = b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n"
+    block = http_headers + payload
+    digest_block = http_headers + (payload if digest_payload is None else digest_payload)
+
+    header_list = [
+        "WARC/1.0",
+        f"WARC-Type: {record_type}",
+        f"WARC-Target-URI: <{url}>",
+        "WARC-Date: 2021-01-15T00:00:00Z",
+        f"WARC-Record-ID: <urn:uuid:{hashlib.md5(url.encode('utf-8')).hexdigest()}>",
+        f"WARC-Block-Digest: {_sha1_digest(digest_block)}",
+        f"WARC-Payload-Digest: {_sha1_digest(payload if digest_payload is None else digest_payload)}",
+        "Content-Type: application/http; msgtype=response",
+        f"Content-Length: {len(block)}",
+    ]
+
+    return ("\r\n".join(header_list) + "\r\n\r\n").encode("utf-8") + block + b"\r\n\r\n"
+
+
+RECORD_LIST = [build_warc_record(f"https://example.com/{idx}", PAYLOAD) for idx in range(3)]
+
+
+def write_warc(warc_path, record_list):
+    ''' @return the list of `(offset, length)` of every record (gzip member for a `.gz`) in the file '''
+
+    result = []
+    offset = 0
+
+    warc_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(warc_path, "wb") as f:
+        for iter_record in record_list:
+            iter_bytes = gzip.compress(iter_record) if warc_path.name.endswith(".gz") else iter_record
+            f.write(iter_bytes)
+            result.append((offset, len(iter_bytes)))
+            offset += len(iter_bytes)
+
+    return result
+
+
+def _flip_byte(path, position):
+
+    data = bytearray(path.read_bytes())
+    data[position] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+
+@pytest.mark.parametrize("warc_file_name", ["day.warc", "day.warc.gz"])
+def test_a_good_warc_has_no_problems(tmp_path, warc_file_name):
+
+    warc_path = tmp_path / warc_file_name
+    write_warc(warc_path, RECORD_LIST)
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert result.problem_list == []
+    assert not result.truncated
+    assert result.num_records == 3
+    assert result.num_digests_checked == 6
+
+
+def test_a_good_warc_fed_one_byte_at_a_time_has_no_problems():
+
+    checker = warc_verify.WarcRecordStreamChecker("day.warc")
+
+    for iter_byte in b"".join(RECORD_LIST):
+        checker.feed(bytes([iter_byte]))
+    checker.finish()
+
+    assert checker.problem_list == []
+    assert checker.num_records == 3
+
+
+def test_a_flipped_byte_is_a_digest_mismatch(tmp_path):
+
+    warc_path = tmp_path / "day.warc"
+    offset_length_list = write_warc(warc_path, RECORD_LIST)
+
+    # a byte of the second record's payload
+    second_offset, second_length = offset_length_list[1]
+    _flip_byte(warc_path, second_offset + second_length - 4 - len(PAYLOAD) // 2)
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert not result.truncated
+    assert result.num_records == 3
+    assert len(result.problem_list) == 2
+    assert "`WARC-Block-Digest` of the record `<urn:uuid:" in result.problem_list[0]
+    assert f"at uncompressed offset `{second_offset}` doesn't match" in result.problem_list[0]
+    assert "`WARC-Payload-Digest`" in result.problem_list[1]
+
+
+def test_a_digest_mismatch_inside_a_good_gzip_member(tmp_path):
+
+    warc_path = tmp_path / "day.warc.gz"
+    write_warc(warc_path, [RECORD_LIST[0], build_warc_record("https://example.com/changed", PAYLOAD, digest_payload=b"something else")])
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert result.num_records == 2
+    assert [iter_problem.split("`")[1] for iter_problem in result.problem_list] == ["WARC-Block-Digest", "WARC-Payload-Digest"]
+
+
+def test_a_revisit_payload_digest_is_not_checked(tmp_path):
+
+    # a revisit's payload digest is the one of the record it points at, and it has no payload of its own
+    warc_path = tmp_path / "day.warc"
+    write_warc(warc_path, [build_warc_record("https://example.com/", b"", record_type=constants.WARC_RECORD_TYPE_REVISIT,
+        digest_payload=PAYLOAD)])
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert result.num_digests_checked == 1
+    assert [iter_problem.split("`")[1] for iter_problem in result.problem_list] == ["WARC-Block-Digest"]
+
+
+@pytest.mark.parametrize("num_bytes_cut", [1, 8, 30])
+def test_a_cut_off_gzip_warc_is_truncated(tmp_path, num_bytes_cut):
+
+    warc_path = tmp_path / "day.warc.gz"
+    write_warc(warc_path, RECORD_LIST)
+    warc_path.write_bytes(warc_path.read_bytes()[:-num_bytes_cut])
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert result.truncated
+    # cutting off only (part of) the 8 byte gzip trailer still leaves all of the last record
+    assert result.num_records == (3 if num_bytes_cut <= 8 else 2)
+    assert "ends in the middle of the gzip member" in result.problem_list[0]
+
+
+def test_a_cut_off_uncompressed_warc_is_truncated(tmp_path):
+
+    warc_path = tmp_path / "day.warc"
+    write_warc(warc_path, RECORD_LIST)
+    warc_path.write_bytes(warc_path.read_bytes()[:-20])
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert result.truncated
+    assert result.num_records == 2
+    assert "ends in the middle of the record" in result.problem_list[0]
+
+
+@pytest.mark.parametrize("position_in_member", [
+    # the gzip magic number
+    0,
+    # the CRC32 in the gzip trailer
+    -6,
+], ids=["header", "crc32"])
+def test_a_corrupt_gzip_member_is_a_problem_and_not_a_crash(tmp_path, position_in_member):
+
+    warc_path = tmp_path / "day.warc.gz"
+    offset_length_list = write_warc(warc_path, RECORD_LIST)
+
+    second_offset, second_length = offset_length_list[1]
+    _flip_byte(warc_path, second_offset + position_in_member if position_in_member >= 0 else second_offset + second_length + position_in_member)
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert not result.truncated
+    assert len(result.problem_list) == 1
+    assert result.problem_list[0].startswith("corrupt gzip data in `day.warc.gz`")
+
+
+def test_something_that_is_not_a_warc_is_a_problem_and_not_a_crash(tmp_path):
+
+    warc_path = tmp_path / "day.warc"
+    warc_path.write_bytes(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+
+    result = warc_verify.verify_warc(warc_path)
+
+    assert len(result.problem_list) == 1
+    assert "is not a WARC record" in result.problem_list[0]
+
+
+def test_run_verify_command_reports_every_warc(tmp_path):
+
+    write_warc(tmp_path / "2021-01-15" / constants.DAY_WARC_FOLDER_NAME / "good.warc.gz", RECORD_LIST)
+    truncated_path = tmp_path / "2021-01-16" / constants.DAY_WARC_FOLDER_NAME / "truncated.warc.gz"
+    write_warc(truncated_path, RECORD_LIST)
+    truncated_path.write_bytes(truncated_path.read_bytes()[:-10])
+
+    assert warc_verify.run_verify_command(argparse.Namespace(root_output_folder=tmp_path, verify_workers=2)) == 1
+
+    report_path_list = list(tmp_path.glob(constants.VERIFY_REPORT_FILE_FORMAT.format("*")))
+    assert len(report_path_list) == 1
+
+    with open(report_path_list[0], "r", encoding="utf-8") as f:
+        report_dict = json.load(f)
+
+    assert (report_dict["total"], report_dict["ok"], report_dict["failed"], report_dict["truncated"]) == (2, 1, 1, 1)
+    assert [iter_warc["truncated"] for iter_warc in report_dict["warcs"]] == [False, True]
@@ -0,0 +1,185 @@
+import gzip
+import os
+import struct
+
+import pytest
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import warc_zstd as warc_zstd
+
+zstandard = pytest.importorskip("zstandard")
+
+LEVEL = 3
+
+
+def build_warc_record(idx):
+    ''' @return the bytes of an uncompressed response record, the records only differ in their url and payload '''
+
+    block = b"HTTP/1.1 200 OK\r\nContent-Type: image/png\r\n\r\n" + f"emote number {idx}".encode("utf-8") * 20
+
+    header_list = [
+        "WARC/1.0",
+        "WARC-Type: response",
+        f"WARC-Target-URI: <https://static-cdn.jtvnw.net/emoticons/v1/{idx}/1.0>",
+        "WARC-Date: 2021-01-15T00:00:00Z",
+        f"WARC-Record-ID: <urn:uuid:00000000-0000-0000-0000-{idx:012d}>",
+        "Content-Type: application/http; msgtype=response",
+        f"Content-Length: {len(block)}",
+    ]
+
+    return ("\r\n".join(header_list) + "\r\n\r\n").encode("utf-8") + block + b"\r\n\r\n"
+
+
+RECORD_LIST = [build_warc_record(idx) for idx in range(3)]
+
+
+def write_warc(warc_path, record_list):
+    ''' writes the records to a WARC, one gzip member per record if the name ends with `.gz` '''
+
+    warc_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(warc_path, "wb") as f:
+        for iter_record in record_list:
+            f.write(gzip.compress(iter_record) if warc_path.name.endswith(".gz") else iter_record)
+
+    return warc_path
+
+
+def _read_zstd_frame_list(zstd_path):
+    ''' @return the decompressed bytes of every zstd frame after the dictionary, one entry per frame '''
+
+    dictionary, offset = warc_zstd.read_warc_zstd_dictionary(zstd_path)
+    dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None
+    data = zstd_path.read_bytes()[offset:]
+
+    result = []
+    while data:
+        decompress_obj = zstandard.ZstdDecompressor(dict_data=dict_data).decompressobj()
+        result.append(decompress_obj.decompress(data))
+        data = decompress_obj.unused_data
+
+    return result
+
+
+@pytest.mark.parametrize("dictionary", [None, b"WARC/1.0\r\nWARC-Type: response\r\nContent-Type: image/png\r\n" * 10],
+    ids=["no_dictionary", "dictionary"])
+@pytest.mark.parametrize("warc_file_name", ["day.warc", "day.warc.gz"])
+def test_recompress_warc_round_trip(tmp_path, warc_file_name, dictionary):
+
+    warc_path = write_warc(tmp_path / warc_file_name, RECORD_LIST)
+
+    result = warc_zstd.recompress_warc(warc_path, dictionary, LEVEL)
+
+    zstd_path = tmp_path / "day.warc.zst"
+    assert result.zstd_path == str(zstd_path)
+    assert (result.num_records, result.used_dictionary) == (3, dictionary is not None)
+    assert (result.input_bytes, result.output_bytes) == (warc_path.stat().st_size, zstd_path.stat().st_size)
+    assert not zstd_path.with_name(f"{zstd_path.name}{constants.ZSTD_TEMP_FILE_SUFFIX}").exists()
+
+    # the dictionary is in a skippable frame at the start, and every record is in its own frame
+    assert warc_zstd.read_warc_zstd_dictionary(zstd_path)[0] == dictionary
+    assert (struct.unpack("<I", zstd_path.read_bytes()[:4])[0] == constants.ZSTD_SKIPPABLE_FRAME_MAGIC) == (dictionary is not None)
+    assert _read_zstd_frame_list(zstd_path) == RECORD_LIST
+
+    assert b"".join(warc_zstd.iter_warc_zstd_chunks(zstd_path)) == b"".join(RECORD_LIST)
+
+
+def test_recompress_an_empty_warc(tmp_path):
+
+    warc_path = write_warc(tmp_path / "day.warc.gz", [])
+
+    result = warc_zstd.recompress_warc(warc_path, None, LEVEL)
+
+    assert result.num_records == 0
+    assert b"".join(warc_zstd.iter_warc_zstd_chunks(tmp_path / "day.warc.zst")) == b""
+
+
+def test_recompressing_a_truncated_warc_leaves_no_zstd_file(tmp_path):
+
+    warc_path = write_warc(tmp_path / "day.warc.gz", RECORD_LIST)
+    warc_path.write_bytes(warc_path.read_bytes()[:-30])
+
+    with pytest.raises(Exception, match="ends in the middle of the gzip member"):
+        warc_zstd.recompress_warc(warc_path, None, LEVEL)
+
+    assert sorted(iter_path.name for iter_path in tmp_path.iterdir()) == ["day.warc.gz"]
+
+
+def test_get_or_train_dictionary_trains_once_and_then_reuses_it(tmp_path):
+
+    # enough records for zstd to have something to train on
+    write_warc(tmp_path / "2021-01-15" / constants.DAY_WARC_FOLDER_NAME / "day.warc.gz", [build_warc_record(idx) for idx in range(500)])
+
+    dictionary = warc_zstd.get_or_train_dictionary(tmp_path)
+
+    assert dictionary is not None
+    assert (tmp_path / constants.ZSTD_DICTIONARY_FILE_NAME).read_bytes() == dictionary
+
+    (tmp_path / constants.ZSTD_DICTIONARY_FILE_NAME).write_bytes(b"the saved dictionary")
+    assert warc_zstd.get_or_train_dictionary(tmp_path) == b"the saved dictionary"
+    assert warc_zstd.get_or_train_dictionary(tmp_path, retrain=True) != b"the saved dictionary"
+
+
+def test_get_or_train_dictionary_without_enough_records(tmp_path):
+
+    write_warc(tmp_path / "2021-01-15" / constants.DAY_WARC_FOLDER_NAME / "day.warc.gz", RECORD_LIST[:1])
+
+    assert warc_zstd.get_or_train_dictionary(tmp_path) is None
+    assert not (tmp_path / constants.ZSTD_DICTIONARY_FILE_NAME).exists()
+
+
+@pytest.mark.parametrize("warc_file_name,expected_zstd_file_name", [
+    ("day.warc.gz", "day.warc.zst"),
+    ("day.warc", "day.warc.zst"),
+    ("day-00001.warc.gz", "day-00001.warc.zst"),
+])
+def test_get_zstd_warc_path(tmp_path, warc_file_name, expected_zstd_file_name):
+
+    assert warc_zstd.get_zstd_warc_path(tmp_path / warc_file_name) == tmp_path / expected_zstd_file_name
+
+
+def test_recompress_warcs_skips_a_warc_that_would_overwrite_another_ones_zstd_file(tmp_path):
+
+    gzip_warc_path = write_warc(tmp_path / "day.warc.gz", RECORD_LIST)
+    plain_warc_path = write_warc(tmp_path / "day.warc", RECORD_LIST[:1])
+
+    result_list, num_failed = warc_zstd.recompress_warcs([gzip_warc_path, plain_warc_path], None, LEVEL, max_workers=2)
+
+    assert num_failed == 0
+    assert [(iter_result.warc_path, iter_result.num_records) for iter_result in result_list] == [(str(gzip_warc_path), 3)]
+
+
+def test_recompress_warcs_only_if_stale(tmp_path):
+
+    first_warc_path = write_warc(tmp_path / "first.warc.gz", RECORD_LIST)
+    second_warc_path = write_warc(tmp_path / "second.warc.gz", RECORD_LIST)
+    warc_path_list = [first_warc_path, second_warc_path]
+
+    result_list, _ = warc_zstd.recompress_warcs(warc_path_list, None, LEVEL, max_workers=2, only_if_stale=True)
+    assert len(result_list) == 2
+
+    # both are up to date
+    assert warc_zstd.recompress_warcs(warc_path_list, None, LEVEL, max_workers=2, only_if_stale=True) == ([], 0)
+
+    # the second WARC changed after it was recompressed
+    zstd_mtime = warc_zstd.get_zstd_warc_path(second_warc_path).stat().st_mtime
+    os.utime(second_warc_path, (zstd_mtime + 10, zstd_mtime + 10))
+
+    result_list, _ = warc_zstd.recompress_warcs(warc_path_list, None, LEVEL, max_workers=2, only_if_stale=True)
+    assert [iter_result.warc_path for iter_result in result_list] == [str(second_warc_path)]
+
+    # without `only_if_stale` everything gets redone
+    result_list, _ = warc_zstd.recompress_warcs(warc_path_list, None, LEVEL, max_workers=2)
+    assert len(result_list) == 2
+
+
+def test_recompress_warcs_counts_the_failures(tmp_path):
+
+    good_warc_path = write_warc(tmp_path / "good.warc.gz", RECORD_LIST)
+    truncated_warc_path = write_warc(tmp_path / "truncated.warc.gz", RECORD_LIST)
+    truncated_warc_path.write_bytes(truncated_warc_path.read_bytes()[:-30])
+
+    result_list, num_failed = warc_zstd.recompress_warcs([good_warc_path, truncated_warc_path], None, LEVEL, max_workers=2)
+
+    assert [iter_result.warc_path for iter_result in result_list] == [str(good_warc_path)]
+    assert num_failed == 1
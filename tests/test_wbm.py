@@ -0,0 +1,320 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import utils as utils
+from archive_pogchamp_emote import wbm as wbm
+
+
+WAIT_TIMEOUT_SECONDS = 10
+
+
+class FakeClock:
+    ''' a clock for `wbm.TokenBucketRateLimiter` that only moves forward when something sleeps on it '''
+
+    def __init__(self):
+
+        self.now = 1000.0
+        self.sleep_list = []
+
+    def __call__(self):
+
+        return self.now
+
+    def sleep(self, seconds):
+
+        self.sleep_list.append(seconds)
+        self.now += seconds
+
+
+class FakeTimer:
+    ''' stands in for `threading.Timer`, it only goes off when the test calls `fire()` '''
+
+    def __init__(self, interval, function):
+
+        self.interval = interval
+        self.function = function
+        self.args = ()
+        self.daemon = False
+        self.started = False
+        self.cancelled = False
+
+    def start(self):
+
+        self.started = True
+
+    def cancel(self):
+
+        self.cancelled = True
+
+    def fire(self):
+
+        self.function(*self.args)
+
+
+class FakeTimerFactory:
+    ''' the `timer_factory` for `wbm.WbmSaveScheduler`, keeps every timer it made '''
+
+    def __init__(self):
+
+        self.timer_list = []
+        self._condition = threading.Condition()
+
+    def __call__(self, interval, function):
+
+        timer = FakeTimer(interval, function)
+        with self._condition:
+            self.timer_list.append(timer)
+            self._condition.notify_all()
+        return timer
+
+    def wait_for_timer(self, count):
+        ''' @return the `count`th timer, waiting for the scheduler to make it '''
+
+        with self._condition:
+            assert self._condition.wait_for(lambda: len(self.timer_list) >= count, WAIT_TIMEOUT_SECONDS)
+            return self.timer_list[count - 1]
+
+
+class LowestJitterRandom:
+    ''' the `random_source` for `wbm.WbmSaveScheduler`, always picks the shortest delay and keeps track of the ranges it was given '''
+
+    def __init__(self):
+
+        self.range_list = []
+
+    def uniform(self, a, b):
+
+        self.range_list.append((a, b))
+        return a
+
+
+class FailingSave:
+    ''' stands in for `utils.attempt_save_archive_of_webpage_in_wbm`, fails every attempt '''
+
+    def __init__(self, is_hashflags=False):
+
+        self.is_hashflags = is_hashflags
+        self.attempt_count = 0
+
+    def __call__(self, url, rate_limiter=None, http_session=None):
+
+        self.attempt_count += 1
+        raise utils.WbmRetryableError(f"attempt {self.attempt_count} failed", is_hashflags=self.is_hashflags)
+
+
+BACKOFF_POLICY = model.BackoffPolicy(base_seconds=10, multiplier=2, max_seconds=30, jitter_fraction=0.5)
+HASHFLAGS_BACKOFF_POLICY = model.BackoffPolicy(base_seconds=100, multiplier=2, max_seconds=1000, jitter_fraction=0.25)
+
+SAVE_REQUEST = model.WbmSaveRequest(url="https://example.com", idx=1, total=1)
+
+
+def _make_scheduler(timer_factory, random_source, max_attempts):
+
+    return wbm.WbmSaveScheduler(1, rate_limiter=None, backoff_policy=BACKOFF_POLICY, hashflags_backoff_policy=HASHFLAGS_BACKOFF_POLICY,
+        max_attempts=max_attempts, timer_factory=timer_factory, random_source=random_source)
+
+
+def test_token_bucket_starts_full_and_then_waits_for_a_refill():
+
+    clock = FakeClock()
+    bucket = wbm.TokenBucketRateLimiter(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleep_list == []
+
+    # empty, the next token shows up after 1 / rate seconds
+    bucket.acquire()
+    assert clock.sleep_list == [pytest.approx(0.5)]
+
+
+def test_token_bucket_refills_over_time_up_to_capacity():
+
+    clock = FakeClock()
+    bucket = wbm.TokenBucketRateLimiter(rate=1, capacity=2, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    bucket.acquire()
+
+    # a long time passes, but the bucket only holds `capacity` tokens
+    clock.now += 60
+
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleep_list == []
+
+    bucket.acquire()
+    assert clock.sleep_list == [pytest.approx(1.0)]
+
+
+def test_token_bucket_counts_partial_refills():
+
+    clock = FakeClock()
+    bucket = wbm.TokenBucketRateLimiter(rate=4, capacity=1, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    clock.now += 0.1
+
+    # 0.4 of a token came back, so only the remaining 0.6 of a token is waited for
+    bucket.acquire()
+    assert clock.sleep_list == [pytest.approx(0.15)]
+
+
+def test_token_bucket_rejects_bad_arguments():
+
+    with pytest.raises(ValueError):
+        wbm.TokenBucketRateLimiter(rate=0, capacity=1)
+
+    with pytest.raises(ValueError):
+        wbm.TokenBucketRateLimiter(rate=1, capacity=0)
+
+
+def test_per_host_rate_limiter_limits_each_host_separately():
+
+    clock = FakeClock()
+    rate_limiter = wbm.PerHostRateLimiter(rate=1, capacity=1, clock=clock, sleep=clock.sleep)
+
+    # each host gets its own full bucket
+    rate_limiter.acquire("web.archive.org")
+    rate_limiter.acquire("example.com")
+    assert clock.sleep_list == []
+
+    # emptying one host's bucket doesn't touch the other one
+    rate_limiter.acquire("web.archive.org")
+    assert clock.sleep_list == [pytest.approx(1.0)]
+
+    clock.now += 1
+    rate_limiter.acquire("example.com")
+    assert clock.sleep_list == [pytest.approx(1.0)]
+
+
+def test_save_urls_in_wbm_concurrently_returns_results_in_submit_order(monkeypatch):
+
+    url_list = [f"https://example.com/{idx}" for idx in range(4)]
+    finished_url_list = []
+    finished_lock = threading.Lock()
+    everything_else_finished = threading.Event()
+
+    def _fake_attempt_save(url, rate_limiter=None, http_session=None):
+
+        # the first url finishes last, after all of the others
+        if url == url_list[0]:
+            assert everything_else_finished.wait(10)
+        else:
+            with finished_lock:
+                finished_url_list.append(url)
+                if len(finished_url_list) == len(url_list) - 1:
+                    everything_else_finished.set()
+
+        return f"https://web.archive.org/web/20210115000000/{url}"
+
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", _fake_attempt_save)
+
+    save_request_list = [model.WbmSaveRequest(url=iter_url, idx=idx, total=len(url_list))
+        for idx, iter_url in enumerate(url_list, start=1)]
+
+    archive_url_list = wbm.save_urls_in_wbm_concurrently(save_request_list, max_workers=len(url_list), rate_limiter=None)
+
+    assert archive_url_list == [f"https://web.archive.org/web/20210115000000/{iter_url}" for iter_url in url_list]
+
+
+def test_save_urls_in_wbm_concurrently_dry_run_does_not_save_anything(monkeypatch):
+
+    failing_save = FailingSave()
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", failing_save)
+
+    save_request_list = [model.WbmSaveRequest(url=f"https://example.com/{idx}", idx=idx, total=2) for idx in range(1, 3)]
+
+    assert wbm.save_urls_in_wbm_concurrently(save_request_list, max_workers=2, rate_limiter=None, dry_run=True) == [None, None]
+    assert failing_save.attempt_count == 0
+
+
+def test_scheduler_retries_with_jittered_exponential_backoff(monkeypatch):
+
+    failing_save = FailingSave()
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", failing_save)
+
+    timer_factory = FakeTimerFactory()
+    random_source = LowestJitterRandom()
+    scheduler = _make_scheduler(timer_factory, random_source, max_attempts=4)
+
+    result_future = scheduler.submit(SAVE_REQUEST)
+
+    for iter_timer_count in range(1, 4):
+        iter_timer = timer_factory.wait_for_timer(iter_timer_count)
+        assert iter_timer.started
+        iter_timer.fire()
+
+    with pytest.raises(Exception):
+        result_future.result(WAIT_TIMEOUT_SECONDS)
+    scheduler.shutdown()
+
+    # 10, 20 and then capped at 30, each one can be up to `jitter_fraction` shorter
+    assert random_source.range_list == [(5, 10), (10, 20), (15, 30)]
+    assert [iter_timer.interval for iter_timer in timer_factory.timer_list] == [5, 10, 15]
+
+
+def test_scheduler_uses_the_hashflags_backoff_for_hashflags_urls(monkeypatch):
+
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", FailingSave(is_hashflags=True))
+
+    timer_factory = FakeTimerFactory()
+    random_source = LowestJitterRandom()
+    scheduler = _make_scheduler(timer_factory, random_source, max_attempts=2)
+
+    result_future = scheduler.submit(SAVE_REQUEST)
+    timer_factory.wait_for_timer(1).fire()
+
+    with pytest.raises(Exception):
+        result_future.result(WAIT_TIMEOUT_SECONDS)
+    scheduler.shutdown()
+
+    assert random_source.range_list == [(75, 100)]
+
+
+def test_scheduler_gives_up_after_the_last_attempt(monkeypatch):
+
+    failing_save = FailingSave()
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", failing_save)
+
+    timer_factory = FakeTimerFactory()
+    scheduler = _make_scheduler(timer_factory, LowestJitterRandom(), max_attempts=3)
+
+    result_future = scheduler.submit(SAVE_REQUEST)
+    timer_factory.wait_for_timer(1).fire()
+    timer_factory.wait_for_timer(2).fire()
+
+    with pytest.raises(Exception) as exc_info:
+        result_future.result(WAIT_TIMEOUT_SECONDS)
+    scheduler.shutdown()
+
+    # no timer after the last attempt, and every attempt's error is in the exception
+    assert failing_save.attempt_count == 3
+    assert len(timer_factory.timer_list) == 2
+    for iter_attempt in range(1, 4):
+        assert f"attempt {iter_attempt} failed" in str(exc_info.value)
+
+
+def test_scheduler_shutdown_cancels_a_pending_retry(monkeypatch):
+
+    failing_save = FailingSave()
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", failing_save)
+
+    timer_factory = FakeTimerFactory()
+    scheduler = _make_scheduler(timer_factory, LowestJitterRandom(), max_attempts=3)
+
+    result_future = scheduler.submit(SAVE_REQUEST)
+    pending_timer = timer_factory.wait_for_timer(1)
+
+    scheduler.shutdown(cancel=True)
+
+    assert pending_timer.cancelled
+    with pytest.raises(concurrent.futures.CancelledError):
+        result_future.result(WAIT_TIMEOUT_SECONDS)
+
+    # a timer that goes off anyway (it was already running when it got cancelled) doesn't start another attempt
+    pending_timer.fire()
+    assert failing_save.attempt_count == 1
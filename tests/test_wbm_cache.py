@@ -0,0 +1,116 @@
+import sqlite3
+
+import arrow
+import pytest
+
+from archive_pogchamp_emote import wbm_cache as wbm_cache
+
+URL = "https://twitter.com/example_streamer"
+OTHER_URL = "https://example.com/only-on-the-first-day"
+
+NOW = arrow.get("2021-01-16T12:00:00+00:00")
+
+FRESHNESS_SECONDS = 24 * 60 * 60
+MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+
+
+def _archive_url(url, capture_time):
+
+    return f"https://web.archive.org/web/{capture_time.format('YYYYMMDDHHmmss')}/{url}"
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+
+    monkeypatch.setattr(wbm_cache.arrow, "utcnow", lambda: NOW)
+
+
+@pytest.fixture
+def database_path(tmp_path):
+
+    return tmp_path / "wbm_cache.sqlite3"
+
+
+@pytest.fixture
+def cache(database_path):
+
+    result = wbm_cache.WbmResultCache(database_path, freshness_seconds=FRESHNESS_SECONDS, max_age_seconds=MAX_AGE_SECONDS)
+
+    try:
+        yield result
+    finally:
+        result.close()
+
+
+def _cached_url_list(database_path):
+
+    connection = sqlite3.connect(str(database_path))
+
+    try:
+        return [iter_row[0] for iter_row in connection.execute("SELECT url FROM wbm_results ORDER BY url")]
+    finally:
+        connection.close()
+
+
+def test_a_fresh_capture_is_a_hit(cache):
+
+    archive_url = _archive_url(URL, NOW.shift(hours=-1))
+    cache.put(URL, archive_url)
+
+    entry = cache.get(URL)
+
+    assert (entry.url, entry.archive_url, entry.capture_timestamp) == (URL, archive_url, NOW.shift(hours=-1))
+    assert cache.get(OTHER_URL) is None
+
+
+def test_a_stale_capture_is_a_miss_but_stays_in_the_cache(cache, database_path):
+
+    cache.put(URL, _archive_url(URL, NOW.shift(seconds=-FRESHNESS_SECONDS - 1)))
+
+    assert cache.get(URL) is None
+    assert _cached_url_list(database_path) == [URL]
+
+
+def test_the_cache_survives_being_reopened(cache, database_path):
+
+    archive_url = _archive_url(URL, NOW.shift(hours=-1))
+    cache.put(URL, archive_url)
+    cache.close()
+
+    reopened_cache = wbm_cache.WbmResultCache(database_path, freshness_seconds=FRESHNESS_SECONDS, max_age_seconds=MAX_AGE_SECONDS)
+
+    try:
+        assert reopened_cache.get(URL).archive_url == archive_url
+    finally:
+        reopened_cache.close()
+
+
+def test_evict_old_entries_only_deletes_the_old_entries(cache, database_path):
+
+    cache.put(URL, _archive_url(URL, NOW.shift(seconds=-MAX_AGE_SECONDS - 1)))
+    # stale, but not old enough to be deleted
+    cache.put(OTHER_URL, _archive_url(OTHER_URL, NOW.shift(seconds=-MAX_AGE_SECONDS + 1)))
+
+    assert cache.evict_old_entries() == 1
+    assert _cached_url_list(database_path) == [OTHER_URL]
+
+    assert cache.evict_old_entries() == 0
+
+
+def test_a_newer_capture_replaces_the_cached_one(cache):
+
+    cache.put(URL, _archive_url(URL, NOW.shift(days=-2)))
+    cache.put(URL, _archive_url(URL, NOW.shift(hours=-1)))
+
+    assert cache.get(URL).capture_timestamp == NOW.shift(hours=-1)
+
+
+def test_an_archive_url_without_a_timestamp_uses_the_current_time(cache):
+
+    archive_url = f"https://web.archive.org/save/{URL}"
+    cache.put(URL, archive_url)
+
+    entry = cache.get(URL)
+
+    assert entry.archive_url == archive_url
+    assert entry.capture_timestamp == NOW
@@ -0,0 +1,173 @@
+import argparse
+import json
+
+import pytest
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import utils as utils
+from archive_pogchamp_emote import wbm as wbm
+from archive_pogchamp_emote import wbm_retry as wbm_retry
+
+SHARED_URL = "https://twitter.com/example_streamer"
+OTHER_URL = "https://example.com/only-on-the-first-day"
+
+
+def _archive_url(url):
+
+    return f"https://web.archive.org/web/20210116000000/{url}"
+
+
+class StubSave:
+    ''' stands in for `utils.attempt_save_archive_of_webpage_in_wbm`, the urls in `failing_url_set` fail, the rest get saved '''
+
+    def __init__(self, failing_url_set):
+
+        self.failing_url_set = failing_url_set
+        self.saved_url_list = []
+
+    def __call__(self, url, rate_limiter=None, http_session=None):
+
+        if url in self.failing_url_set:
+            raise Exception(f"the wayback machine is down, could not save `{url}`")
+
+        self.saved_url_list.append(url)
+        return _archive_url(url)
+
+
+def _run_day(root_output_folder, emote_date, url_list):
+    ''' saves the urls like `Application.save_urls_in_wbm` does, queueing the failures, and writes the day's wbm manifest
+
+    @return the path of the day's wbm manifest
+    '''
+
+    manifest_path = root_output_folder / constants.WBM_MANIFEST_FILE_FORMAT.format(emote_date)
+    retry_queue = wbm_retry.WbmRetryQueue(root_output_folder / constants.WBM_RETRY_QUEUE_FILE_NAME)
+
+    try:
+        archive_url_list = wbm.save_urls_in_wbm_concurrently(
+            [model.WbmSaveRequest(url=iter_url, idx=idx, total=len(url_list)) for idx, iter_url in enumerate(url_list, start=1)],
+            max_workers=2, rate_limiter=None,
+            failure_callback=lambda save_request, error: retry_queue.enqueue(save_request.url, manifest_path, str(error)))
+    finally:
+        retry_queue.close()
+
+    wbm_retry.write_wbm_manifest(manifest_path, emote_date,
+        [{"url": iter_url, "warc_header_key": f"header-{idx}", "archive_url": iter_archive_url}
+            for idx, (iter_url, iter_archive_url) in enumerate(zip(url_list, archive_url_list))])
+
+    return manifest_path
+
+
+def _retry_wbm_args(root_output_folder):
+
+    return argparse.Namespace(
+        root_output_folder=root_output_folder,
+        wbm_cache_file=None,
+        wbm_cache_freshness_hours=constants.WAYBACK_MACHINE_CACHE_DEFAULT_FRESHNESS_HOURS,
+        wbm_cache_max_age_days=constants.WAYBACK_MACHINE_CACHE_DEFAULT_MAX_AGE_DAYS,
+        wbm_http_pool_size=constants.WAYBACK_MACHINE_HTTP_DEFAULT_POOL_SIZE,
+        wbm_concurrency=2,
+        wbm_rate_limit=1000,
+        wbm_rate_limit_burst=1000,
+        wbm_backoff_base_seconds=0,
+        wbm_backoff_max_seconds=0,
+        wbm_hashflags_backoff_base_seconds=0,
+        wbm_hashflags_backoff_max_seconds=0,
+        no_wbm_cdx_check=True,
+        wbm_cdx_endpoint=constants.WAYBACK_MACHINE_CDX_DEFAULT_ENDPOINT,
+        wbm_cdx_window_hours=constants.WAYBACK_MACHINE_CDX_DEFAULT_WINDOW_HOURS)
+
+
+def _read_manifest_results(manifest_path):
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return {iter_entry["url"]: iter_entry for iter_entry in json.load(f)["wbm_results"]}
+
+
+def test_failed_saves_get_retried_and_patched_into_every_day(tmp_path, monkeypatch):
+
+    # both days fail to save the shared url, the first day also fails the other url
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", StubSave({SHARED_URL, OTHER_URL}))
+    first_manifest_path = _run_day(tmp_path, "2021-01-15", [SHARED_URL, OTHER_URL])
+    second_manifest_path = _run_day(tmp_path, "2021-01-16", [SHARED_URL])
+
+    retry_queue = wbm_retry.WbmRetryQueue(tmp_path / constants.WBM_RETRY_QUEUE_FILE_NAME)
+    # keyed on `(url, manifest_path)`, so the shared url is in there once for each day
+    assert sorted((iter_entry.url, iter_entry.manifest_path) for iter_entry in retry_queue.get_pending()) == sorted([
+        (SHARED_URL, first_manifest_path), (OTHER_URL, first_manifest_path), (SHARED_URL, second_manifest_path)])
+    retry_queue.close()
+
+    assert _read_manifest_results(first_manifest_path)[SHARED_URL]["archive_url"] is None
+
+    # the wayback machine works again for the shared url, but not for the other one
+    stub_save = StubSave({OTHER_URL})
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", stub_save)
+
+    assert wbm_retry.retry_pending_wbm_saves(_retry_wbm_args(tmp_path)) == 1
+
+    # the shared url only got saved once, and was patched into both days
+    assert stub_save.saved_url_list == [SHARED_URL]
+
+    for iter_manifest_path in [first_manifest_path, second_manifest_path]:
+        iter_entry = _read_manifest_results(iter_manifest_path)[SHARED_URL]
+        assert iter_entry["archive_url"] == _archive_url(SHARED_URL)
+        assert iter_entry["retried_at"] is not None
+        assert iter_entry["warc_header_key"] == "header-0"
+
+    other_entry = _read_manifest_results(first_manifest_path)[OTHER_URL]
+    assert other_entry["archive_url"] is None
+    assert other_entry["retried_at"] is None
+
+    # only the url that failed again is left, with its attempt counted
+    retry_queue = wbm_retry.WbmRetryQueue(tmp_path / constants.WBM_RETRY_QUEUE_FILE_NAME)
+    pending_list = retry_queue.get_pending()
+    retry_queue.close()
+
+    assert [(iter_entry.url, iter_entry.manifest_path, iter_entry.attempts) for iter_entry in pending_list] == [
+        (OTHER_URL, first_manifest_path, 2)]
+
+    # and a retry with everything working empties the queue
+    monkeypatch.setattr(utils, "attempt_save_archive_of_webpage_in_wbm", StubSave(set()))
+    assert wbm_retry.retry_pending_wbm_saves(_retry_wbm_args(tmp_path)) == 0
+    assert _read_manifest_results(first_manifest_path)[OTHER_URL]["archive_url"] == _archive_url(OTHER_URL)
+
+
+def test_retry_queue_enqueue_updates_the_same_url_and_manifest(tmp_path):
+
+    retry_queue = wbm_retry.WbmRetryQueue(tmp_path / constants.WBM_RETRY_QUEUE_FILE_NAME)
+
+    retry_queue.enqueue(SHARED_URL, tmp_path / "a.json", "first error")
+    retry_queue.enqueue(SHARED_URL, tmp_path / "a.json", "second error")
+    retry_queue.enqueue(SHARED_URL, tmp_path / "b.json", "other day")
+
+    pending_dict = {iter_entry.manifest_path.name: iter_entry for iter_entry in retry_queue.get_pending()}
+    assert pending_dict["a.json"].attempts == 2
+    assert pending_dict["a.json"].last_error == "second error"
+    assert pending_dict["b.json"].attempts == 1
+
+    retry_queue.remove(SHARED_URL, tmp_path / "a.json")
+    assert [iter_entry.manifest_path.name for iter_entry in retry_queue.get_pending()] == ["b.json"]
+
+    retry_queue.close()
+
+
+def test_rewriting_the_manifest_keeps_retried_archive_urls(tmp_path):
+
+    manifest_path = tmp_path / "manifest.json"
+    entry_list = [{"url": SHARED_URL, "warc_header_key": "header-0", "archive_url": None}]
+
+    wbm_retry.write_wbm_manifest(manifest_path, "2021-01-15", entry_list)
+    assert wbm_retry.patch_wbm_manifest(manifest_path, SHARED_URL, _archive_url(SHARED_URL)) == 1
+
+    # a re-run of the day that still couldn't save the url doesn't throw away what `retry-wbm` found
+    wbm_retry.write_wbm_manifest(manifest_path, "2021-01-15", entry_list)
+    assert wbm_retry.get_archive_url_from_wbm_manifest(manifest_path, SHARED_URL) == _archive_url(SHARED_URL)
+
+
+def test_patching_a_manifest_that_does_not_exist_yet_creates_it(tmp_path):
+
+    manifest_path = tmp_path / "manifest.json"
+
+    assert wbm_retry.patch_wbm_manifest(manifest_path, SHARED_URL, _archive_url(SHARED_URL)) == 1
+    assert wbm_retry.get_archive_url_from_wbm_manifest(manifest_path, SHARED_URL) == _archive_url(SHARED_URL)
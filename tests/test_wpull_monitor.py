@@ -0,0 +1,250 @@
+import logging
+import sqlite3
+
+import pytest
+
+from archive_pogchamp_emote import constants as constants
+from archive_pogchamp_emote import model as model
+from archive_pogchamp_emote import wpull_monitor as wpull_monitor
+
+WARC_FILE_PREFIX = "2021-01-15_twitch-tv_pogchamp_emote"
+
+STALL_TIMEOUT_SECONDS = 60
+
+
+def _write_wpull_2_database(database_path, url_status_list):
+    ''' writes a database like the one wpull 2.x makes, the queue is `queued_urls` and the urls are in `url_strings`
+
+    @param url_status_list - a list of `(url, status)` tuples for the queue
+    '''
+
+    connection = sqlite3.connect(database_path)
+    connection.execute("CREATE TABLE url_strings (id INTEGER NOT NULL, url VARCHAR NOT NULL, PRIMARY KEY (id))")
+    connection.execute("CREATE TABLE queued_urls (id INTEGER NOT NULL, url_string_id INTEGER NOT NULL, "
+        "status VARCHAR(11) NOT NULL, try_count INTEGER NOT NULL, level INTEGER NOT NULL, PRIMARY KEY (id))")
+
+    for idx, (iter_url, iter_status) in enumerate(url_status_list, start=1):
+        connection.execute("INSERT INTO url_strings (id, url) VALUES (?, ?)", (idx, iter_url))
+        connection.execute("INSERT INTO queued_urls (id, url_string_id, status, try_count, level) VALUES (?, ?, ?, 0, 0)",
+            (idx, idx, iter_status))
+
+    connection.commit()
+    connection.close()
+
+
+def _write_wpull_1_database(database_path, url_status_list):
+    ''' writes a database like the one wpull 1.x makes, the queue is `urls` and the urls are in `url_strings`
+
+    @param url_status_list - a list of `(url, status)` tuples for the queue
+    '''
+
+    connection = sqlite3.connect(database_path)
+    connection.execute("CREATE TABLE url_strings (id INTEGER NOT NULL, url VARCHAR NOT NULL, PRIMARY KEY (id))")
+    connection.execute("CREATE TABLE urls (id INTEGER NOT NULL, url_str_id INTEGER NOT NULL, "
+        "status VARCHAR(11) NOT NULL, try_count INTEGER NOT NULL, level INTEGER NOT NULL, PRIMARY KEY (id))")
+
+    # wpull 1.x adds the url strings separately, so the ids don't have to line up
+    for idx, (iter_url, iter_status) in enumerate(url_status_list, start=1):
+        connection.execute("INSERT INTO url_strings (id, url) VALUES (?, ?)", (idx + 100, iter_url))
+        connection.execute("INSERT INTO urls (id, url_str_id, status, try_count, level) VALUES (?, ?, ?, 0, 0)",
+            (idx, idx + 100, iter_status))
+
+    connection.commit()
+    connection.close()
+
+
+WRITE_WPULL_DATABASE_PARAMETERS = pytest.mark.parametrize("write_wpull_database",
+    [_write_wpull_1_database, _write_wpull_2_database], ids=["wpull_1", "wpull_2"])
+
+# a crawl that has gotten through 4 of its 7 urls
+CRAWL_URL_STATUS_LIST = [
+    ("https://example.com/", "done"),
+    ("https://example.com/a.png", "done"),
+    ("https://example.com/b.png", "skipped"),
+    ("https://example.com/missing", "error"),
+    ("https://example.com/video.mp4", "in_progress"),
+    ("https://example.com/d.png", "todo"),
+    ("https://example.com/c.png", "todo"),
+]
+
+
+def _make_monitor(tmp_path, stall_timeout_seconds=STALL_TIMEOUT_SECONDS):
+
+    return wpull_monitor.WpullDatabaseMonitor(tmp_path / "wpull.sqlite3", tmp_path, WARC_FILE_PREFIX,
+        interval_seconds=1, stall_timeout_seconds=stall_timeout_seconds, stop_callback=lambda: None,
+        warc_tempdir_folder=tmp_path)
+
+
+def _progress(done=0, in_progress=0, warc_bytes=0, temp_bytes=0):
+
+    return model.WpullDatabaseProgress(todo=0, in_progress=in_progress, done=done, error=0, skipped=0,
+        warc_bytes=warc_bytes, temp_bytes=temp_bytes)
+
+
+def test_read_wpull_database_progress_counts_the_queue_the_warc_and_the_temp_files(tmp_path):
+
+    _write_wpull_2_database(tmp_path / "wpull.sqlite3", [
+        ("https://example.com/", "done"),
+        ("https://example.com/a.png", "done"),
+        ("https://example.com/video.mp4", "in_progress"),
+        ("https://example.com/b.png", "todo"),
+        ("https://example.com/missing", "error"),
+    ])
+    (tmp_path / f"{WARC_FILE_PREFIX}.warc.gz").write_bytes(b"w" * 100)
+    # the response that is still downloading, and the request that goes with it
+    (tmp_path / "tmp-wpull-warcsesrsp-5nrtwttn.tmp").write_bytes(b"r" * 5000)
+    (tmp_path / "tmp-wpull-warcsesreq-2klo_pbn.tmp").write_bytes(b"q" * 11)
+
+    progress = wpull_monitor.read_wpull_database_progress(tmp_path / "wpull.sqlite3", tmp_path, WARC_FILE_PREFIX, tmp_path)
+
+    assert progress == model.WpullDatabaseProgress(todo=1, in_progress=1, done=2, error=1, skipped=0,
+        warc_bytes=100, temp_bytes=5011)
+
+
+def test_read_wpull_database_progress_is_none_before_wpull_makes_its_queue(tmp_path):
+
+    database_path = tmp_path / "wpull.sqlite3"
+    assert wpull_monitor.read_wpull_database_progress(database_path, tmp_path, WARC_FILE_PREFIX) is None
+
+    sqlite3.connect(database_path).close()
+    assert wpull_monitor.read_wpull_database_progress(database_path, tmp_path, WARC_FILE_PREFIX) is None
+
+
+def test_a_download_that_is_still_going_is_not_a_stall(tmp_path):
+
+    monitor = _make_monitor(tmp_path)
+    monitor.update_stall_check(None, 0)
+
+    # one big video, nothing finishes and the WARC doesn't grow for a lot longer than the stall timeout
+    for iter_minute in range(1, 120):
+        assert not monitor.update_stall_check(_progress(in_progress=1, warc_bytes=100, temp_bytes=iter_minute * 1000), iter_minute * 60)
+
+    # until the download stops getting any bytes
+    assert not monitor.update_stall_check(_progress(in_progress=1, warc_bytes=100, temp_bytes=119 * 1000), 119 * 60 + 30)
+    assert monitor.update_stall_check(_progress(in_progress=1, warc_bytes=100, temp_bytes=119 * 1000), 120 * 60)
+
+
+def test_polls_without_any_data_are_not_activity(tmp_path):
+
+    monitor = _make_monitor(tmp_path)
+    progress = _progress(done=3, warc_bytes=100)
+
+    assert not monitor.update_stall_check(progress, 0)
+
+    # the database is locked (or gone), that doesn't keep the stall timeout from running out
+    assert not monitor.update_stall_check(None, STALL_TIMEOUT_SECONDS - 1)
+    assert monitor.update_stall_check(None, STALL_TIMEOUT_SECONDS)
+
+    # and the same progress afterwards still counts from the last activity
+    assert monitor.update_stall_check(progress, STALL_TIMEOUT_SECONDS + 1)
+
+    # but activity after the database comes back resets it
+    assert not monitor.update_stall_check(_progress(done=4, warc_bytes=100), STALL_TIMEOUT_SECONDS + 2)
+
+
+def test_a_database_that_is_never_there_is_a_stall(tmp_path):
+
+    monitor = _make_monitor(tmp_path)
+
+    assert not monitor.update_stall_check(None, 0)
+    assert not monitor.update_stall_check(None, STALL_TIMEOUT_SECONDS - 1)
+    assert monitor.update_stall_check(None, STALL_TIMEOUT_SECONDS)
+
+
+def test_polls_without_any_data_log_a_warning_every_so_often(tmp_path, caplog):
+
+    monitor = _make_monitor(tmp_path, stall_timeout_seconds=None)
+    warning_count = constants.WPULL_MONITOR_FAILED_POLL_WARNING_COUNT
+
+    def _num_warnings():
+        return len([iter_record for iter_record in caplog.records if iter_record.levelno == logging.WARNING])
+
+    with caplog.at_level(logging.WARNING, logger=wpull_monitor.logger.name):
+        for iter_poll in range(1, warning_count):
+            monitor.update_stall_check(None, iter_poll)
+        assert _num_warnings() == 0
+
+        monitor.update_stall_check(None, warning_count)
+        assert _num_warnings() == 1
+        assert f"in the last `{warning_count}` polls" in caplog.records[-1].getMessage()
+
+        # a poll with data starts the count over
+        monitor.update_stall_check(_progress(done=1), warning_count + 1)
+        for iter_poll in range(1, warning_count):
+            monitor.update_stall_check(None, warning_count + 1 + iter_poll)
+        assert _num_warnings() == 1
+
+        for iter_poll in range(warning_count, 2 * warning_count + 1):
+            monitor.update_stall_check(None, warning_count + 1 + iter_poll)
+        assert _num_warnings() == 3
+
+
+@pytest.mark.parametrize("changed_progress", [
+    _progress(done=4, warc_bytes=100),
+    _progress(done=3, in_progress=1, warc_bytes=100),
+    _progress(done=3, warc_bytes=200),
+    _progress(done=3, warc_bytes=100, temp_bytes=10),
+], ids=["url_finished", "url_started", "warc_grew", "temp_file_grew"])
+def test_any_kind_of_activity_resets_the_stall_timeout(tmp_path, changed_progress):
+
+    monitor = _make_monitor(tmp_path)
+
+    assert not monitor.update_stall_check(_progress(done=3, warc_bytes=100), 0)
+    assert not monitor.update_stall_check(changed_progress, STALL_TIMEOUT_SECONDS - 1)
+    assert not monitor.update_stall_check(changed_progress, STALL_TIMEOUT_SECONDS + 1)
+    assert monitor.update_stall_check(changed_progress, 2 * STALL_TIMEOUT_SECONDS)
+
+
+def test_no_stall_timeout_never_stalls(tmp_path):
+
+    monitor = _make_monitor(tmp_path, stall_timeout_seconds=None)
+    progress = _progress(done=3, warc_bytes=100)
+
+    assert not monitor.update_stall_check(progress, 0)
+    assert not monitor.update_stall_check(progress, 24 * 60 * 60)
+
+
+def _make_budget_monitor(tmp_path, crawl_budget):
+
+    return wpull_monitor.WpullDatabaseMonitor(tmp_path / "wpull.sqlite3", tmp_path, WARC_FILE_PREFIX,
+        interval_seconds=1, stall_timeout_seconds=None, stop_callback=lambda: None, crawl_budget=crawl_budget)
+
+
+@WRITE_WPULL_DATABASE_PARAMETERS
+@pytest.mark.parametrize("crawl_budget,expected_exceeded_limit_list", [
+    (model.CrawlBudget(), []),
+    (model.CrawlBudget(max_urls=4), []),
+    # done + error, skipped urls don't count
+    (model.CrawlBudget(max_urls=3), ["max_urls"]),
+    (model.CrawlBudget(max_bytes=1001), []),
+    (model.CrawlBudget(max_bytes=1000), ["max_bytes"]),
+    (model.CrawlBudget(max_wall_time_seconds=60), ["max_wall_time_seconds"]),
+    (model.CrawlBudget(max_urls=1, max_bytes=1, max_wall_time_seconds=3600), ["max_urls", "max_bytes"]),
+])
+def test_get_exceeded_limit_list_from_a_wpull_database(tmp_path, write_wpull_database, crawl_budget, expected_exceeded_limit_list):
+
+    write_wpull_database(tmp_path / "wpull.sqlite3", CRAWL_URL_STATUS_LIST)
+    (tmp_path / f"{WARC_FILE_PREFIX}.warc.gz").write_bytes(b"w" * 1000)
+
+    monitor = _make_budget_monitor(tmp_path, crawl_budget)
+    progress = monitor._poll_progress()
+
+    assert progress == model.WpullDatabaseProgress(todo=2, in_progress=1, done=2, error=1, skipped=1, warc_bytes=1000)
+    assert monitor.get_exceeded_limit_list(progress, elapsed_seconds=120) == expected_exceeded_limit_list
+
+
+def test_get_exceeded_limit_list_without_any_progress_only_checks_the_wall_time(tmp_path):
+
+    monitor = _make_budget_monitor(tmp_path, model.CrawlBudget(max_urls=1, max_bytes=1, max_wall_time_seconds=60))
+
+    assert monitor.get_exceeded_limit_list(None, elapsed_seconds=30) == []
+    assert monitor.get_exceeded_limit_list(None, elapsed_seconds=60) == ["max_wall_time_seconds"]
+
+
+@WRITE_WPULL_DATABASE_PARAMETERS
+def test_the_crawl_budget_report_has_the_urls_that_were_cut(tmp_path, write_wpull_database):
+
+    write_wpull_database(tmp_path / "wpull.sqlite3", CRAWL_URL_STATUS_LIST)
+
+    assert wpull_monitor.read_wpull_database_unfinished_urls(tmp_path / "wpull.sqlite3") == [
+        "https://example.com/c.png", "https://example.com/d.png", "https://example.com/video.mp4"]